@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine
+from app.database import settings
+from app.models import Transacao, Checkin
+from migrate_signed_tickets import remover_checkins_duplicados
+
+INDICES = ("ix_transacoes_evento_status", "ix_checkins_evento_transacao")
+
+def add_dashboard_indexes():
+    """Create the check-in dashboard indexes (sales count and no-show anti-join) on an existing database"""
+    engine = create_engine(settings.database_url)
+    # o índice de check-ins é único: repetidos do mesmo ingresso impedem a criação
+    remover_checkins_duplicados(engine)
+    
+    for model in (Transacao, Checkin):
+        for index in model.__table__.indexes:
+            if index.name not in INDICES:
+                continue
+            try:
+                index.create(bind=engine, checkfirst=True)
+                print(f"✅ Index {index.name} ok")
+            except Exception as e:
+                print(f"❌ Error creating index {index.name}: {e}")
+                sys.exit(1)
+    
+    print("✅ Dashboard indexes migration completed successfully!")
+
+if __name__ == "__main__":
+    add_dashboard_indexes()
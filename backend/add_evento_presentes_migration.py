@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, inspect, text
+from app.database import settings
+
+def add_evento_presentes():
+    """Add eventos.presentes (check-in counter that enforces capacity) and seed it from existing check-ins"""
+    engine = create_engine(settings.database_url)
+    
+    try:
+        with engine.begin() as conn:
+            colunas = {coluna["name"] for coluna in inspect(conn).get_columns("eventos")}
+            if "presentes" not in colunas:
+                conn.execute(text("ALTER TABLE eventos ADD COLUMN presentes INTEGER NOT NULL DEFAULT 0"))
+                print("✅ Column eventos.presentes added")
+            
+            atualizados = conn.execute(text(
+                "UPDATE eventos SET presentes = (SELECT COUNT(*) FROM checkins WHERE checkins.evento_id = eventos.id)"
+            )).rowcount
+            print(f"✅ Check-in counters seeded for {atualizados} events")
+    except Exception as e:
+        print(f"❌ Evento presentes migration failed: {e}")
+        sys.exit(1)
+    
+    print("✅ Evento presentes migration completed successfully!")
+
+if __name__ == "__main__":
+    add_evento_presentes()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, inspect, text
+from app.database import settings
+from app.models import Produto, Comanda, VendaPDV, ContadorSincronizacao, RemocaoSincronizacao
+
+MODELOS = (Produto, Comanda, VendaPDV)
+
+def add_pdv_sync_indexes():
+    """Create keyset/delta-sync columns, tables and indexes on PDV tables of an existing database"""
+    engine = create_engine(settings.database_url)
+    sqlite = engine.dialect.name == "sqlite"
+
+    try:
+        ContadorSincronizacao.__table__.create(bind=engine, checkfirst=True)
+        RemocaoSincronizacao.__table__.create(bind=engine, checkfirst=True)
+        print("✅ Sync counter and tombstone tables ok")
+
+        with engine.begin() as conn:
+            for model in MODELOS:
+                tabela = model.__tablename__
+                colunas = {c["name"] for c in inspect(conn).get_columns(tabela)}
+                if "versao" not in colunas:
+                    conn.execute(text(f"ALTER TABLE {tabela} ADD COLUMN versao BIGINT NOT NULL DEFAULT 0"))
+                    # Versões iniciais distintas dentro da tabela; o contador do evento começa acima delas
+                    conn.execute(text(f"UPDATE {tabela} SET versao = id"))
+                    print(f"✅ Column {tabela}.versao added")
+
+                if sqlite:
+                    # Linhas gravadas pelo server_default ficaram sem microssegundos; o keyset
+                    # compara a coluna crua, então todas precisam do mesmo formato
+                    conn.execute(text(
+                        f"UPDATE {tabela} SET criado_em = criado_em || '.000000' WHERE length(criado_em) = 19"
+                    ))
+
+                conn.execute(text(f"DROP INDEX IF EXISTS ix_{tabela}_evento_atualizado_em"))
+
+            maximo = " UNION ALL ".join(
+                f"SELECT evento_id, MAX(versao) AS versao FROM {model.__tablename__} GROUP BY evento_id"
+                for model in MODELOS
+            )
+            linhas = conn.execute(text(f"SELECT evento_id, MAX(versao) FROM ({maximo}) v GROUP BY evento_id")).all()
+            for evento_id, versao in linhas:
+                existe = conn.execute(
+                    text("SELECT 1 FROM contadores_sincronizacao WHERE evento_id = :evento_id"),
+                    {"evento_id": evento_id}
+                ).first()
+                if existe:
+                    sql = "UPDATE contadores_sincronizacao SET versao = :versao WHERE evento_id = :evento_id AND versao < :versao"
+                else:
+                    sql = "INSERT INTO contadores_sincronizacao (evento_id, versao) VALUES (:evento_id, :versao)"
+                conn.execute(text(sql), {"evento_id": evento_id, "versao": versao})
+            print(f"✅ Sync counters seeded for {len(linhas)} events")
+
+        for model in MODELOS:
+            for index in model.__table__.indexes:
+                if not index.name.startswith(f"ix_{model.__tablename__}_evento_"):
+                    continue
+                index.create(bind=engine, checkfirst=True)
+                print(f"✅ Index {index.name} ok")
+    except Exception as e:
+        print(f"❌ PDV sync migration failed: {e}")
+        sys.exit(1)
+
+    print("✅ PDV sync indexes migration completed successfully!")
+
+if __name__ == "__main__":
+    add_pdv_sync_indexes()
@@ -1,17 +1,34 @@
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from .database import get_db, settings
-from .models import Usuario
+from .database import get_async_db, settings
+from .models import Usuario, TipoUsuario
 from .schemas import TokenData
+from .metrics import metricas
 import secrets
 import string
+import threading
+import time
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes com custo diferente de BCRYPT_ROUNDS são considerados desatualizados
+# e regravados no próximo login (verify_and_update).
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.bcrypt_rounds,
+    bcrypt__min_rounds=settings.bcrypt_rounds,
+    bcrypt__max_rounds=settings.bcrypt_rounds
+)
 security = HTTPBearer()
 
 def verificar_senha(senha_plana: str, senha_hash: str) -> bool:
@@ -20,6 +37,54 @@ def verificar_senha(senha_plana: str, senha_hash: str) -> bool:
 def gerar_hash_senha(senha: str) -> str:
     return pwd_context.hash(senha)
 
+class ExecutorSenhas:
+    """
+    Executor dedicado para bcrypt, fora do event loop.
+
+    Cada verificação leva ~100–300 ms de CPU; rodando no loop, um pico de
+    logins congela WebSockets e vendas. Aqui no máximo `workers` hashes rodam
+    ao mesmo tempo (o bcrypt libera o GIL) e, acima de `fila_max` pedidos
+    pendentes, novos logins recebem 503 em vez de aumentar a fila.
+    """
+
+    def __init__(self, workers: int = 2, fila_max: int = 200):
+        self.fila_max = fila_max
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="senhas")
+        self._pendentes = 0
+        self._lock = threading.Lock()
+        metricas.registrar_gauge("auth.senhas.fila", lambda: self._pendentes)
+
+    async def executar(self, funcao, *args):
+        with self._lock:
+            if self._pendentes >= self.fila_max:
+                metricas.incrementar("auth.senhas.rejeitadas")
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Muitas autenticações simultâneas, tente novamente em instantes"
+                )
+            self._pendentes += 1
+
+        enfileirado_em = time.perf_counter()
+
+        def tarefa():
+            metricas.observar("auth.senhas.espera_ms", (time.perf_counter() - enfileirado_em) * 1000)
+            return funcao(*args)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, tarefa)
+        finally:
+            with self._lock:
+                self._pendentes -= 1
+
+executor_senhas = ExecutorSenhas(settings.senha_workers, settings.senha_fila_max)
+
+async def gerar_hash_senha_async(senha: str) -> str:
+    return await executor_senhas.executar(pwd_context.hash, senha)
+
+async def verificar_e_atualizar_senha_async(senha_plana: str, senha_hash: str):
+    """Retorna (válida, novo_hash); novo_hash vem preenchido quando o custo do hash mudou"""
+    return await executor_senhas.executar(pwd_context.verify_and_update, senha_plana, senha_hash)
+
 def gerar_codigo_verificacao() -> str:
     """Gera código de 6 dígitos para autenticação multi-fator"""
     return ''.join(secrets.choice(string.digits) for _ in range(6))
@@ -50,13 +115,95 @@ def verificar_token(credentials: HTTPAuthorizationCredentials = Depends(security
         raise credentials_exception
     return token_data
 
-def obter_usuario_atual(token_data: TokenData = Depends(verificar_token), db: Session = Depends(get_db)):
-    usuario = db.query(Usuario).filter(Usuario.cpf == token_data.cpf).first()
-    if usuario is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Usuário não encontrado"
+@dataclass(frozen=True)
+class UsuarioAutenticado:
+    """Snapshot imutável do usuário logado, desacoplado da sessão do banco"""
+    id: int
+    cpf: str
+    nome: str
+    email: str
+    telefone: Optional[str]
+    tipo: TipoUsuario
+    ativo: bool
+    ultimo_login: Optional[datetime]
+    criado_em: Optional[datetime]
+
+    @classmethod
+    def de_usuario(cls, usuario: Usuario) -> "UsuarioAutenticado":
+        return cls(
+            id=usuario.id, cpf=usuario.cpf, nome=usuario.nome, email=usuario.email,
+            telefone=usuario.telefone, tipo=usuario.tipo, ativo=bool(usuario.ativo),
+            ultimo_login=usuario.ultimo_login, criado_em=usuario.criado_em
         )
+
+class CacheUsuarios:
+    """
+    Cache TTL/LRU de usuários autenticados, chaveado pelo `sub` (CPF) do token.
+
+    Evita a consulta ao banco em toda requisição. As rotas que alteram usuários
+    chamam `invalidar`; como cada processo tem o seu cache, alterações feitas
+    por outro processo aparecem em no máximo `ttl_segundos`.
+    """
+
+    def __init__(self, ttl_segundos: int = 30, max_usuarios: int = 10000):
+        self.ttl_segundos = ttl_segundos
+        self.max_usuarios = max_usuarios
+        self._itens: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, cpf: str) -> Optional[UsuarioAutenticado]:
+        with self._lock:
+            item = self._itens.get(cpf)
+            if item is None:
+                return None
+            usuario, expira_em = item
+            if expira_em < time.monotonic():
+                del self._itens[cpf]
+                return None
+            self._itens.move_to_end(cpf)
+            return usuario
+
+    def armazenar(self, usuario: UsuarioAutenticado):
+        if self.ttl_segundos <= 0:
+            return
+        with self._lock:
+            self._itens[usuario.cpf] = (usuario, time.monotonic() + self.ttl_segundos)
+            self._itens.move_to_end(usuario.cpf)
+            while len(self._itens) > self.max_usuarios:
+                self._itens.popitem(last=False)
+                metricas.incrementar("auth.cache_usuarios.descartes")
+
+    def invalidar(self, *cpfs: str):
+        with self._lock:
+            for cpf in cpfs:
+                self._itens.pop(cpf, None)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def __len__(self) -> int:
+        return len(self._itens)
+
+cache_usuarios = CacheUsuarios(settings.auth_cache_ttl_segundos, settings.auth_cache_max_usuarios)
+metricas.registrar_gauge("auth.cache_usuarios.tamanho", lambda: len(cache_usuarios))
+
+async def obter_usuario_atual(token_data: TokenData = Depends(verificar_token), db: AsyncSession = Depends(get_async_db)):
+    usuario = cache_usuarios.obter(token_data.cpf)
+    if usuario is not None:
+        metricas.incrementar("auth.cache_usuarios.hits")
+    else:
+        metricas.incrementar("auth.cache_usuarios.misses")
+        registro = (await db.execute(
+            select(Usuario).where(Usuario.cpf == token_data.cpf)
+        )).scalar_one_or_none()
+        if registro is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Usuário não encontrado"
+            )
+        usuario = UsuarioAutenticado.de_usuario(registro)
+        cache_usuarios.armazenar(usuario)
     if not usuario.ativo:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -64,7 +211,7 @@ def obter_usuario_atual(token_data: TokenData = Depends(verificar_token), db: Se
         )
     return usuario
 
-def verificar_permissao_admin(usuario_atual: Usuario = Depends(obter_usuario_atual)):
+async def verificar_permissao_admin(usuario_atual: UsuarioAutenticado = Depends(obter_usuario_atual)):
     if usuario_atual.tipo.value != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -72,7 +219,7 @@ def verificar_permissao_admin(usuario_atual: Usuario = Depends(obter_usuario_atu
         )
     return usuario_atual
 
-def verificar_permissao_promoter(usuario_atual: Usuario = Depends(obter_usuario_atual)):
+async def verificar_permissao_promoter(usuario_atual: UsuarioAutenticado = Depends(obter_usuario_atual)):
     if usuario_atual.tipo.value not in ["admin", "promoter"]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -88,6 +235,25 @@ def autenticar_usuario(cpf: str, senha: str, db: Session):
         return False
     return usuario
 
+async def autenticar_usuario_async(cpf: str, senha: str, db: AsyncSession):
+    """Como autenticar_usuario, com bcrypt no executor e rehash transparente quando BCRYPT_ROUNDS muda"""
+    usuario = (await db.execute(select(Usuario).where(Usuario.cpf == cpf))).scalar_one_or_none()
+    if not usuario:
+        return False
+    senha_hash = usuario.senha_hash
+    # Devolve a conexão ao pool enquanto o bcrypt roda; com muitos logins
+    # simultâneos, segurá-la esgotaria o pool.
+    await db.rollback()
+    valida, novo_hash = await verificar_e_atualizar_senha_async(senha, senha_hash)
+    if not valida:
+        return False
+    await db.refresh(usuario)
+    if novo_hash:
+        usuario.senha_hash = novo_hash
+        await db.commit()
+        metricas.incrementar("auth.senhas.rehash")
+    return usuario
+
 def validar_cpf_basico(cpf: str) -> bool:
     """Validação básica de CPF (formato e dígitos verificadores)"""
     import re
@@ -1,14 +1,66 @@
-from sqlalchemy import create_engine
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from pydantic_settings import BaseSettings
+from .metrics import metricas
+from .sqlite_edge import aplicar_pragmas_edge, EscritorSQLite
 import os
 
+logger = logging.getLogger(__name__)
+
 class Settings(BaseSettings):
     database_url: str = os.getenv("DATABASE_URL", "sqlite:///./eventos.db")
     secret_key: str = os.getenv("SECRET_KEY", "sua-chave-secreta-super-segura-aqui")
+    replica_database_url: str = os.getenv("REPLICA_DATABASE_URL", "")  # vazio: leituras vão ao primário
+    replica_atraso_max_segundos: float = float(os.getenv("REPLICA_ATRASO_MAX_SEGUNDOS", "30"))
+    replica_verificacao_segundos: float = float(os.getenv("REPLICA_VERIFICACAO_SEGUNDOS", "5"))
+    
+    # Pool de conexões (rotas transacionais)
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    db_max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    db_pool_timeout: int = int(os.getenv("DB_POOL_TIMEOUT", "5"))
+    db_pool_recycle: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    db_pool_pre_ping: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    db_statement_timeout_ms: int = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "10000"))
+    
+    # SQLite "edge" (casas pequenas sem PostgreSQL); ver SQLITE_EDGE.md
+    sqlite_perfil: str = os.getenv("SQLITE_PERFIL", "edge")  # edge | padrao
+    sqlite_mmap_mb: int = int(os.getenv("SQLITE_MMAP_MB", "256"))
+    sqlite_busy_timeout_ms: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    sqlite_cache_kb: int = int(os.getenv("SQLITE_CACHE_KB", "65536"))
+    sqlite_escritor_unico: bool = os.getenv("SQLITE_ESCRITOR_UNICO", "true").lower() == "true"
+    
+    # Pool separado para relatórios e exportações (usado também pela réplica)
+    relatorios_pool_size: int = int(os.getenv("RELATORIOS_POOL_SIZE", "3"))
+    relatorios_max_overflow: int = int(os.getenv("RELATORIOS_MAX_OVERFLOW", "2"))
+    relatorios_pool_timeout: int = int(os.getenv("RELATORIOS_POOL_TIMEOUT", "30"))
+    relatorios_statement_timeout_ms: int = int(os.getenv("RELATORIOS_STATEMENT_TIMEOUT_MS", "120000"))
+    
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    auth_cache_ttl_segundos: int = int(os.getenv("AUTH_CACHE_TTL_SEGUNDOS", "30"))
+    auth_cache_max_usuarios: int = int(os.getenv("AUTH_CACHE_MAX_USUARIOS", "10000"))
+    bcrypt_rounds: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    senha_workers: int = int(os.getenv("SENHA_WORKERS", "2"))
+    senha_fila_max: int = int(os.getenv("SENHA_FILA_MAX", "200"))
+    codigo_verificacao_backend: str = os.getenv("CODIGO_VERIFICACAO_BACKEND", "banco")  # banco | memoria
+    codigo_verificacao_ttl_segundos: int = int(os.getenv("CODIGO_VERIFICACAO_TTL_SEGUNDOS", "600"))
+    codigo_verificacao_max_tentativas: int = int(os.getenv("CODIGO_VERIFICACAO_MAX_TENTATIVAS", "5"))
+    codigo_verificacao_max_codigos: int = int(os.getenv("CODIGO_VERIFICACAO_MAX_CODIGOS", "10000"))
+    
+    # Ingressos assinados (QR): HMAC verificado na portaria sem consultar o banco
+    ticket_segredo: str = os.getenv("TICKET_SEGREDO", "")  # vazio: usa a SECRET_KEY
+    ticket_segredo_anterior: str = os.getenv("TICKET_SEGREDO_ANTERIOR", "")  # aceito durante a troca de chave
+    ticket_validade_horas: int = int(os.getenv("TICKET_VALIDADE_HORAS", "24"))  # após o início do evento
+    # estado de check-in em memória: presentes e entradas de outros processos relidos do banco
+    ocupacao_atualizacao_segundos: float = float(os.getenv("OCUPACAO_ATUALIZACAO_SEGUNDOS", "5"))
     
     # Configurações de Email
     email_host: str = os.getenv("EMAIL_HOST", "smtp.gmail.com")
@@ -18,23 +70,342 @@ class Settings(BaseSettings):
     email_from: str = os.getenv("EMAIL_FROM", "")
     email_from_name: str = os.getenv("EMAIL_FROM_NAME", "Sistema Universal")
     email_use_tls: bool = os.getenv("EMAIL_USE_TLS", "true").lower() == "true"
+    email_modo_teste: bool = os.getenv("EMAIL_MODO_TESTE", "true").lower() == "true"  # só no console
+    email_conexoes: int = int(os.getenv("EMAIL_CONEXOES", "2"))  # transacionais (código, boas-vindas)
+    email_conexoes_massa: int = int(os.getenv("EMAIL_CONEXOES_MASSA", "2"))  # lembretes, ingressos
+    email_fila_max: int = int(os.getenv("EMAIL_FILA_MAX", "10000"))
+    email_mensagens_por_conexao: int = int(os.getenv("EMAIL_MENSAGENS_POR_CONEXAO", "100"))
+    email_timeout_segundos: float = float(os.getenv("EMAIL_TIMEOUT_SEGUNDOS", "30"))
+    email_ocioso_segundos: float = float(os.getenv("EMAIL_OCIOSO_SEGUNDOS", "30"))
+    
+    # Agendador e alertas
+    agendador_ativo: bool = os.getenv("AGENDADOR_ATIVO", "true").lower() == "true"
+    agendador_jitter_segundos: float = float(os.getenv("AGENDADOR_JITTER_SEGUNDOS", "60"))
+    alertas_intervalo_minutos: float = float(os.getenv("ALERTAS_INTERVALO_MINUTOS", "30"))
+    alertas_timeout_regra_segundos: float = float(os.getenv("ALERTAS_TIMEOUT_REGRA_SEGUNDOS", "120"))
+
+    # Processos do servidor (uvicorn --workers lê a mesma variável); limites de taxa
+    # mantidos em memória são divididos por ele para valerem no total
+    web_concurrency: int = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+    # Convites em massa pelo WhatsApp (limite de envio do provedor)
+    whatsapp_taxa_mensagens_segundo: float = float(os.getenv("WHATSAPP_TAXA_MENSAGENS_SEGUNDO", "20"))
+    whatsapp_rajada_mensagens: float = float(os.getenv("WHATSAPP_RAJADA_MENSAGENS", "20"))
+    whatsapp_envio_concorrencia: int = int(os.getenv("WHATSAPP_ENVIO_CONCORRENCIA", "10"))
+    whatsapp_envio_tentativas: int = int(os.getenv("WHATSAPP_ENVIO_TENTATIVAS", "3"))
+    whatsapp_envio_backoff_ms: int = int(os.getenv("WHATSAPP_ENVIO_BACKOFF_MS", "500"))
+    whatsapp_envio_max_telefones: int = int(os.getenv("WHATSAPP_ENVIO_MAX_TELEFONES", "5000"))
+
+    # Outbox de envios externos (WhatsApp, email, n8n)
+    outbox_ativo: bool = os.getenv("OUTBOX_ATIVO", "true").lower() == "true"
+    outbox_workers: int = int(os.getenv("OUTBOX_WORKERS", "2"))
+    outbox_lote: int = int(os.getenv("OUTBOX_LOTE", "50"))
+    outbox_concorrencia: int = int(os.getenv("OUTBOX_CONCORRENCIA", "10"))
+    outbox_tentativas: int = int(os.getenv("OUTBOX_TENTATIVAS", "5"))
+    outbox_backoff_segundos: float = float(os.getenv("OUTBOX_BACKOFF_SEGUNDOS", "2"))
+    outbox_backoff_max_segundos: float = float(os.getenv("OUTBOX_BACKOFF_MAX_SEGUNDOS", "600"))
+    outbox_prazo_segundos: float = float(os.getenv("OUTBOX_PRAZO_SEGUNDOS", "300"))
+    outbox_intervalo_ms: int = int(os.getenv("OUTBOX_INTERVALO_MS", "500"))
+
+    # Webhooks de entrada (WhatsApp, n8n): gravados e confirmados na hora, processados pelos workers
+    webhooks_ativo: bool = os.getenv("WEBHOOKS_ATIVO", "true").lower() == "true"
+    webhooks_workers: int = int(os.getenv("WEBHOOKS_WORKERS", "2"))
+    webhooks_lote: int = int(os.getenv("WEBHOOKS_LOTE", "50"))
+    webhooks_tentativas: int = int(os.getenv("WEBHOOKS_TENTATIVAS", "5"))
+    webhooks_backoff_segundos: float = float(os.getenv("WEBHOOKS_BACKOFF_SEGUNDOS", "2"))
+    webhooks_backoff_max_segundos: float = float(os.getenv("WEBHOOKS_BACKOFF_MAX_SEGUNDOS", "300"))
+    webhooks_prazo_segundos: float = float(os.getenv("WEBHOOKS_PRAZO_SEGUNDOS", "120"))
+    webhooks_intervalo_ms: int = int(os.getenv("WEBHOOKS_INTERVALO_MS", "200"))
+
+    # Cliente HTTP de saída (n8n e webhooks)
+    http_limite_conexoes: int = int(os.getenv("HTTP_LIMITE_CONEXOES", "100"))
+    http_limite_por_host: int = int(os.getenv("HTTP_LIMITE_POR_HOST", "10"))
+    http_timeout_segundos: float = float(os.getenv("HTTP_TIMEOUT_SEGUNDOS", "10"))
+    http_timeout_conexao_segundos: float = float(os.getenv("HTTP_TIMEOUT_CONEXAO_SEGUNDOS", "3"))
+    http_keepalive_segundos: float = float(os.getenv("HTTP_KEEPALIVE_SEGUNDOS", "30"))
+    n8n_webhook_lote_max: int = int(os.getenv("N8N_WEBHOOK_LOTE_MAX", "1"))  # >1: vários eventos por POST
+    
+    # WebSocket dos dashboards: mensagens recentes guardadas por evento para retomar a conexão
+    ws_buffer_mensagens: int = int(os.getenv("WS_BUFFER_MENSAGENS", "500"))
+    ws_heartbeat_ativo: bool = os.getenv("WS_HEARTBEAT_ATIVO", "true").lower() == "true"
+    ws_ping_intervalo_segundos: float = float(os.getenv("WS_PING_INTERVALO_SEGUNDOS", "20"))
+    ws_ping_prazo_segundos: float = float(os.getenv("WS_PING_PRAZO_SEGUNDOS", "10"))
+    ws_fila_envio: int = int(os.getenv("WS_FILA_ENVIO", "256"))  # mensagens pendentes por conexão
+    ws_fluxo_retencao_segundos: float = float(os.getenv("WS_FLUXO_RETENCAO_SEGUNDOS", "3600"))
+    
+    # Comprovantes / impressoras térmicas
+    receipt_workers: int = int(os.getenv("RECEIPT_WORKERS", "2"))
+    impressoras_escpos: str = os.getenv("IMPRESSORAS_ESCPOS", "")  # nome=host:porta,nome2=host:porta
+    impressao_lote_max: int = int(os.getenv("IMPRESSAO_LOTE_MAX", "10"))
+    impressao_janela_ms: int = int(os.getenv("IMPRESSAO_JANELA_MS", "200"))
     
     class Config:
         env_file = ".env"
 
 settings = Settings()
 
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {}
+def _classe_pool_medida(base, nome: str):
+    """
+    Pool que mede a espera por conexão. A subclasse carrega o nome porque o
+    SQLAlchemy recria o pool pela própria classe em dispose().
+    """
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return base._do_get(self)
+        except PoolTimeoutError:
+            metricas.incrementar(f"db.{nome}.checkout_timeouts")
+            raise
+        finally:
+            metricas.observar(f"db.{nome}.checkout_espera_ms", (time.perf_counter() - inicio) * 1000)
+
+    return type(f"{base.__name__}_{nome}", (base,), {"_do_get": _do_get})
+
+def _registrar_gauges_pool(engine, nome: str):
+    metricas.registrar_gauge(f"db.{nome}.conexoes_em_uso", lambda: engine.pool.checkedout())
+    metricas.registrar_gauge(f"db.{nome}.conexoes_livres", lambda: engine.pool.checkedin())
+    metricas.registrar_gauge(f"db.{nome}.overflow", lambda: engine.pool.overflow())
+
+def _opcoes_engine(url: str, nome: str, pool_size: int, max_overflow: int, pool_timeout: int,
+                   assincrono: bool = False) -> dict:
+    connect_args = {}
+    if url.startswith("sqlite") and not assincrono:
+        connect_args["check_same_thread"] = False
+
+    opcoes = {"connect_args": connect_args, "pool_pre_ping": settings.db_pool_pre_ping}
+    if ":memory:" not in url:
+        opcoes.update(
+            poolclass=_classe_pool_medida(AsyncAdaptedQueuePool if assincrono else QueuePool, nome),
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            pool_recycle=settings.db_pool_recycle,
+        )
+    return opcoes
+
+def _perfil_edge(url: str) -> bool:
+    return url.startswith("sqlite") and ":memory:" not in url and settings.sqlite_perfil == "edge"
+
+def _registrar_pragmas_edge(engine):
+    def ao_conectar(dbapi_conn, connection_record):
+        aplicar_pragmas_edge(
+            dbapi_conn, settings.sqlite_mmap_mb, settings.sqlite_busy_timeout_ms, settings.sqlite_cache_kb
+        )
+    event.listen(engine, "connect", ao_conectar)
+
+def criar_engine(url: str, nome: str = "oltp", pool_size: int = None, max_overflow: int = None,
+                 pool_timeout: int = None):
+    """
+    Engine síncrono com o pool configurado em Settings e métricas de espera
+    por conexão (`db.<nome>.checkout_espera_ms`). O statement timeout não é do
+    engine: vai em cada transação da sessão (ver _aplicar_statement_timeout).
+    """
+    engine = create_engine(url, **_opcoes_engine(
+        url, nome,
+        settings.db_pool_size if pool_size is None else pool_size,
+        settings.db_max_overflow if max_overflow is None else max_overflow,
+        settings.db_pool_timeout if pool_timeout is None else pool_timeout,
+    ))
+    if _perfil_edge(url):
+        _registrar_pragmas_edge(engine)
+    _registrar_gauges_pool(engine, nome)
+    return engine
+
+engine = criar_engine(settings.database_url)
+
+# Relatórios e exportações usam outro pool, com timeout maior: uma exportação
+# pesada não segura as conexões das vendas.
+def _criar_engine_leitura(url: str, nome: str):
+    return criar_engine(
+        url,
+        nome=nome,
+        pool_size=settings.relatorios_pool_size,
+        max_overflow=settings.relatorios_max_overflow,
+        pool_timeout=settings.relatorios_pool_timeout,
+    )
+
+engine_relatorios = _criar_engine_leitura(settings.database_url, "relatorios")
+engine_replica = (
+    _criar_engine_leitura(settings.replica_database_url, "replica")
+    if settings.replica_database_url else None
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Statement timeout por transação (SET LOCAL), lido de session.info: cada
+# sessão leva o seu, e uma rota pode trocá-lo em db.info antes da primeira consulta.
+OLTP_INFO = {"statement_timeout_ms": settings.db_statement_timeout_ms}
+RELATORIOS_INFO = {"statement_timeout_ms": settings.relatorios_statement_timeout_ms}
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, info=OLTP_INFO)
+SessionRelatorios = sessionmaker(autocommit=False, autoflush=False, bind=engine_relatorios, info=RELATORIOS_INFO)
+SessionReplica = (
+    sessionmaker(autocommit=False, autoflush=False, bind=engine_replica, info=RELATORIOS_INFO)
+    if engine_replica else None
+)
 Base = declarative_base()
 
+@event.listens_for(Session, "after_begin")
+def _aplicar_statement_timeout(session, transaction, connection):
+    """No PostgreSQL, limita cada comando da transação; no SQLite não há equivalente."""
+    timeout_ms = session.info.get("statement_timeout_ms")
+    if timeout_ms and connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+def _bloquear_escrita(session, flush_context, instances):
+    raise RuntimeError("Sessão somente leitura: use get_db para gravar")
+
+def medir_atraso_replica(conn) -> float:
+    """Atraso da réplica em segundos. Só o PostgreSQL informa; nos demais bancos vale 0."""
+    if conn.dialect.name != "postgresql":
+        return 0.0
+    # Réplica sem WAL pendente está em dia, mesmo que o último replay seja antigo
+    return float(conn.execute(text(
+        "SELECT CASE WHEN NOT pg_is_in_recovery() "
+        "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+        "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+    )).scalar())
+
+class RoteadorLeitura:
+    """
+    Entrega sessões somente leitura na réplica quando ela existe, responde e
+    está dentro do atraso máximo; senão, no pool de relatórios do primário.
+    O atraso é medido no máximo a cada `intervalo_verificacao` segundos.
+    """
+
+    def __init__(self, sessao_replica, sessao_primario, atraso_max_segundos: float,
+                 intervalo_verificacao: float, medir_atraso=medir_atraso_replica):
+        self.sessao_replica = sessao_replica
+        self.sessao_primario = sessao_primario
+        self.atraso_max_segundos = atraso_max_segundos
+        self.intervalo_verificacao = intervalo_verificacao
+        self.medir_atraso = medir_atraso
+        self._atraso: Optional[float] = None
+        self._verificado_em = float("-inf")
+        self._lock = threading.Lock()
+        metricas.registrar_gauge("db.replica.atraso_segundos", lambda: self._atraso)
+
+    def atraso_replica(self) -> Optional[float]:
+        """Último atraso medido; None se a réplica não existe ou não respondeu"""
+        if self.sessao_replica is None:
+            return None
+        with self._lock:
+            if time.monotonic() - self._verificado_em < self.intervalo_verificacao:
+                return self._atraso
+            self._verificado_em = time.monotonic()
+        try:
+            with self.sessao_replica() as db:
+                atraso = self.medir_atraso(db.connection())
+        except Exception as e:
+            logger.warning(f"Réplica indisponível, leituras irão ao primário: {e}")
+            atraso = None
+        self._atraso = atraso
+        return atraso
+
+    def sessao(self, atraso_max_segundos: Optional[float] = None):
+        limite = self.atraso_max_segundos if atraso_max_segundos is None else atraso_max_segundos
+        atraso = self.atraso_replica()
+        if atraso is not None and atraso <= limite:
+            metricas.incrementar("db.leitura.replica")
+            db = self.sessao_replica()
+        else:
+            metricas.incrementar("db.leitura.primario")
+            db = self.sessao_primario()
+        db.info["somente_leitura"] = True
+        event.listen(db, "before_flush", _bloquear_escrita)
+        return db
+
+roteador_leitura = RoteadorLeitura(
+    SessionReplica, SessionRelatorios,
+    settings.replica_atraso_max_segundos, settings.replica_verificacao_segundos
+)
+
+def get_db_leitura():
+    """Sessão para rotas somente leitura (relatórios, dashboards, exportações)"""
+    db = roteador_leitura.sessao()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Camada assíncrona (rotas quentes). O caminho síncrono acima continua valendo
+# para scripts, migrações e rotas ainda não portadas.
+DRIVERS_ASYNC = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "postgresql+psycopg": "postgresql+asyncpg",
+}
+
+def url_async(url: str) -> str:
+    """Converte a DATABASE_URL síncrona para o driver assíncrono equivalente"""
+    esquema, separador, resto = url.partition("://")
+    return f"{DRIVERS_ASYNC.get(esquema, esquema)}{separador}{resto}"
+
+def criar_async_sessionmaker(url: str, nome: str = "oltp_async") -> async_sessionmaker:
+    async_engine = create_async_engine(url_async(url), **_opcoes_engine(
+        url, nome, settings.db_pool_size, settings.db_max_overflow,
+        settings.db_pool_timeout, assincrono=True
+    ))
+    if _perfil_edge(url):
+        _registrar_pragmas_edge(async_engine.sync_engine)
+    _registrar_gauges_pool(async_engine.sync_engine, nome)
+    # expire_on_commit=False: depois do commit os objetos continuam legíveis sem
+    # nova ida ao banco (lazy load implícito não é permitido em AsyncSession)
+    return async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False, info=OLTP_INFO)
+
+_async_session_local: Optional[async_sessionmaker] = None
+
+def AsyncSessionLocal() -> AsyncSession:
+    # O engine assíncrono é criado na primeira utilização, para que scripts
+    # síncronos não dependam de aiosqlite/asyncpg instalados.
+    global _async_session_local
+    if _async_session_local is None:
+        _async_session_local = criar_async_sessionmaker(settings.database_url)
+    return _async_session_local()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Escritor único do SQLite edge, um por arquivo de banco
+_escritores_sqlite: Dict[str, EscritorSQLite] = {}
+_escritores_lock = threading.Lock()
+
+def obter_escritor_sqlite(url: str) -> Optional[EscritorSQLite]:
+    if not (_perfil_edge(url) and settings.sqlite_escritor_unico):
+        return None
+    with _escritores_lock:
+        escritor = _escritores_sqlite.get(url)
+        if escritor is None:
+            # pool de uma conexão: todas as gravações enfileiradas usam a mesma
+            engine_escrita = criar_engine(url, nome="sqlite_escrita", pool_size=1, max_overflow=0)
+            escritor = _escritores_sqlite[url] = EscritorSQLite(
+                sessionmaker(autocommit=False, autoflush=False, bind=engine_escrita), nome="sqlite"
+            )
+        return escritor
+
+async def executar_escrita(db: AsyncSession, funcao: Callable, *args):
+    """
+    Executa `funcao(sessao_sincrona, *args)`, que grava e faz o commit. No SQLite
+    edge a função vai para o escritor único do arquivo; nos demais bancos roda
+    na própria sessão via run_sync.
+    """
+    url = db.bind.url.set(drivername="sqlite").render_as_string(hide_password=False)
+    escritor = obter_escritor_sqlite(url) if db.bind.dialect.name == "sqlite" else None
+    if escritor is None:
+        return await db.run_sync(funcao, *args)
+    return await escritor.executar(funcao, *args)
+
+def encerrar_escritores():
+    with _escritores_lock:
+        for escritor in _escritores_sqlite.values():
+            escritor.encerrar()
+        _escritores_sqlite.clear()
@@ -0,0 +1,69 @@
+"""
+Cliente HTTP compartilhado para chamadas de saída (n8n e webhooks).
+
+Uma única `aiohttp.ClientSession` por processo, com keep-alive, limite de
+conexões (total e por host) e timeouts: cada notificação reaproveita uma
+conexão aberta em vez de refazer DNS, TCP e TLS. A sessão é criada no
+primeiro uso, dentro do event loop, e fechada pelo lifespan (ver main.py).
+"""
+import asyncio
+import time
+from typing import Any, Optional
+
+import aiohttp
+from .database import settings
+from .metrics import metricas
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ClienteHTTP:
+    def __init__(self, limite_conexoes: int = None, limite_por_host: int = None,
+                 timeout_segundos: float = None, timeout_conexao_segundos: float = None,
+                 keepalive_segundos: float = None):
+        self.limite_conexoes = limite_conexoes or settings.http_limite_conexoes
+        self.limite_por_host = limite_por_host or settings.http_limite_por_host
+        self.timeout_segundos = timeout_segundos or settings.http_timeout_segundos
+        self.timeout_conexao_segundos = timeout_conexao_segundos or settings.http_timeout_conexao_segundos
+        self.keepalive_segundos = keepalive_segundos or settings.http_keepalive_segundos
+        self._sessao: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def sessao(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._sessao is None or self._sessao.closed or self._loop is not loop:
+            self._sessao = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.limite_conexoes,
+                    limit_per_host=self.limite_por_host,
+                    keepalive_timeout=self.keepalive_segundos,
+                    ttl_dns_cache=300
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.timeout_segundos, connect=self.timeout_conexao_segundos)
+            )
+            self._loop = loop
+        return self._sessao
+
+    async def post_json(self, url: str, payload: Any, nome: str = "webhook") -> int:
+        """POST de um JSON; retorna o status HTTP (erros de rede e timeout propagam)"""
+        inicio = time.perf_counter()
+        try:
+            async with self.sessao().post(url, json=payload) as resposta:
+                await resposta.read()  # devolve a conexão ao pool
+        except Exception:
+            metricas.incrementar(f"http.{nome}.erros")
+            raise
+        finally:
+            metricas.observar(f"http.{nome}.latencia_ms", (time.perf_counter() - inicio) * 1000)
+            metricas.incrementar(f"http.{nome}.requisicoes")
+        if resposta.status >= 400:
+            metricas.incrementar(f"http.{nome}.erros")
+        return resposta.status
+
+    async def fechar(self):
+        if self._sessao is not None and not self._sessao.closed:
+            await self._sessao.close()
+        self._sessao = None
+        self._loop = None
+
+cliente_http = ClienteHTTP()
@@ -1,17 +1,25 @@
 from fastapi import FastAPI, Depends, HTTPException, status, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 import os
 import logging
 
-from .database import engine, get_db
+from .database import engine, get_db, encerrar_escritores, settings
 from .models import Base
 from .routers import auth, eventos, usuarios, empresas, listas, transacoes, checkins, dashboard, relatorios, whatsapp, cupons, n8n, pdv, financeiro, gamificacao
 from .middleware import LoggingMiddleware
 from .auth import verificar_permissao_admin
-from .scheduler import start_scheduler
-from .websocket import manager
+from .metrics import metricas
+from .scheduler import agendador
+from .websocket import manager, websocket_evento
+from .services.receipt_service import receipt_service
+from .services.outbox_service import outbox_service
+from .services.webhook_service import webhook_service
+from .services.ocupacao_service import ocupacao_service
+from .http_client import cliente_http
+from .services.email_service import email_service
 
 Base.metadata.create_all(bind=engine)
 
@@ -19,7 +27,33 @@ Base.metadata.create_all(bind=engine)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        await ocupacao_service.reconstruir()
+    except Exception as e:
+        # sem o estado pré-carregado, cada evento é montado na primeira leitura
+        logger.error(f"Erro ao carregar o estado de check-in: {e}")
+    if settings.agendador_ativo:
+        agendador.iniciar()
+    if settings.outbox_ativo:
+        outbox_service.iniciar()
+    if settings.webhooks_ativo:
+        webhook_service.iniciar()
+    if settings.ws_heartbeat_ativo:
+        manager.iniciar()
+    yield
+    await manager.encerrar()
+    await agendador.encerrar()
+    await webhook_service.encerrar()
+    await outbox_service.encerrar()
+    await cliente_http.fechar()
+    email_service.transporte.encerrar()
+    await receipt_service.encerrar()
+    encerrar_escritores()
+
 app = FastAPI(
+    lifespan=lifespan,
     title="Sistema de Gestão de Eventos",
     description="API completa para gestão de eventos com foco em segurança e automação via CPF",
     version="1.0.0",
@@ -89,7 +123,6 @@ app.add_middleware(
 
 app.add_middleware(LoggingMiddleware)
 
-start_scheduler()
 
 app.include_router(auth.router, prefix="/api/auth", tags=["Autenticação"])
 app.include_router(empresas.router, prefix="/api/empresas", tags=["Empresas"])
@@ -107,25 +140,8 @@ app.include_router(pdv.router, prefix="/api")
 app.include_router(financeiro.router, prefix="/api")
 app.include_router(gamificacao.router, prefix="/api")
 
-@app.websocket("/api/pdv/ws/{evento_id}")
-async def websocket_endpoint(websocket: WebSocket, evento_id: int):
-    await manager.connect(websocket, evento_id)
-    try:
-        while True:
-            data = await websocket.receive_text()
-            await websocket.send_text(f"pong: {data}")
-    except WebSocketDisconnect:
-        manager.disconnect(websocket, evento_id)
-
-@app.websocket("/api/checkin/ws/{evento_id}")
-async def checkin_websocket_endpoint(websocket: WebSocket, evento_id: int):
-    await manager.connect(websocket, evento_id)
-    try:
-        while True:
-            data = await websocket.receive_text()
-            await websocket.send_text(f"checkin-pong: {data}")
-    except WebSocketDisconnect:
-        manager.disconnect(websocket, evento_id)
+# WebSocket dos eventos: o mesmo endpoint do PDV (/api/pdv/ws/{evento_id}), no caminho da portaria
+app.add_api_websocket_route("/api/checkin/ws/{evento_id}", websocket_evento)
 
 @app.get("/healthz")
 async def healthz():
@@ -152,6 +168,44 @@ async def api_health():
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/api/metrics")
+async def obter_metricas(usuario_atual = Depends(verificar_permissao_admin)):
+    """Métricas internas deste processo (apenas admins)"""
+    return metricas.snapshot()
+
+@app.get("/api/outbox")
+async def resumo_outbox(db: Session = Depends(get_db), usuario_atual = Depends(verificar_permissao_admin)):
+    """Mensagens da outbox por canal e status (apenas admins)"""
+    return outbox_service.resumo(db)
+
+@app.post("/api/outbox/reprocessar")
+async def reprocessar_outbox(
+    canal: str = None,
+    db: Session = Depends(get_db),
+    usuario_atual = Depends(verificar_permissao_admin)
+):
+    """Devolver à fila as mensagens que esgotaram as tentativas (apenas admins)"""
+    return {"reprocessadas": outbox_service.reprocessar_falhas(db, canal)}
+
+@app.get("/api/webhooks")
+async def resumo_webhooks(db: Session = Depends(get_db), usuario_atual = Depends(verificar_permissao_admin)):
+    """Webhooks recebidos por origem e status, com o atraso da fila (apenas admins)"""
+    return webhook_service.resumo(db)
+
+@app.post("/api/webhooks/reprocessar")
+async def reprocessar_webhooks(
+    origem: str = None,
+    db: Session = Depends(get_db),
+    usuario_atual = Depends(verificar_permissao_admin)
+):
+    """Devolver à fila os webhooks que esgotaram as tentativas (apenas admins)"""
+    return {"reprocessados": webhook_service.reprocessar_falhas(db, origem)}
+
+@app.get("/api/websocket/conexoes")
+async def conexoes_websocket(usuario_atual = Depends(verificar_permissao_admin)):
+    """Conexões WebSocket abertas, no total e por evento (apenas admins)"""
+    return manager.contagem()
+
 @app.api_route("/api/cors-test", methods=["GET", "POST", "OPTIONS"])
 async def cors_test(request: Request):
     """Endpoint para testar CORS e debug"""
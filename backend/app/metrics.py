@@ -0,0 +1,86 @@
+"""
+Métricas internas do processo (contadores, gauges e observações).
+
+Registro simples em memória, compartilhado pelos serviços e exposto em
+GET /api/metrics para administradores. Cada processo do servidor tem o seu.
+"""
+import threading
+from collections import deque
+from typing import Any, Callable, Dict
+
+class RegistroMetricas:
+    def __init__(self, janela_observacoes: int = 1024):
+        self._lock = threading.Lock()
+        self._contadores: Dict[str, float] = {}
+        self._gauges: Dict[str, Callable[[], Any]] = {}
+        self._observacoes: Dict[str, Dict[str, Any]] = {}
+        self._janela = janela_observacoes
+
+    def incrementar(self, nome: str, valor: float = 1):
+        with self._lock:
+            self._contadores[nome] = self._contadores.get(nome, 0) + valor
+
+    def registrar_gauge(self, nome: str, leitura: Callable[[], Any]):
+        """Gauge lido na hora da consulta (ex.: tamanho de fila, itens em cache)"""
+        with self._lock:
+            self._gauges[nome] = leitura
+
+    def observar(self, nome: str, valor: float):
+        """Registrar uma amostra (ex.: latência em ms); guarda contagem, soma, máximo e janela recente"""
+        with self._lock:
+            obs = self._observacoes.get(nome)
+            if obs is None:
+                obs = self._observacoes[nome] = {
+                    "contagem": 0, "soma": 0.0, "max": 0.0, "recentes": deque(maxlen=self._janela)
+                }
+            obs["contagem"] += 1
+            obs["soma"] += valor
+            obs["max"] = max(obs["max"], valor)
+            obs["recentes"].append(valor)
+
+    def contador(self, nome: str) -> float:
+        with self._lock:
+            return self._contadores.get(nome, 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            contadores = dict(self._contadores)
+            gauges = dict(self._gauges)
+            observacoes = {
+                nome: (obs["contagem"], obs["soma"], obs["max"], sorted(obs["recentes"]))
+                for nome, obs in self._observacoes.items()
+            }
+
+        valores_gauges = {}
+        for nome, leitura in gauges.items():
+            try:
+                valores_gauges[nome] = leitura()
+            except Exception:
+                valores_gauges[nome] = None
+
+        return {
+            "contadores": contadores,
+            "gauges": valores_gauges,
+            "observacoes": {
+                nome: {
+                    "contagem": contagem,
+                    "media": soma / contagem if contagem else 0,
+                    "max": maximo,
+                    "p50": _percentil(recentes, 0.50),
+                    "p99": _percentil(recentes, 0.99),
+                }
+                for nome, (contagem, soma, maximo, recentes) in observacoes.items()
+            }
+        }
+
+    def limpar(self):
+        with self._lock:
+            self._contadores.clear()
+            self._observacoes.clear()
+
+def _percentil(ordenados: list, p: float) -> float:
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+metricas = RegistroMetricas()
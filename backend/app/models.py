@@ -1,9 +1,13 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Numeric, Enum, Date
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Numeric, Enum, Date, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
+from datetime import datetime, timezone
 import enum
 
+def _agora_utc():
+    return datetime.now(timezone.utc)
+
 class StatusEvento(enum.Enum):
     ATIVO = "ativo"
     INATIVO = "inativo"
@@ -62,6 +66,15 @@ class Usuario(Base):
     transacoes = relationship("Transacao", back_populates="usuario")
     checkins = relationship("Checkin", back_populates="usuario")
 
+class CodigoVerificacao(Base):
+    __tablename__ = "codigos_verificacao"  # um código pendente por CPF (segunda etapa do login)
+    
+    cpf = Column(String(14), primary_key=True)
+    codigo_hash = Column(String(64), nullable=False)
+    tentativas = Column(Integer, nullable=False, default=0)
+    expira_em = Column(DateTime, nullable=False, index=True)
+    criado_em = Column(DateTime(timezone=True), server_default=func.now())
+
 class Evento(Base):
     __tablename__ = "eventos"
     
@@ -73,6 +86,8 @@ class Evento(Base):
     endereco = Column(Text)
     limite_idade = Column(Integer, default=18)
     capacidade_maxima = Column(Integer)
+    # check-ins gravados; incrementado só se couber na capacidade (ver ocupacao_service.ocupar_vaga)
+    presentes = Column(Integer, nullable=False, default=0, server_default="0")
     status = Column(Enum(StatusEvento), default=StatusEvento.ATIVO)
     empresa_id = Column(Integer, ForeignKey("empresas.id"), nullable=False)
     criador_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
@@ -135,7 +150,8 @@ class Transacao(Base):
     status = Column(Enum(StatusTransacao), default=StatusTransacao.PENDENTE)
     metodo_pagamento = Column(String(50))
     codigo_transacao = Column(String(100), unique=True)
-    qr_code_ticket = Column(String(100), unique=True)
+    qr_code_ticket = Column(String(100), unique=True)  # ingresso assinado (ver ticket_service)
+    qr_code_legado = Column(String(100), unique=True)  # código aleatório anterior, aceito na portaria
     evento_id = Column(Integer, ForeignKey("eventos.id"), nullable=False)
     lista_id = Column(Integer, ForeignKey("listas.id"), nullable=False)
     usuario_id = Column(Integer, ForeignKey("usuarios.id"))
@@ -146,6 +162,11 @@ class Transacao(Base):
     evento = relationship("Evento", back_populates="transacoes")
     lista = relationship("Lista", back_populates="transacoes")
     usuario = relationship("Usuario", back_populates="transacoes")
+    
+    __table_args__ = (
+        # contagens do dashboard por evento e status sem ler a tabela
+        Index("ix_transacoes_evento_status", "evento_id", "status"),
+    )
 
 class Checkin(Base):
     __tablename__ = "checkins"
@@ -164,6 +185,12 @@ class Checkin(Base):
     evento = relationship("Evento", back_populates="checkins")
     usuario = relationship("Usuario", back_populates="checkins")
     transacao = relationship("Transacao")
+    
+    __table_args__ = (
+        # uma entrada por ingresso: garante o mapa de entradas em memória entre processos
+        # e atende o NOT EXISTS de vendas sem check-in do dashboard
+        Index("ix_checkins_evento_transacao", "evento_id", "transacao_id", unique=True),
+    )
 
 class TipoProduto(enum.Enum):
     BEBIDA = "BEBIDA"
@@ -206,6 +233,10 @@ class TipoPagamentoPDV(enum.Enum):
 
 class Produto(Base):
     __tablename__ = "produtos"
+    __table_args__ = (
+        Index("ix_produtos_evento_criado_em_id", "evento_id", "criado_em", "id"),
+        Index("ix_produtos_evento_versao", "evento_id", "versao"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     nome = Column(String(255), nullable=False)
@@ -223,8 +254,11 @@ class Produto(Base):
     imagem_url = Column(String(500))
     evento_id = Column(Integer, ForeignKey("eventos.id"), nullable=False)
     empresa_id = Column(Integer, ForeignKey("empresas.id"), nullable=False)
-    criado_em = Column(DateTime(timezone=True), server_default=func.now())
+    # Default em Python para todas as linhas terem o mesmo formato no SQLite
+    # (com microssegundos) e o keyset comparar a coluna indexada direto
+    criado_em = Column(DateTime(timezone=True), default=_agora_utc, server_default=func.now())
     atualizado_em = Column(DateTime(timezone=True), onupdate=func.now())
+    versao = Column(BigInteger, nullable=False, default=0)  # contador de sincronização (ver pagination.py)
     
     evento = relationship("Evento")
     empresa = relationship("Empresa")
@@ -233,6 +267,10 @@ class Produto(Base):
 
 class Comanda(Base):
     __tablename__ = "comandas"
+    __table_args__ = (
+        Index("ix_comandas_evento_criado_em_id", "evento_id", "criado_em", "id"),
+        Index("ix_comandas_evento_versao", "evento_id", "versao"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     numero_comanda = Column(String(20), unique=True, nullable=False)
@@ -246,16 +284,24 @@ class Comanda(Base):
     status = Column(Enum(StatusComanda), default=StatusComanda.ATIVA)
     evento_id = Column(Integer, ForeignKey("eventos.id"), nullable=False)
     empresa_id = Column(Integer, ForeignKey("empresas.id"), nullable=False)
-    criado_em = Column(DateTime(timezone=True), server_default=func.now())
+    # Default em Python para todas as linhas terem o mesmo formato no SQLite
+    # (com microssegundos) e o keyset comparar a coluna indexada direto
+    criado_em = Column(DateTime(timezone=True), default=_agora_utc, server_default=func.now())
     atualizado_em = Column(DateTime(timezone=True), onupdate=func.now())
+    versao = Column(BigInteger, nullable=False, default=0)  # contador de sincronização (ver pagination.py)
     
     evento = relationship("Evento")
     empresa = relationship("Empresa")
     vendas = relationship("VendaPDV", back_populates="comanda")
     recargas = relationship("RecargaComanda", back_populates="comanda")
+    movimentos_saldo = relationship("MovimentoSaldoComanda", back_populates="comanda")
 
 class VendaPDV(Base):
     __tablename__ = "vendas_pdv"
+    __table_args__ = (
+        Index("ix_vendas_pdv_evento_criado_em_id", "evento_id", "criado_em", "id"),
+        Index("ix_vendas_pdv_evento_versao", "evento_id", "versao"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     numero_venda = Column(String(20), unique=True, nullable=False)
@@ -274,8 +320,11 @@ class VendaPDV(Base):
     cupom_codigo = Column(String(50))
     observacoes = Column(Text)
     ip_origem = Column(String(45))
-    criado_em = Column(DateTime(timezone=True), server_default=func.now())
+    # Default em Python para todas as linhas terem o mesmo formato no SQLite
+    # (com microssegundos) e o keyset comparar a coluna indexada direto
+    criado_em = Column(DateTime(timezone=True), default=_agora_utc, server_default=func.now())
     atualizado_em = Column(DateTime(timezone=True), onupdate=func.now())
+    versao = Column(BigInteger, nullable=False, default=0)  # contador de sincronização (ver pagination.py)
     
     comanda = relationship("Comanda", back_populates="vendas")
     evento = relationship("Evento")
@@ -334,6 +383,33 @@ class RecargaComanda(Base):
     comanda = relationship("Comanda", back_populates="recargas")
     usuario = relationship("Usuario")
 
+class TipoMovimentoSaldo(enum.Enum):
+    CREDITO = "CREDITO"
+    DEBITO = "DEBITO"
+
+class MovimentoSaldoComanda(Base):
+    __tablename__ = "movimentos_saldo_comanda"  # append-only: linhas nunca são alteradas
+    __table_args__ = (
+        Index("ix_movimentos_saldo_comanda_comanda_id_id", "comanda_id", "id"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    comanda_id = Column(Integer, ForeignKey("comandas.id"), nullable=False)
+    tipo = Column(Enum(TipoMovimentoSaldo), nullable=False)
+    valor = Column(Numeric(10, 2), nullable=False)
+    saldo_anterior = Column(Numeric(10, 2), nullable=False)
+    saldo_posterior = Column(Numeric(10, 2), nullable=False)
+    descricao = Column(String(100))
+    venda_id = Column(Integer, ForeignKey("vendas_pdv.id"))
+    recarga_id = Column(Integer, ForeignKey("recargas_comanda.id"))
+    usuario_id = Column(Integer, ForeignKey("usuarios.id"))
+    criado_em = Column(DateTime(timezone=True), server_default=func.now())
+    
+    comanda = relationship("Comanda", back_populates="movimentos_saldo")
+    venda = relationship("VendaPDV")
+    recarga = relationship("RecargaComanda")
+    usuario = relationship("Usuario")
+
 class MovimentoEstoque(Base):
     __tablename__ = "movimentos_estoque"
     
@@ -533,3 +609,96 @@ class MetricaPromoter(Base):
     
     promoter = relationship("Usuario")
     evento = relationship("Evento")
+
+class BloqueioAgendador(Base):
+    __tablename__ = "bloqueios_agendador"  # líder de cada job do agendador entre os workers
+    
+    nome = Column(String(100), primary_key=True)
+    dono = Column(String(100), nullable=False)
+    expira_em = Column(DateTime, nullable=False)
+
+class AlertaEnviado(Base):
+    __tablename__ = "alertas_enviados"  # evita repetir o mesmo alerta a cada rodada do agendador
+    
+    id = Column(Integer, primary_key=True, index=True)
+    regra = Column(String(50), nullable=False)
+    chave = Column(String(100), nullable=False)  # o que disparou o alerta (ex.: id da lista)
+    destinatario = Column(String(20), nullable=False)
+    enviado_em = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        UniqueConstraint("regra", "chave", "destinatario", name="uq_alerta_enviado"),
+    )
+
+class StatusMensagemSaida(enum.Enum):
+    PENDENTE = "pendente"
+    PROCESSANDO = "processando"
+    ENVIADA = "enviada"
+    FALHOU = "falhou"  # dead-letter: esgotou as tentativas
+
+class MensagemSaida(Base):
+    __tablename__ = "mensagens_saida"  # outbox: envios externos (WhatsApp, email, n8n) entregues pelos workers
+    
+    id = Column(Integer, primary_key=True, index=True)
+    canal = Column(String(20), nullable=False)
+    destino = Column(String(500), nullable=False)  # telefone, email ou URL do webhook
+    payload = Column(Text, nullable=False)  # JSON
+    lote = Column(String(32), index=True)  # agrupa envios em massa (ex.: convites)
+    status = Column(Enum(StatusMensagemSaida), nullable=False, default=StatusMensagemSaida.PENDENTE)
+    tentativas = Column(Integer, nullable=False, default=0)
+    # pendente: quando tentar de novo; processando: fim do prazo do worker que a reivindicou
+    disponivel_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+    ultimo_erro = Column(Text)
+    criado_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+    enviado_em = Column(DateTime)
+    
+    __table_args__ = (
+        Index("ix_mensagens_saida_fila", "status", "disponivel_em"),
+    )
+
+class StatusWebhookRecebido(enum.Enum):
+    PENDENTE = "pendente"
+    PROCESSANDO = "processando"
+    PROCESSADO = "processado"
+    FALHOU = "falhou"  # esgotou as tentativas
+
+class WebhookRecebido(Base):
+    __tablename__ = "webhooks_recebidos"  # payload bruto dos webhooks de entrada, processado pelos workers
+    
+    id = Column(Integer, primary_key=True, index=True)
+    origem = Column(String(30), nullable=False)  # whatsapp, meta_ads, crm
+    chave = Column(String(128), nullable=False)  # chave de idempotência (id do provedor ou hash do payload)
+    payload = Column(Text, nullable=False)  # JSON
+    ip_origem = Column(String(45))
+    status = Column(Enum(StatusWebhookRecebido), nullable=False, default=StatusWebhookRecebido.PENDENTE)
+    tentativas = Column(Integer, nullable=False, default=0)
+    # pendente: quando tentar de novo; processando: fim do prazo do worker que o reivindicou
+    disponivel_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+    ultimo_erro = Column(Text)
+    recebido_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+    processado_em = Column(DateTime)
+    
+    __table_args__ = (
+        UniqueConstraint("origem", "chave", name="uq_webhook_recebido"),
+        Index("ix_webhooks_recebidos_fila", "status", "disponivel_em"),
+    )
+
+class ContadorSincronizacao(Base):
+    __tablename__ = "contadores_sincronizacao"  # última versão de sincronização entregue por evento
+    
+    evento_id = Column(Integer, ForeignKey("eventos.id"), primary_key=True)
+    versao = Column(BigInteger, nullable=False, default=0)
+
+class RemocaoSincronizacao(Base):
+    __tablename__ = "remocoes_sincronizacao"  # tombstones para os terminais apagarem registros removidos
+    
+    id = Column(Integer, primary_key=True, index=True)
+    evento_id = Column(Integer, ForeignKey("eventos.id"), nullable=False)
+    tabela = Column(String(50), nullable=False)
+    registro_id = Column(Integer, nullable=False)
+    versao = Column(BigInteger, nullable=False)
+    removido_em = Column(DateTime(timezone=True), default=_agora_utc, server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_remocoes_sincronizacao_evento_tabela_versao", "evento_id", "tabela", "versao"),
+    )
@@ -0,0 +1,213 @@
+import base64
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import and_, or_, asc, desc, event, update, bindparam
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Query, Session
+from .models import Produto, Comanda, VendaPDV, ContadorSincronizacao, RemocaoSincronizacao
+
+CURSOR_INICIO = "0"
+
+# Tabelas sincronizadas com os terminais por versão (ver sincronizar_delta)
+MODELOS_SINCRONIZADOS = (Produto, Comanda, VendaPDV)
+
+_PENDENTES = "sincronizacao_pendentes"
+
+class CursorInvalidoError(ValueError):
+    pass
+
+def codificar_cursor(momento: datetime, registro_id: int) -> str:
+    """Cursor opaco para (timestamp, id) — base64 url-safe de 'iso|id'."""
+    bruto = f"{momento.isoformat()}|{registro_id}".encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip("=")
+
+def decodificar_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        preenchido = cursor + "=" * (-len(cursor) % 4)
+        momento, registro_id = base64.urlsafe_b64decode(preenchido).decode().rsplit("|", 1)
+        return datetime.fromisoformat(momento), int(registro_id)
+    except Exception:
+        raise CursorInvalidoError("Cursor inválido")
+
+def paginar_keyset(
+    db: Session,
+    query: Query,
+    coluna_tempo: Any,
+    coluna_id: Any,
+    cursor: Optional[str],
+    limite: int,
+    descendente: bool = True
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Página ordenada por (coluna_tempo, coluna_id) a partir do cursor.
+
+    Retorna os itens e o cursor da próxima página (None quando acabou). O custo
+    é constante por página, ao contrário de OFFSET, porque o banco parte direto
+    da posição do cursor no índice (evento_id, criado_em, id). A coluna é
+    comparada crua, sem função em volta, para o índice servir filtro e ordem.
+    """
+    if cursor:
+        momento, ultimo_id = decodificar_cursor(cursor)
+        if descendente:
+            query = query.filter(or_(coluna_tempo < momento, and_(coluna_tempo == momento, coluna_id < ultimo_id)))
+        else:
+            query = query.filter(or_(coluna_tempo > momento, and_(coluna_tempo == momento, coluna_id > ultimo_id)))
+
+    ordem = desc if descendente else asc
+    itens = query.order_by(ordem(coluna_tempo), ordem(coluna_id)).limit(limite + 1).all()
+
+    proximo = None
+    if len(itens) > limite:
+        itens = itens[:limite]
+        ultimo = itens[-1]
+        proximo = codificar_cursor(_extrair(ultimo, coluna_tempo), _extrair(ultimo, coluna_id))
+
+    return itens, proximo
+
+def sincronizar_delta(
+    db: Session,
+    query: Query,
+    modelo: Any,
+    evento_id: int,
+    since: str,
+    limite: int
+) -> Tuple[List[Any], List[int], str, bool]:
+    """
+    Registros criados, alterados ou removidos depois da versão `since`.
+
+    Cada escrita num modelo sincronizado recebe, no commit, uma versão tirada
+    do contador do evento (ver _versionar_no_commit); remoções viram tombstones
+    com versão própria. Como o contador é incrementado com a linha travada até
+    o commit, as versões de um evento ficam na ordem de commit e uma transação
+    lenta não "volta no tempo" como acontecia com timestamps.
+
+    A varredura por versão é feita no evento inteiro e só depois cruzada com
+    os filtros de `query`: um registro alterado que não atende mais ao filtro
+    (mudou de status ou categoria, por exemplo) volta em "removidos", para o
+    terminal descartá-lo. Registros que nunca estiveram no filtro também podem
+    aparecer ali; apagar um id desconhecido é inofensivo no terminal.
+
+    Retorna (itens alterados, ids removidos, cursor para a próxima chamada,
+    há_mais). Com `since="0"` começa do início; o terminal guarda o cursor
+    devolvido e o reenvia.
+    """
+    try:
+        versao = int(since)
+    except ValueError:
+        raise CursorInvalidoError("Cursor inválido")
+    if versao < 0:
+        raise CursorInvalidoError("Cursor inválido")
+
+    alterados = db.query(modelo.id, modelo.versao).filter(
+        modelo.evento_id == evento_id,
+        modelo.versao > versao
+    ).order_by(asc(modelo.versao)).limit(limite + 1).all()
+    ids_alterados = [alterado.id for alterado in alterados]
+    visiveis = {item.id: item for item in query.filter(modelo.id.in_(ids_alterados))} if ids_alterados else {}
+    removidos = db.query(RemocaoSincronizacao.registro_id, RemocaoSincronizacao.versao).filter(
+        RemocaoSincronizacao.evento_id == evento_id,
+        RemocaoSincronizacao.tabela == modelo.__tablename__,
+        RemocaoSincronizacao.versao > versao
+    ).order_by(asc(RemocaoSincronizacao.versao)).limit(limite + 1).all()
+
+    # Intercala alterações e remoções por versão e corta no limite; alterado
+    # fora do filtro conta como remoção
+    fila = sorted(
+        [(a.versao, visiveis.get(a.id), None if a.id in visiveis else a.id) for a in alterados] +
+        [(r.versao, None, r.registro_id) for r in removidos],
+        key=lambda entrada: entrada[0]
+    )
+    ha_mais = len(fila) > limite
+    fila = fila[:limite]
+
+    itens = [item for _, item, _ in fila if item is not None]
+    ids_removidos = [registro_id for _, _, registro_id in fila if registro_id is not None]
+    cursor_atual = str(fila[-1][0]) if fila else str(versao)
+
+    return itens, ids_removidos, cursor_atual, ha_mais
+
+def marcar_alterado(db: Session, modelo: Any, evento_id: int, registro_id: int):
+    """Registrar escrita feita fora do ORM (UPDATE em Core) para receber versão no commit."""
+    db.info.setdefault(_PENDENTES, {})[(modelo.__tablename__, registro_id)] = (modelo, evento_id, False)
+
+def reservar_versoes(db: Session, evento_id: int, quantidade: int) -> int:
+    """
+    Reserva `quantidade` versões do contador do evento e retorna a última.
+
+    O UPDATE trava a linha do contador até o fim da transação, o que faz dela
+    um ponto de serialização por evento: dois commits do mesmo evento passam
+    por aqui um de cada vez. É o preço de versões na ordem de commit (com uma
+    sequence, uma versão menor poderia ser confirmada depois de o terminal já
+    ter avançado o cursor além dela). Para a espera ficar curta, só
+    _versionar_no_commit chama esta função, depois do último flush: a linha
+    fica travada apenas pelo carimbo das versões e pelo próprio commit.
+    Escritas fora do ORM entram pelo mesmo caminho via marcar_alterado.
+    """
+    tabela = ContadorSincronizacao.__table__
+    incremento = update(tabela).where(tabela.c.evento_id == evento_id).values(
+        versao=tabela.c.versao + quantidade
+    ).returning(tabela.c.versao)
+
+    ultima = db.execute(incremento).scalar_one_or_none()
+    if ultima is None:
+        construtor = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+        db.execute(construtor(tabela).values(evento_id=evento_id, versao=0).on_conflict_do_nothing())
+        ultima = db.execute(incremento).scalar_one()
+    return ultima
+
+@event.listens_for(Session, "after_flush")
+def _coletar_alteracoes(session, contexto):
+    pendentes = session.info.setdefault(_PENDENTES, {})
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, MODELOS_SINCRONIZADOS) and obj.id is not None:
+            pendentes.setdefault((obj.__tablename__, obj.id), (type(obj), obj.evento_id, False))
+    for obj in session.deleted:
+        if isinstance(obj, MODELOS_SINCRONIZADOS):
+            pendentes[(obj.__tablename__, obj.id)] = (type(obj), obj.evento_id, True)
+
+@event.listens_for(Session, "before_commit")
+def _versionar_no_commit(session):
+    if session.info.get(_PENDENTES) is None and not (session.new or session.dirty or session.deleted):
+        return
+    session.flush()
+    pendentes = session.info.pop(_PENDENTES, None)
+    if not pendentes:
+        return
+
+    por_evento: Dict[int, List[Tuple[Any, int, bool]]] = {}
+    for (_, registro_id), (modelo, evento_id, removido) in pendentes.items():
+        por_evento.setdefault(evento_id, []).append((modelo, registro_id, removido))
+
+    # Ordem fixa de eventos para duas transações não se travarem em cruz
+    for evento_id in sorted(por_evento):
+        registros = por_evento[evento_id]
+        ultima = reservar_versoes(session, evento_id, len(registros))
+        _gravar_versoes(session, evento_id, registros, range(ultima - len(registros) + 1, ultima + 1))
+
+def _gravar_versoes(session: Session, evento_id: int, registros: List[tuple], versoes: Iterable[int]):
+    por_tabela: Dict[Any, List[Dict[str, int]]] = {}
+    remocoes = []
+    for (modelo, registro_id, removido), versao in zip(registros, versoes):
+        if removido:
+            remocoes.append({
+                "evento_id": evento_id, "tabela": modelo.__tablename__,
+                "registro_id": registro_id, "versao": versao
+            })
+        else:
+            por_tabela.setdefault(modelo.__table__, []).append({"b_id": registro_id, "b_versao": versao})
+
+    for tabela, parametros in por_tabela.items():
+        session.execute(
+            update(tabela).where(tabela.c.id == bindparam("b_id")).values(versao=bindparam("b_versao")),
+            parametros
+        )
+    if remocoes:
+        session.execute(RemocaoSincronizacao.__table__.insert(), remocoes)
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_pendentes(session):
+    session.info.pop(_PENDENTES, None)
+
+def _extrair(registro: Any, coluna: Any) -> Any:
+    return getattr(registro, coluna.key)
@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
-from ..database import get_db, settings
+from ..database import get_db, get_async_db, executar_escrita, settings
 from ..models import Usuario, Empresa, TipoUsuario
 from ..schemas import Token, LoginRequest, Usuario as UsuarioSchema, UsuarioRegister
-from ..auth import autenticar_usuario, criar_access_token, gerar_codigo_verificacao, obter_usuario_atual, gerar_hash_senha, validar_cpf_basico
+from ..auth import autenticar_usuario_async, criar_access_token, gerar_codigo_verificacao, obter_usuario_atual, gerar_hash_senha, gerar_hash_senha_async, validar_cpf_basico, cache_usuarios
 try:
     from ..services.email_service import email_service
 except ImportError:
@@ -19,21 +20,22 @@ except ImportError:
             return True
     email_service = DummyEmailService()
 
+from ..services.outbox_service import outbox_service
+from ..services.verification_service import codigos_verificacao
+
 router = APIRouter()
 security = HTTPBearer()
 
-codigos_verificacao = {}
-
 
 @router.post("/login", response_model=Token)
-async def login(login_data: LoginRequest, db: Session = Depends(get_db)):
+async def login(login_data: LoginRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Autenticação multi-fator:
     1. Primeira etapa: CPF + senha
     2. Segunda etapa: código de verificação (simulado)
     """
     
-    usuario = autenticar_usuario(login_data.cpf, login_data.senha, db)
+    usuario = await autenticar_usuario_async(login_data.cpf, login_data.senha, db)
     if not usuario:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -48,7 +50,7 @@ async def login(login_data: LoginRequest, db: Session = Depends(get_db)):
     
     if not login_data.codigo_verificacao:
         codigo = gerar_codigo_verificacao()
-        codigos_verificacao[login_data.cpf] = codigo
+        await executar_escrita(db, codigos_verificacao.salvar, login_data.cpf, codigo)
         
         # Enviar código por email
         email_enviado = await email_service.send_verification_code(
@@ -63,17 +65,15 @@ async def login(login_data: LoginRequest, db: Session = Depends(get_db)):
             detail=f"🧪 MODO TESTE: Código de verificação gerado. Verifique o console do backend para o código: {codigo}"
         )
     
-    codigo_armazenado = codigos_verificacao.get(login_data.cpf)
-    if not codigo_armazenado or codigo_armazenado != login_data.codigo_verificacao:
+    if not await executar_escrita(db, codigos_verificacao.validar, login_data.cpf, login_data.codigo_verificacao):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Código de verificação inválido"
         )
     
-    del codigos_verificacao[login_data.cpf]
-    
-    usuario.ultimo_login = db.query(Usuario).filter(Usuario.id == usuario.id).first().criado_em
-    db.commit()
+    usuario.ultimo_login = usuario.criado_em
+    await db.commit()
+    cache_usuarios.invalidar(usuario.cpf)
     
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
     access_token = criar_access_token(
@@ -108,7 +108,7 @@ async def registrar_usuario(usuario_data: UsuarioRegister, db: Session = Depends
     
     try:
         # Criar usuário sem empresa obrigatória
-        senha_hash = gerar_hash_senha(usuario_data.senha)
+        senha_hash = await gerar_hash_senha_async(usuario_data.senha)
         
         novo_usuario = Usuario(
             cpf=usuario_data.cpf,
@@ -121,15 +121,11 @@ async def registrar_usuario(usuario_data: UsuarioRegister, db: Session = Depends
         )
         
         db.add(novo_usuario)
+        # Email de boas-vindas sai pela outbox, junto com o commit do usuário
+        outbox_service.enfileirar(db, "email", novo_usuario.email, {"tipo": "boas_vindas", "nome": novo_usuario.nome})
         db.commit()
         db.refresh(novo_usuario)
         
-        # Enviar email de boas-vindas
-        await email_service.send_welcome_email(
-            to_email=novo_usuario.email,
-            to_name=novo_usuario.nome
-        )
-        
         return novo_usuario
         
     except Exception as e:
@@ -160,7 +156,7 @@ async def solicitar_codigo_verificacao(cpf: str, db: Session = Depends(get_db)):
         )
     
     codigo = gerar_codigo_verificacao()
-    codigos_verificacao[cpf] = codigo
+    codigos_verificacao.salvar(db, cpf, codigo)
     
     # Enviar código por email
     email_enviado = await email_service.send_verification_code(
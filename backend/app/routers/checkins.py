@@ -1,20 +1,95 @@
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from sqlalchemy import select, func, or_, exists
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime, timedelta
-from ..database import get_db
-from ..models import Checkin, Transacao, Evento, Usuario, Comanda
+from ..database import get_async_db, executar_escrita
+from ..models import Checkin, Transacao, Evento, Usuario, Comanda, StatusTransacao
 from ..schemas import Checkin as CheckinSchema, CheckinCreate
 from ..auth import obter_usuario_atual, validar_cpf_basico
-from ..websocket import manager
+from ..websocket import manager, notify_ocupacao_update, registrar_snapshot
 from ..services.whatsapp_service import whatsapp_service
+from ..services.ticket_service import ticket_service, DadosTicket, TicketInvalido
+from ..services.ocupacao_service import ocupacao_service, ocupar_vaga, REPETIDO, LOTADO
 
 router = APIRouter()
 
+async def _snapshot_ocupacao(db: AsyncSession, evento_id: int, assinatura):
+    if await ocupacao_service.carregar(db, evento_id) is None:
+        return None
+    return ocupacao_service.resumo(evento_id)
+
+registrar_snapshot("ocupacao", "checkins", _snapshot_ocupacao)
+
+def _gravar_checkin(db: Session, dados: dict) -> Optional[CheckinSchema]:
+    """
+    Grava o check-in ocupando uma vaga do evento; None se o ingresso já tinha
+    entrada (índice único evento/transação). A capacidade vale entre processos:
+    quem passa é o UPDATE condicional em eventos.presentes.
+    """
+    if ocupar_vaga(db, dados["evento_id"]) is None:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Capacidade máxima do evento atingida")
+    db_checkin = Checkin(**dados)
+    db.add(db_checkin)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return None
+    db.refresh(db_checkin)
+    return CheckinSchema.model_validate(db_checkin)
+
+def _gravar_checkin_ticket(db: Session, ticket: DadosTicket, validacao_cpf: str,
+                           usuario_id: int) -> Tuple[Optional[CheckinSchema], Optional[str]]:
+    """Check-in de ingresso assinado: a transação é lida pela chave primária na própria gravação"""
+    transacao = db.get(Transacao, ticket.transacao_id)
+    if not transacao or transacao.evento_id != ticket.evento_id or transacao.status != StatusTransacao.APROVADA:
+        raise HTTPException(status_code=404, detail="Ingresso cancelado ou não encontrado")
+    
+    cpf_limpo = transacao.cpf_comprador.replace(".", "").replace("-", "")
+    if validacao_cpf != cpf_limpo[:3]:
+        raise HTTPException(status_code=400, detail="Validação de CPF incorreta")
+    
+    return _gravar_checkin(db, {
+        "cpf": transacao.cpf_comprador,
+        "nome": transacao.nome_comprador,
+        "evento_id": ticket.evento_id,
+        "usuario_id": usuario_id,
+        "transacao_id": transacao.id,
+        "metodo_checkin": "qr_code",
+        "validacao_cpf": validacao_cpf
+    }), transacao.telefone_comprador
+
+async def _reservar_entrada(db: AsyncSession, evento_id: int, transacao_id: Optional[int], ja_realizado: str):
+    """Barrar entrada repetida e evento lotado pelo estado em memória (cache), antes de gravar"""
+    if await ocupacao_service.carregar(db, evento_id) is None:
+        raise HTTPException(status_code=404, detail="Evento não encontrado")
+    motivo = ocupacao_service.reservar(evento_id, transacao_id)
+    if motivo == REPETIDO:
+        raise HTTPException(status_code=400, detail=ja_realizado)
+    if motivo == LOTADO:
+        raise HTTPException(status_code=409, detail="Capacidade máxima do evento atingida")
+
+async def _gravar_reservado(db: AsyncSession, evento_id: int, transacao_id: Optional[int], funcao, *args):
+    """Gravar o check-in reservado; se a gravação falhar, a reserva é desfeita"""
+    try:
+        return await executar_escrita(db, funcao, *args)
+    except BaseException:
+        ocupacao_service.liberar(evento_id, transacao_id)
+        raise
+
+async def _confirmar_entrada(db: AsyncSession, evento_id: int):
+    # relê presentes e as entradas novas (inclusive a recém-gravada) antes de avisar os dashboards
+    await ocupacao_service.carregar(db, evento_id, atualizar=True)
+    await notify_ocupacao_update(evento_id, ocupacao_service.resumo(evento_id))
+
 @router.post("/", response_model=CheckinSchema)
 async def realizar_checkin(
     checkin: CheckinCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     usuario_atual: Usuario = Depends(obter_usuario_atual)
 ):
     """Realizar check-in no evento"""
@@ -25,7 +100,7 @@ async def realizar_checkin(
             detail="CPF inválido"
         )
     
-    evento = db.query(Evento).filter(Evento.id == checkin.evento_id).first()
+    evento = await db.get(Evento, checkin.evento_id)
     if not evento:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -39,10 +114,10 @@ async def realizar_checkin(
             detail="Acesso negado: apenas admins e promoters podem realizar checkin"
         )
     
-    checkin_existente = db.query(Checkin).filter(
+    checkin_existente = (await db.execute(select(Checkin.id).where(
         Checkin.cpf == checkin.cpf,
         Checkin.evento_id == checkin.evento_id
-    ).first()
+    ).limit(1))).first()
     
     if checkin_existente:
         raise HTTPException(
@@ -50,11 +125,11 @@ async def realizar_checkin(
             detail="Check-in já realizado para este CPF neste evento"
         )
     
-    transacao = db.query(Transacao).filter(
+    transacao = (await db.execute(select(Transacao).where(
         Transacao.cpf_comprador == checkin.cpf,
         Transacao.evento_id == checkin.evento_id,
-        Transacao.status == "aprovada"
-    ).first()
+        Transacao.status == StatusTransacao.APROVADA
+    ).limit(1))).scalars().first()
     
     if not transacao:
         raise HTTPException(
@@ -74,22 +149,27 @@ async def realizar_checkin(
     checkin_data['usuario_id'] = usuario_atual.id
     checkin_data['transacao_id'] = transacao.id
     
-    db_checkin = Checkin(**checkin_data)
-    db.add(db_checkin)
-    db.commit()
-    db.refresh(db_checkin)
-    
+    ja_realizado = "Check-in já realizado para este CPF neste evento"
+    await _reservar_entrada(db, checkin.evento_id, transacao.id, ja_realizado)
+    db_checkin = await _gravar_reservado(db, checkin.evento_id, transacao.id, _gravar_checkin, checkin_data)
+    if db_checkin is None:
+        # entrada gravada por outro processo
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=ja_realizado
+        )
+    await _confirmar_entrada(db, checkin.evento_id)
     return db_checkin
 
 @router.get("/evento/{evento_id}", response_model=List[CheckinSchema])
 async def listar_checkins_evento(
     evento_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     usuario_atual: Usuario = Depends(obter_usuario_atual)
 ):
     """Listar check-ins de um evento"""
     
-    evento = db.query(Evento).filter(Evento.id == evento_id).first()
+    evento = await db.get(Evento, evento_id)
     if not evento:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -103,14 +183,14 @@ async def listar_checkins_evento(
             detail="Acesso negado: apenas admins e promoters podem realizar checkin"
         )
     
-    checkins = db.query(Checkin).filter(Checkin.evento_id == evento_id).all()
+    checkins = (await db.execute(select(Checkin).where(Checkin.evento_id == evento_id))).scalars().all()
     return checkins
 
 @router.get("/cpf/{cpf}")
 async def verificar_checkin_cpf(
     cpf: str,
     evento_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     usuario_atual: Usuario = Depends(obter_usuario_atual)
 ):
     """Verificar se CPF já fez check-in no evento"""
@@ -121,7 +201,7 @@ async def verificar_checkin_cpf(
             detail="CPF inválido"
         )
     
-    evento = db.query(Evento).filter(Evento.id == evento_id).first()
+    evento = await db.get(Evento, evento_id)
     if not evento:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -135,16 +215,16 @@ async def verificar_checkin_cpf(
             detail="Acesso negado: apenas admins e promoters podem realizar checkin"
         )
     
-    checkin = db.query(Checkin).filter(
+    checkin = (await db.execute(select(Checkin).where(
         Checkin.cpf == cpf,
         Checkin.evento_id == evento_id
-    ).first()
+    ).limit(1))).scalars().first()
     
-    transacao = db.query(Transacao).filter(
+    transacao = (await db.execute(select(Transacao).where(
         Transacao.cpf_comprador == cpf,
         Transacao.evento_id == evento_id,
-        Transacao.status == "aprovada"
-    ).first()
+        Transacao.status == StatusTransacao.APROVADA
+    ).limit(1))).scalars().first()
     
     return {
         "cpf": cpf,
@@ -159,18 +239,29 @@ async def verificar_checkin_cpf(
 async def checkin_por_qr(
     qr_code: str,
     validacao_cpf: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     usuario_atual: Usuario = Depends(obter_usuario_atual)
 ):
-    """Check-in por QR Code único"""
+    """
+    Check-in por QR Code único.
+    
+    Ingressos assinados (T1...) são conferidos sem consulta: assinatura,
+    validade e entrada repetida (mapa de entradas do evento). Códigos antigos
+    e comandas seguem pela consulta ao banco.
+    """
+    
+    if ticket_service.assinado(qr_code):
+        return await _checkin_ticket_assinado(qr_code, validacao_cpf, db, usuario_atual)
     
-    transacao = db.query(Transacao).filter(
-        Transacao.qr_code_ticket == qr_code,
-        Transacao.status == "aprovada"
-    ).first()
+    transacao = (await db.execute(select(Transacao).where(
+        or_(Transacao.qr_code_ticket == qr_code, Transacao.qr_code_legado == qr_code),
+        Transacao.status == StatusTransacao.APROVADA
+    ).limit(1))).scalars().first()
     
     if not transacao:
-        comanda = db.query(Comanda).filter(Comanda.qr_code == qr_code).first()
+        comanda = (await db.execute(
+            select(Comanda).where(Comanda.qr_code == qr_code).limit(1)
+        )).scalars().first()
         if not comanda:
             raise HTTPException(status_code=404, detail="QR Code não encontrado ou inválido")
         
@@ -189,35 +280,59 @@ async def checkin_por_qr(
     if validacao_cpf != cpf_limpo[:3]:
         raise HTTPException(status_code=400, detail="Validação de CPF incorreta")
     
-    checkin_existente = db.query(Checkin).filter(
+    ja_realizado = "Check-in já realizado para este CPF neste evento"
+    if not transacao and (await db.execute(select(Checkin.id).where(
         Checkin.cpf == cpf_formatado,
         Checkin.evento_id == evento_id
-    ).first()
+    ).limit(1))).first():
+        raise HTTPException(status_code=400, detail=ja_realizado)
+    
+    transacao_id = transacao.id if transacao else None
+    await _reservar_entrada(db, evento_id, transacao_id, ja_realizado)
+    db_checkin = await _gravar_reservado(db, evento_id, transacao_id, _gravar_checkin, {
+        "cpf": cpf_formatado,
+        "nome": nome_cliente,
+        "evento_id": evento_id,
+        "usuario_id": usuario_atual.id,
+        "transacao_id": transacao_id,
+        "metodo_checkin": "qr_code",
+        "validacao_cpf": validacao_cpf
+    })
+    if db_checkin is None:
+        raise HTTPException(status_code=400, detail=ja_realizado)
     
-    if checkin_existente:
-        raise HTTPException(status_code=400, detail="Check-in já realizado para este CPF neste evento")
-    
-    db_checkin = Checkin(
-        cpf=cpf_formatado,
-        nome=nome_cliente,
-        evento_id=evento_id,
-        usuario_id=usuario_atual.id,
-        transacao_id=transacao.id if transacao else None,
-        metodo_checkin="qr_code",
-        validacao_cpf=validacao_cpf
+    await _notificar_checkin(db, db_checkin, transacao.telefone_comprador if transacao else None)
+    return db_checkin
+
+async def _checkin_ticket_assinado(qr_code: str, validacao_cpf: str, db: AsyncSession,
+                                   usuario_atual: Usuario) -> CheckinSchema:
+    try:
+        ticket = ticket_service.verificar(qr_code)
+    except TicketInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    ja_realizado = "Check-in já realizado para este ingresso"
+    await _reservar_entrada(db, ticket.evento_id, ticket.transacao_id, ja_realizado)
+    # ingresso cancelado, CPF errado ou falha na gravação desfazem a reserva
+    db_checkin, telefone = await _gravar_reservado(
+        db, ticket.evento_id, ticket.transacao_id, _gravar_checkin_ticket, ticket, validacao_cpf, usuario_atual.id
     )
+    if db_checkin is None:
+        # entrada gravada por outro processo
+        raise HTTPException(status_code=400, detail=ja_realizado)
     
-    db.add(db_checkin)
-    db.commit()
-    db.refresh(db_checkin)
-    
-    await manager.broadcast_to_event(evento_id, {
+    await _notificar_checkin(db, db_checkin, telefone)
+    return db_checkin
+
+async def _notificar_checkin(db: AsyncSession, db_checkin: CheckinSchema, telefone: Optional[str]):
+    await _confirmar_entrada(db, db_checkin.evento_id)
+    await manager.broadcast_to_event(db_checkin.evento_id, {
         "type": "checkin_update",
         "data": {
             "tipo": "novo_checkin",
             "checkin": {
-                "nome": nome_cliente,
-                "cpf": cpf_formatado,
+                "nome": db_checkin.nome,
+                "cpf": db_checkin.cpf,
                 "metodo": "qr_code",
                 "horario": db_checkin.checkin_em.isoformat()
             }
@@ -225,63 +340,68 @@ async def checkin_por_qr(
         "timestamp": datetime.now().isoformat()
     })
     
-    if transacao and transacao.telefone_comprador:
+    if telefone:
         await whatsapp_service.notify_n8n("checkin_realizado", {
-            "cpf": cpf_formatado,
-            "nome": nome_cliente,
-            "evento_id": evento_id,
-            "telefone": transacao.telefone_comprador
+            "cpf": db_checkin.cpf,
+            "nome": db_checkin.nome,
+            "evento_id": db_checkin.evento_id,
+            "telefone": telefone
         })
-    
-    return db_checkin
+
+def _consulta_vendas(evento_id: int):
+    """Vendas aprovadas e vendas sem check-in do evento numa única passada (NOT EXISTS pelo índice evento/transação)"""
+    aprovada = Transacao.status == StatusTransacao.APROVADA
+    sem_checkin = ~exists().where(Checkin.evento_id == Transacao.evento_id, Checkin.transacao_id == Transacao.id)
+    return select(
+        func.count(Transacao.id).filter(aprovada),
+        func.count(Transacao.id).filter(aprovada, sem_checkin)
+    ).where(Transacao.evento_id == evento_id)
 
 @router.get("/dashboard/{evento_id}")
 async def dashboard_checkin_tempo_real(
     evento_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     usuario_atual: Usuario = Depends(obter_usuario_atual)
 ):
-    """Dashboard de check-in em tempo real"""
+    """Dashboard de check-in em tempo real (presença e ritmo vêm do estado em memória)"""
     
-    evento = db.query(Evento).filter(Evento.id == evento_id).first()
+    evento = await db.get(Evento, evento_id)
     if not evento:
         raise HTTPException(status_code=404, detail="Evento não encontrado")
     
-    total_checkins = db.query(Checkin).filter(Checkin.evento_id == evento_id).count()
-    
-    uma_hora_atras = datetime.now() - timedelta(hours=1)
-    checkins_ultima_hora = db.query(Checkin).filter(
-        Checkin.evento_id == evento_id,
-        Checkin.checkin_em >= uma_hora_atras
-    ).count()
+    await ocupacao_service.carregar(db, evento_id)
+    ocupacao = ocupacao_service.resumo(evento_id)
     
-    total_vendas = db.query(Transacao).filter(
-        Transacao.evento_id == evento_id,
-        Transacao.status == "aprovada"
-    ).count()
-    
-    checkins_por_metodo = db.query(
-        Checkin.metodo_checkin,
-        db.func.count(Checkin.id).label('total')
-    ).filter(Checkin.evento_id == evento_id).group_by(Checkin.metodo_checkin).all()
-    
-    vendas_sem_checkin = db.query(Transacao).outerjoin(
-        Checkin, Transacao.cpf_comprador == Checkin.cpf
-    ).filter(
-        Transacao.evento_id == evento_id,
-        Transacao.status == "aprovada",
-        Checkin.id.is_(None)
-    ).count()
+    total_vendas, vendas_sem_checkin = (await db.execute(_consulta_vendas(evento_id))).one()
     
+    # total do banco (eventos.presentes), igual em todos os processos
     return {
         "evento_id": evento_id,
         "nome_evento": evento.nome,
-        "total_checkins": total_checkins,
-        "checkins_ultima_hora": checkins_ultima_hora,
+        "total_checkins": evento.presentes,
+        "checkins_ultima_hora": ocupacao["checkins_ultima_hora"],
         "total_vendas": total_vendas,
-        "taxa_presenca": round((total_checkins / total_vendas * 100) if total_vendas > 0 else 0, 1),
+        "taxa_presenca": round((evento.presentes / total_vendas * 100) if total_vendas > 0 else 0, 1),
         "fila_espera": vendas_sem_checkin,
-        "checkins_por_metodo": [{"metodo": m[0], "total": m[1]} for m in checkins_por_metodo],
+        "checkins_por_metodo": [{"metodo": m, "total": t} for m, t in ocupacao["por_metodo"].items()],
+        "capacidade": ocupacao["capacidade"],
+        "ocupacao_percentual": ocupacao["ocupacao_percentual"],
+        "taxa_por_minuto": ocupacao["taxa_por_minuto"],
         "status_evento": evento.status.value,
         "timestamp": datetime.now().isoformat()
     }
+
+@router.get("/ocupacao/{evento_id}")
+async def ocupacao_evento(
+    evento_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    usuario_atual: Usuario = Depends(obter_usuario_atual)
+):
+    """Presentes, capacidade e entradas por minuto, sem consultar o banco depois da primeira leitura"""
+    
+    if usuario_atual.tipo.value not in ["admin", "promoter"]:
+        raise HTTPException(status_code=403, detail="Acesso negado")
+    
+    if await ocupacao_service.carregar(db, evento_id) is None:
+        raise HTTPException(status_code=404, detail="Evento não encontrado")
+    return ocupacao_service.resumo(evento_id)
@@ -1,46 +1,43 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, desc, select
 from typing import List, Optional
 from datetime import datetime, date, timedelta
 from decimal import Decimal
-from ..database import get_db
-from ..models import Evento, Transacao, Checkin, Usuario, Lista, PromoterEvento
+from ..database import get_db, get_db_leitura, get_async_db
+from ..models import Evento, Transacao, Checkin, Usuario, Lista, PromoterEvento, StatusTransacao, TipoUsuario
 from ..schemas import DashboardResumo, RankingPromoter, DashboardAvancado, FiltrosDashboard, RankingPromoterAvancado, DadosGrafico
 from ..auth import obter_usuario_atual
+from ..services.ocupacao_service import ocupacao_service
 
 router = APIRouter()
 
 @router.get("/resumo", response_model=DashboardResumo)
 async def obter_resumo_dashboard(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     usuario_atual: Usuario = Depends(obter_usuario_atual)
 ):
     """Obter resumo do dashboard"""
     
-    if usuario_atual.tipo.value == "admin":
-        eventos_query = db.query(Evento)
-        transacoes_query = db.query(Transacao)
-        checkins_query = db.query(Checkin)
-    else:
-        eventos_query = db.query(Evento)
-        transacoes_query = db.query(Transacao)
-        checkins_query = db.query(Checkin)
+    hoje = date.today()
+    aprovada = Transacao.status == StatusTransacao.APROVADA
     
-    total_eventos = eventos_query.count()
-    total_vendas = transacoes_query.filter(Transacao.status == "aprovada").count()
-    total_checkins = checkins_query.count()
+    total_eventos = await db.scalar(select(func.count(Evento.id)))
+    total_vendas = await db.scalar(select(func.count(Transacao.id)).where(aprovada))
+    total_checkins = await db.scalar(select(func.count(Checkin.id)))
     
-    receita_total = transacoes_query.filter(Transacao.status == "aprovada").with_entities(
-        func.sum(Transacao.valor)
-    ).scalar() or Decimal('0.00')
+    receita_total = await db.scalar(
+        select(func.sum(Transacao.valor)).where(aprovada)
+    ) or Decimal('0.00')
     
-    hoje = date.today()
-    eventos_hoje = eventos_query.filter(func.date(Evento.data_evento) == hoje).count()
-    vendas_hoje = transacoes_query.filter(
+    eventos_hoje = await db.scalar(
+        select(func.count(Evento.id)).where(func.date(Evento.data_evento) == hoje)
+    )
+    vendas_hoje = await db.scalar(select(func.count(Transacao.id)).where(
         func.date(Transacao.criado_em) == hoje,
-        Transacao.status == "aprovada"
-    ).count()
+        aprovada
+    ))
     
     return DashboardResumo(
         total_eventos=total_eventos,
@@ -55,12 +52,12 @@ async def obter_resumo_dashboard(
 async def obter_ranking_promoters(
     evento_id: Optional[int] = None,
     limit: int = 10,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     usuario_atual: Usuario = Depends(obter_usuario_atual)
 ):
     """Obter ranking de promoters por vendas"""
     
-    query = db.query(
+    query = select(
         Usuario.id.label('promoter_id'),
         Usuario.nome.label('nome_promoter'),
         func.count(Transacao.id).label('total_vendas'),
@@ -69,21 +66,21 @@ async def obter_ranking_promoters(
         Lista, Lista.promoter_id == Usuario.id
     ).join(
         Transacao, Transacao.lista_id == Lista.id
-    ).filter(
-        Transacao.status == "aprovada",
-        Usuario.tipo == "promoter"
+    ).where(
+        Transacao.status == StatusTransacao.APROVADA,
+        Usuario.tipo == TipoUsuario.PROMOTER
     )
     
     # Role-based filtering removed - promoters and admins have access to all data
     
     if evento_id:
-        query = query.filter(Transacao.evento_id == evento_id)
+        query = query.where(Transacao.evento_id == evento_id)
     
-    ranking_data = query.group_by(
+    ranking_data = (await db.execute(query.group_by(
         Usuario.id, Usuario.nome
     ).order_by(
         desc('total_vendas')
-    ).limit(limit).all()
+    ).limit(limit))).all()
     
     ranking = []
     for i, row in enumerate(ranking_data, 1):
@@ -112,7 +109,7 @@ async def obter_vendas_tempo_real(
     
     vendas_por_hora = query.filter(
         Transacao.criado_em >= datetime.now() - timedelta(hours=24),
-        Transacao.status == "aprovada"
+        Transacao.status == StatusTransacao.APROVADA
     ).with_entities(
         func.extract('hour', Transacao.criado_em).label('hora'),
         func.count(Transacao.id).label('vendas'),
@@ -120,7 +117,7 @@ async def obter_vendas_tempo_real(
     ).group_by('hora').order_by('hora').all()
     
     vendas_por_lista = query.join(Lista).filter(
-        Transacao.status == "aprovada"
+        Transacao.status == StatusTransacao.APROVADA
     ).with_entities(
         Lista.tipo.label('tipo_lista'),
         func.count(Transacao.id).label('vendas'),
@@ -179,12 +176,12 @@ async def obter_aniversariantes(
 @router.get("/tempo-real/{evento_id}")
 async def obter_dados_tempo_real(
     evento_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     usuario_atual: Usuario = Depends(obter_usuario_atual)
 ):
     """Obter dados em tempo real para dashboard"""
     
-    evento = db.query(Evento).filter(Evento.id == evento_id).first()
+    evento = await db.get(Evento, evento_id)
     if not evento:
         raise HTTPException(status_code=404, detail="Evento não encontrado")
     
@@ -193,16 +190,14 @@ async def obter_dados_tempo_real(
         raise HTTPException(status_code=403, detail="Acesso negado")
     
     uma_hora_atras = datetime.now() - timedelta(hours=1)
-    vendas_ultima_hora = db.query(func.count(Transacao.id)).filter(
+    vendas_ultima_hora = await db.scalar(select(func.count(Transacao.id)).where(
         Transacao.evento_id == evento_id,
-        Transacao.status == "aprovada",
+        Transacao.status == StatusTransacao.APROVADA,
         Transacao.criado_em >= uma_hora_atras
-    ).scalar() or 0
+    )) or 0
     
-    checkins_ultima_hora = db.query(func.count(Checkin.id)).filter(
-        Checkin.evento_id == evento_id,
-        Checkin.checkin_em >= uma_hora_atras
-    ).scalar() or 0
+    await ocupacao_service.carregar(db, evento_id)
+    ocupacao = ocupacao_service.resumo(evento_id)
     
     ranking_atual = await obter_ranking_promoters(evento_id, 5, db, usuario_atual)
     
@@ -210,7 +205,10 @@ async def obter_dados_tempo_real(
         "evento_id": evento_id,
         "timestamp": datetime.now().isoformat(),
         "vendas_ultima_hora": vendas_ultima_hora,
-        "checkins_ultima_hora": checkins_ultima_hora,
+        "checkins_ultima_hora": ocupacao["checkins_ultima_hora"],
+        "presentes": evento.presentes,
+        "capacidade": ocupacao["capacidade"],
+        "taxa_checkins_por_minuto": ocupacao["taxa_por_minuto"],
         "ranking_promoters": ranking_atual,
         "status_evento": evento.status.value
     }
@@ -223,7 +221,7 @@ async def obter_dashboard_avancado(
     data_inicio: Optional[date] = None,
     data_fim: Optional[date] = None,
     metodo_pagamento: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db_leitura),
     usuario_atual: Usuario = Depends(obter_usuario_atual)
 ):
     """Dashboard avançado com métricas completas"""
@@ -250,9 +248,9 @@ async def obter_dashboard_avancado(
     if metodo_pagamento:
         transacoes_query = transacoes_query.filter(Transacao.metodo_pagamento == metodo_pagamento)
     
-    total_vendas = transacoes_query.filter(Transacao.status == "aprovada").count()
+    total_vendas = transacoes_query.filter(Transacao.status == StatusTransacao.APROVADA).count()
     total_checkins = checkins_query.count()
-    receita_total = transacoes_query.filter(Transacao.status == "aprovada").with_entities(
+    receita_total = transacoes_query.filter(Transacao.status == StatusTransacao.APROVADA).with_entities(
         func.sum(Transacao.valor)
     ).scalar() or Decimal('0.00')
     
@@ -262,32 +260,32 @@ async def obter_dashboard_avancado(
     
     vendas_hoje = transacoes_query.filter(
         func.date(Transacao.criado_em) == hoje,
-        Transacao.status == "aprovada"
+        Transacao.status == StatusTransacao.APROVADA
     ).count()
     
     vendas_semana = transacoes_query.filter(
         Transacao.criado_em >= inicio_semana,
-        Transacao.status == "aprovada"
+        Transacao.status == StatusTransacao.APROVADA
     ).count()
     
     vendas_mes = transacoes_query.filter(
         Transacao.criado_em >= inicio_mes,
-        Transacao.status == "aprovada"
+        Transacao.status == StatusTransacao.APROVADA
     ).count()
     
     receita_hoje = transacoes_query.filter(
         func.date(Transacao.criado_em) == hoje,
-        Transacao.status == "aprovada"
+        Transacao.status == StatusTransacao.APROVADA
     ).with_entities(func.sum(Transacao.valor)).scalar() or Decimal('0.00')
     
     receita_semana = transacoes_query.filter(
         Transacao.criado_em >= inicio_semana,
-        Transacao.status == "aprovada"
+        Transacao.status == StatusTransacao.APROVADA
     ).with_entities(func.sum(Transacao.valor)).scalar() or Decimal('0.00')
     
     receita_mes = transacoes_query.filter(
         Transacao.criado_em >= inicio_mes,
-        Transacao.status == "aprovada"
+        Transacao.status == StatusTransacao.APROVADA
     ).with_entities(func.sum(Transacao.valor)).scalar() or Decimal('0.00')
     
     checkins_hoje = checkins_query.filter(
@@ -304,7 +302,7 @@ async def obter_dashboard_avancado(
     vendas_sem_checkin = db.query(Transacao).outerjoin(
         Checkin, Transacao.cpf_comprador == Checkin.cpf
     ).filter(
-        Transacao.status == "aprovada",
+        Transacao.status == StatusTransacao.APROVADA,
         Checkin.id.is_(None)
     )
     
@@ -314,7 +312,7 @@ async def obter_dashboard_avancado(
     fila_espera = vendas_sem_checkin.count()
     
     cortesias = transacoes_query.filter(
-        Transacao.status == "aprovada",
+        Transacao.status == StatusTransacao.APROVADA,
         Transacao.valor == 0
     ).count()
     
@@ -352,12 +350,12 @@ async def obter_dashboard_avancado(
 async def obter_grafico_vendas_tempo(
     periodo: str = "7d",
     evento_id: Optional[int] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db_leitura),
     usuario_atual: Usuario = Depends(obter_usuario_atual)
 ):
     """Gráfico de vendas ao longo do tempo"""
     
-    transacoes_query = db.query(Transacao).filter(Transacao.status == "aprovada")
+    transacoes_query = db.query(Transacao).filter(Transacao.status == StatusTransacao.APROVADA)
     
     # Role-based filtering removed - promoters and admins have access to all data
     
@@ -424,7 +422,7 @@ async def obter_grafico_vendas_tempo(
 @router.get("/graficos/vendas-lista")
 async def obter_grafico_vendas_lista(
     evento_id: Optional[int] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db_leitura),
     usuario_atual: Usuario = Depends(obter_usuario_atual)
 ):
     """Gráfico de vendas por lista"""
@@ -434,7 +432,7 @@ async def obter_grafico_vendas_lista(
         func.count(Transacao.id).label('vendas'),
         func.sum(Transacao.valor).label('receita')
     ).join(Transacao, Lista.id == Transacao.lista_id).filter(
-        Transacao.status == "aprovada"
+        Transacao.status == StatusTransacao.APROVADA
     )
     
     # Role-based filtering removed - promoters and admins have access to all data
@@ -461,7 +459,7 @@ async def obter_grafico_vendas_lista(
 async def obter_ranking_promoters_avancado(
     evento_id: Optional[int] = None,
     limit: int = 10,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db_leitura),
     usuario_atual: Usuario = Depends(obter_usuario_atual)
 ):
     """Ranking avançado de promoters com métricas de conversão"""
@@ -479,8 +477,8 @@ async def obter_ranking_promoters_avancado(
     ).outerjoin(
         Checkin, Transacao.cpf_comprador == Checkin.cpf
     ).filter(
-        Transacao.status == "aprovada",
-        Usuario.tipo == "promoter"
+        Transacao.status == StatusTransacao.APROVADA,
+        Usuario.tipo == TipoUsuario.PROMOTER
     )
     
     # Role-based filtering removed - promoters and admins have access to all data
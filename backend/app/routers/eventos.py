@@ -10,7 +10,8 @@ import io
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import inch
-from ..database import get_db
+from ..database import get_db, get_db_leitura
+from ..services.ocupacao_service import ocupacao_service
 from ..models import Evento, Usuario, PromoterEvento, Transacao, Checkin, Lista, TipoUsuario
 from ..schemas import (
     Evento as EventoSchema, 
@@ -187,6 +188,7 @@ async def atualizar_evento(
     
     db.commit()
     db.refresh(evento)
+    ocupacao_service.atualizar_capacidade(evento.id, evento.capacidade_maxima)
     
     return evento
 
@@ -475,7 +477,7 @@ async def obter_status_financeiro(
 @router.get("/{evento_id}/export/csv")
 async def exportar_evento_csv(
     evento_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db_leitura),
     usuario_atual: Usuario = Depends(obter_usuario_atual)
 ):
     """Exportar dados do evento em CSV"""
@@ -533,7 +535,7 @@ async def exportar_evento_csv(
 @router.get("/{evento_id}/export/pdf")
 async def exportar_evento_pdf(
     evento_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db_leitura),
     usuario_atual: Usuario = Depends(obter_usuario_atual)
 ):
     """Exportar dados do evento em PDF"""
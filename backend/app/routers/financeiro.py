@@ -13,7 +13,7 @@ from openpyxl.styles import Font, PatternFill
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 
-from ..database import get_db
+from ..database import get_db, get_db_leitura
 from ..models import (
     MovimentacaoFinanceira, CaixaEvento, Evento, Usuario, 
     TipoMovimentacaoFinanceira, StatusMovimentacaoFinanceira,
@@ -208,7 +208,7 @@ async def upload_comprovante(
 @router.get("/dashboard/{evento_id}", response_model=DashboardFinanceiro)
 async def obter_dashboard_financeiro(
     evento_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db_leitura),
     usuario_atual: Usuario = Depends(obter_usuario_atual)
 ):
     """Dashboard financeiro do evento"""
@@ -311,7 +311,7 @@ async def exportar_relatorio_financeiro(
     formato: str,
     data_inicio: Optional[str] = "",
     data_fim: Optional[str] = "",
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db_leitura),
     usuario_atual: Usuario = Depends(obter_usuario_atual)
 ):
     """Exportar relatório financeiro em PDF, Excel ou CSV"""
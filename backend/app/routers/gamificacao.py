@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc, and_, or_
 from typing import List, Optional
@@ -12,7 +12,7 @@ from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment
 from openpyxl.chart import BarChart, Reference
 
-from ..database import get_db
+from ..database import get_db, get_db_leitura
 from ..models import (
     Usuario, Evento, Lista, Transacao, Checkin, PromoterEvento,
     Conquista, PromoterConquista, MetricaPromoter, TipoConquista, NivelBadge,
@@ -24,7 +24,7 @@ from ..schemas import (
     FiltrosRanking, PromoterConquistaResponse
 )
 from ..auth import obter_usuario_atual, verificar_permissao_admin, verificar_permissao_promoter
-from ..services.whatsapp_service import whatsapp_service
+from ..services.outbox_service import outbox_service
 
 router = APIRouter(prefix="/gamificacao", tags=["Gamificação"])
 
@@ -36,7 +36,7 @@ async def obter_ranking_gamificado(
     badge_nivel: Optional[str] = None,
     tipo_ranking: Optional[str] = "geral",
     limit: int = 20,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db_leitura),
     usuario_atual: Usuario = Depends(obter_usuario_atual)
 ):
     """Obter ranking gamificado de promoters"""
@@ -125,7 +125,7 @@ async def obter_ranking_gamificado(
 @router.get("/dashboard", response_model=DashboardGamificacao)
 async def obter_dashboard_gamificacao(
     evento_id: Optional[int] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db_leitura),
     usuario_atual: Usuario = Depends(obter_usuario_atual)
 ):
     """Dashboard completo de gamificação"""
@@ -226,7 +226,6 @@ async def criar_conquista(
 @router.post("/verificar-conquistas/{promoter_id}")
 async def verificar_conquistas_promoter(
     promoter_id: int,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     usuario_atual: Usuario = Depends(verificar_permissao_admin)
 ):
@@ -285,15 +284,11 @@ async def verificar_conquistas_promoter(
             novas_conquistas.append(conquista)
     
     if novas_conquistas:
-        db.commit()
-        
         if promoter.telefone:
-            background_tasks.add_task(
-                enviar_notificacao_conquista,
-                promoter.telefone,
-                promoter.nome,
-                novas_conquistas
-            )
+            outbox_service.enfileirar(db, "whatsapp", promoter.telefone, {
+                "mensagem": formatar_notificacao_conquista(promoter.nome, novas_conquistas)
+            })
+        db.commit()
     
     return {
         "message": f"{len(novas_conquistas)} novas conquistas atribuídas",
@@ -309,7 +304,7 @@ async def exportar_ranking(
     badge_nivel: Optional[str] = None,
     tipo_ranking: Optional[str] = "geral",
     limit: int = 20,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db_leitura),
     usuario_atual: Usuario = Depends(obter_usuario_atual)
 ):
     """Exportar ranking em Excel, PDF ou CSV"""
@@ -431,8 +426,8 @@ def calcular_pontuacao_gamificada(vendas: int, receita: float, taxa_presenca: fl
     
     return pontos_vendas + pontos_receita + pontos_presenca + pontos_conquistas
 
-async def enviar_notificacao_conquista(telefone: str, nome: str, conquistas: List[Conquista]):
-    """Enviar notificação de conquista via WhatsApp"""
+def formatar_notificacao_conquista(nome: str, conquistas: List[Conquista]) -> str:
+    """Mensagem de WhatsApp com as novas conquistas do promoter"""
     conquistas_texto = "\n".join([f"{c.icone} {c.nome}" for c in conquistas])
     
     message = f"""
@@ -444,4 +439,4 @@ Você conquistou novos badges:
 Continue assim e alcance novos níveis! 🚀
     """.strip()
     
-    await whatsapp_service._send_whatsapp_message(telefone, message)
+    return message
@@ -9,6 +9,7 @@ from ..schemas import (
     DashboardListas, ConvidadoCreate, ConvidadoImport
 )
 from ..auth import obter_usuario_atual
+from ..services.ticket_service import ticket_service
 import uuid
 import re
 import csv
@@ -231,6 +232,7 @@ async def importar_convidados(
             )
         
         convidados_criados = 0
+        criados = []
         erros = []
         
         for index, row in df.iterrows():
@@ -261,17 +263,22 @@ async def importar_convidados(
                     'lista_id': lista_id,
                     'evento_id': evento.id,
                     'usuario_id': usuario_atual.id,
-                    'codigo_transacao': str(uuid.uuid4()),
-                    'qr_code_ticket': f"TICKET-{str(uuid.uuid4())[:8].upper()}-{evento.id}"
+                    'codigo_transacao': str(uuid.uuid4())
                 }
                 
                 db_transacao = Transacao(**transacao_data)
                 db.add(db_transacao)
+                criados.append(db_transacao)
                 convidados_criados += 1
                 
             except Exception as e:
                 erros.append(f"Linha {index + 2}: {str(e)}")
         
+        # os ingressos assinados levam o id da transação
+        db.flush()
+        for db_transacao in criados:
+            db_transacao.qr_code_ticket = ticket_service.emitir_para(db_transacao, evento, lista)
+        
         lista.vendas_realizadas += convidados_criados
         db.commit()
         
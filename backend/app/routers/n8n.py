@@ -1,82 +1,96 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from datetime import datetime
 import json
-import aiohttp
-from ..database import get_db
+from ..database import get_db, get_async_db, executar_escrita
 from ..models import Evento, Transacao, Usuario, LogAuditoria
 from ..auth import verificar_permissao_admin
+from ..http_client import cliente_http
+from ..services.webhook_service import webhook_service, chave_idempotencia, registrar_processador
 
 router = APIRouter(prefix="/n8n", tags=["N8N Automações"])
 
-@router.post("/webhook/meta-ads", summary="Webhook Meta Ads")
+async def _receber_webhook(request: Request, db: AsyncSession, origem: str) -> Dict[str, Any]:
+    """Validar o corpo, gravar com a chave de idempotência e confirmar; o processamento fica com os workers"""
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Payload JSON inválido")
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Payload deve ser um objeto JSON")
+    
+    chave = chave_idempotencia(data, request.headers.get("Idempotency-Key") or request.headers.get("X-Request-Id"))
+    webhook_id, duplicado = await executar_escrita(
+        db, webhook_service.receber, origem, data, chave, request.client.host if request.client else None
+    )
+    return {"id": webhook_id, "duplicado": duplicado}
+
+@router.post("/webhook/meta-ads", status_code=202, summary="Webhook Meta Ads")
 async def webhook_meta_ads(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Webhook para receber dados do Meta Ads via N8N.
     
+    O payload é gravado e confirmado com 202; o processamento acontece nos
+    workers de webhooks. Reenvios (mesmo header `Idempotency-Key`, ou mesmo
+    corpo) são ignorados.
+    
     **Uso:** Configure este endpoint no N8N para receber dados do Meta Ads.
     """
-    
-    try:
-        data = await request.json()
-        
-        log = LogAuditoria(
-            cpf_usuario="sistema",
-            acao="webhook_meta_ads",
-            dados_novos=json.dumps(data),
-            ip_origem=request.client.host,
-            status="sucesso"
-        )
-        db.add(log)
-        db.commit()
-        
-        if data.get("event_type") == "lead":
-            await processar_lead_meta_ads(data, db)
-        elif data.get("event_type") == "purchase":
-            await processar_compra_meta_ads(data, db)
-        
-        return {"status": "success", "message": "Webhook Meta Ads processado"}
-        
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
+    recebido = await _receber_webhook(request, db, "meta_ads")
+    return {"status": "accepted", "message": "Webhook Meta Ads recebido", **recebido}
 
-@router.post("/webhook/crm", summary="Webhook CRM")
+@router.post("/webhook/crm", status_code=202, summary="Webhook CRM")
 async def webhook_crm(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Webhook para integração com CRM via N8N.
     
+    O payload é gravado e confirmado com 202; o processamento acontece nos
+    workers de webhooks.
+    
     **Uso:** Configure este endpoint no N8N para receber dados do CRM.
     """
+    recebido = await _receber_webhook(request, db, "crm")
+    return {"status": "accepted", "message": "Webhook CRM recebido", **recebido}
+
+def _processar_webhook_meta_ads(db: Session, data: Dict[str, Any], ip_origem: Optional[str]):
+    """Processamento do webhook Meta Ads (workers de webhooks)"""
+    db.add(LogAuditoria(
+        cpf_usuario="sistema",
+        acao="webhook_meta_ads",
+        dados_novos=json.dumps(data),
+        ip_origem=ip_origem,
+        status="sucesso"
+    ))
+    db.commit()
     
-    try:
-        data = await request.json()
-        
-        log = LogAuditoria(
-            cpf_usuario="sistema",
-            acao="webhook_crm",
-            dados_novos=json.dumps(data),
-            ip_origem=request.client.host,
-            status="sucesso"
-        )
-        db.add(log)
-        db.commit()
-        
-        if data.get("action") == "new_contact":
-            await processar_novo_contato_crm(data, db)
-        elif data.get("action") == "update_contact":
-            await processar_atualizacao_contato_crm(data, db)
-        
-        return {"status": "success", "message": "Webhook CRM processado"}
-        
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
+    if data.get("event_type") == "lead":
+        processar_lead_meta_ads(data, db)
+    elif data.get("event_type") == "purchase":
+        processar_compra_meta_ads(data, db)
+
+def _processar_webhook_crm(db: Session, data: Dict[str, Any], ip_origem: Optional[str]):
+    """Processamento do webhook CRM (workers de webhooks)"""
+    db.add(LogAuditoria(
+        cpf_usuario="sistema",
+        acao="webhook_crm",
+        dados_novos=json.dumps(data),
+        ip_origem=ip_origem,
+        status="sucesso"
+    ))
+    db.commit()
+    
+    if data.get("action") == "new_contact":
+        processar_novo_contato_crm(data, db)
+    elif data.get("action") == "update_contact":
+        processar_atualizacao_contato_crm(data, db)
 
 @router.post("/trigger/evento-criado", summary="Disparar automação evento criado")
 async def trigger_evento_criado(
@@ -105,12 +119,11 @@ async def trigger_evento_criado(
     }
     
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(n8n_webhook_url, json=payload) as response:
-                if response.status == 200:
-                    return {"status": "success", "message": "Automação N8N disparada"}
-                else:
-                    return {"status": "error", "message": f"Erro HTTP {response.status}"}
+        status = await cliente_http.post_json(n8n_webhook_url, payload, nome="n8n")
+        if status == 200:
+            return {"status": "success", "message": "Automação N8N disparada"}
+        else:
+            return {"status": "error", "message": f"Erro HTTP {status}"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
@@ -142,27 +155,29 @@ async def trigger_venda_realizada(
     }
     
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(n8n_webhook_url, json=payload) as response:
-                if response.status == 200:
-                    return {"status": "success", "message": "Automação N8N disparada"}
-                else:
-                    return {"status": "error", "message": f"Erro HTTP {response.status}"}
+        status = await cliente_http.post_json(n8n_webhook_url, payload, nome="n8n")
+        if status == 200:
+            return {"status": "success", "message": "Automação N8N disparada"}
+        else:
+            return {"status": "error", "message": f"Erro HTTP {status}"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
-async def processar_lead_meta_ads(data: Dict[str, Any], db: Session):
+def processar_lead_meta_ads(data: Dict[str, Any], db: Session):
     """Processar lead do Meta Ads"""
     pass
 
-async def processar_compra_meta_ads(data: Dict[str, Any], db: Session):
+def processar_compra_meta_ads(data: Dict[str, Any], db: Session):
     """Processar compra do Meta Ads"""
     pass
 
-async def processar_novo_contato_crm(data: Dict[str, Any], db: Session):
+def processar_novo_contato_crm(data: Dict[str, Any], db: Session):
     """Processar novo contato do CRM"""
     pass
 
-async def processar_atualizacao_contato_crm(data: Dict[str, Any], db: Session):
+def processar_atualizacao_contato_crm(data: Dict[str, Any], db: Session):
     """Processar atualização de contato do CRM"""
     pass
+
+registrar_processador("meta_ads", _processar_webhook_meta_ads)
+registrar_processador("crm", _processar_webhook_crm)
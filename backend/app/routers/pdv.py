@@ -1,27 +1,103 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, WebSocket, WebSocketDisconnect
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, and_
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, WebSocket, WebSocketDisconnect, UploadFile, File, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, desc, and_, select
 from typing import List, Optional
 from datetime import datetime, date, timedelta
 from decimal import Decimal
 import uuid
 import json
-from ..database import get_db
+import io
+from ..database import get_db, get_async_db, executar_escrita
+from ..pagination import paginar_keyset, sincronizar_delta, CursorInvalidoError
 from ..models import (
     Produto, Comanda, VendaPDV, ItemVendaPDV, PagamentoPDV, 
-    RecargaComanda, MovimentoEstoque, CaixaPDV, Evento,
+    RecargaComanda, MovimentoEstoque, CaixaPDV, Evento, MovimentoSaldoComanda,
     StatusProduto, StatusComanda, StatusVendaPDV, TipoPagamentoPDV
 )
 from ..schemas import (
-    ProdutoCreate, Produto as ProdutoSchema, ComandaCreate, Comanda as ComandaSchema,
+    ProdutoCreate, Produto as ProdutoSchema, ComandaCreate, Comanda as ComandaSchema, ComandaLoteCreate,
     VendaPDVCreate, VendaPDV as VendaPDVSchema, RecargaComandaCreate, RecargaComanda as RecargaComandaSchema,
-    CaixaPDVCreate, CaixaPDV as CaixaPDVSchema, RelatorioVendasPDV, DashboardPDV
+    CaixaPDVCreate, CaixaPDV as CaixaPDVSchema, RelatorioVendasPDV, DashboardPDV,
+    SaldoComanda, MovimentoSaldoComanda as MovimentoSaldoComandaSchema,
+    ProdutoLoteItem, ProdutoLoteRequest, ResumoLoteProdutos
 )
 from ..auth import obter_usuario_atual, verificar_permissao_admin
-from ..websocket import notify_stock_update, notify_new_sale, notify_cash_register_update
+from ..websocket import (
+    notify_stock_update, notify_new_sale, notify_cash_register_update, registrar_snapshot, websocket_evento
+)
+from ..services.issuance_service import issuance_service
+from ..services.catalog_service import catalog_service
+from ..services.receipt_service import receipt_service
+from ..services.ledger_service import (
+    ledger_service, ComandaNaoEncontradaError, ComandaInativaError, SaldoInsuficienteError
+)
 
 router = APIRouter(prefix="/pdv", tags=["PDV"])
 
+async def _snapshot_estoque(db: AsyncSession, evento_id: int, assinatura):
+    """Estoque atual dos produtos controlados do evento (só os do filtro, se houver), nos campos de stock_update"""
+    consulta = select(Produto.id, Produto.nome, Produto.estoque_atual).where(
+        Produto.evento_id == evento_id,
+        Produto.controla_estoque == True,
+        Produto.status == StatusProduto.ATIVO
+    )
+    if assinatura.produtos:
+        consulta = consulta.where(Produto.id.in_(assinatura.produtos))
+    produtos = (await db.execute(consulta.order_by(Produto.id))).all()
+    return [{"produto_id": p.id, "produto_nome": p.nome, "estoque_atual": p.estoque_atual} for p in produtos]
+
+registrar_snapshot("estoque", "estoque", _snapshot_estoque)
+
+LIMITE_PAGINA_PADRAO = 100
+LIMITE_PAGINA_MAXIMO = 1000
+
+def _listar_paginado(
+    db: Session,
+    query,
+    modelo,
+    evento_id: int,
+    response: Response,
+    cursor: Optional[str],
+    limite: Optional[int],
+    since: Optional[str],
+    descendente: bool,
+    ordem_padrao
+):
+    """
+    Lista sem paginação quando nenhum parâmetro é informado (comportamento
+    original); com `cursor`/`limite` pagina por keyset em (criado_em, id); com
+    `since` devolve só o que foi criado/alterado após a versão informada e, em
+    X-Sync-Removidos, os ids removidos ou que saíram dos filtros da listagem.
+    Os cursores seguintes vão nos headers
+    X-Proximo-Cursor / X-Sync-Cursor.
+    """
+    if since is None and cursor is None and limite is None:
+        return query.order_by(*ordem_padrao).all()
+    
+    limite = max(1, min(limite or LIMITE_PAGINA_PADRAO, LIMITE_PAGINA_MAXIMO))
+    
+    try:
+        if since is not None:
+            itens, removidos, sync_cursor, ha_mais = sincronizar_delta(
+                db, query, modelo, evento_id, since, limite
+            )
+            response.headers["X-Sync-Cursor"] = sync_cursor
+            response.headers["X-Sync-Ha-Mais"] = "true" if ha_mais else "false"
+            response.headers["X-Sync-Removidos"] = ",".join(str(registro_id) for registro_id in removidos)
+            return itens
+        
+        itens, proximo = paginar_keyset(
+            db, query, modelo.criado_em, modelo.id, cursor, limite, descendente=descendente
+        )
+    except CursorInvalidoError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if proximo:
+        response.headers["X-Proximo-Cursor"] = proximo
+    return itens
+
 @router.post("/produtos", response_model=ProdutoSchema)
 async def criar_produto(
     produto: ProdutoCreate,
@@ -51,12 +127,104 @@ async def criar_produto(
     
     return db_produto
 
+@router.post("/produtos/lote", response_model=ResumoLoteProdutos)
+def aplicar_lote_produtos(
+    lote: ProdutoLoteRequest,
+    db: Session = Depends(get_db),
+    usuario_atual = Depends(verificar_permissao_admin)
+):
+    """Criar/atualizar produtos em lote, casando por codigo_interno ou codigo_barras
+
+    Síncrona (roda no threadpool): até 5000 itens de escrita na Session.
+    """
+    
+    evento = db.query(Evento).filter(Evento.id == lote.evento_id).first()
+    if not evento:
+        raise HTTPException(status_code=404, detail="Evento não encontrado")
+    
+    if len(lote.produtos) > 5000:
+        raise HTTPException(status_code=400, detail="Máximo de 5000 produtos por lote")
+    
+    return catalog_service.aplicar_lote(
+        db, evento,
+        [item.model_dump(exclude_unset=True) for item in lote.produtos],
+        usuario_id=usuario_atual.id,
+        criar_novos=lote.criar_novos,
+        motivo_estoque=lote.motivo_estoque,
+        simular=lote.simular
+    )
+
+@router.post("/produtos/importar", response_model=ResumoLoteProdutos)
+def importar_produtos(
+    evento_id: int,
+    file: UploadFile = File(...),
+    criar_novos: bool = True,
+    simular: bool = False,
+    db: Session = Depends(get_db),
+    usuario_atual = Depends(verificar_permissao_admin)
+):
+    """Importar catálogo de produtos via CSV/Excel
+
+    Também síncrona: a leitura com pandas e o lote não ocupam o event loop.
+    """
+    
+    import pandas as pd
+    
+    evento = db.query(Evento).filter(Evento.id == evento_id).first()
+    if not evento:
+        raise HTTPException(status_code=404, detail="Evento não encontrado")
+    
+    content = file.file.read()
+    
+    try:
+        if file.filename.endswith('.csv'):
+            df = pd.read_csv(io.StringIO(content.decode('utf-8')), dtype=str)
+        elif file.filename.endswith(('.xlsx', '.xls')):
+            df = pd.read_excel(io.BytesIO(content), dtype=str)
+        else:
+            raise HTTPException(status_code=400, detail="Formato não suportado. Use CSV ou Excel.")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Erro ao ler arquivo: {str(e)}")
+    
+    if 'codigo_interno' not in df.columns and 'codigo_barras' not in df.columns:
+        raise HTTPException(
+            status_code=400,
+            detail="O arquivo deve ter a coluna codigo_interno ou codigo_barras"
+        )
+    
+    colunas = [c for c in df.columns if c in ProdutoLoteItem.model_fields]
+    itens = []
+    erros = []
+    for index, row in df[colunas].iterrows():
+        dados = {c: row[c].strip() for c in colunas if isinstance(row[c], str) and row[c].strip()}
+        try:
+            itens.append(ProdutoLoteItem(**dados).model_dump(exclude_unset=True))
+        except Exception as e:
+            erros.append(f"Linha {index + 2}: {str(e)}")
+    
+    resumo = catalog_service.aplicar_lote(
+        db, evento, itens,
+        usuario_id=usuario_atual.id,
+        criar_novos=criar_novos,
+        motivo_estoque=f"Importação {file.filename}",
+        simular=simular
+    )
+    resumo["erros"] = erros + resumo["erros"]
+    
+    return resumo
+
 @router.get("/produtos", response_model=List[ProdutoSchema])
 async def listar_produtos(
     evento_id: int,
+    response: Response,
     categoria: Optional[str] = None,
     status: Optional[str] = None,
     busca: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limite: Optional[int] = None,
+    since: Optional[str] = None,
     db: Session = Depends(get_db),
     usuario_atual = Depends(obter_usuario_atual)
 ):
@@ -87,7 +255,10 @@ async def listar_produtos(
             Produto.codigo_interno.ilike(f"%{busca}%")
         )
     
-    return query.order_by(Produto.nome).all()
+    return _listar_paginado(
+        db, query, Produto, evento_id, response, cursor, limite, since,
+        descendente=False, ordem_padrao=[Produto.nome]
+    )
 
 @router.get("/produtos/{produto_id}", response_model=ProdutoSchema)
 async def obter_produto(
@@ -165,11 +336,51 @@ async def criar_comanda(
     
     return db_comanda
 
+@router.post("/comandas/lote")
+def emitir_comandas_lote(
+    lote: ComandaLoteCreate,
+    db: Session = Depends(get_db),
+    usuario_atual = Depends(verificar_permissao_admin)
+):
+    """Pré-emitir comandas em lote; retorna CSV com o mapeamento número/QR/RFID para impressão
+
+    Rota síncrona de propósito: o FastAPI a executa no threadpool, então um
+    lote de dezenas de milhares de INSERTs não bloqueia o event loop.
+    """
+    
+    evento = db.query(Evento).filter(Evento.id == lote.evento_id).first()
+    if not evento:
+        raise HTTPException(status_code=404, detail="Evento não encontrado")
+    
+    try:
+        resultado = issuance_service.emitir_lote(
+            db, evento, lote.quantidade,
+            tipo=lote.tipo,
+            prefixo=lote.prefixo,
+            gerar_rfid=lote.gerar_rfid
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    return StreamingResponse(
+        issuance_service.gerar_csv(resultado["linhas"]),
+        media_type="text/csv",
+        headers={
+            "Content-Disposition": f"attachment; filename=comandas_evento_{evento.id}_lote_{resultado['lote']}.csv",
+            "X-Lote-Comandas": resultado["lote"],
+            "X-Total-Comandas": str(len(resultado["linhas"]))
+        }
+    )
+
 @router.get("/comandas", response_model=List[ComandaSchema])
 async def listar_comandas(
     evento_id: int,
+    response: Response,
     status: Optional[str] = None,
     cpf: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limite: Optional[int] = None,
+    since: Optional[str] = None,
     db: Session = Depends(get_db),
     usuario_atual = Depends(obter_usuario_atual)
 ):
@@ -193,7 +404,10 @@ async def listar_comandas(
     if cpf:
         query = query.filter(Comanda.cpf_cliente == cpf)
     
-    return query.order_by(desc(Comanda.criado_em)).all()
+    return _listar_paginado(
+        db, query, Comanda, evento_id, response, cursor, limite, since,
+        descendente=True, ordem_padrao=[desc(Comanda.criado_em)]
+    )
 
 @router.post("/comandas/{comanda_id}/recarga", response_model=RecargaComandaSchema)
 async def recarregar_comanda(
@@ -215,6 +429,9 @@ async def recarregar_comanda(
     if comanda.status != StatusComanda.ATIVA:
         raise HTTPException(status_code=400, detail="Comanda não está ativa")
     
+    if recarga.valor <= 0:
+        raise HTTPException(status_code=400, detail="Valor da recarga deve ser positivo")
+    
     db_recarga = RecargaComanda(
         comanda_id=comanda_id,
         valor=recarga.valor,
@@ -223,35 +440,80 @@ async def recarregar_comanda(
         codigo_transacao=str(uuid.uuid4())
     )
     
-    comanda.saldo_atual += recarga.valor
-    
     db.add(db_recarga)
+    db.flush()
+    
+    try:
+        ledger_service.creditar(
+            db, comanda_id, recarga.valor,
+            usuario_id=usuario_atual.id,
+            recarga_id=db_recarga.id
+        )
+    except ComandaInativaError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Comanda não está ativa")
+    
     db.commit()
     db.refresh(db_recarga)
     
     return db_recarga
 
-@router.post("/vendas", response_model=VendaPDVSchema)
-async def processar_venda(
-    venda: VendaPDVCreate,
-    background_tasks: BackgroundTasks,
+@router.get("/comandas/{comanda_id}/saldo", response_model=SaldoComanda)
+async def obter_saldo_comanda(
+    comanda_id: int,
     db: Session = Depends(get_db),
     usuario_atual = Depends(obter_usuario_atual)
 ):
-    """Processar venda no PDV"""
+    """Consultar saldo atual da comanda (leitura por PK, sempre do último commit)"""
+    
+    if usuario_atual.tipo.value not in ["admin", "promoter"]:
+        raise HTTPException(status_code=403, detail="Acesso negado")
+    
+    try:
+        saldo = ledger_service.obter_saldo(db, comanda_id)
+    except ComandaNaoEncontradaError:
+        raise HTTPException(status_code=404, detail="Comanda não encontrada")
+    
+    return SaldoComanda(comanda_id=comanda_id, saldo_atual=saldo)
+
+@router.get("/comandas/{comanda_id}/extrato", response_model=List[MovimentoSaldoComandaSchema])
+async def obter_extrato_comanda(
+    comanda_id: int,
+    limite: int = 50,
+    db: Session = Depends(get_db),
+    usuario_atual = Depends(obter_usuario_atual)
+):
+    """Extrato de créditos e débitos da comanda (mais recentes primeiro)"""
+    
+    if usuario_atual.tipo.value not in ["admin", "promoter"]:
+        raise HTTPException(status_code=403, detail="Acesso negado")
+    
+    comanda = db.query(Comanda.id).filter(Comanda.id == comanda_id).first()
+    if not comanda:
+        raise HTTPException(status_code=404, detail="Comanda não encontrada")
+    
+    return db.query(MovimentoSaldoComanda).filter(
+        MovimentoSaldoComanda.comanda_id == comanda_id
+    ).order_by(desc(MovimentoSaldoComanda.id)).limit(min(limite, 500)).all()
+
+def _registrar_venda(db: Session, venda: VendaPDVCreate, usuario_id: int, tipo_usuario: str):
+    """Parte síncrona da venda; roda via executar_escrita (escritor único no SQLite edge)"""
     
     evento = db.query(Evento).filter(Evento.id == venda.evento_id).first()
     if not evento:
         raise HTTPException(status_code=404, detail="Evento não encontrado")
     
-    if usuario_atual.tipo.value not in ["admin", "promoter"]:
+    if tipo_usuario not in ["admin", "promoter"]:
         raise HTTPException(
             status_code=403, 
             detail="Acesso negado: apenas admins e promoters podem acessar este recurso"
         )
     
+    ids_produtos = {item.produto_id for item in venda.itens}
+    produtos = {p.id: p for p in db.query(Produto).filter(Produto.id.in_(ids_produtos)).all()}
+    
     for item in venda.itens:
-        produto = db.query(Produto).filter(Produto.id == item.produto_id).first()
+        produto = produtos.get(item.produto_id)
         if not produto:
             raise HTTPException(status_code=404, detail=f"Produto {item.produto_id} não encontrado")
         
@@ -289,7 +551,8 @@ async def processar_venda(
         status=StatusVendaPDV.APROVADA,
         comanda_id=venda.comanda_id,
         evento_id=venda.evento_id,
-        usuario_vendedor_id=usuario_atual.id,
+        empresa_id=evento.empresa_id,
+        usuario_vendedor_id=usuario_id,
         cupom_codigo=venda.cupom_codigo,
         observacoes=venda.observacoes
     )
@@ -310,7 +573,7 @@ async def processar_venda(
         )
         db.add(db_item)
         
-        produto = db.query(Produto).filter(Produto.id == item.produto_id).first()
+        produto = produtos[item.produto_id]
         if produto.controla_estoque:
             estoque_anterior = produto.estoque_atual
             produto.estoque_atual -= item.quantidade
@@ -323,7 +586,7 @@ async def processar_venda(
                 estoque_atual=produto.estoque_atual,
                 motivo="Venda PDV",
                 venda_id=db_venda.id,
-                usuario_id=usuario_atual.id
+                usuario_id=usuario_id
             )
             db.add(movimento)
     
@@ -340,43 +603,69 @@ async def processar_venda(
         db.add(db_pagamento)
     
     if venda.comanda_id:
-        comanda = db.query(Comanda).filter(Comanda.id == venda.comanda_id).first()
-        if comanda and comanda.saldo_atual >= valor_final:
-            comanda.saldo_atual -= valor_final
-        else:
+        try:
+            ledger_service.debitar(
+                db, venda.comanda_id, valor_final,
+                usuario_id=usuario_id,
+                venda_id=db_venda.id
+            )
+        except ComandaNaoEncontradaError:
+            db.rollback()
+            raise HTTPException(status_code=404, detail="Comanda não encontrada")
+        except ComandaInativaError:
+            db.rollback()
+            raise HTTPException(status_code=400, detail="Comanda não está ativa")
+        except SaldoInsuficienteError:
+            db.rollback()
             raise HTTPException(status_code=400, detail="Saldo insuficiente na comanda")
     
     db.commit()
     db.refresh(db_venda)
     
+    estoques = [
+        (produto.id, produto.estoque_atual, produto.nome)
+        for produto in (produtos[item.produto_id] for item in venda.itens)
+    ]
+    return VendaPDVSchema.model_validate(db_venda), estoques
+
+@router.post("/vendas", response_model=VendaPDVSchema)
+async def processar_venda(
+    venda: VendaPDVCreate,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+    usuario_atual = Depends(obter_usuario_atual)
+):
+    """Processar venda no PDV"""
+    
+    venda_registrada, estoques = await executar_escrita(
+        db, _registrar_venda, venda, usuario_atual.id, usuario_atual.tipo.value
+    )
+    
     await notify_new_sale(venda.evento_id, {
-        "numero_venda": db_venda.numero_venda,
-        "valor_final": float(db_venda.valor_final),
-        "tipo_pagamento": db_venda.pagamentos[0].tipo_pagamento.value if db_venda.pagamentos else "N/A",
+        "numero_venda": venda_registrada.numero_venda,
+        "valor_final": float(venda_registrada.valor_final),
+        "tipo_pagamento": venda_registrada.pagamentos[0].tipo_pagamento.value if venda_registrada.pagamentos else "N/A",
         "itens_count": len(venda.itens)
     })
     
-    for item in venda.itens:
-        produto = db.query(Produto).filter(Produto.id == item.produto_id).first()
-        if produto:
-            await notify_stock_update(
-                produto.id, 
-                venda.evento_id, 
-                produto.estoque_atual,
-                produto.nome
-            )
+    for produto_id, estoque_atual, nome in estoques:
+        await notify_stock_update(produto_id, venda.evento_id, estoque_atual, nome)
     
-    background_tasks.add_task(imprimir_comprovante, db_venda.id)
+    background_tasks.add_task(imprimir_comprovante, venda_registrada.id, venda.impressora)
     
-    return db_venda
+    return venda_registrada
 
 @router.get("/vendas", response_model=List[VendaPDVSchema])
 async def listar_vendas(
     evento_id: int,
+    response: Response,
     data_inicio: Optional[date] = None,
     data_fim: Optional[date] = None,
     status: Optional[str] = None,
     cpf_cliente: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limite: Optional[int] = None,
+    since: Optional[str] = None,
     db: Session = Depends(get_db),
     usuario_atual = Depends(obter_usuario_atual)
 ):
@@ -392,7 +681,10 @@ async def listar_vendas(
             detail="Acesso negado: apenas admins e promoters podem acessar este recurso"
         )
     
-    query = db.query(VendaPDV).filter(VendaPDV.evento_id == evento_id)
+    query = db.query(VendaPDV).options(
+        selectinload(VendaPDV.itens),
+        selectinload(VendaPDV.pagamentos)
+    ).filter(VendaPDV.evento_id == evento_id)
     
     if data_inicio:
         query = query.filter(func.date(VendaPDV.criado_em) >= data_inicio)
@@ -406,7 +698,53 @@ async def listar_vendas(
     if cpf_cliente:
         query = query.filter(VendaPDV.cpf_cliente == cpf_cliente)
     
-    return query.order_by(desc(VendaPDV.criado_em)).all()
+    return _listar_paginado(
+        db, query, VendaPDV, evento_id, response, cursor, limite, since,
+        descendente=True, ordem_padrao=[desc(VendaPDV.criado_em)]
+    )
+
+@router.get("/vendas/{venda_id}/comprovante")
+async def obter_comprovante(
+    venda_id: int,
+    formato: str = "pdf",
+    db: Session = Depends(get_db),
+    usuario_atual = Depends(obter_usuario_atual)
+):
+    """Segunda via do comprovante (PDF renderizado fora do event loop, ou ESC/POS)"""
+    
+    if formato not in ("pdf", "escpos"):
+        raise HTTPException(status_code=400, detail="Formato deve ser 'pdf' ou 'escpos'")
+    
+    venda = db.query(VendaPDV).options(
+        selectinload(VendaPDV.itens).selectinload(ItemVendaPDV.produto),
+        selectinload(VendaPDV.pagamentos)
+    ).filter(VendaPDV.id == venda_id).first()
+    if not venda:
+        raise HTTPException(status_code=404, detail="Venda não encontrada")
+    
+    if formato == "escpos":
+        return Response(
+            content=receipt_service.gerar_comprovante_escpos(venda),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f"attachment; filename={venda.numero_venda}.bin"}
+        )
+    
+    conteudo = await receipt_service.gerar_comprovante_pdf_async(venda)
+    return Response(
+        content=conteudo,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f"inline; filename={venda.numero_venda}.pdf"}
+    )
+
+def _dados_caixa(caixa: CaixaPDV) -> dict:
+    return {
+        "id": caixa.id,
+        "numero_caixa": caixa.numero_caixa,
+        "status": caixa.status,
+        "valor_abertura": float(caixa.valor_abertura or 0),
+        "valor_vendas": float(caixa.valor_vendas or 0),
+        "valor_fechamento": float(caixa.valor_fechamento or 0)
+    }
 
 @router.post("/caixa/abrir", response_model=CaixaPDVSchema)
 async def abrir_caixa(
@@ -449,6 +787,8 @@ async def abrir_caixa(
     db.commit()
     db.refresh(db_caixa)
     
+    await notify_cash_register_update(db_caixa.evento_id, _dados_caixa(db_caixa))
+    
     return db_caixa
 
 @router.post("/caixa/{caixa_id}/fechar", response_model=CaixaPDVSchema)
@@ -489,6 +829,8 @@ async def fechar_caixa(
     db.commit()
     db.refresh(caixa)
     
+    await notify_cash_register_update(caixa.evento_id, _dados_caixa(caixa))
+    
     return caixa
 
 @router.get("/dashboard/{evento_id}", response_model=DashboardPDV)
@@ -645,17 +987,8 @@ async def relatorio_z(
     
     return relatorio_x_data
 
-@router.websocket("/ws/{evento_id}")
-async def websocket_endpoint(websocket: WebSocket, evento_id: int):
-    from ..websocket import manager
-    await manager.connect(websocket, evento_id)
-    try:
-        while True:
-            data = await websocket.receive_text()
-            await websocket.send_text(json.dumps({"type": "ping", "message": "pong"}))
-    except WebSocketDisconnect:
-        manager.disconnect(websocket, evento_id)
+router.add_api_websocket_route("/ws/{evento_id}", websocket_evento)
 
-async def imprimir_comprovante(venda_id: int):
+async def imprimir_comprovante(venda_id: int, impressora: Optional[str] = None):
     """Função para imprimir comprovante (background task)"""
-    pass
+    await receipt_service.imprimir_venda(venda_id, impressora)
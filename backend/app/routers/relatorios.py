@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, date
-from ..database import get_db
+from ..database import get_db_leitura
 from ..models import Evento, Transacao, Checkin, Usuario, Lista
 from ..schemas import RelatorioVendas
 from ..auth import obter_usuario_atual, verificar_permissao_admin
@@ -16,7 +16,7 @@ router = APIRouter()
 @router.get("/vendas/{evento_id}", response_model=RelatorioVendas)
 async def gerar_relatorio_vendas(
     evento_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db_leitura),
     usuario_atual: Usuario = Depends(obter_usuario_atual)
 ):
     """Gerar relatório de vendas de um evento"""
@@ -82,7 +82,7 @@ async def gerar_relatorio_vendas(
 @router.get("/vendas/{evento_id}/csv")
 async def exportar_vendas_csv(
     evento_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db_leitura),
     usuario_atual: Usuario = Depends(obter_usuario_atual)
 ):
     """Exportar relatório de vendas em CSV"""
@@ -144,7 +144,7 @@ async def exportar_vendas_csv(
 @router.get("/checkins/{evento_id}/csv")
 async def exportar_checkins_csv(
     evento_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db_leitura),
     usuario_atual: Usuario = Depends(obter_usuario_atual)
 ):
     """Exportar relatório de check-ins em CSV"""
@@ -202,7 +202,7 @@ async def exportar_logs_auditoria(
     cpf_usuario: Optional[str] = None,
     evento_id: Optional[int] = None,
     formato: str = "json",
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db_leitura),
     usuario_atual: Usuario = Depends(verificar_permissao_admin)
 ):
     """Exportar logs de auditoria (apenas admins)"""
@@ -276,7 +276,7 @@ async def exportar_logs_auditoria(
 @router.get("/vendas/{evento_id}/excel")
 async def exportar_vendas_excel(
     evento_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db_leitura),
     usuario_atual: Usuario = Depends(obter_usuario_atual)
 ):
     """Exportar relatório de vendas em Excel"""
@@ -340,7 +340,7 @@ async def exportar_vendas_excel(
 async def exportar_dashboard(
     formato: str,
     evento_id: Optional[int] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db_leitura),
     usuario_atual: Usuario = Depends(obter_usuario_atual)
 ):
     """Exportar dados do dashboard em diferentes formatos"""
@@ -5,6 +5,7 @@ from ..database import get_db
 from ..models import Transacao, Lista, Evento, Usuario
 from ..schemas import Transacao as TransacaoSchema, TransacaoCreate
 from ..auth import obter_usuario_atual, validar_cpf_basico
+from ..services.ticket_service import ticket_service
 import uuid
 
 router = APIRouter()
@@ -52,12 +53,13 @@ async def criar_transacao(
     
     transacao_data = transacao.dict()
     transacao_data['codigo_transacao'] = str(uuid.uuid4())
-    transacao_data['qr_code_ticket'] = f"TICKET-{str(uuid.uuid4())[:8].upper()}-{evento.id}"
     transacao_data['usuario_id'] = usuario_atual.id
     transacao_data['valor'] = lista.preco
     
     db_transacao = Transacao(**transacao_data)
     db.add(db_transacao)
+    db.flush()  # o ingresso assinado leva o id da transação
+    db_transacao.qr_code_ticket = ticket_service.emitir_para(db_transacao, evento, lista)
     
     lista.vendas_realizadas += 1
     
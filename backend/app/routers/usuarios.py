@@ -4,7 +4,7 @@ from typing import List, Optional
 from ..database import get_db
 from ..models import Usuario, Empresa
 from ..schemas import Usuario as UsuarioSchema, UsuarioCreate
-from ..auth import obter_usuario_atual, verificar_permissao_admin, gerar_hash_senha, validar_cpf_basico
+from ..auth import obter_usuario_atual, verificar_permissao_admin, gerar_hash_senha_async, validar_cpf_basico, cache_usuarios
 
 router = APIRouter()
 
@@ -37,7 +37,7 @@ async def criar_usuario(
         )
     
     
-    senha_hash = gerar_hash_senha(usuario.senha)
+    senha_hash = await gerar_hash_senha_async(usuario.senha)
     usuario_data = usuario.dict()
     del usuario_data['senha']
     usuario_data['senha_hash'] = senha_hash
@@ -124,14 +124,16 @@ async def atualizar_usuario(
                 detail="Email já cadastrado"
             )
     
+    cpf_anterior = usuario.cpf
     for field, value in usuario_update.dict(exclude={'senha'}).items():
         setattr(usuario, field, value)
     
     if usuario_update.senha:
-        usuario.senha_hash = gerar_hash_senha(usuario_update.senha)
+        usuario.senha_hash = await gerar_hash_senha_async(usuario_update.senha)
     
     db.commit()
     db.refresh(usuario)
+    cache_usuarios.invalidar(cpf_anterior, usuario.cpf)
     
     return usuario
 
@@ -152,5 +154,6 @@ async def desativar_usuario(
     
     usuario.ativo = False
     db.commit()
+    cache_usuarios.invalidar(usuario.cpf)
     
     return {"mensagem": "Usuário desativado com sucesso"}
@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
-from ..database import get_db
+from ..database import get_db, get_async_db, executar_escrita, settings
 from ..auth import obter_usuario_atual, verificar_permissao_promoter
 from ..models import Usuario, Evento, Lista
 from ..services.whatsapp_service import whatsapp_service
+from ..services.bulk_invite_service import bulk_invite_service
+from ..services.outbox_service import outbox_service
+from ..services.webhook_service import webhook_service, chave_idempotencia
 import logging
 
 logger = logging.getLogger(__name__)
@@ -29,6 +33,7 @@ class WebhookMessage(BaseModel):
     phone: str
     message: str
     timestamp: str = None
+    message_id: Optional[str] = None  # id do provedor: deduplica reenvios
 
 @router.post("/init", summary="Inicializar sessão WhatsApp")
 async def inicializar_whatsapp(
@@ -76,7 +81,6 @@ async def status_whatsapp(
 @router.post("/send-invite", summary="Enviar convite individual")
 async def enviar_convite(
     request: SendInviteRequest,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     usuario_atual: Usuario = Depends(verificar_permissao_promoter)
 ):
@@ -106,13 +110,10 @@ async def enviar_convite(
         if not lista:
             raise HTTPException(status_code=404, detail="Lista não encontrada")
         
-        background_tasks.add_task(
-            whatsapp_service.send_invite,
-            request.phone,
-            request.evento_id,
-            request.lista_id,
-            db
-        )
+        outbox_service.enfileirar(db, "whatsapp", request.phone, {
+            "mensagem": whatsapp_service._format_invite_message(evento, lista)
+        })
+        db.commit()
         
         return {
             "message": "Convite sendo enviado",
@@ -130,7 +131,6 @@ async def enviar_convite(
 @router.post("/send-bulk", summary="Enviar convites em massa")
 async def enviar_convites_massa(
     request: BulkInviteRequest,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     usuario_atual: Usuario = Depends(verificar_permissao_promoter)
 ):
@@ -160,20 +160,20 @@ async def enviar_convites_massa(
         if not lista:
             raise HTTPException(status_code=404, detail="Lista não encontrada")
         
-        if len(request.phones) > 100:
-            raise HTTPException(status_code=400, detail="Máximo de 100 números por vez")
+        if len(request.phones) > settings.whatsapp_envio_max_telefones:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Máximo de {settings.whatsapp_envio_max_telefones} números por vez"
+            )
         
-        background_tasks.add_task(
-            whatsapp_service.send_bulk_invites,
-            request.evento_id,
-            request.lista_id,
-            request.phones,
-            db
-        )
+        # mensagem montada uma vez; os convites entram na outbox e a resposta sai na hora
+        mensagem = bulk_invite_service.renderizar_convite(evento, lista)
+        envio = bulk_invite_service.iniciar(db, mensagem, request.phones)
         
         return {
             "message": "Convites sendo enviados em massa",
-            "total_phones": len(request.phones),
+            "envio_id": envio.id,
+            "total_phones": envio.total,
             "evento": evento.nome,
             "lista": lista.nome
         }
@@ -184,32 +184,47 @@ async def enviar_convites_massa(
         logger.error(f"Erro ao enviar convites em massa: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/webhook", summary="Webhook para mensagens recebidas")
+@router.get("/send-bulk/{envio_id}", summary="Progresso do envio em massa")
+async def progresso_convites_massa(
+    envio_id: str,
+    db: Session = Depends(get_db),
+    usuario_atual: Usuario = Depends(verificar_permissao_promoter)
+):
+    """
+    Retorna o progresso de um envio em massa: enviados, falhas,
+    retentativas e taxa de envio (mensagens/s).
+    """
+    envio = bulk_invite_service.obter(db, envio_id)
+    if not envio:
+        raise HTTPException(status_code=404, detail="Envio não encontrado")
+    return envio.progresso()
+
+@router.post("/webhook", status_code=202, summary="Webhook para mensagens recebidas")
 async def webhook_mensagens(
     message: WebhookMessage,
-    db: Session = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Webhook para processar mensagens recebidas via WhatsApp.
+    Webhook para mensagens recebidas via WhatsApp.
+    
+    A mensagem é gravada e confirmada com 202; o processamento (confirmação
+    de presença, check-in) acontece nos workers de webhooks. Reenvios da
+    mesma mensagem (mesmo `message_id`, ou mesmo conteúdo) são ignorados.
     
     **Uso:** Este endpoint deve ser configurado no sistema de WhatsApp
     para receber mensagens automaticamente.
     """
-    try:
-        result = await whatsapp_service.process_incoming_message(
-            message.phone,
-            message.message,
-            db
-        )
-        
-        return {
-            "message": "Mensagem processada",
-            "result": result
-        }
-        
-    except Exception as e:
-        logger.error(f"Erro no webhook: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    payload = message.dict(exclude_none=True)
+    webhook_id, duplicado = await executar_escrita(
+        db, webhook_service.receber, "whatsapp", payload,
+        chave_idempotencia(payload, message.message_id), request.client.host if request.client else None
+    )
+    return {
+        "message": "Mensagem recebida",
+        "id": webhook_id,
+        "duplicado": duplicado
+    }
 
 @router.get("/eventos/{evento_id}/invites", summary="Listar convites enviados")
 async def listar_convites_evento(
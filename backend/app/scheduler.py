@@ -1,31 +1,142 @@
+"""
+Agendador de tarefas periódicas no event loop da aplicação.
+
+Iniciado e encerrado pelo lifespan do FastAPI (ver main.py). Com vários
+workers no ar, cada rodada de uma tarefa é executada por um só: antes de
+rodar, o worker adquire o bloqueio da tarefa na tabela `bloqueios_agendador`,
+válido por um intervalo.
+"""
 import asyncio
-import schedule
+import os
+import random
+import socket
 import time
-from threading import Thread
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+from sqlalchemy import delete, or_, update
+from sqlalchemy.exc import IntegrityError
+from .database import SessionLocal, settings
+from .metrics import metricas
+from .models import BloqueioAgendador
 from .services.alert_service import alert_service
 import logging
 
 logger = logging.getLogger(__name__)
 
-def run_alert_checks():
-    """Executar verificações de alerta"""
-    try:
-        asyncio.run(alert_service.run_alert_checks())
-        logger.info("Verificações de alerta executadas com sucesso")
-    except Exception as e:
-        logger.error(f"Erro nas verificações de alerta: {e}")
-
-def start_scheduler():
-    """Iniciar scheduler de alertas"""
-    schedule.every(30).minutes.do(run_alert_checks)
-    
-    schedule.every(6).hours.do(run_alert_checks)
-    
-    def run_scheduler():
+class BloqueioLider:
+    """Bloqueio por nome de tarefa, com expiração, compartilhado pelos workers via banco"""
+
+    def __init__(self, fabrica_sessao: Callable = SessionLocal, dono: Optional[str] = None):
+        self.fabrica_sessao = fabrica_sessao
+        self.dono = dono or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def adquirir(self, nome: str, duracao_segundos: float) -> bool:
+        agora = datetime.utcnow()
+        expira_em = agora + timedelta(seconds=duracao_segundos)
+        db = self.fabrica_sessao()
+        try:
+            atualizados = db.execute(
+                update(BloqueioAgendador)
+                .where(
+                    BloqueioAgendador.nome == nome,
+                    or_(BloqueioAgendador.expira_em < agora, BloqueioAgendador.dono == self.dono)
+                )
+                .values(dono=self.dono, expira_em=expira_em)
+            ).rowcount
+            if not atualizados:
+                db.add(BloqueioAgendador(nome=nome, dono=self.dono, expira_em=expira_em))
+            db.commit()
+            return True
+        except IntegrityError:
+            # outro worker detém o bloqueio (ou acabou de criá-lo)
+            db.rollback()
+            return False
+        finally:
+            db.close()
+
+    def liberar_todos(self):
+        db = self.fabrica_sessao()
+        try:
+            db.execute(delete(BloqueioAgendador).where(BloqueioAgendador.dono == self.dono))
+            db.commit()
+        finally:
+            db.close()
+
+class Tarefa:
+    def __init__(self, nome: str, intervalo_segundos: float, funcao: Callable[[], Awaitable],
+                 jitter_segundos: float = 0, timeout_segundos: Optional[float] = None):
+        self.nome = nome
+        self.intervalo_segundos = intervalo_segundos
+        self.funcao = funcao
+        self.jitter_segundos = jitter_segundos
+        self.timeout_segundos = timeout_segundos
+
+class Agendador:
+    def __init__(self, bloqueio: Optional[BloqueioLider] = None):
+        self.bloqueio = bloqueio or BloqueioLider()
+        self._tarefas: Dict[str, Tarefa] = {}
+        self._execucoes: List[asyncio.Task] = []
+
+    def agendar(self, nome: str, intervalo_segundos: float, funcao: Callable[[], Awaitable],
+                jitter_segundos: float = 0, timeout_segundos: Optional[float] = None):
+        self._tarefas[nome] = Tarefa(nome, intervalo_segundos, funcao, jitter_segundos, timeout_segundos)
+
+    def iniciar(self):
+        for tarefa in self._tarefas.values():
+            self._execucoes.append(asyncio.create_task(self._executar_periodicamente(tarefa)))
+        logger.info(f"Agendador iniciado: {', '.join(self._tarefas) or 'nenhuma tarefa'}")
+
+    async def _executar_periodicamente(self, tarefa: Tarefa):
         while True:
-            schedule.run_pending()
-            time.sleep(60)
-    
-    scheduler_thread = Thread(target=run_scheduler, daemon=True)
-    scheduler_thread.start()
-    logger.info("Scheduler de alertas iniciado")
+            # jitter: workers iniciados juntos não disputam o bloqueio no mesmo instante
+            await asyncio.sleep(tarefa.intervalo_segundos + random.uniform(0, tarefa.jitter_segundos))
+            await self.executar_agora(tarefa.nome)
+
+    async def executar_agora(self, nome: str) -> bool:
+        """Executar a tarefa se este worker obtiver o bloqueio; retorna se executou"""
+        tarefa = self._tarefas[nome]
+        # bloqueio válido por um intervalo: no máximo uma execução por intervalo entre todos os workers
+        try:
+            lider = await asyncio.to_thread(self.bloqueio.adquirir, nome, tarefa.intervalo_segundos)
+        except Exception as e:
+            metricas.incrementar(f"agendador.{nome}.erros")
+            logger.error(f"Não foi possível obter o bloqueio da tarefa {nome}: {e}")
+            return False
+        if not lider:
+            metricas.incrementar(f"agendador.{nome}.ignoradas")
+            return False
+
+        inicio = time.perf_counter()
+        try:
+            await asyncio.wait_for(tarefa.funcao(), tarefa.timeout_segundos)
+            metricas.incrementar(f"agendador.{nome}.execucoes")
+        except asyncio.TimeoutError:
+            metricas.incrementar(f"agendador.{nome}.timeouts")
+            logger.error(f"Tarefa {nome} excedeu {tarefa.timeout_segundos}s e foi cancelada")
+        except Exception as e:
+            metricas.incrementar(f"agendador.{nome}.erros")
+            logger.error(f"Erro na tarefa {nome}: {e}")
+        finally:
+            metricas.observar(f"agendador.{nome}.duracao_ms", (time.perf_counter() - inicio) * 1000)
+        return True
+
+    async def encerrar(self):
+        for execucao in self._execucoes:
+            execucao.cancel()
+        await asyncio.gather(*self._execucoes, return_exceptions=True)
+        self._execucoes.clear()
+        try:
+            await asyncio.to_thread(self.bloqueio.liberar_todos)
+        except Exception as e:
+            logger.warning(f"Não foi possível liberar os bloqueios do agendador: {e}")
+
+agendador = Agendador()
+agendador.agendar(
+    "alertas",
+    settings.alertas_intervalo_minutos * 60,
+    alert_service.run_alert_checks,
+    jitter_segundos=settings.agendador_jitter_segundos,
+    # cada regra já tem seu timeout; este limita a rodada inteira
+    timeout_segundos=settings.alertas_timeout_regra_segundos * 2
+)
@@ -2,7 +2,7 @@ from pydantic import BaseModel, EmailStr, validator
 from datetime import datetime, date
 from typing import Optional, List
 from decimal import Decimal
-from .models import StatusEvento, TipoLista, StatusTransacao, TipoUsuario, TipoProduto, StatusProduto, TipoComanda, StatusComanda, StatusVendaPDV, TipoPagamentoPDV
+from .models import StatusEvento, TipoLista, StatusTransacao, TipoUsuario, TipoProduto, StatusProduto, TipoComanda, StatusComanda, StatusVendaPDV, TipoPagamentoPDV, TipoMovimentoSaldo
 import re
 
 
@@ -396,6 +396,36 @@ class Produto(ProdutoBase):
     class Config:
         from_attributes = True
 
+class ProdutoLoteItem(BaseModel):
+    codigo_interno: Optional[str] = None
+    codigo_barras: Optional[str] = None
+    nome: Optional[str] = None
+    descricao: Optional[str] = None
+    tipo: Optional[TipoProduto] = None
+    preco: Optional[Decimal] = None
+    estoque_atual: Optional[int] = None
+    estoque_minimo: Optional[int] = None
+    estoque_maximo: Optional[int] = None
+    controla_estoque: Optional[bool] = None
+    status: Optional[StatusProduto] = None
+    categoria: Optional[str] = None
+    imagem_url: Optional[str] = None
+
+class ProdutoLoteRequest(BaseModel):
+    evento_id: int
+    produtos: List[ProdutoLoteItem]
+    criar_novos: bool = True
+    motivo_estoque: str = "Ajuste em lote"
+    simular: bool = False
+
+class ResumoLoteProdutos(BaseModel):
+    criados: int
+    atualizados: int
+    inalterados: int
+    movimentos_estoque: int
+    alteracoes: List[dict]
+    erros: List[str]
+
 class ComandaBase(BaseModel):
     numero_comanda: str
     cpf_cliente: Optional[str] = None
@@ -407,6 +437,25 @@ class ComandaBase(BaseModel):
 class ComandaCreate(ComandaBase):
     evento_id: int
 
+class ComandaLoteCreate(BaseModel):
+    evento_id: int
+    quantidade: int
+    tipo: TipoComanda = TipoComanda.RFID
+    prefixo: str = "C"
+    gerar_rfid: bool = True
+    
+    @validator('quantidade')
+    def validar_quantidade(cls, v):
+        if v < 1 or v > 50000:
+            raise ValueError('Quantidade deve estar entre 1 e 50000')
+        return v
+    
+    @validator('prefixo')
+    def validar_prefixo(cls, v):
+        if not re.fullmatch(r'[A-Za-z0-9]{1,4}', v):
+            raise ValueError('Prefixo deve ter de 1 a 4 caracteres alfanuméricos')
+        return v.upper()
+
 class Comanda(ComandaBase):
     id: int
     saldo_atual: Decimal
@@ -471,6 +520,7 @@ class VendaPDVCreate(VendaPDVBase):
     evento_id: int
     itens: List[ItemVendaPDVCreate]
     pagamentos: List[PagamentoPDVCreate]
+    impressora: Optional[str] = None  # nome em IMPRESSORAS_ESCPOS; None = padrão
 
 class VendaPDV(VendaPDVBase):
     id: int
@@ -510,6 +560,26 @@ class RecargaComanda(RecargaComandaBase):
     class Config:
         from_attributes = True
 
+class SaldoComanda(BaseModel):
+    comanda_id: int
+    saldo_atual: Decimal
+
+class MovimentoSaldoComanda(BaseModel):
+    id: int
+    comanda_id: int
+    tipo: TipoMovimentoSaldo
+    valor: Decimal
+    saldo_anterior: Decimal
+    saldo_posterior: Decimal
+    descricao: Optional[str] = None
+    venda_id: Optional[int] = None
+    recarga_id: Optional[int] = None
+    usuario_id: Optional[int] = None
+    criado_em: datetime
+    
+    class Config:
+        from_attributes = True
+
 class CaixaPDVBase(BaseModel):
     numero_caixa: str
     valor_abertura: Decimal = Decimal('0.00')
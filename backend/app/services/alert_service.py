@@ -1,17 +1,22 @@
 import asyncio
+import time
 from datetime import datetime, date, timedelta
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List, Dict, Any
-from ..database import SessionLocal
-from ..models import Evento, Lista, Transacao, Usuario, TipoLista
-from ..services.whatsapp_service import whatsapp_service
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, func, insert, select
+from typing import Callable, List, Dict, Any, Optional, Tuple
+from ..database import AsyncSessionLocal, settings
+from ..metrics import metricas
+from ..models import Evento, Lista, Transacao, Usuario, TipoLista, StatusTransacao, TipoUsuario, AlertaEnviado
+from ..services.outbox_service import outbox_service
 import logging
 
 logger = logging.getLogger(__name__)
 
 class AlertService:
-    def __init__(self):
+    def __init__(self, fabrica_sessao: Callable[[], AsyncSession] = AsyncSessionLocal,
+                 timeout_regra_segundos: Optional[float] = None):
+        self.fabrica_sessao = fabrica_sessao
+        self.timeout_regra_segundos = timeout_regra_segundos or settings.alertas_timeout_regra_segundos
         self.alert_rules = {
             "limite_lista": self.check_limite_lista,
             "aniversarios_vip": self.check_aniversarios_vip,
@@ -21,208 +26,282 @@ class AlertService:
         }
     
     async def run_alert_checks(self):
-        """Executar todas as verificações de alerta"""
-        db = SessionLocal()
+        """Executar todas as verificações de alerta, em paralelo"""
+        await asyncio.gather(*[
+            self._executar_regra(rule_name, rule_func)
+            for rule_name, rule_func in self.alert_rules.items()
+        ])
+    
+    async def _executar_regra(self, rule_name: str, rule_func):
+        """Cada regra com sua sessão e seu timeout: uma regra lenta ou com erro não atrasa as outras"""
+        inicio = time.perf_counter()
         try:
-            for rule_name, rule_func in self.alert_rules.items():
-                try:
-                    await rule_func(db)
-                except Exception as e:
-                    logger.error(f"Erro na regra {rule_name}: {e}")
+            async with self.fabrica_sessao() as db:
+                await asyncio.wait_for(rule_func(db), self.timeout_regra_segundos)
+        except asyncio.TimeoutError:
+            metricas.incrementar(f"alertas.{rule_name}.timeouts")
+            logger.error(f"Regra {rule_name} excedeu {self.timeout_regra_segundos}s e foi cancelada")
+        except Exception as e:
+            metricas.incrementar(f"alertas.{rule_name}.erros")
+            logger.error(f"Erro na regra {rule_name}: {e}")
         finally:
-            db.close()
+            metricas.observar(f"alertas.{rule_name}.duracao_ms", (time.perf_counter() - inicio) * 1000)
+    
+    async def _admins(self, db: AsyncSession) -> List[str]:
+        """Telefones dos administradores (uma consulta por regra, não por evento)"""
+        return (await db.execute(
+            select(Usuario.telefone).where(Usuario.tipo == TipoUsuario.ADMIN, Usuario.telefone.isnot(None))
+        )).scalars().all()
     
-    async def check_limite_lista(self, db: Session):
+    async def _enviar_alertas(self, db: AsyncSession, regra: str, alertas: List[Tuple[str, str, str]]):
+        """
+        Enfileira na outbox os alertas (chave, telefone, mensagem) ainda não
+        registrados em `alertas_enviados` e os registra na mesma transação:
+        uma consulta e dois INSERTs por regra, qualquer que seja o número de eventos.
+        """
+        if not alertas:
+            return
+        
+        chaves = {chave for chave, _, _ in alertas}
+        ja_enviados = set((await db.execute(
+            select(AlertaEnviado.chave, AlertaEnviado.destinatario).where(
+                AlertaEnviado.regra == regra,
+                AlertaEnviado.chave.in_(chaves)
+            )
+        )).all())
+        pendentes = list({
+            (chave, telefone): mensagem
+            for chave, telefone, mensagem in alertas
+            if (chave, telefone) not in ja_enviados
+        }.items())
+        if not pendentes:
+            return
+        
+        await outbox_service.enfileirar_varios_async(db, "whatsapp", [
+            (telefone, {"mensagem": mensagem}) for (_, telefone), mensagem in pendentes
+        ])
+        await db.execute(insert(AlertaEnviado), [
+            {"regra": regra, "chave": chave, "destinatario": telefone} for (chave, telefone), _ in pendentes
+        ])
+        await db.commit()
+        metricas.incrementar(f"alertas.{regra}.enviados", len(pendentes))
+    
+    async def check_limite_lista(self, db: AsyncSession):
         """Verificar listas próximas do limite"""
-        listas_criticas = db.query(Lista).filter(
-            Lista.ativa == True,
-            Lista.limite_vendas.isnot(None),
-            Lista.vendas_realizadas >= Lista.limite_vendas * 0.9
-        ).all()
+        listas_criticas = (await db.execute(
+            select(
+                Lista.id, Lista.nome, Lista.vendas_realizadas, Lista.limite_vendas,
+                Evento.nome.label("evento_nome"), Usuario.telefone
+            )
+            .join(Evento, Evento.id == Lista.evento_id)
+            .join(Usuario, Usuario.id == Lista.promoter_id)
+            .where(
+                Lista.ativa == True,
+                Lista.limite_vendas.isnot(None),
+                Lista.vendas_realizadas >= Lista.limite_vendas * 0.9,
+                Usuario.telefone.isnot(None)
+            )
+        )).all()
         
+        alertas = []
         for lista in listas_criticas:
             percentual = (lista.vendas_realizadas / lista.limite_vendas) * 100
-            
-            if lista.promoter_id:
-                promoter = db.query(Usuario).filter(Usuario.id == lista.promoter_id).first()
-                if promoter and promoter.telefone:
-                    message = f"""
+            message = f"""
 🚨 *ALERTA - LIMITE DE LISTA*
 
 Lista: {lista.nome}
 Vendas: {lista.vendas_realizadas}/{lista.limite_vendas} ({percentual:.1f}%)
-Evento: {lista.evento.nome}
+Evento: {lista.evento_nome}
 
 Ação necessária: Verificar estratégia de vendas
-                    """.strip()
-                    
-                    await whatsapp_service._send_whatsapp_message(
-                        promoter.telefone, message
-                    )
+            """.strip()
+            alertas.append((str(lista.id), lista.telefone, message))
+        
+        await self._enviar_alertas(db, "limite_lista", alertas)
     
-    async def check_aniversarios_vip(self, db: Session):
+    async def check_aniversarios_vip(self, db: AsyncSession):
         """Verificar aniversariantes VIP nos próximos eventos"""
         hoje = date.today()
         proximos_7_dias = hoje + timedelta(days=7)
         
-        eventos_proximos = db.query(Evento).filter(
-            func.date(Evento.data_evento).between(hoje, proximos_7_dias)
-        ).all()
-        
-        for evento in eventos_proximos:
-            transacoes_vip = db.query(Transacao).join(Lista).filter(
-                Transacao.evento_id == evento.id,
+        transacoes_vip = (await db.execute(
+            select(Evento.id, Evento.nome, Evento.data_evento, Transacao.cpf_comprador, Transacao.nome_comprador)
+            .join(Transacao, Transacao.evento_id == Evento.id)
+            .join(Lista, Lista.id == Transacao.lista_id)
+            .where(
+                func.date(Evento.data_evento).between(hoje, proximos_7_dias),
                 Lista.tipo == TipoLista.VIP,
-                Transacao.status == "aprovada"
-            ).all()
-            
-            aniversariantes = []
-            for transacao in transacoes_vip:
-                if self._is_birthday_week(transacao.cpf_comprador):
-                    aniversariantes.append(transacao.nome_comprador)
-            
-            if aniversariantes:
-                admin_users = db.query(Usuario).filter(
-                    # Usuario.empresa_id removido
-                    Usuario.tipo == "admin"
-                ).all()
-                
-                for admin in admin_users:
-                    if admin.telefone:
-                        message = f"""
+                Transacao.status == StatusTransacao.APROVADA
+            )
+            .order_by(Evento.id)
+        )).all()
+        
+        aniversariantes_por_evento: Dict[int, Dict[str, Any]] = {}
+        for linha in transacoes_vip:
+            if self._is_birthday_week(linha.cpf_comprador):
+                evento = aniversariantes_por_evento.setdefault(
+                    linha.id, {"nome": linha.nome, "data_evento": linha.data_evento, "aniversariantes": []}
+                )
+                evento["aniversariantes"].append(linha.nome_comprador)
+        
+        if not aniversariantes_por_evento:
+            return
+        
+        telefones_admins = await self._admins(db)
+        alertas = []
+        for evento_id, evento in aniversariantes_por_evento.items():
+            message = f"""
 🎂 *ANIVERSARIANTES VIP*
 
-Evento: {evento.nome}
-Data: {evento.data_evento.strftime('%d/%m/%Y')}
+Evento: {evento["nome"]}
+Data: {evento["data_evento"].strftime('%d/%m/%Y')}
 
 Aniversariantes da semana:
-{chr(10).join(f"• {nome}" for nome in aniversariantes)}
+{chr(10).join(f"• {nome}" for nome in evento["aniversariantes"])}
 
 Considere preparar algo especial! 🎉
-                        """.strip()
-                        
-                        await whatsapp_service._send_whatsapp_message(
-                            admin.telefone, message
-                        )
+            """.strip()
+            alertas.extend((str(evento_id), telefone, message) for telefone in telefones_admins)
+        
+        await self._enviar_alertas(db, "aniversarios_vip", alertas)
     
-    async def check_vendas_baixas(self, db: Session):
+    async def check_vendas_baixas(self, db: AsyncSession):
         """Verificar eventos com vendas baixas"""
         hoje = date.today()
-        proximos_30_dias = hoje + timedelta(days=30)
-        
-        eventos_proximos = db.query(Evento).filter(
-            func.date(Evento.data_evento).between(hoje, proximos_30_dias)
-        ).all()
-        
-        for evento in eventos_proximos:
-            total_vendas = db.query(func.count(Transacao.id)).filter(
-                Transacao.evento_id == evento.id,
-                Transacao.status == "aprovada"
-            ).scalar() or 0
-            
+        proximos_7_dias = hoje + timedelta(days=7)
+        
+        total_vendas = func.count(Transacao.id)
+        eventos = (await db.execute(
+            select(Evento.id, Evento.nome, Evento.data_evento, total_vendas.label("total_vendas"))
+            .outerjoin(Transacao, and_(
+                Transacao.evento_id == Evento.id,
+                Transacao.status == StatusTransacao.APROVADA
+            ))
+            .where(func.date(Evento.data_evento).between(hoje, proximos_7_dias))
+            .group_by(Evento.id, Evento.nome, Evento.data_evento)
+            .having(total_vendas < 10)
+        )).all()
+        
+        if not eventos:
+            return
+        
+        promoters = (await db.execute(
+            select(Lista.evento_id, Usuario.telefone)
+            .join(Usuario, Usuario.id == Lista.promoter_id)
+            .where(Lista.evento_id.in_([evento.id for evento in eventos]), Usuario.telefone.isnot(None))
+            .distinct()
+        )).all()
+        telefones_por_evento: Dict[int, List[str]] = {}
+        for evento_id, telefone in promoters:
+            telefones_por_evento.setdefault(evento_id, []).append(telefone)
+        
+        alertas = []
+        for evento in eventos:
             dias_restantes = (evento.data_evento.date() - hoje).days
-            
-            if dias_restantes <= 7 and total_vendas < 10:
-                promoters = db.query(Usuario).join(
-                    Lista, Lista.promoter_id == Usuario.id
-                ).filter(Lista.evento_id == evento.id).distinct().all()
-                
-                for promoter in promoters:
-                    if promoter.telefone:
-                        message = f"""
+            message = f"""
 📉 *ALERTA - VENDAS BAIXAS*
 
 Evento: {evento.nome}
 Data: {evento.data_evento.strftime('%d/%m/%Y')}
-Vendas atuais: {total_vendas}
+Vendas atuais: {evento.total_vendas}
 Dias restantes: {dias_restantes}
 
 Ação sugerida: Intensificar divulgação
-                        """.strip()
-                        
-                        await whatsapp_service._send_whatsapp_message(
-                            promoter.telefone, message
-                        )
+            """.strip()
+            alertas.extend((str(evento.id), telefone, message) for telefone in telefones_por_evento.get(evento.id, []))
+        
+        await self._enviar_alertas(db, "vendas_baixas", alertas)
     
-    async def check_evento_proximo(self, db: Session):
+    async def check_evento_proximo(self, db: AsyncSession):
         """Verificar eventos nas próximas 24h"""
         amanha = date.today() + timedelta(days=1)
         
-        eventos_amanha = db.query(Evento).filter(
-            func.date(Evento.data_evento) == amanha
-        ).all()
+        eventos_amanha = (await db.execute(
+            select(
+                Evento.id, Evento.nome, Evento.data_evento, Evento.local,
+                func.count(Transacao.id).label("total_vendas")
+            )
+            .outerjoin(Transacao, and_(
+                Transacao.evento_id == Evento.id,
+                Transacao.status == StatusTransacao.APROVADA
+            ))
+            .where(func.date(Evento.data_evento) == amanha)
+            .group_by(Evento.id, Evento.nome, Evento.data_evento, Evento.local)
+        )).all()
         
+        if not eventos_amanha:
+            return
+        
+        telefones_admins = await self._admins(db)
+        alertas = []
         for evento in eventos_amanha:
-            total_vendas = db.query(func.count(Transacao.id)).filter(
-                Transacao.evento_id == evento.id,
-                Transacao.status == "aprovada"
-            ).scalar() or 0
-            
-            admin_users = db.query(Usuario).filter(
-                # Usuario.empresa_id removido
-                Usuario.tipo == "admin"
-            ).all()
-            
-            for admin in admin_users:
-                if admin.telefone:
-                    message = f"""
+            message = f"""
 ⏰ *EVENTO AMANHÃ*
 
 {evento.nome}
 📅 {evento.data_evento.strftime('%d/%m/%Y às %H:%M')}
 📍 {evento.local}
-🎫 {total_vendas} vendas confirmadas
+🎫 {evento.total_vendas} vendas confirmadas
 
 Lembrete: Preparar equipe e materiais
-                    """.strip()
-                    
-                    await whatsapp_service._send_whatsapp_message(
-                        admin.telefone, message
-                    )
+            """.strip()
+            alertas.extend((str(evento.id), telefone, message) for telefone in telefones_admins)
+        
+        await self._enviar_alertas(db, "evento_proximo", alertas)
     
     def _is_birthday_week(self, cpf: str) -> bool:
         """Mock para verificação de aniversário (requer API de CPF real)"""
         return cpf.endswith(('01', '15', '30'))
     
-    async def check_conquistas_pendentes(self, db: Session):
+    async def check_conquistas_pendentes(self, db: AsyncSession):
         """Verificar promoters que podem ter novas conquistas"""
         from ..models import Conquista, PromoterConquista, TipoConquista
         
-        promoters_ativos = db.query(Usuario).filter(
-            Usuario.tipo == "promoter",
-            Usuario.ativo == True
-        ).all()
-        
-        for promoter in promoters_ativos:
-            total_vendas = db.query(func.count(Transacao.id)).join(Lista).filter(
-                Lista.promoter_id == promoter.id,
-                Transacao.status == "aprovada"
-            ).scalar() or 0
-            
-            conquistas_vendas = db.query(Conquista).filter(
+        promoters = (await db.execute(
+            select(Usuario.id, Usuario.nome, Usuario.telefone, func.count(Transacao.id).label("total_vendas"))
+            .join(Lista, Lista.promoter_id == Usuario.id)
+            .join(Transacao, and_(
+                Transacao.lista_id == Lista.id,
+                Transacao.status == StatusTransacao.APROVADA
+            ))
+            .where(
+                Usuario.tipo == TipoUsuario.PROMOTER,
+                Usuario.ativo == True,
+                Usuario.telefone.isnot(None)
+            )
+            .group_by(Usuario.id, Usuario.nome, Usuario.telefone)
+        )).all()
+        
+        if not promoters:
+            return
+        
+        conquistas_vendas = (await db.execute(
+            select(Conquista).where(
                 Conquista.tipo == TipoConquista.VENDAS,
-                Conquista.criterio_valor <= total_vendas,
                 Conquista.ativa == True
-            ).all()
-            
+            )
+        )).scalars().all()
+        ja_possuem = set((await db.execute(
+            select(PromoterConquista.promoter_id, PromoterConquista.conquista_id).where(
+                PromoterConquista.promoter_id.in_([promoter.id for promoter in promoters])
+            )
+        )).all())
+        
+        alertas = []
+        for promoter in promoters:
             for conquista in conquistas_vendas:
-                ja_possui = db.query(PromoterConquista).filter(
-                    PromoterConquista.promoter_id == promoter.id,
-                    PromoterConquista.conquista_id == conquista.id
-                ).first()
-                
-                if not ja_possui and promoter.telefone:
-                    message = f"""
+                if conquista.criterio_valor > promoter.total_vendas or (promoter.id, conquista.id) in ja_possuem:
+                    continue
+                message = f"""
 🎉 *NOVA CONQUISTA DISPONÍVEL!*
 
 {promoter.nome}, você pode ter desbloqueado:
 {conquista.icone} {conquista.nome}
 
 Acesse o sistema para verificar! 🚀
-                    """.strip()
-                    
-                    await whatsapp_service._send_whatsapp_message(
-                        promoter.telefone, message
-                    )
+                """.strip()
+                alertas.append((f"{promoter.id}:{conquista.id}", promoter.telefone, message))
+        
+        await self._enviar_alertas(db, "conquistas_pendentes", alertas)
 
 alert_service = AlertService()
@@ -0,0 +1,127 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+from ..models import Evento, Lista, MensagemSaida, StatusMensagemSaida
+from .outbox_service import outbox_service
+import logging
+
+logger = logging.getLogger(__name__)
+
+class LimitadorTaxa:
+    """Token bucket: `taxa` envios por segundo, com rajadas de até `capacidade`"""
+
+    def __init__(self, taxa: float, capacidade: Optional[float] = None):
+        self.taxa = taxa
+        self.capacidade = capacidade or taxa
+        self._fichas = self.capacidade
+        self._atualizado = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def adquirir(self):
+        async with self._lock:
+            while True:
+                agora = time.monotonic()
+                self._fichas = min(self.capacidade, self._fichas + (agora - self._atualizado) * self.taxa)
+                self._atualizado = agora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                await asyncio.sleep((1 - self._fichas) / self.taxa)
+
+class EnvioConvites:
+    """Progresso de um envio em massa"""
+
+    def __init__(self, total: int, envio_id: Optional[str] = None):
+        self.id = envio_id or uuid.uuid4().hex
+        self.total = total
+        self.enviados = 0
+        self.retentativas = 0
+        self.falhas: List[Dict[str, str]] = []
+        self.status = "enviando"
+        self.iniciado_em = datetime.utcnow()
+        self.concluido_em: Optional[datetime] = None
+        # última entrega com sucesso: base da taxa de envio
+        self.ultimo_envio_em: Optional[datetime] = None
+
+    def progresso(self) -> Dict[str, Any]:
+        duracao = ((self.ultimo_envio_em or self.iniciado_em) - self.iniciado_em).total_seconds()
+        processados = self.enviados + len(self.falhas)
+        return {
+            "envio_id": self.id,
+            "status": self.status,
+            "total": self.total,
+            "success": self.enviados,
+            "failed": len(self.falhas),
+            "pendentes": self.total - processados,
+            "retentativas": self.retentativas,
+            "mensagens_por_segundo": round(self.enviados / duracao, 2) if duracao > 0 else 0,
+            "iniciado_em": self.iniciado_em.isoformat(),
+            "concluido_em": self.concluido_em.isoformat() if self.concluido_em else None,
+            "falhas": self.falhas,
+        }
+
+class BulkInviteService:
+    """
+    Envio de convites em massa pelo WhatsApp.
+
+    A mensagem é montada uma vez por (evento, lista) e cada telefone vira uma
+    mensagem na outbox, agrupada pelo id do envio. A entrega fica com os
+    workers da outbox, no canal "whatsapp": concorrência, retentativas com
+    backoff e o token bucket do provedor (compartilhado com os demais envios
+    de WhatsApp) vêm das configurações WHATSAPP_* desse canal. O progresso é
+    lido da tabela, então sobrevive a reinícios e vale para qualquer worker.
+    """
+
+    def renderizar_convite(self, evento: Evento, lista: Lista) -> str:
+        from .whatsapp_service import whatsapp_service
+        return whatsapp_service._format_invite_message(evento, lista)
+
+    def iniciar(self, db: Session, mensagem: str, telefones: List[str]) -> EnvioConvites:
+        """Enfileirar os convites; o progresso fica em `obter(db, envio_id)`"""
+        telefones = list(dict.fromkeys(telefones))
+        envio = EnvioConvites(len(telefones))
+        outbox_service.enfileirar_varios(
+            db, "whatsapp", [(telefone, {"mensagem": mensagem}) for telefone in telefones], lote=envio.id
+        )
+        db.commit()
+        logger.info(f"Envio {envio.id}: {envio.total} convites na fila")
+        return envio
+
+    def obter(self, db: Session, envio_id: str) -> Optional[EnvioConvites]:
+        por_status = {
+            status: (quantidade, retentativas, iniciado_em, ultimo_envio_em)
+            for status, quantidade, retentativas, iniciado_em, ultimo_envio_em in db.query(
+                MensagemSaida.status,
+                func.count(MensagemSaida.id),
+                # a primeira tentativa de cada mensagem não conta como retentativa
+                func.sum(case((MensagemSaida.tentativas > 1, MensagemSaida.tentativas - 1), else_=0)),
+                func.min(MensagemSaida.criado_em),
+                func.max(MensagemSaida.enviado_em)
+            ).filter(MensagemSaida.lote == envio_id).group_by(MensagemSaida.status)
+        }
+        if not por_status:
+            return None
+
+        envio = EnvioConvites(sum(quantidade for quantidade, _, _, _ in por_status.values()), envio_id)
+        envio.enviados = por_status.get(StatusMensagemSaida.ENVIADA, (0,))[0]
+        envio.retentativas = sum(retentativas or 0 for _, retentativas, _, _ in por_status.values())
+        envio.iniciado_em = min(inicio for _, _, inicio, _ in por_status.values())
+        envio.ultimo_envio_em = por_status.get(StatusMensagemSaida.ENVIADA, (0, 0, None, None))[3]
+        if StatusMensagemSaida.FALHOU in por_status:
+            envio.falhas = [
+                {"phone": destino, "erro": erro}
+                for destino, erro in db.query(MensagemSaida.destino, MensagemSaida.ultimo_erro).filter(
+                    MensagemSaida.lote == envio_id,
+                    MensagemSaida.status == StatusMensagemSaida.FALHOU
+                ).order_by(MensagemSaida.id)
+            ]
+        if envio.enviados + len(envio.falhas) == envio.total:
+            envio.status = "concluido"
+            envio.concluido_em = envio.ultimo_envio_em or envio.iniciado_em
+        return envio
+
+bulk_invite_service = BulkInviteService()
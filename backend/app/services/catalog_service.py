@@ -0,0 +1,248 @@
+import uuid
+from decimal import Decimal
+from typing import Any, Dict, List
+from sqlalchemy import insert, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from ..models import Produto, MovimentoEstoque, Evento, StatusProduto
+import logging
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_ATUALIZAVEIS = (
+    "nome", "descricao", "tipo", "preco", "codigo_barras", "estoque_atual",
+    "estoque_minimo", "estoque_maximo", "controla_estoque", "status",
+    "categoria", "imagem_url"
+)
+
+CAMPOS_OBRIGATORIOS_CRIACAO = ("nome", "tipo", "preco")
+
+class CatalogService:
+    """
+    Operações em lote sobre o catálogo de produtos do PDV.
+
+    Cada item é casado com o catálogo por `codigo_interno` ou `codigo_barras`
+    (uma única consulta para o lote inteiro), comparado campo a campo e só os
+    campos alterados são gravados. Ajustes de estoque geram `MovimentoEstoque`
+    inseridos em bloco, e tudo é aplicado numa única transação.
+    """
+
+    def aplicar_lote(
+        self,
+        db: Session,
+        evento: Evento,
+        itens: List[Dict[str, Any]],
+        usuario_id: int,
+        criar_novos: bool = True,
+        motivo_estoque: str = "Ajuste em lote",
+        simular: bool = False
+    ) -> Dict[str, Any]:
+        """Aplicar o lote de itens (dicts só com os campos informados) e retornar o resumo."""
+        resumo = {
+            "criados": 0,
+            "atualizados": 0,
+            "inalterados": 0,
+            "movimentos_estoque": 0,
+            "alteracoes": [],
+            "erros": []
+        }
+
+        por_codigo_interno, por_codigo_barras = self._carregar_catalogo(db, itens)
+        internos_vistos = set()
+        barras_vistos = set()
+        # (indice, produto, diferencas, alteracao); diferencas None indica criação
+        operacoes: List[tuple] = []
+
+        for indice, item in enumerate(itens, start=1):
+            codigo_interno = item.get("codigo_interno")
+            codigo_barras = item.get("codigo_barras")
+            chave = codigo_interno or codigo_barras
+
+            if not chave:
+                resumo["erros"].append(f"Item {indice}: informe codigo_interno ou codigo_barras")
+                continue
+            if codigo_interno in internos_vistos or codigo_barras in barras_vistos:
+                repetido = codigo_interno if codigo_interno in internos_vistos else codigo_barras
+                resumo["erros"].append(f"Item {indice}: código {repetido} repetido no lote")
+                continue
+            if codigo_interno:
+                internos_vistos.add(codigo_interno)
+            if codigo_barras:
+                barras_vistos.add(codigo_barras)
+
+            produto = None
+            if codigo_interno:
+                produto = por_codigo_interno.get(codigo_interno)
+            if produto is None and codigo_barras:
+                produto = por_codigo_barras.get(codigo_barras)
+
+            if produto is not None and produto.evento_id != evento.id:
+                resumo["erros"].append(f"Item {indice}: código {chave} pertence a outro evento")
+                continue
+
+            dono_barras = por_codigo_barras.get(codigo_barras) if codigo_barras else None
+            if dono_barras is not None and dono_barras is not produto:
+                resumo["erros"].append(
+                    f"Item {indice}: código de barras {codigo_barras} já pertence ao produto {dono_barras.codigo_interno}"
+                )
+                continue
+
+            if produto is None:
+                if not criar_novos:
+                    resumo["erros"].append(f"Item {indice}: produto {chave} não encontrado")
+                    continue
+                faltando = [c for c in CAMPOS_OBRIGATORIOS_CRIACAO if item.get(c) is None]
+                if faltando:
+                    resumo["erros"].append(f"Item {indice}: campos obrigatórios ausentes: {', '.join(faltando)}")
+                    continue
+
+                dados = {c: item[c] for c in CAMPOS_ATUALIZAVEIS if item.get(c) is not None}
+                dados.setdefault("status", StatusProduto.ATIVO)
+                produto = Produto(
+                    **dados,
+                    codigo_interno=codigo_interno or self._gerar_codigo_interno(),
+                    evento_id=evento.id,
+                    empresa_id=evento.empresa_id
+                )
+                operacoes.append((indice, produto, None, {"codigo": chave, "acao": "criado", "campos": sorted(dados)}))
+                continue
+
+            diferencas = self._diferencas(produto, item)
+            if not diferencas:
+                resumo["inalterados"] += 1
+                continue
+
+            operacoes.append((indice, produto, diferencas, {
+                "codigo": chave,
+                "acao": "atualizado",
+                "campos": {
+                    campo: {"de": self._serializar(antes), "para": self._serializar(depois)}
+                    for campo, (antes, depois) in diferencas.items()
+                }
+            }))
+
+        movimentos: List[Dict[str, Any]] = []
+        for indice, produto, diferencas, alteracao in self._gravar(db, operacoes, resumo):
+            resumo["alteracoes"].append(alteracao)
+            if diferencas is None:
+                resumo["criados"] += 1
+                if produto.controla_estoque and produto.estoque_atual:
+                    movimentos.append({
+                        "produto_id": produto.id,
+                        "tipo_movimento": "entrada",
+                        "quantidade": produto.estoque_atual,
+                        "estoque_anterior": 0,
+                        "estoque_atual": produto.estoque_atual,
+                        "motivo": motivo_estoque,
+                        "usuario_id": usuario_id
+                    })
+                continue
+
+            resumo["atualizados"] += 1
+            if "estoque_atual" in diferencas:
+                anterior, atual = diferencas["estoque_atual"]
+                anterior = anterior or 0
+                movimentos.append({
+                    "produto_id": produto.id,
+                    "tipo_movimento": "ajuste",
+                    "quantidade": abs(atual - anterior),
+                    "estoque_anterior": anterior,
+                    "estoque_atual": atual,
+                    "motivo": motivo_estoque,
+                    "usuario_id": usuario_id
+                })
+
+        if movimentos:
+            db.execute(insert(MovimentoEstoque), movimentos)
+        resumo["movimentos_estoque"] = len(movimentos)
+
+        if simular:
+            db.rollback()
+        else:
+            db.commit()
+            logger.info(
+                f"Catálogo do evento {evento.id}: {resumo['criados']} criados, "
+                f"{resumo['atualizados']} atualizados, {len(movimentos)} movimentos de estoque"
+            )
+
+        return resumo
+
+    def _gravar(self, db: Session, operacoes: List[tuple], resumo: Dict[str, Any]) -> List[tuple]:
+        """
+        Gravar o lote num único flush. Se o banco ainda recusar algum código
+        único (ex.: gravado por outra requisição depois da carga do catálogo),
+        reaplica item a item em savepoints e devolve só as operações gravadas;
+        as recusadas viram erro do item em vez de derrubar o lote.
+        """
+        self._aplicar(db, operacoes)
+        try:
+            with db.begin_nested():
+                db.flush()
+            return operacoes
+        except IntegrityError:
+            db.rollback()
+
+        gravadas = []
+        for operacao in operacoes:
+            try:
+                with db.begin_nested():
+                    self._aplicar(db, [operacao])
+                    db.flush()
+                gravadas.append(operacao)
+            except IntegrityError:
+                indice, _, _, alteracao = operacao
+                resumo["erros"].append(f"Item {indice}: código {alteracao['codigo']} já cadastrado")
+        return gravadas
+
+    def _aplicar(self, db: Session, operacoes: List[tuple]):
+        for _, produto, diferencas, _ in operacoes:
+            if diferencas is None:
+                db.add(produto)
+                continue
+            for campo, (_, novo_valor) in diferencas.items():
+                setattr(produto, campo, novo_valor)
+
+    def _carregar_catalogo(self, db: Session, itens: List[Dict[str, Any]]):
+        codigos_internos = {i["codigo_interno"] for i in itens if i.get("codigo_interno")}
+        codigos_barras = {i["codigo_barras"] for i in itens if i.get("codigo_barras")}
+
+        filtros = []
+        if codigos_internos:
+            filtros.append(Produto.codigo_interno.in_(codigos_internos))
+        if codigos_barras:
+            filtros.append(Produto.codigo_barras.in_(codigos_barras))
+        if not filtros:
+            return {}, {}
+
+        produtos = db.query(Produto).filter(or_(*filtros)).all()
+        return (
+            {p.codigo_interno: p for p in produtos if p.codigo_interno},
+            {p.codigo_barras: p for p in produtos if p.codigo_barras}
+        )
+
+    def _diferencas(self, produto: Produto, item: Dict[str, Any]) -> Dict[str, tuple]:
+        diferencas = {}
+        for campo in CAMPOS_ATUALIZAVEIS:
+            if campo not in item or item[campo] is None:
+                continue
+            atual = getattr(produto, campo)
+            novo = item[campo]
+            if isinstance(atual, Decimal) or isinstance(novo, Decimal):
+                iguais = atual is not None and Decimal(str(atual)) == Decimal(str(novo))
+            else:
+                iguais = atual == novo
+            if not iguais:
+                diferencas[campo] = (atual, novo)
+        return diferencas
+
+    def _serializar(self, valor: Any) -> Any:
+        if isinstance(valor, Decimal):
+            return float(valor)
+        if hasattr(valor, "value"):
+            return valor.value
+        return valor
+
+    def _gerar_codigo_interno(self) -> str:
+        return f"PROD{uuid.uuid4().hex[:16].upper()}"
+
+catalog_service = CatalogService()
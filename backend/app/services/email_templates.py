@@ -0,0 +1,173 @@
+"""
+Modelos de email, compilados uma vez na importação do módulo: cada envio só
+preenche as variáveis, sem recompilar o Jinja2 por mensagem.
+"""
+from typing import Tuple
+from jinja2 import DictLoader, Environment
+
+_BASE_HTML = """<!DOCTYPE html>
+<html lang="pt-BR">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{% block titulo %}{% endblock %}</title>
+    <style>
+        body { font-family: Arial, sans-serif; background-color: #f4f4f4; margin: 0; padding: 20px; }
+        .container { max-width: 600px; margin: 0 auto; background-color: #ffffff; padding: 30px; border-radius: 8px; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1); }
+        .header { text-align: center; margin-bottom: 30px; }
+        .logo { color: #2563eb; font-size: 24px; font-weight: bold; }
+        .content { color: #374151; line-height: 1.6; }
+        .box { background-color: #f8f9fa; border: 2px dashed #2563eb; padding: 20px; margin: 20px 0; border-radius: 8px; text-align: center; }
+        .destaque { font-size: 32px; font-weight: bold; color: #2563eb; letter-spacing: 4px; }
+        .footer { margin-top: 30px; padding-top: 20px; border-top: 1px solid #e5e7eb; text-align: center; color: #9ca3af; font-size: 14px; }
+        {% block estilo %}{% endblock %}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <div class="logo">🎉 Sistema Universal</div>
+            {% block cabecalho %}{% endblock %}
+        </div>
+        <div class="content">
+            {% block conteudo %}{% endblock %}
+        </div>
+        <div class="footer">
+            <p>Este é um email automático, não responda.</p>
+            <p>© 2025 Sistema Universal - Gestão de Eventos</p>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+_MODELOS_HTML = {
+    "base.html": _BASE_HTML,
+    "verificacao.html": """{% extends "base.html" %}
+{% block titulo %}Código de Verificação{% endblock %}
+{% block cabecalho %}<h1 style="color: #1f2937; margin: 10px 0;">Código de Verificação</h1>{% endblock %}
+{% block conteudo %}
+<p style="font-size: 16px; text-align: center;">Olá, <strong>{{ name }}</strong>!</p>
+<p style="color: #6b7280; text-align: center;">Use o código abaixo para completar seu login:</p>
+<div class="box"><div class="destaque">{{ code }}</div></div>
+<p><strong>Instruções:</strong></p>
+<p>• Digite este código na tela de login</p>
+<p>• O código é válido por 10 minutos</p>
+<p>• Por segurança, não compartilhe este código</p>
+<p style="color: #9ca3af; font-size: 14px;">Se você não solicitou este código, ignore este email.</p>
+{% endblock %}""",
+    "boas_vindas.html": """{% extends "base.html" %}
+{% block titulo %}Bem-vindo ao Sistema Universal{% endblock %}
+{% block estilo %}
+.welcome-box { background: linear-gradient(135deg, #2563eb, #3b82f6); color: white; padding: 25px; border-radius: 8px; text-align: center; margin: 20px 0; }
+.features { background-color: #f8f9fa; padding: 20px; border-radius: 8px; margin: 20px 0; }
+.feature-item { margin: 10px 0; padding-left: 20px; }
+{% endblock %}
+{% block conteudo %}
+<div class="welcome-box">
+    <h1 style="margin: 0 0 10px 0;">Bem-vindo, {{ name }}!</h1>
+    <p style="margin: 0; opacity: 0.9;">Sua conta foi criada com sucesso</p>
+</div>
+<p>Olá <strong>{{ name }}</strong>,</p>
+<p>É um prazer tê-lo(a) conosco! Sua conta no Sistema Universal foi criada com sucesso e você já pode começar a aproveitar todos os recursos disponíveis.</p>
+<div class="features">
+    <h3 style="color: #1f2937; margin-top: 0;">O que você pode fazer agora:</h3>
+    <div class="feature-item">✓ Gerenciar eventos e listas de convidados</div>
+    <div class="feature-item">✓ Acompanhar vendas e check-ins em tempo real</div>
+    <div class="feature-item">✓ Visualizar relatórios detalhados</div>
+    <div class="feature-item">✓ Usar o sistema PDV integrado</div>
+    <div class="feature-item">✓ Gerenciar promoters e comissões</div>
+</div>
+<p>Se precisar de ajuda ou tiver alguma dúvida, nossa equipe de suporte está sempre disponível.</p>
+<p>Desejamos muito sucesso em seus eventos!</p>
+{% endblock %}""",
+    "lembrete_evento.html": """{% extends "base.html" %}
+{% block titulo %}Lembrete: {{ evento }}{% endblock %}
+{% block cabecalho %}<h1 style="color: #1f2937; margin: 10px 0;">{{ evento }}</h1>{% endblock %}
+{% block conteudo %}
+<p>Olá <strong>{{ name }}</strong>,</p>
+<p>Falta pouco! Confira os detalhes do evento:</p>
+<div class="box">
+    <p>📅 {{ data }}</p>
+    <p>📍 {{ local }}</p>
+</div>
+<p>Leve um documento com o CPF usado na compra para o check-in.</p>
+{% endblock %}""",
+    "ingresso.html": """{% extends "base.html" %}
+{% block titulo %}Seu ingresso: {{ evento }}{% endblock %}
+{% block cabecalho %}<h1 style="color: #1f2937; margin: 10px 0;">Seu ingresso</h1>{% endblock %}
+{% block conteudo %}
+<p>Olá <strong>{{ name }}</strong>,</p>
+<p>Seu ingresso para <strong>{{ evento }}</strong> ({{ data }}, {{ local }}) está confirmado.</p>
+<p style="text-align: center;">Apresente este código na entrada:</p>
+<div class="box"><div class="destaque">{{ codigo }}</div></div>
+{% endblock %}""",
+}
+
+_MODELOS_TEXTO = {
+    "verificacao.txt": """Olá, {{ name }}!
+
+Seu código de verificação é: {{ code }}
+
+Digite este código na tela de login para completar seu acesso.
+
+Este código é válido por 10 minutos.
+
+Se você não solicitou este código, ignore este email.
+
+---
+Sistema Universal - Gestão de Eventos""",
+    "boas_vindas.txt": """Bem-vindo ao Sistema Universal, {{ name }}!
+
+Sua conta foi criada com sucesso e você já pode começar a usar todos os recursos:
+
+• Gerenciar eventos e listas de convidados
+• Acompanhar vendas e check-ins em tempo real
+• Visualizar relatórios detalhados
+• Usar o sistema PDV integrado
+• Gerenciar promoters e comissões
+
+Se precisar de ajuda, nossa equipe está sempre disponível.
+
+Desejamos muito sucesso em seus eventos!
+
+---
+Sistema Universal - Gestão de Eventos""",
+    "lembrete_evento.txt": """Olá, {{ name }}!
+
+Falta pouco para {{ evento }}:
+
+Data: {{ data }}
+Local: {{ local }}
+
+Leve um documento com o CPF usado na compra para o check-in.
+
+---
+Sistema Universal - Gestão de Eventos""",
+    "ingresso.txt": """Olá, {{ name }}!
+
+Seu ingresso para {{ evento }} ({{ data }}, {{ local }}) está confirmado.
+
+Código do ingresso: {{ codigo }}
+
+---
+Sistema Universal - Gestão de Eventos""",
+}
+
+_html = Environment(loader=DictLoader(_MODELOS_HTML), autoescape=True)
+_texto = Environment(loader=DictLoader(_MODELOS_TEXTO), autoescape=False)
+
+class ModeloEmail:
+    def __init__(self, nome: str, assunto: str):
+        self.assunto = _texto.from_string(assunto)
+        self.html = _html.get_template(f"{nome}.html")
+        self.texto = _texto.get_template(f"{nome}.txt")
+
+    def renderizar(self, **contexto) -> Tuple[str, str, str]:
+        """(assunto, html, texto)"""
+        return self.assunto.render(**contexto), self.html.render(**contexto), self.texto.render(**contexto)
+
+VERIFICACAO = ModeloEmail("verificacao", "Código de Verificação: {{ code }}")
+BOAS_VINDAS = ModeloEmail("boas_vindas", "Bem-vindo ao Sistema Universal! 🎉")
+LEMBRETE_EVENTO = ModeloEmail("lembrete_evento", "Lembrete: {{ evento }} - {{ data }}")
+INGRESSO = ModeloEmail("ingresso", "Seu ingresso para {{ evento }}")
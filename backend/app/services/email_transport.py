@@ -0,0 +1,173 @@
+"""
+Transporte SMTP fora do event loop.
+
+Cada fila tem algumas threads, e cada thread é dona de uma conexão SMTP
+autenticada (EHLO, STARTTLS e login uma vez só) que atende muitas mensagens
+em sequência. A conexão é refeita depois de `mensagens_por_conexao` envios
+ou se o servidor a derrubar, e é fechada após `ocioso_segundos` sem uso.
+
+Emails transacionais (código de verificação, boas-vindas) e envios em massa
+(lembretes de evento, ingressos) têm filas e conexões separadas: uma
+campanha grande não atrasa o código de quem está tentando entrar.
+"""
+import asyncio
+import queue
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+from typing import List, Optional
+
+from ..database import settings
+from ..metrics import metricas
+import logging
+
+logger = logging.getLogger(__name__)
+
+class FilaSMTP:
+    def __init__(self, nome: str, host: str, porta: int, usuario: str = "", senha: str = "",
+                 use_tls: bool = True, conexoes: int = 2, fila_max: int = 10000,
+                 mensagens_por_conexao: int = 100, timeout_segundos: float = 30,
+                 ocioso_segundos: float = 30):
+        self.nome = nome
+        self.host = host
+        self.porta = porta
+        self.usuario = usuario
+        self.senha = senha
+        self.use_tls = use_tls
+        self.conexoes = conexoes
+        self.mensagens_por_conexao = mensagens_por_conexao
+        self.timeout_segundos = timeout_segundos
+        self.ocioso_segundos = ocioso_segundos
+        self._fila: "queue.Queue" = queue.Queue(maxsize=fila_max)
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        metricas.registrar_gauge(f"email.{nome}.fila", self._fila.qsize)
+
+    def _iniciar(self):
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self.conexoes:
+                thread = threading.Thread(
+                    target=self._executar, name=f"smtp-{self.nome}-{len(self._threads)}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    async def enviar(self, mensagem: EmailMessage):
+        """Enfileirar a mensagem e aguardar o envio (a exceção do SMTP propaga)"""
+        self._iniciar()
+        loop = asyncio.get_running_loop()
+        futuro = loop.create_future()
+        try:
+            self._fila.put_nowait((mensagem, loop, futuro, time.perf_counter()))
+        except queue.Full:
+            metricas.incrementar(f"email.{self.nome}.rejeitadas")
+            raise RuntimeError(f"Fila de email {self.nome} cheia")
+        await futuro
+
+    def _conectar(self) -> smtplib.SMTP:
+        inicio = time.perf_counter()
+        conexao = smtplib.SMTP(self.host, self.porta, timeout=self.timeout_segundos)
+        try:
+            if self.use_tls:
+                conexao.starttls()
+            if self.usuario:
+                conexao.login(self.usuario, self.senha)
+        except Exception:
+            conexao.close()
+            raise
+        metricas.incrementar(f"email.{self.nome}.conexoes")
+        metricas.observar(f"email.{self.nome}.conexao_ms", (time.perf_counter() - inicio) * 1000)
+        return conexao
+
+    def _executar(self):
+        conexao: Optional[smtplib.SMTP] = None
+        enviadas = 0
+        try:
+            while True:
+                try:
+                    item = self._fila.get(timeout=self.ocioso_segundos)
+                except queue.Empty:
+                    conexao = _fechar(conexao)
+                    continue
+                if item is None:
+                    break
+
+                mensagem, loop, futuro, enfileirado_em = item
+                metricas.observar(f"email.{self.nome}.espera_ms", (time.perf_counter() - enfileirado_em) * 1000)
+                inicio = time.perf_counter()
+                erro = None
+                for tentativa in (1, 2):
+                    try:
+                        if conexao is None or enviadas >= self.mensagens_por_conexao:
+                            conexao = _fechar(conexao)
+                            conexao = self._conectar()
+                            enviadas = 0
+                        conexao.send_message(mensagem)
+                        enviadas += 1
+                        erro = None
+                        break
+                    except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+                        # conexão derrubada pelo servidor (timeout, limite por sessão): reconecta uma vez
+                        conexao, erro = None, e
+                    except Exception as e:
+                        erro = e
+                        conexao = _descartar_transacao(conexao)
+                        break
+
+                metricas.observar(f"email.{self.nome}.envio_ms", (time.perf_counter() - inicio) * 1000)
+                metricas.incrementar(f"email.{self.nome}.{'falhas' if erro else 'enviadas'}")
+                loop.call_soon_threadsafe(_resolver, futuro, erro)
+        finally:
+            _fechar(conexao)
+
+    def encerrar(self, timeout: float = 5):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._fila.put(None)
+        for thread in threads:
+            thread.join(timeout)
+
+class TransporteSMTP:
+    def __init__(self, host: str, porta: int, usuario: str = "", senha: str = "", use_tls: bool = True,
+                 conexoes: int = None, conexoes_massa: int = None, **opcoes):
+        self.transacional = FilaSMTP(
+            "transacional", host, porta, usuario, senha, use_tls,
+            conexoes or settings.email_conexoes, **opcoes
+        )
+        self.massa = FilaSMTP(
+            "massa", host, porta, usuario, senha, use_tls,
+            conexoes_massa or settings.email_conexoes_massa, **opcoes
+        )
+
+    def encerrar(self):
+        self.transacional.encerrar()
+        self.massa.encerrar()
+
+def _fechar(conexao: Optional[smtplib.SMTP]) -> None:
+    if conexao is not None:
+        try:
+            conexao.quit()
+        except Exception:
+            conexao.close()
+    return None
+
+def _descartar_transacao(conexao: Optional[smtplib.SMTP]) -> Optional[smtplib.SMTP]:
+    """Depois de um erro (ex.: destinatário recusado), RSET para reaproveitar a conexão"""
+    if conexao is None:
+        return None
+    try:
+        conexao.rset()
+        return conexao
+    except Exception:
+        return _fechar(conexao)
+
+def _resolver(futuro: asyncio.Future, erro: Optional[BaseException]):
+    if futuro.cancelled():
+        return
+    if erro is not None:
+        futuro.set_exception(erro)
+    else:
+        futuro.set_result(None)
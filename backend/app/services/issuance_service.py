@@ -0,0 +1,106 @@
+import csv
+import io
+import secrets
+from typing import Dict, Iterator, List
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from ..pagination import marcar_alterado
+from ..models import Comanda, Evento, StatusComanda, TipoComanda
+import logging
+
+logger = logging.getLogger(__name__)
+
+class IssuanceService:
+    """
+    Pré-emissão de comandas cashless em lote.
+
+    Números, QR codes e códigos RFID são gerados em memória a partir de um
+    identificador de lote aleatório, sem consultas de unicidade por cartão; a
+    unicidade fica a cargo das constraints do banco. As linhas são inseridas em
+    blocos com INSERT multi-valores numa única transação.
+    """
+
+    TAMANHO_BLOCO = 1000
+    MAX_QUANTIDADE = 50000
+    MAX_TENTATIVAS = 3
+
+    def emitir_lote(
+        self,
+        db: Session,
+        evento: Evento,
+        quantidade: int,
+        tipo: TipoComanda = TipoComanda.RFID,
+        prefixo: str = "C",
+        gerar_rfid: bool = True
+    ) -> Dict:
+        """Emitir `quantidade` comandas para o evento. Retorna o lote e as linhas geradas."""
+        if quantidade < 1 or quantidade > self.MAX_QUANTIDADE:
+            raise ValueError(f"Quantidade deve estar entre 1 e {self.MAX_QUANTIDADE}")
+
+        for tentativa in range(1, self.MAX_TENTATIVAS + 1):
+            lote = secrets.token_hex(3).upper()
+            linhas = self._gerar_linhas(evento, quantidade, tipo, prefixo, lote, gerar_rfid)
+            try:
+                # INSERT em Core não passa pelo flush: os ids voltam no RETURNING e
+                # recebem versão no commit, sem travar o contador do evento durante o lote
+                inserir = insert(Comanda).returning(Comanda.id, sort_by_parameter_order=True)
+                for inicio in range(0, len(linhas), self.TAMANHO_BLOCO):
+                    for comanda_id in db.execute(inserir, linhas[inicio:inicio + self.TAMANHO_BLOCO]).scalars():
+                        marcar_alterado(db, Comanda, evento.id, comanda_id)
+                db.commit()
+                logger.info(f"Lote {lote}: {quantidade} comandas emitidas para o evento {evento.id}")
+                return {"lote": lote, "linhas": linhas}
+            except IntegrityError:
+                db.rollback()
+                logger.warning(f"Colisão de códigos no lote {lote} (tentativa {tentativa}), gerando novamente")
+
+        raise RuntimeError("Não foi possível gerar códigos únicos para o lote")
+
+    def _gerar_linhas(
+        self,
+        evento: Evento,
+        quantidade: int,
+        tipo: TipoComanda,
+        prefixo: str,
+        lote: str,
+        gerar_rfid: bool
+    ) -> List[Dict]:
+        largura = max(5, len(str(quantidade)))
+        return [
+            {
+                "numero_comanda": f"{prefixo}{lote}{sequencia:0{largura}d}",
+                "qr_code": secrets.token_hex(8).upper(),
+                "codigo_rfid": secrets.token_hex(7).upper() if gerar_rfid else None,
+                "tipo": tipo,
+                "saldo_atual": 0,
+                "saldo_bloqueado": 0,
+                "status": StatusComanda.ATIVA,
+                "evento_id": evento.id,
+                "empresa_id": evento.empresa_id,
+            }
+            for sequencia in range(1, quantidade + 1)
+        ]
+
+    def gerar_csv(self, linhas: List[Dict], linhas_por_bloco: int = 2000) -> Iterator[str]:
+        """CSV do mapeamento dos cartões para a gráfica, produzido em blocos."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["numero_comanda", "qr_code", "codigo_rfid", "tipo"])
+
+        for indice, linha in enumerate(linhas, start=1):
+            writer.writerow([
+                linha["numero_comanda"],
+                linha["qr_code"],
+                linha["codigo_rfid"] or "",
+                linha["tipo"].value
+            ])
+            if indice % linhas_por_bloco == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+
+        if buffer.tell():
+            yield buffer.getvalue()
+
+issuance_service = IssuanceService()
@@ -0,0 +1,140 @@
+from decimal import Decimal
+from typing import Optional
+from sqlalchemy import update, func
+from sqlalchemy.orm import Session
+from ..pagination import marcar_alterado
+from ..models import Comanda, MovimentoSaldoComanda, StatusComanda, TipoMovimentoSaldo
+import logging
+
+logger = logging.getLogger(__name__)
+
+CENTAVOS = Decimal('0.01')
+
+class ComandaNaoEncontradaError(Exception):
+    pass
+
+class ComandaInativaError(Exception):
+    pass
+
+class SaldoInsuficienteError(Exception):
+    def __init__(self, saldo_atual: Decimal, valor: Decimal):
+        self.saldo_atual = saldo_atual
+        self.valor = valor
+        super().__init__(f"Saldo insuficiente: disponível {saldo_atual}, solicitado {valor}")
+
+class LedgerService:
+    """
+    Razão de saldo das comandas cashless.
+
+    O saldo corrente continua materializado em `Comanda.saldo_atual`, mas só é
+    alterado por UPDATE condicional (`saldo_atual = saldo_atual ± valor`) no
+    banco, nunca lido e regravado em Python. Cada alteração gera uma linha em
+    `movimentos_saldo_comanda`, de modo que o extrato é auditável e a consulta
+    de saldo continua O(1) independente do número de movimentos.
+
+    Não há cache de saldo em memória: com vários workers, um cache local
+    serviria saldo antigo depois de um débito feito em outro processo. A
+    leitura por PK já é barata e sempre reflete o último commit.
+    """
+
+    def creditar(
+        self,
+        db: Session,
+        comanda_id: int,
+        valor: Decimal,
+        usuario_id: Optional[int] = None,
+        recarga_id: Optional[int] = None,
+        descricao: str = "Recarga"
+    ) -> Decimal:
+        """Creditar valor na comanda. Retorna o novo saldo (visível após o commit)."""
+        return self._movimentar(
+            db, comanda_id, Decimal(valor), TipoMovimentoSaldo.CREDITO,
+            usuario_id=usuario_id, recarga_id=recarga_id, descricao=descricao
+        )
+
+    def debitar(
+        self,
+        db: Session,
+        comanda_id: int,
+        valor: Decimal,
+        usuario_id: Optional[int] = None,
+        venda_id: Optional[int] = None,
+        descricao: str = "Venda PDV"
+    ) -> Decimal:
+        """Debitar valor da comanda; falha com SaldoInsuficienteError sem alterar nada."""
+        return self._movimentar(
+            db, comanda_id, Decimal(valor), TipoMovimentoSaldo.DEBITO,
+            usuario_id=usuario_id, venda_id=venda_id, descricao=descricao
+        )
+
+    def _movimentar(
+        self,
+        db: Session,
+        comanda_id: int,
+        valor: Decimal,
+        tipo: TipoMovimentoSaldo,
+        usuario_id: Optional[int] = None,
+        venda_id: Optional[int] = None,
+        recarga_id: Optional[int] = None,
+        descricao: Optional[str] = None
+    ) -> Decimal:
+        valor = valor.quantize(CENTAVOS)
+        if valor <= 0:
+            raise ValueError("Valor da movimentação deve ser positivo")
+
+        delta = valor if tipo == TipoMovimentoSaldo.CREDITO else -valor
+
+        stmt = update(Comanda).where(
+            Comanda.id == comanda_id,
+            Comanda.status == StatusComanda.ATIVA
+        )
+        if tipo == TipoMovimentoSaldo.DEBITO:
+            stmt = stmt.where(Comanda.saldo_atual >= valor)
+
+        stmt = stmt.values(
+            saldo_atual=Comanda.saldo_atual + delta,
+            atualizado_em=func.now()
+        ).returning(Comanda.saldo_atual, Comanda.evento_id).execution_options(synchronize_session="fetch")
+
+        alterada = db.execute(stmt).first()
+
+        if alterada is None:
+            self._levantar_motivo(db, comanda_id, valor)
+
+        # UPDATE em Core não passa pelo flush; avisa a sincronização dos terminais
+        marcar_alterado(db, Comanda, alterada.evento_id, comanda_id)
+        saldo_posterior = Decimal(alterada.saldo_atual).quantize(CENTAVOS)
+
+        db.add(MovimentoSaldoComanda(
+            comanda_id=comanda_id,
+            tipo=tipo,
+            valor=valor,
+            saldo_anterior=saldo_posterior - delta,
+            saldo_posterior=saldo_posterior,
+            descricao=descricao,
+            venda_id=venda_id,
+            recarga_id=recarga_id,
+            usuario_id=usuario_id
+        ))
+
+        return saldo_posterior
+
+    def _levantar_motivo(self, db: Session, comanda_id: int, valor: Decimal):
+        comanda = db.query(Comanda.status, Comanda.saldo_atual).filter(Comanda.id == comanda_id).first()
+        if comanda is None:
+            raise ComandaNaoEncontradaError(f"Comanda {comanda_id} não encontrada")
+        if comanda.status != StatusComanda.ATIVA:
+            raise ComandaInativaError(f"Comanda {comanda_id} não está ativa")
+        raise SaldoInsuficienteError(Decimal(comanda.saldo_atual or 0).quantize(CENTAVOS), valor)
+
+    def obter_saldo(self, db: Session, comanda_id: int) -> Decimal:
+        """Saldo corrente, lido por PK do banco (fonte autoritativa)."""
+        saldo = db.query(Comanda.saldo_atual).filter(Comanda.id == comanda_id).scalar()
+        if saldo is None:
+            if not db.query(Comanda.id).filter(Comanda.id == comanda_id).first():
+                raise ComandaNaoEncontradaError(f"Comanda {comanda_id} não encontrada")
+            saldo = Decimal('0.00')
+
+        return Decimal(saldo).quantize(CENTAVOS)
+
+ledger_service = LedgerService()
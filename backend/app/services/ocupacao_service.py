@@ -0,0 +1,253 @@
+"""
+Estado de check-in de cada evento, em memória.
+
+Por evento: um bit por transação (quem já entrou), o total de presentes, a
+capacidade, contadores por método e um anel com as entradas de cada minuto
+da última hora. Presentes, ocupação e ritmo de entrada são lidos sem
+consultar o banco (dashboards e WebSocket da portaria).
+
+O estado é montado do banco na inicialização (eventos ativos do dia) ou na
+primeira leitura de um evento, e atualizado a cada check-in: a portaria
+reserva a entrada (`reservar`, que também barra repetidas e evento lotado),
+grava e relê o evento (`carregar(..., atualizar=True)`) ou libera
+(`liberar`) se a gravação falhar. Tudo roda no event loop, sem await entre
+a verificação e a marcação.
+
+O estado é do processo e serve só de cache: quem garante as regras é o
+banco. A gravação do check-in ocupa a vaga com um UPDATE condicional em
+`eventos.presentes` (`ocupar_vaga`), na mesma transação, e o índice único
+(evento_id, transacao_id) de `checkins` garante uma entrada por ingresso.
+A cada `OCUPACAO_ATUALIZACAO_SEGUNDOS` o estado relê presentes e capacidade
+do evento e as entradas gravadas pelos outros processos.
+"""
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from ..database import AsyncSessionLocal, settings
+from ..metrics import metricas
+from ..models import Checkin, Evento, StatusEvento, Transacao
+import logging
+
+logger = logging.getLogger(__name__)
+
+REPETIDO = "repetido"
+LOTADO = "lotado"
+_MINUTOS = 60
+
+def _minuto(quando: datetime) -> int:
+    return int(quando.timestamp() // 60)
+
+def ocupar_vaga(db: Session, evento_id: int) -> Optional[int]:
+    """
+    Ocupar uma vaga do evento na transação do chamador, antes de gravar o
+    check-in. Retorna o novo total de presentes, ou None se o evento está
+    lotado (ou não existe). A linha do evento fica travada até o commit, então
+    processos diferentes não passam juntos da capacidade.
+    """
+    return db.execute(
+        update(Evento)
+        .where(
+            Evento.id == evento_id,
+            or_(func.coalesce(Evento.capacidade_maxima, 0) <= 0, Evento.presentes < Evento.capacidade_maxima)
+        )
+        .values(presentes=Evento.presentes + 1, atualizado_em=Evento.atualizado_em)
+        .returning(Evento.presentes)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
+
+class EstadoEvento:
+    def __init__(self, capacidade: Optional[int] = None, primeira_transacao: int = 0):
+        self.capacidade = capacidade
+        self.presentes = 0
+        self.ingressos = 0  # entradas com transação (marcadas no mapa)
+        self.por_metodo: Dict[str, int] = {}
+        # o mapa começa na primeira transação do evento, não no id 0 da tabela
+        self._base = primeira_transacao - primeira_transacao % 8
+        self._entradas = bytearray()
+        self._contagem_minuto = [0] * _MINUTOS
+        self._carimbo_minuto = [-1] * _MINUTOS
+        # releitura do banco: só os check-ins acima do maior já visto
+        self.ultimo_checkin_id = 0
+        self.atualizado_em = time.monotonic()
+
+    def marcado(self, transacao_id: int) -> bool:
+        posicao, bit = divmod(transacao_id - self._base, 8)
+        return 0 <= posicao < len(self._entradas) and bool(self._entradas[posicao] & (1 << bit))
+
+    def _marcar(self, transacao_id: int):
+        if transacao_id < self._base:
+            anteriores = (self._base - transacao_id + 7) // 8
+            self._entradas[0:0] = bytes(anteriores)
+            self._base -= anteriores * 8
+        posicao, bit = divmod(transacao_id - self._base, 8)
+        if posicao >= len(self._entradas):
+            self._entradas.extend(bytes(posicao + 1 - len(self._entradas)))
+        self._entradas[posicao] |= 1 << bit
+        self.ingressos += 1
+
+    def _desmarcar(self, transacao_id: int):
+        posicao, bit = divmod(transacao_id - self._base, 8)
+        self._entradas[posicao] &= ~(1 << bit)
+        self.ingressos -= 1
+
+    def _aplicar_entradas(self, entradas, agora: datetime):
+        """
+        Check-ins novos lidos do banco (de qualquer processo): marcar e contar
+        por método e minuto. Leituras concorrentes do mesmo evento trazem as
+        mesmas linhas; só as acima do maior id já aplicado contam.
+        """
+        for checkin_id, transacao_id, metodo, checkin_em in entradas:
+            if checkin_id <= self.ultimo_checkin_id:
+                continue
+            self.ultimo_checkin_id = checkin_id
+            # a reserva deste processo já marcou o ingresso
+            if transacao_id is not None and not self.marcado(transacao_id):
+                self._marcar(transacao_id)
+            self._contar(metodo, checkin_em or agora, agora)
+
+    @property
+    def lotado(self) -> bool:
+        return bool(self.capacidade) and self.presentes >= self.capacidade
+
+    def _contar(self, metodo: Optional[str], quando: datetime, agora: datetime):
+        metodo = metodo or "outro"
+        self.por_metodo[metodo] = self.por_metodo.get(metodo, 0) + 1
+        minuto = _minuto(quando)
+        if minuto <= _minuto(agora) - _MINUTOS:
+            return
+        slot = minuto % _MINUTOS
+        if self._carimbo_minuto[slot] != minuto:
+            self._carimbo_minuto[slot] = minuto
+            self._contagem_minuto[slot] = 0
+        self._contagem_minuto[slot] += 1
+
+    def entradas_por_minuto(self, minutos: int, agora: datetime) -> list:
+        """Entradas nos últimos `minutos` minutos, do mais antigo ao atual"""
+        atual = _minuto(agora)
+        return [
+            self._contagem_minuto[m % _MINUTOS] if self._carimbo_minuto[m % _MINUTOS] == m else 0
+            for m in range(atual - minutos + 1, atual + 1)
+        ]
+
+class OcupacaoService:
+    def __init__(self, intervalo_atualizacao: float = None):
+        self._estados: Dict[int, EstadoEvento] = {}
+        self.intervalo_atualizacao = (
+            settings.ocupacao_atualizacao_segundos if intervalo_atualizacao is None else intervalo_atualizacao
+        )
+        metricas.registrar_gauge("checkins.eventos_em_memoria", lambda: len(self._estados))
+        metricas.registrar_gauge(
+            "checkins.mapa_entradas.bytes", lambda: sum(len(e._entradas) for e in self._estados.values())
+        )
+
+    async def carregar(self, db: AsyncSession, evento_id: int, atualizar: bool = False) -> Optional[EstadoEvento]:
+        """
+        Estado do evento, montado do banco na primeira vez e relido quando
+        passa do intervalo de atualização (ou com `atualizar`, logo depois de
+        um check-in); None se o evento não existe.
+        """
+        estado = self._estados.get(evento_id)
+        if estado is not None and not atualizar and time.monotonic() - estado.atualizado_em < self.intervalo_atualizacao:
+            return estado
+
+        evento = (await db.execute(
+            select(Evento.id, Evento.capacidade_maxima, Evento.presentes).where(Evento.id == evento_id)
+        )).first()
+        if evento is None:
+            self._estados.pop(evento_id, None)
+            return None
+        if estado is None:
+            primeira_transacao = await db.scalar(
+                select(func.min(Transacao.id)).where(Transacao.evento_id == evento_id)
+            )
+            estado = EstadoEvento(evento.capacidade_maxima, primeira_transacao or 0)
+        entradas = (await db.execute(
+            select(Checkin.id, Checkin.transacao_id, Checkin.metodo_checkin, Checkin.checkin_em)
+            .where(Checkin.evento_id == evento_id, Checkin.id > estado.ultimo_checkin_id)
+            .order_by(Checkin.id)
+        )).all()
+
+        # outra requisição pode ter montado o estado enquanto esta consultava
+        estado = self._estados.setdefault(evento_id, estado)
+        estado._aplicar_entradas(entradas, datetime.now())
+        estado.capacidade = evento.capacidade_maxima
+        estado.presentes = evento.presentes
+        estado.atualizado_em = time.monotonic()
+        metricas.incrementar("checkins.estado_relido")
+        return estado
+
+    async def reconstruir(self, fabrica_sessao: Callable[[], AsyncSession] = AsyncSessionLocal,
+                          janela_horas: int = 24) -> int:
+        """Na inicialização: montar o estado dos eventos ativos que acontecem perto de agora"""
+        agora = datetime.now()
+        async with fabrica_sessao() as db:
+            eventos = (await db.execute(select(Evento.id).where(
+                Evento.status == StatusEvento.ATIVO,
+                Evento.data_evento.between(agora - timedelta(hours=janela_horas), agora + timedelta(hours=janela_horas))
+            ))).scalars().all()
+            for evento_id in eventos:
+                await self.carregar(db, evento_id)
+        logger.info(f"Estado de check-in carregado para {len(eventos)} eventos")
+        return len(eventos)
+
+    def reservar(self, evento_id: int, transacao_id: Optional[int]) -> Optional[str]:
+        """
+        Reservar a entrada antes de gravar (o estado já deve estar carregado).
+        Retorna None, REPETIDO ou LOTADO.
+        """
+        estado = self._estados[evento_id]
+        if transacao_id is not None and estado.marcado(transacao_id):
+            metricas.incrementar("checkins.repetidos")
+            return REPETIDO
+        if estado.lotado:
+            metricas.incrementar("checkins.lotado")
+            return LOTADO
+        if transacao_id is not None:
+            estado._marcar(transacao_id)
+        estado.presentes += 1
+        return None
+
+    def liberar(self, evento_id: int, transacao_id: Optional[int]):
+        """Desfazer a reserva quando a gravação não aconteceu; o estado é relido na próxima leitura"""
+        estado = self._estados.get(evento_id)
+        if estado is None:
+            return
+        if transacao_id is not None and estado.marcado(transacao_id):
+            estado._desmarcar(transacao_id)
+        estado.presentes -= 1
+        # ex.: o banco recusou por lotação que este processo ainda não via
+        estado.atualizado_em = float("-inf")
+
+    def atualizar_capacidade(self, evento_id: int, capacidade: Optional[int]):
+        estado = self._estados.get(evento_id)
+        if estado is not None:
+            estado.capacidade = capacidade
+
+    def resumo(self, evento_id: int, agora: Optional[datetime] = None) -> Dict[str, Any]:
+        """Presentes, capacidade e ritmo de entrada do evento (estado já carregado)"""
+        estado = self._estados[evento_id]
+        agora = agora or datetime.now()
+        ultimos = estado.entradas_por_minuto(_MINUTOS, agora)
+        return {
+            "evento_id": evento_id,
+            "presentes": estado.presentes,
+            "capacidade": estado.capacidade,
+            "ocupacao_percentual": round(estado.presentes / estado.capacidade * 100, 1) if estado.capacidade else None,
+            "lotado": estado.lotado,
+            "por_metodo": dict(estado.por_metodo),
+            "checkins_ultima_hora": sum(ultimos),
+            "checkins_ultimo_minuto": ultimos[-1],
+            "taxa_por_minuto": round(sum(ultimos[-5:]) / 5, 1),
+            "por_minuto": ultimos[-15:],
+        }
+
+    def limpar(self, evento_id: Optional[int] = None):
+        if evento_id is None:
+            self._estados.clear()
+        else:
+            self._estados.pop(evento_id, None)
+
+ocupacao_service = OcupacaoService()
@@ -0,0 +1,286 @@
+"""
+Outbox de envios externos (WhatsApp, email, n8n).
+
+Quem envia só grava uma linha em `mensagens_saida`, de preferência na mesma
+transação do que originou o envio, e responde na hora. Os workers deste
+módulo reivindicam as mensagens em lotes (`FOR UPDATE SKIP LOCKED` no
+PostgreSQL), entregam com concorrência limitada e, em caso de falha,
+reagendam com backoff exponencial até esgotar as tentativas: a mensagem
+fica então com status FALHOU (dead-letter) até ser reprocessada. Canais com
+entrega em lote (ex.: webhooks do n8n) recebem numa chamada só as mensagens
+do lote reivindicado que vão para o mesmo destino.
+
+Uma mensagem reivindicada por um worker que caiu volta para a fila quando
+vence o prazo dele (`OUTBOX_PRAZO_SEGUNDOS`).
+"""
+import asyncio
+import contextlib
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from ..database import AsyncSessionLocal, settings
+from ..metrics import metricas
+from ..models import MensagemSaida, StatusMensagemSaida
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Canal:
+    """
+    Destino de entrega da outbox. `limitador` é qualquer objeto com
+    `async adquirir()` (ex.: o token bucket do provedor de WhatsApp);
+    `concorrencia`, `tentativas` e `backoff_segundos` restringem o canal
+    dentro dos limites gerais da outbox (None = usar os da outbox).
+    """
+
+    def __init__(self, entregar: Callable[[str, Dict[str, Any]], Awaitable],
+                 limitador: Optional[Any] = None,
+                 entregar_lote: Optional[Callable[[str, List[Dict[str, Any]]], Awaitable]] = None,
+                 lote_max: int = 1, concorrencia: Optional[int] = None,
+                 tentativas: Optional[int] = None, backoff_segundos: Optional[float] = None):
+        self.entregar = entregar
+        self.limitador = limitador
+        self.entregar_lote = entregar_lote
+        self.lote_max = lote_max if entregar_lote else 1
+        self.concorrencia = concorrencia
+        self.tentativas = tentativas
+        self.backoff_segundos = backoff_segundos
+        self._semaforo: Optional[asyncio.Semaphore] = None
+
+    def semaforo(self) -> Optional[asyncio.Semaphore]:
+        if self.concorrencia and self._semaforo is None:
+            self._semaforo = asyncio.Semaphore(self.concorrencia)
+        return self._semaforo
+
+# preenchido pelos serviços de cada canal (whatsapp_service, email_service)
+canais: Dict[str, Canal] = {}
+
+def registrar_canal(nome: str, entregar: Callable[[str, Dict[str, Any]], Awaitable],
+                    limitador: Optional[Any] = None,
+                    entregar_lote: Optional[Callable[[str, List[Dict[str, Any]]], Awaitable]] = None,
+                    lote_max: int = 1, concorrencia: Optional[int] = None,
+                    tentativas: Optional[int] = None, backoff_segundos: Optional[float] = None):
+    canais[nome] = Canal(entregar, limitador, entregar_lote, lote_max, concorrencia, tentativas, backoff_segundos)
+
+def _linha(canal: str, destino: str, payload: Dict[str, Any], lote: Optional[str]) -> Dict[str, Any]:
+    return {
+        "canal": canal,
+        "destino": destino,
+        "payload": json.dumps(payload, ensure_ascii=False, default=str),
+        "lote": lote,
+    }
+
+class OutboxService:
+    def __init__(self, fabrica_sessao: Callable[[], AsyncSession] = AsyncSessionLocal,
+                 canais_entrega: Optional[Dict[str, Canal]] = None, workers: int = None,
+                 lote: int = None, concorrencia: int = None, tentativas: int = None,
+                 backoff_segundos: float = None, backoff_max_segundos: float = None,
+                 prazo_segundos: float = None, intervalo_segundos: float = None):
+        self.fabrica_sessao = fabrica_sessao
+        self.canais = canais if canais_entrega is None else canais_entrega
+        self.workers = workers or settings.outbox_workers
+        self.lote = lote or settings.outbox_lote
+        self.concorrencia = concorrencia or settings.outbox_concorrencia
+        self.tentativas = tentativas or settings.outbox_tentativas
+        self.backoff_segundos = settings.outbox_backoff_segundos if backoff_segundos is None else backoff_segundos
+        self.backoff_max_segundos = backoff_max_segundos or settings.outbox_backoff_max_segundos
+        self.prazo_segundos = prazo_segundos or settings.outbox_prazo_segundos
+        self.intervalo_segundos = settings.outbox_intervalo_ms / 1000 if intervalo_segundos is None else intervalo_segundos
+        self._semaforo: Optional[asyncio.Semaphore] = None
+        self._execucoes: List[asyncio.Task] = []
+
+    # Enfileiramento
+
+    def enfileirar(self, db, canal: str, destino: str, payload: Dict[str, Any], lote: Optional[str] = None):
+        """Grava a mensagem na sessão do chamador (síncrona ou assíncrona); sai com o commit dele"""
+        db.add(MensagemSaida(**_linha(canal, destino, payload, lote)))
+
+    def enfileirar_varios(self, db: Session, canal: str, envios: List[Tuple[str, Dict[str, Any]]],
+                          lote: Optional[str] = None):
+        if envios:
+            db.execute(insert(MensagemSaida), [_linha(canal, destino, payload, lote) for destino, payload in envios])
+
+    async def enfileirar_varios_async(self, db: AsyncSession, canal: str, envios: List[Tuple[str, Dict[str, Any]]],
+                                      lote: Optional[str] = None):
+        if envios:
+            await db.execute(insert(MensagemSaida), [_linha(canal, destino, payload, lote) for destino, payload in envios])
+
+    async def publicar(self, canal: str, destino: str, payload: Dict[str, Any]):
+        """Enfileirar fora de uma transação do chamador (abre e confirma a própria sessão)"""
+        async with self.fabrica_sessao() as db:
+            self.enfileirar(db, canal, destino, payload)
+            await db.commit()
+
+    # Entrega
+
+    def iniciar(self):
+        for _ in range(self.workers):
+            self._execucoes.append(asyncio.create_task(self._executar_worker()))
+        logger.info(f"Outbox iniciada: {self.workers} workers, canais {', '.join(self.canais) or 'nenhum'}")
+
+    async def encerrar(self):
+        # mensagens em entrega voltam para a fila quando vencer o prazo
+        for execucao in self._execucoes:
+            execucao.cancel()
+        await asyncio.gather(*self._execucoes, return_exceptions=True)
+        self._execucoes.clear()
+
+    async def _executar_worker(self):
+        while True:
+            try:
+                processadas = await self.processar_lote()
+            except Exception as e:
+                metricas.incrementar("outbox.erros")
+                logger.error(f"Erro no worker da outbox: {e}")
+                processadas = 0
+            if processadas < self.lote:
+                await asyncio.sleep(self.intervalo_segundos)
+
+    async def processar_lote(self) -> int:
+        """Reivindicar um lote, entregar e registrar os resultados; retorna o tamanho do lote"""
+        mensagens = await self._reivindicar()
+        if not mensagens:
+            return 0
+        if self._semaforo is None:
+            self._semaforo = asyncio.Semaphore(self.concorrencia)
+        grupos = self._agrupar(mensagens)
+        erros = await asyncio.gather(*[self._entregar(grupo) for grupo in grupos])
+        await self._registrar_resultados([
+            (mensagem, erro) for grupo, erro in zip(grupos, erros) for mensagem in grupo
+        ])
+        return len(mensagens)
+
+    async def processar_pendentes(self) -> int:
+        """Esvaziar o que já está disponível na fila (scripts e testes)"""
+        total = 0
+        while processadas := await self.processar_lote():
+            total += processadas
+        return total
+
+    async def _reivindicar(self) -> List[Any]:
+        agora = datetime.utcnow()
+        candidatas = (
+            select(MensagemSaida.id)
+            .where(
+                MensagemSaida.status.in_([StatusMensagemSaida.PENDENTE, StatusMensagemSaida.PROCESSANDO]),
+                MensagemSaida.disponivel_em <= agora
+            )
+            .order_by(MensagemSaida.id)
+            .limit(self.lote)
+            .with_for_update(skip_locked=True)
+        )
+        async with self.fabrica_sessao() as db:
+            mensagens = (await db.execute(
+                update(MensagemSaida)
+                .where(MensagemSaida.id.in_(candidatas))
+                .values(
+                    status=StatusMensagemSaida.PROCESSANDO,
+                    tentativas=MensagemSaida.tentativas + 1,
+                    disponivel_em=agora + timedelta(seconds=self.prazo_segundos)
+                )
+                .returning(MensagemSaida.id, MensagemSaida.canal, MensagemSaida.destino,
+                           MensagemSaida.payload, MensagemSaida.tentativas)
+                .execution_options(synchronize_session=False)
+            )).all()
+            await db.commit()
+        return mensagens
+
+    def _agrupar(self, mensagens: List[Any]) -> List[List[Any]]:
+        """Uma entrega por mensagem, ou por destino (até `lote_max`) nos canais com entrega em lote"""
+        grupos: List[List[Any]] = []
+        abertos: Dict[Tuple[str, str], List[Any]] = {}
+        for mensagem in mensagens:
+            canal = self.canais.get(mensagem.canal)
+            if canal is None or canal.lote_max <= 1:
+                grupos.append([mensagem])
+                continue
+            grupo = abertos.get((mensagem.canal, mensagem.destino))
+            if grupo is None or len(grupo) >= canal.lote_max:
+                grupo = abertos[(mensagem.canal, mensagem.destino)] = []
+                grupos.append(grupo)
+            grupo.append(mensagem)
+        return grupos
+
+    async def _entregar(self, grupo: List[Any]) -> Optional[str]:
+        """Entregar as mensagens de um grupo (mesmo canal e destino); retorna o erro, ou None se saíram"""
+        primeira = grupo[0]
+        canal = self.canais.get(primeira.canal)
+        if canal is None:
+            return f"Canal desconhecido: {primeira.canal}"
+        async with self._semaforo, canal.semaforo() or contextlib.nullcontext():
+            if canal.limitador:
+                await canal.limitador.adquirir()
+            inicio = time.perf_counter()
+            try:
+                if len(grupo) == 1:
+                    await canal.entregar(primeira.destino, json.loads(primeira.payload))
+                else:
+                    await canal.entregar_lote(primeira.destino, [json.loads(m.payload) for m in grupo])
+                return None
+            except Exception as e:
+                return str(e) or e.__class__.__name__
+            finally:
+                metricas.observar(f"outbox.{primeira.canal}.entrega_ms", (time.perf_counter() - inicio) * 1000)
+                metricas.observar(f"outbox.{primeira.canal}.mensagens_por_entrega", len(grupo))
+
+    async def _registrar_resultados(self, resultados: List[Tuple[Any, Optional[str]]]):
+        agora = datetime.utcnow()
+        atualizacoes = []
+        for mensagem, erro in resultados:
+            canal = self.canais.get(mensagem.canal) or Canal(None)
+            tentativas = canal.tentativas or self.tentativas
+            backoff_segundos = self.backoff_segundos if canal.backoff_segundos is None else canal.backoff_segundos
+            if erro is None:
+                atualizacoes.append({"id": mensagem.id, "status": StatusMensagemSaida.ENVIADA,
+                                     "enviado_em": agora, "ultimo_erro": None})
+                metricas.incrementar(f"outbox.{mensagem.canal}.enviadas")
+            elif mensagem.tentativas >= tentativas:
+                atualizacoes.append({"id": mensagem.id, "status": StatusMensagemSaida.FALHOU, "ultimo_erro": erro})
+                metricas.incrementar(f"outbox.{mensagem.canal}.falhas")
+                logger.error(
+                    f"Mensagem {mensagem.id} ({mensagem.canal} para {mensagem.destino}) "
+                    f"falhou após {mensagem.tentativas} tentativas: {erro}"
+                )
+            else:
+                espera = min(self.backoff_max_segundos, backoff_segundos * 2 ** (mensagem.tentativas - 1))
+                atualizacoes.append({
+                    "id": mensagem.id,
+                    "status": StatusMensagemSaida.PENDENTE,
+                    "disponivel_em": agora + timedelta(seconds=espera * random.uniform(0.5, 1.5)),
+                    "ultimo_erro": erro
+                })
+                metricas.incrementar(f"outbox.{mensagem.canal}.retentativas")
+
+        async with self.fabrica_sessao() as db:
+            await db.execute(update(MensagemSaida), atualizacoes)
+            await db.commit()
+
+    # Administração
+
+    def resumo(self, db: Session) -> Dict[str, Dict[str, int]]:
+        """Quantidade de mensagens por canal e status"""
+        resumo: Dict[str, Dict[str, int]] = {}
+        for canal, status, quantidade in db.query(
+            MensagemSaida.canal, MensagemSaida.status, func.count(MensagemSaida.id)
+        ).group_by(MensagemSaida.canal, MensagemSaida.status):
+            resumo.setdefault(canal, {})[status.value] = quantidade
+        return resumo
+
+    def reprocessar_falhas(self, db: Session, canal: Optional[str] = None) -> int:
+        """Devolver à fila as mensagens do dead-letter, com as tentativas zeradas"""
+        consulta = update(MensagemSaida).where(MensagemSaida.status == StatusMensagemSaida.FALHOU)
+        if canal:
+            consulta = consulta.where(MensagemSaida.canal == canal)
+        reprocessadas = db.execute(
+            consulta.values(status=StatusMensagemSaida.PENDENTE, tentativas=0, disponivel_em=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        return reprocessadas
+
+outbox_service = OutboxService()
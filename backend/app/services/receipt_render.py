@@ -0,0 +1,145 @@
+"""
+Renderização de comprovantes a partir de um snapshot (dict) da venda.
+
+Este módulo não importa banco, settings nem serviços: ele é carregado pelos
+processos do ProcessPoolExecutor do ReceiptService, então precisa ser leve e
+ter apenas funções de nível de módulo (serializáveis via pickle).
+"""
+import io
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+from reportlab.pdfgen import canvas
+from reportlab.lib.units import mm
+
+LARGURA_PDF = 80 * mm  # Largura papel térmico
+MARGEM = 5 * mm
+TITULO = "COMPROVANTE DE VENDA"
+RODAPE = "Obrigado pela preferência!"
+
+ESC = b"\x1b"
+GS = b"\x1d"
+ESCPOS_INICIALIZAR = ESC + b"@"
+ESCPOS_CENTRO = ESC + b"a\x01"
+ESCPOS_ESQUERDA = ESC + b"a\x00"
+ESCPOS_NEGRITO = ESC + b"E\x01"
+ESCPOS_NORMAL = ESC + b"E\x00"
+ESCPOS_CORTE = GS + b"V\x42\x00"
+ESCPOS_CODIFICACAO = "cp860"
+
+@lru_cache(maxsize=256)
+def _cabecalho_pdf(estabelecimento: str, evento: str) -> Tuple[Tuple[str, int, str], ...]:
+    """Linhas fixas do topo (texto, tamanho, fonte) — iguais para todas as vendas do evento."""
+    linhas = [(TITULO, 12, "Helvetica-Bold")]
+    if estabelecimento:
+        linhas.append((estabelecimento[:40], 8, "Helvetica-Bold"))
+    if evento:
+        linhas.append((evento[:40], 8, "Helvetica"))
+    return tuple(linhas)
+
+def _altura_pdf(dados: Dict[str, Any]) -> float:
+    return (75 + 8 * len(dados["itens"])) * mm
+
+def renderizar_pdf(dados: Dict[str, Any]) -> bytes:
+    """Comprovante em PDF para impressão térmica (80 mm)."""
+    altura = _altura_pdf(dados)
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer, pagesize=(LARGURA_PDF, altura))
+
+    y = altura - 12 * mm
+    for texto, tamanho, fonte in _cabecalho_pdf(dados.get("estabelecimento", ""), dados.get("evento", "")):
+        p.setFont(fonte, tamanho)
+        p.drawCentredString(LARGURA_PDF / 2, y, texto)
+        y -= (tamanho / 2 + 2) * mm
+
+    p.setFont("Helvetica", 8)
+    p.drawCentredString(LARGURA_PDF / 2, y, f"Venda: {dados['numero_venda']}")
+    y -= 5 * mm
+    p.drawCentredString(LARGURA_PDF / 2, y, f"Data: {dados['data']}")
+
+    y -= 8 * mm
+    p.line(MARGEM, y, LARGURA_PDF - MARGEM, y)
+
+    y -= 8 * mm
+    p.setFont("Helvetica-Bold", 8)
+    p.drawString(MARGEM, y, "ITEM")
+    p.drawRightString(LARGURA_PDF - MARGEM, y, "TOTAL")
+
+    y -= 5 * mm
+    p.setFont("Helvetica", 7)
+    for item in dados["itens"]:
+        p.drawString(MARGEM, y, item["nome"][:25])
+        y -= 3 * mm
+        p.drawString(8 * mm, y, f"{item['quantidade']} x R$ {item['preco_unitario']}")
+        p.drawRightString(LARGURA_PDF - MARGEM, y, f"R$ {item['preco_total']}")
+        y -= 5 * mm
+
+    y -= 3 * mm
+    p.line(MARGEM, y, LARGURA_PDF - MARGEM, y)
+
+    y -= 8 * mm
+    p.setFont("Helvetica-Bold", 10)
+    p.drawString(MARGEM, y, "TOTAL:")
+    p.drawRightString(LARGURA_PDF - MARGEM, y, f"R$ {dados['valor_final']}")
+
+    y -= 8 * mm
+    p.setFont("Helvetica", 8)
+    if dados.get("pagamento"):
+        p.drawString(MARGEM, y, f"Pagamento: {dados['pagamento']}")
+
+    y -= 15 * mm
+    p.setFont("Helvetica", 6)
+    p.drawCentredString(LARGURA_PDF / 2, y, RODAPE)
+
+    p.save()
+    return buffer.getvalue()
+
+@lru_cache(maxsize=256)
+def _cabecalho_escpos(estabelecimento: str, evento: str, colunas: int) -> bytes:
+    partes = [ESCPOS_INICIALIZAR, ESCPOS_CENTRO, ESCPOS_NEGRITO, f"{TITULO}\n".encode(ESCPOS_CODIFICACAO)]
+    if estabelecimento:
+        partes.append(f"{estabelecimento[:colunas]}\n".encode(ESCPOS_CODIFICACAO, errors="replace"))
+    partes.append(ESCPOS_NORMAL)
+    if evento:
+        partes.append(f"{evento[:colunas]}\n".encode(ESCPOS_CODIFICACAO, errors="replace"))
+    return b"".join(partes)
+
+@lru_cache(maxsize=8)
+def _rodape_escpos(colunas: int) -> bytes:
+    return b"".join([
+        ESCPOS_CENTRO,
+        f"{'-' * colunas}\n{RODAPE}\n\n\n\n".encode(ESCPOS_CODIFICACAO),
+        ESCPOS_CORTE
+    ])
+
+def _linha_dupla(esquerda: str, direita: str, colunas: int) -> str:
+    espaco = max(1, colunas - len(esquerda) - len(direita))
+    return f"{esquerda[:colunas - len(direita) - 1]}{' ' * espaco}{direita}\n"
+
+def renderizar_escpos(dados: Dict[str, Any], colunas: int = 48) -> bytes:
+    """Comprovante em texto ESC/POS para impressoras térmicas (48 colunas = 80 mm)."""
+    corpo: List[str] = [
+        f"Venda: {dados['numero_venda']}\n",
+        f"Data: {dados['data']}\n",
+        "-" * colunas + "\n",
+    ]
+    for item in dados["itens"]:
+        corpo.append(f"{item['nome'][:colunas]}\n")
+        corpo.append(_linha_dupla(
+            f"  {item['quantidade']} x R$ {item['preco_unitario']}",
+            f"R$ {item['preco_total']}",
+            colunas
+        ))
+    corpo.append("-" * colunas + "\n")
+
+    return b"".join([
+        _cabecalho_escpos(dados.get("estabelecimento", ""), dados.get("evento", ""), colunas),
+        ESCPOS_ESQUERDA,
+        "".join(corpo).encode(ESCPOS_CODIFICACAO, errors="replace"),
+        ESCPOS_NEGRITO,
+        _linha_dupla("TOTAL:", f"R$ {dados['valor_final']}", colunas).encode(ESCPOS_CODIFICACAO),
+        ESCPOS_NORMAL,
+        (f"Pagamento: {dados['pagamento']}\n" if dados.get("pagamento") else "").encode(
+            ESCPOS_CODIFICACAO, errors="replace"
+        ),
+        _rodape_escpos(colunas),
+    ])
@@ -1,94 +1,175 @@
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
 from reportlab.lib.units import mm
-import io
-from datetime import datetime
-from decimal import Decimal
-from sqlalchemy.orm import sessionmaker
-from ..database import engine
-from ..models import VendaPDV, ItemVendaPDV, Produto
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import selectinload
+from ..database import SessionLocal, settings
+from ..models import VendaPDV, ItemVendaPDV
 from .whatsapp_service import whatsapp_service
+from .receipt_render import renderizar_pdf, renderizar_escpos
+import logging
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+logger = logging.getLogger(__name__)
 
 class ReceiptService:
     def __init__(self):
         self.width = 80 * mm  # Largura papel térmico
         self.height = 200 * mm  # Altura variável
-    
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._filas: Dict[str, asyncio.Queue] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self.impressoras = self._carregar_impressoras(settings.impressoras_escpos)
+
+    def _carregar_impressoras(self, config: str) -> Dict[str, tuple]:
+        impressoras = {}
+        for entrada in filter(None, (e.strip() for e in config.split(","))):
+            nome, _, endereco = entrada.partition("=")
+            host, _, porta = endereco.partition(":")
+            impressoras[nome.strip()] = (host.strip(), int(porta or 9100))
+        return impressoras
+
+    def snapshot_venda(self, venda: VendaPDV) -> Dict[str, Any]:
+        """Dados da venda como dict simples, pronto para ir a outro processo"""
+        return {
+            "numero_venda": venda.numero_venda,
+            "data": venda.criado_em.strftime('%d/%m/%Y %H:%M') if venda.criado_em else "",
+            "estabelecimento": venda.empresa.nome if venda.empresa else "",
+            "evento": venda.evento.nome if venda.evento else "",
+            "itens": [
+                {
+                    "nome": item.produto.nome if item.produto else "Produto",
+                    "quantidade": item.quantidade,
+                    "preco_unitario": f"{item.preco_unitario:.2f}",
+                    "preco_total": f"{item.preco_total:.2f}",
+                }
+                for item in venda.itens
+            ],
+            "valor_final": f"{venda.valor_final:.2f}",
+            "pagamento": venda.pagamentos[0].tipo_pagamento.value.replace('_', ' ').title() if venda.pagamentos else "",
+        }
+
+    def _obter_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: os workers só importam receipt_render, sem herdar conexões/threads do servidor
+            self._executor = ProcessPoolExecutor(
+                max_workers=settings.receipt_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
     def gerar_comprovante_pdf(self, venda: VendaPDV) -> bytes:
-        """Gerar comprovante em PDF para impressão térmica"""
-        
-        buffer = io.BytesIO()
-        p = canvas.Canvas(buffer, pagesize=(self.width, self.height))
-        
-        y = self.height - 20 * mm
-        p.setFont("Helvetica-Bold", 12)
-        p.drawCentredText(self.width/2, y, "COMPROVANTE DE VENDA")
-        
-        y -= 10 * mm
-        p.setFont("Helvetica", 8)
-        p.drawCentredText(self.width/2, y, f"Venda: {venda.numero_venda}")
-        
-        y -= 5 * mm
-        p.drawCentredText(self.width/2, y, f"Data: {venda.criado_em.strftime('%d/%m/%Y %H:%M')}")
-        
-        y -= 8 * mm
-        p.line(5 * mm, y, self.width - 5 * mm, y)
-        
-        y -= 8 * mm
-        p.setFont("Helvetica-Bold", 8)
-        p.drawString(5 * mm, y, "ITEM")
-        p.drawRightString(self.width - 5 * mm, y, "TOTAL")
-        
-        y -= 5 * mm
-        p.setFont("Helvetica", 7)
-        
-        for item in venda.itens:
-            nome_produto = item.produto.nome[:25] if item.produto else "Produto"
-            p.drawString(5 * mm, y, nome_produto)
-            y -= 3 * mm
-            
-            linha_item = f"{item.quantidade} x R$ {item.preco_unitario:.2f}"
-            p.drawString(8 * mm, y, linha_item)
-            p.drawRightString(self.width - 5 * mm, y, f"R$ {item.preco_total:.2f}")
-            y -= 5 * mm
-        
-        y -= 3 * mm
-        p.line(5 * mm, y, self.width - 5 * mm, y)
-        
-        y -= 8 * mm
-        p.setFont("Helvetica-Bold", 10)
-        p.drawString(5 * mm, y, "TOTAL:")
-        p.drawRightString(self.width - 5 * mm, y, f"R$ {venda.valor_final:.2f}")
-        
-        y -= 8 * mm
-        p.setFont("Helvetica", 8)
-        if venda.pagamentos:
-            pagamento_texto = venda.pagamentos[0].tipo_pagamento.value.replace('_', ' ').title()
-            p.drawString(5 * mm, y, f"Pagamento: {pagamento_texto}")
-        
-        y -= 15 * mm
-        p.setFont("Helvetica", 6)
-        p.drawCentredText(self.width/2, y, "Obrigado pela preferência!")
-        
-        p.save()
-        buffer.seek(0)
-        return buffer.getvalue()
-    
+        """Gerar comprovante em PDF para impressão térmica (síncrono, no processo atual)"""
+        return renderizar_pdf(self.snapshot_venda(venda))
+
+    async def gerar_comprovante_pdf_async(self, venda: VendaPDV) -> bytes:
+        """Gerar comprovante em PDF no pool de processos, sem ocupar o event loop"""
+        dados = self.snapshot_venda(venda)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._obter_executor(), renderizar_pdf, dados)
+        except BrokenProcessPool:
+            # Um worker morreu: descarta o pool (recriado na próxima chamada) e renderiza aqui mesmo
+            logger.error("Pool de comprovantes interrompido; renderizando no processo principal")
+            self._executor = None
+            return renderizar_pdf(dados)
+
+    def gerar_comprovante_escpos(self, venda: VendaPDV, colunas: int = 48) -> bytes:
+        """Gerar comprovante em texto ESC/POS (leve, dispensa o pool de processos)"""
+        return renderizar_escpos(self.snapshot_venda(venda), colunas)
+
+    def _carregar_snapshot(self, venda_id: int) -> Optional[Dict[str, Any]]:
+        """Snapshot da venda pela sessão OLTP compartilhada (bloqueante: roda fora do event loop)"""
+        db = SessionLocal()
+        try:
+            venda = db.query(VendaPDV).options(
+                selectinload(VendaPDV.itens).selectinload(ItemVendaPDV.produto),
+                selectinload(VendaPDV.pagamentos)
+            ).filter(VendaPDV.id == venda_id).first()
+            return self.snapshot_venda(venda) if venda else None
+        finally:
+            db.close()
+
+    async def imprimir_venda(self, venda_id: int, impressora: Optional[str] = None):
+        """Carregar a venda e enfileirar o comprovante ESC/POS na impressora"""
+        dados = await asyncio.to_thread(self._carregar_snapshot, venda_id)
+        if dados is None:
+            logger.warning(f"Venda {venda_id} não encontrada para impressão")
+            return
+
+        await self.enfileirar_impressao(impressora or "padrao", renderizar_escpos(dados))
+
+    async def enfileirar_impressao(self, impressora: str, conteudo: bytes):
+        """Enfileirar comprovante; cada impressora tem uma fila e um worker que agrupa envios"""
+        fila = self._filas.get(impressora)
+        if fila is None:
+            fila = self._filas[impressora] = asyncio.Queue()
+            self._workers[impressora] = asyncio.create_task(self._worker_impressora(impressora, fila))
+        await fila.put(conteudo)
+
+    async def _worker_impressora(self, impressora: str, fila: asyncio.Queue):
+        janela = settings.impressao_janela_ms / 1000
+        while True:
+            lote: List[bytes] = [await fila.get()]
+            prazo = asyncio.get_running_loop().time() + janela
+            while len(lote) < settings.impressao_lote_max:
+                restante = prazo - asyncio.get_running_loop().time()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(await asyncio.wait_for(fila.get(), timeout=restante))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._enviar_impressora(impressora, b"".join(lote))
+            except Exception as e:
+                logger.error(f"Erro ao imprimir {len(lote)} comprovante(s) em {impressora}: {e}")
+            finally:
+                for _ in lote:
+                    fila.task_done()
+
+    async def _enviar_impressora(self, impressora: str, conteudo: bytes):
+        """Enviar bytes ESC/POS para a impressora de rede (RAW, porta 9100)"""
+        destino = self.impressoras.get(impressora)
+        if not destino:
+            logger.info(f"Impressora '{impressora}' não configurada; {len(conteudo)} bytes descartados")
+            return
+
+        host, porta = destino
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, porta), timeout=5)
+        try:
+            writer.write(conteudo)
+            await writer.drain()
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    async def encerrar(self):
+        """Finalizar workers de impressão e o pool de processos"""
+        for fila in self._filas.values():
+            await fila.join()
+        for task in self._workers.values():
+            task.cancel()
+        self._filas.clear()
+        self._workers.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
     async def enviar_comprovante_whatsapp(self, venda: VendaPDV, telefone: str):
         """Enviar comprovante via WhatsApp"""
-        
+
         if not telefone:
             return
-        
+
         itens_texto = "\n".join([
-            f"• {item.quantidade}x {item.produto.nome if item.produto else 'Produto'} - R$ {item.preco_total:.2f}" 
+            f"• {item.quantidade}x {item.produto.nome if item.produto else 'Produto'} - R$ {item.preco_total:.2f}"
             for item in venda.itens
         ])
-        
+
         pagamento_texto = venda.pagamentos[0].tipo_pagamento.value.replace('_', ' ').title() if venda.pagamentos else "N/A"
-        
+
         mensagem = f"""
 🧾 *COMPROVANTE DE VENDA*
 
@@ -103,7 +184,7 @@ Pagamento: {pagamento_texto}
 
 Obrigado pela preferência! 🎉
         """.strip()
-        
+
         try:
             await whatsapp_service._send_whatsapp_message(telefone, mensagem)
         except Exception as e:
@@ -0,0 +1,87 @@
+"""
+Ingressos assinados.
+
+O código do ingresso carrega evento, transação, tipo de lista e validade,
+assinados com HMAC-SHA256 (truncado em 80 bits): a portaria confere a
+assinatura em microssegundos, sem consultar o banco. O código usa só o
+alfabeto base32 (A-Z, 2-7), que cabe no modo alfanumérico do QR.
+
+Entradas repetidas são barradas pelo mapa de entradas do evento, em memória
+(ver ocupacao_service).
+
+Os códigos aleatórios antigos (TICKET-XXXXXXXX-<evento>) vão para
+`qr_code_legado` na migração (migrate_signed_tickets.py) e continuam aceitos
+pela consulta ao banco.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import struct
+from datetime import datetime, timedelta
+from typing import List, NamedTuple, Optional
+from ..database import settings
+from ..metrics import metricas
+from ..models import Evento, Lista, TipoLista, Transacao
+
+PREFIXO = "T1"
+_CAMPOS = struct.Struct(">IIBI")  # evento, transação, tipo de lista, validade (epoch em segundos)
+_TAMANHO_ASSINATURA = 10
+_TIPOS_LISTA = list(TipoLista)
+
+class TicketInvalido(ValueError):
+    pass
+
+class DadosTicket(NamedTuple):
+    evento_id: int
+    transacao_id: int
+    tipo_lista: TipoLista
+    expira_em: datetime
+
+class TicketService:
+    def __init__(self, segredo: Optional[str] = None, segredo_anterior: Optional[str] = None,
+                 validade_horas: Optional[int] = None):
+        segredo = segredo or settings.ticket_segredo or settings.secret_key
+        segredo_anterior = settings.ticket_segredo_anterior if segredo_anterior is None else segredo_anterior
+        # a primeira chave assina; as demais só verificam (troca de chave sem invalidar ingressos vendidos)
+        self._chaves: List[bytes] = [chave.encode() for chave in (segredo, segredo_anterior) if chave]
+        self.validade_horas = validade_horas or settings.ticket_validade_horas
+
+    def _assinatura(self, chave: bytes, dados: bytes) -> bytes:
+        return hmac.new(chave, dados, hashlib.sha256).digest()[:_TAMANHO_ASSINATURA]
+
+    def emitir(self, evento_id: int, transacao_id: int, tipo_lista: TipoLista, expira_em: datetime) -> str:
+        dados = _CAMPOS.pack(evento_id, transacao_id, _TIPOS_LISTA.index(tipo_lista), int(expira_em.timestamp()))
+        codigo = base64.b32encode(dados + self._assinatura(self._chaves[0], dados)).decode()
+        return PREFIXO + codigo.rstrip("=")
+
+    def emitir_para(self, transacao: Transacao, evento: Evento, lista: Lista) -> str:
+        """Código do ingresso de uma transação já gravada (precisa do id); vale até X horas após o início do evento"""
+        return self.emitir(evento.id, transacao.id, lista.tipo,
+                           evento.data_evento + timedelta(hours=self.validade_horas))
+
+    def assinado(self, codigo: str) -> bool:
+        return codigo.upper().startswith(PREFIXO)
+
+    def verificar(self, codigo: str, agora: Optional[datetime] = None) -> DadosTicket:
+        """Conferir assinatura e validade, sem banco; TicketInvalido se o código não serve"""
+        corpo = codigo.strip().upper()[len(PREFIXO):]
+        try:
+            bruto = base64.b32decode(corpo + "=" * (-len(corpo) % 8))
+        except (binascii.Error, ValueError):
+            raise TicketInvalido("QR Code inválido")
+        if len(bruto) != _CAMPOS.size + _TAMANHO_ASSINATURA:
+            raise TicketInvalido("QR Code inválido")
+
+        dados, assinatura = bruto[:_CAMPOS.size], bruto[_CAMPOS.size:]
+        if not any(hmac.compare_digest(assinatura, self._assinatura(chave, dados)) for chave in self._chaves):
+            metricas.incrementar("tickets.assinatura_invalida")
+            raise TicketInvalido("QR Code inválido")
+
+        evento_id, transacao_id, tipo, expira = _CAMPOS.unpack(dados)
+        expira_em = datetime.fromtimestamp(expira)
+        if (agora or datetime.now()) > expira_em:
+            raise TicketInvalido("Ingresso expirado")
+        return DadosTicket(evento_id, transacao_id, _TIPOS_LISTA[tipo], expira_em)
+
+ticket_service = TicketService()
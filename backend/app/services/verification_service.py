@@ -0,0 +1,139 @@
+import hashlib
+import hmac
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import delete, update
+from sqlalchemy.orm import Session
+from ..database import settings
+from ..metrics import metricas
+from ..models import CodigoVerificacao
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _hash_codigo(cpf: str, codigo: str) -> str:
+    return hashlib.sha256(f"{settings.secret_key}:{cpf}:{codigo}".encode()).hexdigest()
+
+class ArmazenamentoCodigos(ABC):
+    """
+    Códigos de verificação pendentes da segunda etapa do login.
+
+    Um código por CPF; expira após `ttl_segundos` e é invalidado após
+    `max_tentativas` erros. `validar` consome o código quando ele confere.
+    """
+
+    def __init__(self, ttl_segundos: int = 600, max_tentativas: int = 5):
+        self.ttl_segundos = ttl_segundos
+        self.max_tentativas = max_tentativas
+
+    @abstractmethod
+    def salvar(self, db: Session, cpf: str, codigo: str):
+        """Gravar (ou substituir) o código pendente do CPF."""
+
+    @abstractmethod
+    def validar(self, db: Session, cpf: str, codigo: str) -> bool:
+        """Conferir o código; consome-o quando confere e conta a tentativa quando não."""
+
+    def _registrar(self, valido: bool) -> bool:
+        metricas.incrementar("auth.codigos.validos" if valido else "auth.codigos.invalidos")
+        return valido
+
+class ArmazenamentoCodigosMemoria(ArmazenamentoCodigos):
+    """Backend em memória: serve para um único worker; limitado a `max_codigos` (LRU)"""
+
+    def __init__(self, ttl_segundos: int = 600, max_tentativas: int = 5, max_codigos: int = 10000):
+        super().__init__(ttl_segundos, max_tentativas)
+        self.max_codigos = max_codigos
+        self._codigos: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def salvar(self, db: Session, cpf: str, codigo: str):
+        expira_em = datetime.utcnow() + timedelta(seconds=self.ttl_segundos)
+        with self._lock:
+            self._codigos[cpf] = [_hash_codigo(cpf, codigo), 0, expira_em]
+            self._codigos.move_to_end(cpf)
+            while len(self._codigos) > self.max_codigos:
+                self._codigos.popitem(last=False)
+
+    def validar(self, db: Session, cpf: str, codigo: str) -> bool:
+        with self._lock:
+            item = self._codigos.get(cpf)
+            if item is None:
+                return self._registrar(False)
+            codigo_hash, tentativas, expira_em = item
+            if expira_em < datetime.utcnow() or tentativas >= self.max_tentativas:
+                del self._codigos[cpf]
+                return self._registrar(False)
+            if not hmac.compare_digest(codigo_hash, _hash_codigo(cpf, codigo)):
+                item[1] += 1
+                return self._registrar(False)
+            del self._codigos[cpf]
+            return self._registrar(True)
+
+    def __len__(self) -> int:
+        return len(self._codigos)
+
+class ArmazenamentoCodigosBanco(ArmazenamentoCodigos):
+    """
+    Backend na tabela `codigos_verificacao`: compartilhado entre todos os
+    workers. O tamanho fica limitado a um código por CPF, e os expirados são
+    removidos a cada novo código gerado.
+    """
+
+    def salvar(self, db: Session, cpf: str, codigo: str):
+        agora = datetime.utcnow()
+        db.execute(delete(CodigoVerificacao).where(
+            (CodigoVerificacao.cpf == cpf) | (CodigoVerificacao.expira_em < agora)
+        ))
+        db.add(CodigoVerificacao(
+            cpf=cpf,
+            codigo_hash=_hash_codigo(cpf, codigo),
+            tentativas=0,
+            expira_em=agora + timedelta(seconds=self.ttl_segundos)
+        ))
+        db.commit()
+
+    def validar(self, db: Session, cpf: str, codigo: str) -> bool:
+        # Conta a tentativa antes de comparar, num UPDATE condicional: dois
+        # workers validando o mesmo CPF não conseguem passar do limite.
+        codigo_hash = db.execute(
+            update(CodigoVerificacao)
+            .where(
+                CodigoVerificacao.cpf == cpf,
+                CodigoVerificacao.expira_em >= datetime.utcnow(),
+                CodigoVerificacao.tentativas < self.max_tentativas
+            )
+            .values(tentativas=CodigoVerificacao.tentativas + 1)
+            .returning(CodigoVerificacao.codigo_hash)
+        ).scalar_one_or_none()
+
+        if codigo_hash is None or not hmac.compare_digest(codigo_hash, _hash_codigo(cpf, codigo)):
+            db.commit()
+            return self._registrar(False)
+
+        removidos = db.execute(delete(CodigoVerificacao).where(
+            CodigoVerificacao.cpf == cpf,
+            CodigoVerificacao.codigo_hash == codigo_hash
+        )).rowcount
+        db.commit()
+        # rowcount 0: outro worker consumiu o mesmo código ao mesmo tempo
+        return self._registrar(removidos == 1)
+
+def criar_armazenamento_codigos(backend: str = None) -> ArmazenamentoCodigos:
+    backend = backend or settings.codigo_verificacao_backend
+    if backend == "memoria":
+        return ArmazenamentoCodigosMemoria(
+            settings.codigo_verificacao_ttl_segundos,
+            settings.codigo_verificacao_max_tentativas,
+            settings.codigo_verificacao_max_codigos
+        )
+    if backend != "banco":
+        logger.warning(f"CODIGO_VERIFICACAO_BACKEND '{backend}' desconhecido; usando 'banco'")
+    return ArmazenamentoCodigosBanco(
+        settings.codigo_verificacao_ttl_segundos,
+        settings.codigo_verificacao_max_tentativas
+    )
+
+codigos_verificacao = criar_armazenamento_codigos()
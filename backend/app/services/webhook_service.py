@@ -0,0 +1,245 @@
+"""
+Ingestão de webhooks de entrada (WhatsApp, n8n).
+
+O endpoint só valida o corpo, grava o payload bruto em `webhooks_recebidos`
+com uma chave de idempotência e responde 202: o provedor recebe a
+confirmação em milissegundos e não reenvia por timeout. Um reenvio que
+chegue mesmo assim cai na restrição única (origem, chave) e é confirmado
+sem gerar outra linha.
+
+Os workers deste módulo reivindicam os webhooks pendentes em lotes (como a
+outbox), chamam o processador registrado para a origem e, em caso de erro,
+reagendam com backoff exponencial até esgotar as tentativas. O processador
+é síncrono e roda via `executar_escrita`: no SQLite edge vai para o escritor
+único, nos demais bancos roda na sessão assíncrona (run_sync), sem travar o
+event loop com consultas e commits bloqueantes. O atraso entre
+o recebimento e o fim do processamento vai para as métricas
+(`webhooks.<origem>.atraso_ms`).
+"""
+import asyncio
+import hashlib
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from ..database import AsyncSessionLocal, executar_escrita, settings
+from ..metrics import metricas
+from ..models import StatusWebhookRecebido, WebhookRecebido
+import logging
+
+logger = logging.getLogger(__name__)
+
+Processador = Callable[[Session, Dict[str, Any], Optional[str]], Any]
+
+# preenchido pelos módulos de cada origem (whatsapp_service, routers/n8n)
+processadores: Dict[str, Processador] = {}
+
+def registrar_processador(origem: str, processar: Processador):
+    """
+    `processar(db, payload, ip_origem)`: função síncrona que grava e faz o
+    commit (envios externos vão para a outbox na mesma transação); deve ser
+    idempotente, pois pode rodar de novo após uma falha.
+    """
+    processadores[origem] = processar
+
+def chave_idempotencia(payload: Dict[str, Any], informada: Optional[str] = None) -> str:
+    """Id enviado pelo provedor, ou o hash do payload (reenvio idêntico = mesma chave)"""
+    if informada:
+        return str(informada)[:128]
+    conteudo = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(conteudo.encode()).hexdigest()
+
+class WebhookService:
+    def __init__(self, fabrica_sessao: Callable[[], AsyncSession] = AsyncSessionLocal,
+                 processadores_origem: Optional[Dict[str, Processador]] = None, workers: int = None,
+                 lote: int = None, tentativas: int = None, backoff_segundos: float = None,
+                 backoff_max_segundos: float = None, prazo_segundos: float = None,
+                 intervalo_segundos: float = None):
+        self.fabrica_sessao = fabrica_sessao
+        self.processadores = processadores if processadores_origem is None else processadores_origem
+        self.workers = workers or settings.webhooks_workers
+        self.lote = lote or settings.webhooks_lote
+        self.tentativas = tentativas or settings.webhooks_tentativas
+        self.backoff_segundos = settings.webhooks_backoff_segundos if backoff_segundos is None else backoff_segundos
+        self.backoff_max_segundos = backoff_max_segundos or settings.webhooks_backoff_max_segundos
+        self.prazo_segundos = prazo_segundos or settings.webhooks_prazo_segundos
+        self.intervalo_segundos = settings.webhooks_intervalo_ms / 1000 if intervalo_segundos is None else intervalo_segundos
+        self._execucoes: List[asyncio.Task] = []
+
+    # Recebimento
+
+    def receber(self, db: Session, origem: str, payload: Dict[str, Any], chave: str,
+                ip_origem: Optional[str] = None) -> Tuple[Optional[int], bool]:
+        """
+        Gravar o webhook e confirmar (roda via executar_escrita). Retorna
+        (id, duplicado); um reenvio da mesma chave não gera outra linha.
+        """
+        webhook = WebhookRecebido(
+            origem=origem,
+            chave=chave,
+            payload=json.dumps(payload, ensure_ascii=False, default=str),
+            ip_origem=ip_origem
+        )
+        db.add(webhook)
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            metricas.incrementar(f"webhooks.{origem}.duplicados")
+            existente = db.query(WebhookRecebido.id).filter(
+                WebhookRecebido.origem == origem, WebhookRecebido.chave == chave
+            ).scalar()
+            return existente, True
+        metricas.incrementar(f"webhooks.{origem}.recebidos")
+        return webhook.id, False
+
+    # Processamento
+
+    def iniciar(self):
+        for _ in range(self.workers):
+            self._execucoes.append(asyncio.create_task(self._executar_worker()))
+        logger.info(f"Webhooks: {self.workers} workers, origens {', '.join(self.processadores) or 'nenhuma'}")
+
+    async def encerrar(self):
+        # webhooks em processamento voltam para a fila quando vencer o prazo
+        for execucao in self._execucoes:
+            execucao.cancel()
+        await asyncio.gather(*self._execucoes, return_exceptions=True)
+        self._execucoes.clear()
+
+    async def _executar_worker(self):
+        while True:
+            try:
+                processados = await self.processar_lote()
+            except Exception as e:
+                metricas.incrementar("webhooks.erros")
+                logger.error(f"Erro no worker de webhooks: {e}")
+                processados = 0
+            if processados < self.lote:
+                await asyncio.sleep(self.intervalo_segundos)
+
+    async def processar_lote(self) -> int:
+        """Reivindicar um lote, processar na ordem de chegada e registrar os resultados"""
+        webhooks = await self._reivindicar()
+        if not webhooks:
+            return 0
+        resultados = [(webhook, await self._processar(webhook)) for webhook in webhooks]
+        await self._registrar_resultados(resultados)
+        return len(webhooks)
+
+    async def processar_pendentes(self) -> int:
+        """Esvaziar o que já está disponível na fila (scripts e testes)"""
+        total = 0
+        while processados := await self.processar_lote():
+            total += processados
+        return total
+
+    async def _reivindicar(self) -> List[Any]:
+        agora = datetime.utcnow()
+        candidatos = (
+            select(WebhookRecebido.id)
+            .where(
+                WebhookRecebido.status.in_([StatusWebhookRecebido.PENDENTE, StatusWebhookRecebido.PROCESSANDO]),
+                WebhookRecebido.disponivel_em <= agora
+            )
+            .order_by(WebhookRecebido.id)
+            .limit(self.lote)
+            .with_for_update(skip_locked=True)
+        )
+        async with self.fabrica_sessao() as db:
+            webhooks = (await db.execute(
+                update(WebhookRecebido)
+                .where(WebhookRecebido.id.in_(candidatos))
+                .values(
+                    status=StatusWebhookRecebido.PROCESSANDO,
+                    tentativas=WebhookRecebido.tentativas + 1,
+                    disponivel_em=agora + timedelta(seconds=self.prazo_segundos)
+                )
+                .returning(WebhookRecebido.id, WebhookRecebido.origem, WebhookRecebido.payload,
+                           WebhookRecebido.ip_origem, WebhookRecebido.tentativas, WebhookRecebido.recebido_em)
+                .execution_options(synchronize_session=False)
+            )).all()
+            await db.commit()
+        # RETURNING não garante ordem; a ordem de chegada importa (ex.: CONFIRMAR antes de CHECKIN)
+        return sorted(webhooks, key=lambda webhook: webhook.id)
+
+    async def _processar(self, webhook: Any) -> Optional[str]:
+        """Chamar o processador da origem; retorna o erro, ou None se deu certo"""
+        processar = self.processadores.get(webhook.origem)
+        if processar is None:
+            return f"Origem desconhecida: {webhook.origem}"
+        inicio = time.perf_counter()
+        try:
+            async with self.fabrica_sessao() as db:
+                await executar_escrita(db, processar, json.loads(webhook.payload), webhook.ip_origem)
+            return None
+        except Exception as e:
+            return str(e) or e.__class__.__name__
+        finally:
+            metricas.observar(f"webhooks.{webhook.origem}.processamento_ms", (time.perf_counter() - inicio) * 1000)
+
+    async def _registrar_resultados(self, resultados: List[Tuple[Any, Optional[str]]]):
+        agora = datetime.utcnow()
+        atualizacoes = []
+        for webhook, erro in resultados:
+            if erro is None:
+                atualizacoes.append({"id": webhook.id, "status": StatusWebhookRecebido.PROCESSADO,
+                                     "processado_em": agora, "ultimo_erro": None})
+                metricas.incrementar(f"webhooks.{webhook.origem}.processados")
+                metricas.observar(f"webhooks.{webhook.origem}.atraso_ms",
+                                  (agora - webhook.recebido_em).total_seconds() * 1000)
+            elif webhook.tentativas >= self.tentativas:
+                atualizacoes.append({"id": webhook.id, "status": StatusWebhookRecebido.FALHOU, "ultimo_erro": erro})
+                metricas.incrementar(f"webhooks.{webhook.origem}.falhas")
+                logger.error(f"Webhook {webhook.id} ({webhook.origem}) falhou após {webhook.tentativas} tentativas: {erro}")
+            else:
+                espera = min(self.backoff_max_segundos, self.backoff_segundos * 2 ** (webhook.tentativas - 1))
+                atualizacoes.append({
+                    "id": webhook.id,
+                    "status": StatusWebhookRecebido.PENDENTE,
+                    "disponivel_em": agora + timedelta(seconds=espera * random.uniform(0.5, 1.5)),
+                    "ultimo_erro": erro
+                })
+                metricas.incrementar(f"webhooks.{webhook.origem}.retentativas")
+
+        async with self.fabrica_sessao() as db:
+            await db.execute(update(WebhookRecebido), atualizacoes)
+            await db.commit()
+
+    # Administração
+
+    def resumo(self, db: Session) -> Dict[str, Dict[str, Any]]:
+        """Quantidade por origem e status, e a idade do pendente mais antigo (atraso da fila)"""
+        resumo: Dict[str, Dict[str, Any]] = {}
+        for origem, status, quantidade in db.query(
+            WebhookRecebido.origem, WebhookRecebido.status, func.count(WebhookRecebido.id)
+        ).group_by(WebhookRecebido.origem, WebhookRecebido.status):
+            resumo.setdefault(origem, {})[status.value] = quantidade
+
+        agora = datetime.utcnow()
+        for origem, mais_antigo in db.query(
+            WebhookRecebido.origem, func.min(WebhookRecebido.recebido_em)
+        ).filter(
+            WebhookRecebido.status.in_([StatusWebhookRecebido.PENDENTE, StatusWebhookRecebido.PROCESSANDO])
+        ).group_by(WebhookRecebido.origem):
+            resumo[origem]["atraso_segundos"] = round((agora - mais_antigo).total_seconds(), 3)
+        return resumo
+
+    def reprocessar_falhas(self, db: Session, origem: Optional[str] = None) -> int:
+        """Devolver à fila os webhooks que esgotaram as tentativas"""
+        consulta = update(WebhookRecebido).where(WebhookRecebido.status == StatusWebhookRecebido.FALHOU)
+        if origem:
+            consulta = consulta.where(WebhookRecebido.origem == origem)
+        reprocessados = db.execute(
+            consulta.values(status=StatusWebhookRecebido.PENDENTE, tentativas=0, disponivel_em=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        return reprocessados
+
+webhook_service = WebhookService()
@@ -7,10 +7,14 @@ import base64
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 from sqlalchemy.orm import Session
-from ..database import get_db
+from ..database import get_db, settings
 from ..models import Evento, Usuario, Transacao, Checkin, Lista
 from ..auth import validar_cpf_basico
-import aiohttp
+from ..http_client import cliente_http
+from .outbox_service import outbox_service, registrar_canal
+from .bulk_invite_service import LimitadorTaxa, bulk_invite_service
+from .webhook_service import registrar_processador
+from .ocupacao_service import ocupar_vaga
 import websockets
 
 logger = logging.getLogger(__name__)
@@ -51,7 +55,7 @@ class WhatsAppService:
         return f"data:image/png;base64,{img_str}"
     
     async def send_invite(self, phone: str, evento_id: int, lista_id: int, db: Session) -> Dict[str, Any]:
-        """Envia convite via WhatsApp"""
+        """Enfileira convite via WhatsApp (entregue pela outbox)"""
         try:
             evento = db.query(Evento).filter(Evento.id == evento_id).first()
             lista = db.query(Lista).filter(Lista.id == lista_id).first()
@@ -59,16 +63,15 @@ class WhatsAppService:
             if not evento or not lista:
                 return {"status": "error", "message": "Evento ou lista não encontrados"}
             
-            message = self._format_invite_message(evento, lista)
-            
-            result = await self._send_whatsapp_message(phone, message)
+            outbox_service.enfileirar(db, "whatsapp", phone, {"mensagem": self._format_invite_message(evento, lista)})
+            db.commit()
             
             return {
-                "status": "sent",
+                "status": "queued",
                 "phone": phone,
                 "evento": evento.nome,
                 "lista": lista.nome,
-                "message": "Convite enviado com sucesso"
+                "message": "Convite na fila de envio"
             }
             
         except Exception as e:
@@ -110,35 +113,39 @@ Limite de idade: {evento.limite_idade}+ anos
             "phone": phone
         }
     
-    async def process_incoming_message(self, phone: str, message: str, db: Session) -> Dict[str, Any]:
-        """Processa mensagens recebidas via WhatsApp"""
+    def _responder(self, db: Session, phone: str, message: str):
+        """Resposta a uma mensagem recebida: entra na outbox e sai com o commit do processamento"""
+        outbox_service.enfileirar(db, "whatsapp", phone, {"mensagem": message})
+    
+    def process_incoming_message(self, phone: str, message: str, db: Session) -> Dict[str, Any]:
+        """Processa mensagens recebidas via WhatsApp (síncrono: roda no escritor do banco)"""
         try:
             message = message.strip().upper()
             
             if message.startswith("CONFIRMAR"):
-                return await self._process_confirmation(phone, message, db)
+                return self._process_confirmation(phone, message, db)
             
             elif message.startswith("CHECKIN"):
-                return await self._process_checkin(phone, message, db)
+                return self._process_checkin(phone, message, db)
             
             else:
-                return await self._send_help_message(phone)
+                return self._send_help_message(db, phone)
                 
         except Exception as e:
             logger.error(f"Erro ao processar mensagem: {e}")
             return {"status": "error", "message": str(e)}
     
-    async def _process_confirmation(self, phone: str, message: str, db: Session) -> Dict[str, Any]:
+    def _process_confirmation(self, phone: str, message: str, db: Session) -> Dict[str, Any]:
         """Processa confirmação de presença"""
         try:
             parts = message.split()
             if len(parts) < 2:
-                return await self._send_error_message(phone, "Formato inválido. Use: CONFIRMAR [SEU CPF]")
+                return self._send_error_message(db, phone, "Formato inválido. Use: CONFIRMAR [SEU CPF]")
             
             cpf = parts[1].replace(".", "").replace("-", "")
             
             if not validar_cpf_basico(cpf):
-                return await self._send_error_message(phone, "CPF inválido. Verifique e tente novamente.")
+                return self._send_error_message(db, phone, "CPF inválido. Verifique e tente novamente.")
             
             cpf_formatado = f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}"
             
@@ -148,14 +155,12 @@ Limite de idade: {evento.limite_idade}+ anos
             ).all()
             
             if not transacoes:
-                return await self._send_error_message(phone, "Nenhum convite pendente encontrado para este CPF.")
+                return self._send_error_message(db, phone, "Nenhum convite pendente encontrado para este CPF.")
             
             for transacao in transacoes:
                 transacao.status = "confirmado"
                 transacao.telefone_comprador = phone
             
-            db.commit()
-            
             response_msg = f"""
 ✅ *PRESENÇA CONFIRMADA!*
 
@@ -168,13 +173,13 @@ Para fazer check-in no evento, responda:
 Exemplo: CHECKIN {cpf_formatado} {cpf[:3]}
             """.strip()
             
-            await self._send_whatsapp_message(phone, response_msg)
-            
-            await self.notify_n8n("confirmacao_presenca", {
+            self._responder(db, phone, response_msg)
+            self._enfileirar_n8n(db, "confirmacao_presenca", {
                 "cpf": cpf_formatado,
                 "phone": phone,
                 "eventos_confirmados": len(transacoes)
             })
+            db.commit()
             
             return {
                 "status": "confirmed",
@@ -186,24 +191,24 @@ Exemplo: CHECKIN {cpf_formatado} {cpf[:3]}
             logger.error(f"Erro ao processar confirmação: {e}")
             return {"status": "error", "message": str(e)}
     
-    async def _process_checkin(self, phone: str, message: str, db: Session) -> Dict[str, Any]:
+    def _process_checkin(self, phone: str, message: str, db: Session) -> Dict[str, Any]:
         """Processa check-in via WhatsApp"""
         try:
             parts = message.split()
             if len(parts) < 3:
-                return await self._send_error_message(phone, "Formato inválido. Use: CHECKIN [CPF] [3 DÍGITOS]")
+                return self._send_error_message(db, phone, "Formato inválido. Use: CHECKIN [CPF] [3 DÍGITOS]")
             
             cpf = parts[1].replace(".", "").replace("-", "")
             validacao = parts[2]
             
             if not validar_cpf_basico(cpf):
-                return await self._send_error_message(phone, "CPF inválido.")
+                return self._send_error_message(db, phone, "CPF inválido.")
             
             if len(validacao) != 3 or not validacao.isdigit():
-                return await self._send_error_message(phone, "Validação deve ter exatamente 3 dígitos.")
+                return self._send_error_message(db, phone, "Validação deve ter exatamente 3 dígitos.")
             
             if cpf[:3] != validacao:
-                return await self._send_error_message(phone, "Dígitos de validação incorretos.")
+                return self._send_error_message(db, phone, "Dígitos de validação incorretos.")
             
             cpf_formatado = f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}"
             
@@ -215,7 +220,7 @@ Exemplo: CHECKIN {cpf_formatado} {cpf[:3]}
             ).all()
             
             if not transacoes:
-                return await self._send_error_message(phone, "Nenhum evento confirmado para hoje.")
+                return self._send_error_message(db, phone, "Nenhum evento confirmado para hoje.")
             
             checkin_existente = db.query(Checkin).filter(
                 Checkin.cpf == cpf_formatado,
@@ -223,10 +228,13 @@ Exemplo: CHECKIN {cpf_formatado} {cpf[:3]}
             ).first()
             
             if checkin_existente:
-                return await self._send_error_message(phone, "Check-in já realizado para este evento.")
+                return self._send_error_message(db, phone, "Check-in já realizado para este evento.")
             
             checkins_realizados = []
             for transacao in transacoes:
+                if ocupar_vaga(db, transacao.evento_id) is None:
+                    db.rollback()
+                    return self._send_error_message(db, phone, "Evento lotado: capacidade máxima atingida.")
                 checkin = Checkin(
                     cpf=cpf_formatado,
                     nome=transacao.nome_comprador,
@@ -239,8 +247,6 @@ Exemplo: CHECKIN {cpf_formatado} {cpf[:3]}
                 db.add(checkin)
                 checkins_realizados.append(transacao.evento.nome)
             
-            db.commit()
-            
             response_msg = f"""
 ✅ *CHECK-IN REALIZADO!*
 
@@ -252,13 +258,13 @@ Horário: {datetime.now().strftime('%H:%M')}
 Bem-vindo(a) ao evento! 🎉
             """.strip()
             
-            await self._send_whatsapp_message(phone, response_msg)
-            
-            await self.notify_n8n("checkin_realizado", {
+            self._responder(db, phone, response_msg)
+            self._enfileirar_n8n(db, "checkin_realizado", {
                 "cpf": cpf_formatado,
                 "phone": phone,
                 "eventos": checkins_realizados
             })
+            db.commit()
             
             return {
                 "status": "checkin_success",
@@ -270,7 +276,7 @@ Bem-vindo(a) ao evento! 🎉
             logger.error(f"Erro ao processar check-in: {e}")
             return {"status": "error", "message": str(e)}
     
-    async def _send_help_message(self, phone: str) -> Dict[str, Any]:
+    def _send_help_message(self, db: Session, phone: str) -> Dict[str, Any]:
         """Envia mensagem de ajuda"""
         help_msg = """
 🤖 *SISTEMA DE EVENTOS*
@@ -290,33 +296,28 @@ CHECKIN 123.456.789-10 123
 Precisa de ajuda? Entre em contato com a organização.
         """.strip()
         
-        await self._send_whatsapp_message(phone, help_msg)
+        self._responder(db, phone, help_msg)
+        db.commit()
         return {"status": "help_sent"}
     
-    async def _send_error_message(self, phone: str, error: str) -> Dict[str, Any]:
+    def _send_error_message(self, db: Session, phone: str, error: str) -> Dict[str, Any]:
         """Envia mensagem de erro"""
         error_msg = f"❌ *ERRO*\n\n{error}\n\nDigite qualquer mensagem para ver os comandos disponíveis."
-        await self._send_whatsapp_message(phone, error_msg)
+        self._responder(db, phone, error_msg)
+        db.commit()
         return {"status": "error_sent", "message": error}
     
     async def send_bulk_invites(self, evento_id: int, lista_id: int, phones: List[str], db: Session) -> Dict[str, Any]:
-        """Envia convites em massa"""
+        """Enfileira convites em massa (entregues pela outbox, sob o limite de taxa do provedor)"""
         try:
-            results = []
-            for phone in phones:
-                result = await self.send_invite(phone, evento_id, lista_id, db)
-                results.append({"phone": phone, "result": result})
-                await asyncio.sleep(1)  # Delay entre envios
+            evento = db.query(Evento).filter(Evento.id == evento_id).first()
+            lista = db.query(Lista).filter(Lista.id == lista_id).first()
             
-            success_count = sum(1 for r in results if r["result"]["status"] == "sent")
+            if not evento or not lista:
+                return {"status": "error", "message": "Evento ou lista não encontrados"}
             
-            return {
-                "status": "completed",
-                "total": len(phones),
-                "success": success_count,
-                "failed": len(phones) - success_count,
-                "results": results
-            }
+            envio = bulk_invite_service.iniciar(db, bulk_invite_service.renderizar_convite(evento, lista), phones)
+            return {**envio.progresso(), "status": "queued"}
             
         except Exception as e:
             logger.error(f"Erro no envio em massa: {e}")
@@ -326,24 +327,49 @@ Precisa de ajuda? Entre em contato com a organização.
         """Configurar webhook N8N para automações"""
         self.n8n_webhook_url = webhook_url
         
-    async def notify_n8n(self, event_type: str, data: Dict[str, Any]):
-        """Notificar N8N sobre eventos do WhatsApp"""
-        if not self.n8n_webhook_url:
-            return
-            
-        payload = {
+    def _payload_n8n(self, event_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
             "source": "whatsapp",
             "event_type": event_type,
             "timestamp": datetime.now().isoformat(),
             "data": data
         }
+    
+    async def notify_n8n(self, event_type: str, data: Dict[str, Any]):
+        """Notificar N8N sobre eventos do WhatsApp (entregue pela outbox)"""
+        if not self.n8n_webhook_url:
+            return
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self.n8n_webhook_url, json=payload) as response:
-                    logger.info(f"N8N notificado: {event_type} - Status: {response.status}")
+            await outbox_service.publicar("n8n", self.n8n_webhook_url, self._payload_n8n(event_type, data))
         except Exception as e:
-            logger.error(f"Erro ao notificar N8N: {e}")
+            logger.error(f"Erro ao enfileirar notificação N8N: {e}")
+    
+    def _enfileirar_n8n(self, db: Session, event_type: str, data: Dict[str, Any]):
+        """Notificação N8N na transação do chamador (sai com o commit dele)"""
+        if self.n8n_webhook_url:
+            outbox_service.enfileirar(db, "n8n", self.n8n_webhook_url, self._payload_n8n(event_type, data))
+    
+    def _processar_webhook(self, db: Session, payload: Dict[str, Any], ip_origem: Optional[str]):
+        """Processa uma mensagem recebida pelo webhook (workers de webhooks, via executar_escrita)"""
+        self.process_incoming_message(payload["phone"], payload["message"], db)
+    
+    async def _entregar_whatsapp(self, phone: str, payload: Dict[str, Any]):
+        await self._send_whatsapp_message(phone, payload["mensagem"])
+    
+    async def _entregar_n8n(self, webhook_url: str, payload: Dict[str, Any]):
+        status = await cliente_http.post_json(webhook_url, payload, nome="n8n")
+        if status >= 400:
+            raise RuntimeError(f"N8N respondeu HTTP {status}")
+        logger.info(f"N8N notificado: {payload['event_type']} - Status: {status}")
+    
+    async def _entregar_n8n_lote(self, webhook_url: str, payloads: List[Dict[str, Any]]):
+        await self._entregar_n8n(webhook_url, {
+            "source": "whatsapp",
+            "event_type": "lote",
+            "timestamp": datetime.now().isoformat(),
+            "eventos": payloads
+        })
 
     async def get_session_status(self) -> Dict[str, Any]:
         """Retorna status da sessão WhatsApp"""
@@ -354,3 +380,22 @@ Precisa de ajuda? Entre em contato com a organização.
         }
 
 whatsapp_service = WhatsAppService()
+registrar_canal(
+    "whatsapp",
+    whatsapp_service._entregar_whatsapp,
+    # o bucket é por processo: cada um fica com a sua fração da cota do provedor
+    LimitadorTaxa(
+        settings.whatsapp_taxa_mensagens_segundo / settings.web_concurrency,
+        max(1, settings.whatsapp_rajada_mensagens / settings.web_concurrency)
+    ),
+    concorrencia=settings.whatsapp_envio_concorrencia,
+    tentativas=settings.whatsapp_envio_tentativas,
+    backoff_segundos=settings.whatsapp_envio_backoff_ms / 1000
+)
+registrar_canal(
+    "n8n",
+    whatsapp_service._entregar_n8n,
+    entregar_lote=whatsapp_service._entregar_n8n_lote,
+    lote_max=settings.n8n_webhook_lote_max
+)
+registrar_processador("whatsapp", whatsapp_service._processar_webhook)
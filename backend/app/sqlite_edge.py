@@ -0,0 +1,151 @@
+"""
+Perfil "edge" do SQLite, para casas pequenas que rodam sem PostgreSQL.
+
+- `aplicar_pragmas_edge`: WAL, synchronous=NORMAL, mmap, busy_timeout e cache
+  em cada conexão nova (hook de "connect" do engine);
+- `EscritorSQLite`: uma thread dona da única conexão de escrita; as rotas
+  async enfileiram funções de gravação nela em vez de disputar o lock do
+  arquivo entre várias conexões.
+"""
+import asyncio
+import queue
+import threading
+import time
+from typing import Any, Callable
+
+from fastapi import HTTPException, status
+from .metrics import metricas
+import logging
+
+logger = logging.getLogger(__name__)
+
+def aplicar_pragmas_edge(dbapi_conn, mmap_mb: int, busy_timeout_ms: int, cache_kb: int):
+    cursor = dbapi_conn.cursor()
+    try:
+        # WAL: leitores não bloqueiam o escritor; NORMAL é seguro em WAL
+        # (perde no máximo as últimas transações numa queda de energia)
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA mmap_size={mmap_mb * 1024 * 1024}")
+        cursor.execute(f"PRAGMA busy_timeout={busy_timeout_ms}")
+        cursor.execute(f"PRAGMA cache_size=-{cache_kb}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+class EscritorSQLite:
+    """
+    Serializa as gravações num único worker com uma sessão própria.
+
+    `await executar(funcao, *args)` roda `funcao(sessao, *args)` na thread do
+    escritor e devolve o resultado (ou a exceção). A função faz o commit; se
+    ela falhar, o escritor desfaz a transação antes da próxima.
+    """
+
+    def __init__(self, fabrica_sessao: Callable, nome: str = "sqlite", fila_max: int = 1000, lote_max: int = 64):
+        self.fabrica_sessao = fabrica_sessao
+        self.nome = nome
+        self.lote_max = lote_max
+        self._fila: "queue.Queue" = queue.Queue(maxsize=fila_max)
+        self._thread = None
+        self._lock = threading.Lock()
+        metricas.registrar_gauge(f"db.{nome}.escrita.fila", self._fila.qsize)
+
+    def _iniciar(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._executar_fila, name=f"escritor-{self.nome}", daemon=True)
+                self._thread.start()
+
+    async def executar(self, funcao: Callable, *args) -> Any:
+        self._iniciar()
+        loop = asyncio.get_running_loop()
+        futuro = loop.create_future()
+        try:
+            self._fila.put_nowait((funcao, args, loop, futuro, time.perf_counter()))
+        except queue.Full:
+            metricas.incrementar(f"db.{self.nome}.escrita.rejeitadas")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Servidor ocupado, tente novamente em instantes"
+            )
+        return await futuro
+
+    def _executar_fila(self):
+        db = self.fabrica_sessao()
+        pendentes, resolvidos = [], []
+        try:
+            encerrar = False
+            while not encerrar:
+                lote = [self._fila.get()]
+                # Esvazia o que já está na fila e devolve os resultados de uma
+                # vez: uma só troca de thread para acordar o event loop.
+                while len(lote) < self.lote_max:
+                    try:
+                        lote.append(self._fila.get_nowait())
+                    except queue.Empty:
+                        break
+
+                # O sinal de encerramento pode vir no meio do lote: o que veio
+                # junto com ele também é executado.
+                encerrar = None in lote
+                pendentes = [item for item in lote if item is not None]
+                resolvidos = []
+                while pendentes:
+                    funcao, args, loop, futuro, enfileirado_em = pendentes[0]
+                    metricas.observar(f"db.{self.nome}.escrita.espera_ms", (time.perf_counter() - enfileirado_em) * 1000)
+                    try:
+                        resultado, erro = funcao(db, *args), None
+                    except Exception as e:
+                        resultado, erro = None, e
+                        db.rollback()
+                    finally:
+                        # a sessão é reaproveitada: nada de estado entre uma gravação e outra
+                        db.expunge_all()
+                    resolvidos.append((loop, futuro, resultado, erro))
+                    pendentes.pop(0)
+
+                _entregar(resolvidos)
+                resolvidos = []
+        finally:
+            # Encerrado (ou a thread caiu): quem ainda espera recebe erro em vez de ficar pendurado
+            _entregar(resolvidos)
+            restantes = pendentes + self._esvaziar_fila()
+            _entregar([
+                (loop, futuro, None, HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Servidor encerrando, tente novamente em instantes"
+                ))
+                for _, _, loop, futuro, _ in restantes
+            ])
+            db.close()
+
+    def _esvaziar_fila(self) -> list:
+        itens = []
+        while True:
+            try:
+                item = self._fila.get_nowait()
+            except queue.Empty:
+                return itens
+            if item is not None:
+                itens.append(item)
+
+    def encerrar(self, timeout: float = 5):
+        if self._thread is not None and self._thread.is_alive():
+            self._fila.put(None)
+            self._thread.join(timeout)
+        self._thread = None
+
+def _entregar(resolvidos: list):
+    """Resolve os futuros no event loop de cada um, com uma chamada por loop"""
+    for loop in {loop for loop, *_ in resolvidos}:
+        loop.call_soon_threadsafe(_resolver, [r[1:] for r in resolvidos if r[0] is loop])
+
+def _resolver(resolvidos: list):
+    for futuro, resultado, erro in resolvidos:
+        if futuro.cancelled():
+            continue
+        if erro is not None:
+            futuro.set_exception(erro)
+        else:
+            futuro.set_result(resultado)
@@ -1,43 +1,417 @@
-from fastapi import WebSocket, WebSocketDisconnect
-from typing import List, Dict
+from fastapi import Depends, WebSocket, WebSocketDisconnect
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, List, NamedTuple, Optional, Set
+from collections import deque
 from datetime import datetime
+import itertools
 import json
 import asyncio
-from sqlalchemy.orm import sessionmaker
-from .database import engine
-from datetime import datetime
+import logging
+import secrets
+import time
+from sqlalchemy.ext.asyncio import AsyncSession
+from .database import settings, get_async_db
+from .metrics import metricas
+
+logger = logging.getLogger(__name__)
+
+# Tópico de cada tipo de mensagem; tipos fora da tabela vão para todas as conexões do evento
+TOPICOS_POR_TIPO = {
+    "new_sale": "vendas",
+    "stock_update": "estoque",
+    "cash_register_update": "caixa",
+    "checkin_update": "checkins",
+    "ocupacao_update": "checkins",
+    "dashboard_update": "dashboard",
+}
+TOPICOS = frozenset(TOPICOS_POR_TIPO.values())
+
+def _chave(message: dict) -> Optional[int]:
+    """Produto ou caixa a que a mensagem se refere (filtros de estoque e caixa)"""
+    if message.get("type") == "stock_update":
+        return message.get("produto_id")
+    if message.get("type") == "cash_register_update":
+        return (message.get("caixa") or {}).get("id")
+    return None
+
+def _ids(valor: Optional[str], nome: str) -> FrozenSet[int]:
+    try:
+        return frozenset(int(item) for item in valor.split(",") if item.strip()) if valor else frozenset()
+    except ValueError:
+        raise ValueError(f"Parâmetro '{nome}' deve ser uma lista de ids separados por vírgula")
+
+class Assinatura:
+    """Tópicos e filtros escolhidos pelo cliente na conexão; sem tópicos, recebe tudo"""
+
+    def __init__(self, topicos: Optional[Set[str]] = None, produtos: Optional[Set[int]] = None,
+                 caixas: Optional[Set[int]] = None):
+        self.topicos = frozenset(topicos) if topicos else TOPICOS
+        self.produtos = frozenset(produtos or ())
+        self.caixas = frozenset(caixas or ())
+
+    @classmethod
+    def de_parametros(cls, topicos: Optional[str] = None, produtos: Optional[str] = None,
+                      caixa: Optional[str] = None) -> "Assinatura":
+        """Ex.: ?topicos=estoque,vendas&produtos=3,7&caixa=2; ValueError se algo não é válido"""
+        escolhidos = {topico.strip() for topico in (topicos or "").split(",") if topico.strip()}
+        desconhecidos = escolhidos - TOPICOS
+        if desconhecidos:
+            raise ValueError(f"Tópicos desconhecidos: {', '.join(sorted(desconhecidos))}")
+        return cls(escolhidos, _ids(produtos, "produtos"), _ids(caixa, "caixa"))
+
+    def filtro(self, topico: str) -> FrozenSet[int]:
+        if topico == "estoque":
+            return self.produtos
+        if topico == "caixa":
+            return self.caixas
+        return frozenset()
+
+    def recebe(self, topico: Optional[str], chave: Optional[int]) -> bool:
+        if topico is None:
+            return True
+        if topico not in self.topicos:
+            return False
+        filtro = self.filtro(topico)
+        return not filtro or chave in filtro
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Partes do snapshot enviado na conexão, registradas pelos routers:
+# nome -> (tópico, async fn(db, evento_id, assinatura)); só vão as partes dos tópicos assinados
+snapshots: Dict[str, tuple] = {}
+
+def registrar_snapshot(nome: str, topico: str, fn: Callable[[AsyncSession, int, Assinatura], Awaitable[Any]]):
+    snapshots[nome] = (topico, fn)
+
+class MensagemFluxo(NamedTuple):
+    seq: int
+    topico: Optional[str]
+    chave: Optional[int]
+    texto: str
+
+class FluxoEvento:
+    """Sequência das mensagens de um evento e as mais recentes, para retomar conexões"""
+
+    def __init__(self, tamanho: int):
+        # identifica esta sequência: muda se o processo reinicia ou o fluxo é descartado e recriado
+        self.stream = secrets.token_hex(4)
+        self.seq = 0
+        self.recentes = deque(maxlen=tamanho)
+        self.atualizado_em = time.monotonic()
+
+    def publicar(self, message: dict) -> MensagemFluxo:
+        self.seq += 1
+        self.atualizado_em = time.monotonic()
+        message["seq"] = self.seq
+        mensagem = MensagemFluxo(self.seq, TOPICOS_POR_TIPO.get(message.get("type")), _chave(message),
+                                 json.dumps(message))
+        self.recentes.append(mensagem)
+        return mensagem
+
+    def desde(self, seq: int) -> Optional[List[MensagemFluxo]]:
+        """Mensagens depois de `seq`; None se alguma já saiu do buffer (ou `seq` não é deste fluxo)"""
+        if seq > self.seq or seq < 0:
+            return None
+        if seq == self.seq:
+            return []
+        primeira = self.recentes[0].seq if self.recentes else self.seq + 1
+        if seq + 1 < primeira:
+            return None
+        return list(itertools.islice(self.recentes, seq + 1 - primeira, None))
+
+class Conexao:
+    """
+    Um socket registrado: evento, assinatura, o último sinal de vida do
+    cliente e a fila de saída, esvaziada em ordem pela tarefa `escritor`
+    """
+    __slots__ = ("id", "websocket", "evento_id", "assinatura", "ultimo_contato", "fila", "escritor")
+
+    def __init__(self, websocket: WebSocket, evento_id: int, assinatura: Assinatura, tamanho_fila: int):
+        self.id = secrets.token_hex(8)
+        self.websocket = websocket
+        self.evento_id = evento_id
+        self.assinatura = assinatura
+        self.ultimo_contato = time.monotonic()
+        self.fila: asyncio.Queue = asyncio.Queue(tamanho_fila)
+        self.escritor: Optional[asyncio.Task] = None
+
+def _e_ping(texto: str) -> bool:
+    if texto.strip().lower() == "ping":
+        return True
+    try:
+        dados = json.loads(texto)
+    except ValueError:
+        return False
+    return isinstance(dados, dict) and dados.get("type") == "ping"
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, List[WebSocket]] = {}
+    """
+    Conexões dos dashboards por evento. Cada mensagem recebe um número de
+    sequência do evento (`seq`) e fica num buffer circular. Na conexão o
+    cliente recebe um snapshot do estado atual; ao reconectar com `last_seq`
+    (e o `stream` recebido), só as mensagens perdidas, ou um novo snapshot
+    se elas já saíram do buffer ou o fluxo é outro (servidor reiniciou).
+
+    O cliente escolhe tópicos (vendas, estoque, caixa, checkins, dashboard) e
+    filtros (produtos, caixa) na conexão. A difusão usa um índice por
+    evento -> tópico -> chave do filtro (None = sem filtro), então cada
+    mensagem só percorre quem vai recebê-la.
+
+    O registro é por id de conexão (entrada e saída em O(1)). O servidor manda
+    {"type": "ping"} a quem está calado há `ping_intervalo` segundos; quem não
+    der sinal de vida (qualquer mensagem, como {"type": "pong"}) em mais
+    `ping_prazo` segundos é desconectado. Fluxos de eventos sem conexões são
+    descartados depois de `retencao` segundos sem mensagens.
+
+    Cada conexão tem uma fila de saída de até `tamanho_fila` mensagens e uma
+    tarefa que a envia em ordem, cada envio com o mesmo `ping_prazo`. A
+    difusão só enfileira: não espera cliente lento, e a ordem de `seq` por
+    socket é a de publicação. Quem estoura a fila ou passa do prazo num envio
+    é desconectado.
+    """
+
+    def __init__(self, tamanho_buffer: Optional[int] = None, ping_intervalo: Optional[float] = None,
+                 ping_prazo: Optional[float] = None, retencao: Optional[float] = None,
+                 tamanho_fila: Optional[int] = None):
+        self.active_connections: Dict[int, Dict[str, Conexao]] = {}
+        self.assinantes: Dict[int, Dict[str, Dict[Optional[int], Set[Conexao]]]] = {}
+        self.fluxos: Dict[int, FluxoEvento] = {}
+        self.tamanho_buffer = tamanho_buffer or settings.ws_buffer_mensagens
+        self.ping_intervalo = ping_intervalo or settings.ws_ping_intervalo_segundos
+        self.ping_prazo = ping_prazo or settings.ws_ping_prazo_segundos
+        self.retencao = retencao or settings.ws_fluxo_retencao_segundos
+        self.tamanho_fila = tamanho_fila or settings.ws_fila_envio
+        self._execucao: Optional[asyncio.Task] = None
+        self._fechamentos: Set[asyncio.Task] = set()
+        metricas.registrar_gauge("websocket.conexoes", lambda: sum(len(c) for c in self.active_connections.values()))
+        metricas.registrar_gauge("websocket.fluxos", lambda: len(self.fluxos))
+    
+    def _fluxo(self, evento_id: int) -> FluxoEvento:
+        fluxo = self.fluxos.get(evento_id)
+        if fluxo is None:
+            fluxo = self.fluxos[evento_id] = FluxoEvento(self.tamanho_buffer)
+        return fluxo
+    
+    async def _enviar_snapshot(self, websocket: WebSocket, evento_id: int, db: Optional[AsyncSession],
+                               assinatura: Assinatura) -> int:
+        # a sequência é lida antes do estado: o que mudar durante a leitura é reenviado em seguida
+        # (as mensagens trazem o valor atual, então reaplicar é inofensivo)
+        fluxo = self._fluxo(evento_id)
+        seq = fluxo.seq
+        dados = {}
+        for nome, (topico, parte) in snapshots.items():
+            if topico not in assinatura.topicos:
+                continue
+            try:
+                dados[nome] = await parte(db, evento_id, assinatura)
+            except Exception as e:
+                logger.error(f"Erro no snapshot '{nome}' do evento {evento_id}: {e}")
+                dados[nome] = None
+        await websocket.send_text(json.dumps({
+            "type": "snapshot",
+            "stream": fluxo.stream,
+            "seq": seq,
+            "data": dados,
+            "timestamp": datetime.now().isoformat()
+        }, default=str))
+        metricas.incrementar("websocket.snapshots")
+        return seq
     
-    async def connect(self, websocket: WebSocket, evento_id: int):
+    async def connect(self, websocket: WebSocket, evento_id: int, db: Optional[AsyncSession] = None,
+                      last_seq: Optional[int] = None, stream: Optional[str] = None,
+                      assinatura: Optional[Assinatura] = None) -> Conexao:
+        assinatura = assinatura or Assinatura()
         await websocket.accept()
-        if evento_id not in self.active_connections:
-            self.active_connections[evento_id] = []
-        self.active_connections[evento_id].append(websocket)
+        fluxo = self._fluxo(evento_id)
+        
+        if last_seq is not None and stream in (None, fluxo.stream) and fluxo.desde(last_seq) is not None:
+            await websocket.send_text(json.dumps({"type": "resume", "stream": fluxo.stream, "seq": last_seq}))
+            metricas.incrementar("websocket.retomadas")
+            enviado = last_seq
+        else:
+            enviado = await self._enviar_snapshot(websocket, evento_id, db, assinatura)
+        
+        # alcançar o fluxo antes de entrar na difusão; entre a última verificação e a entrada não há await
+        while True:
+            pendentes = fluxo.desde(enviado)
+            if pendentes is None:
+                enviado = await self._enviar_snapshot(websocket, evento_id, db, assinatura)
+                continue
+            if not pendentes:
+                break
+            for mensagem in pendentes:
+                if assinatura.recebe(mensagem.topico, mensagem.chave):
+                    await websocket.send_text(mensagem.texto)
+            enviado = pendentes[-1].seq
+        
+        conexao = Conexao(websocket, evento_id, assinatura, self.tamanho_fila)
+        conexao.escritor = asyncio.create_task(self._escrever(conexao))
+        self.active_connections.setdefault(evento_id, {})[conexao.id] = conexao
+        topicos = self.assinantes.setdefault(evento_id, {})
+        for topico in assinatura.topicos:
+            por_chave = topicos.setdefault(topico, {})
+            for chave in assinatura.filtro(topico) or (None,):
+                por_chave.setdefault(chave, set()).add(conexao)
+        return conexao
     
-    def disconnect(self, websocket: WebSocket, evento_id: int):
-        if evento_id in self.active_connections:
-            if websocket in self.active_connections[evento_id]:
-                self.active_connections[evento_id].remove(websocket)
+    def disconnect(self, conexao: Conexao):
+        if conexao.escritor is not None and conexao.escritor is not asyncio.current_task():
+            conexao.escritor.cancel()
+        conexoes = self.active_connections.get(conexao.evento_id)
+        if conexoes is None or conexoes.pop(conexao.id, None) is None:
+            return
+        if not conexoes:
+            del self.active_connections[conexao.evento_id]
+        topicos = self.assinantes.get(conexao.evento_id, {})
+        for topico in conexao.assinatura.topicos:
+            por_chave = topicos.get(topico, {})
+            for chave in conexao.assinatura.filtro(topico) or (None,):
+                assinantes = por_chave.get(chave)
+                if assinantes is not None:
+                    assinantes.discard(conexao)
+                    if not assinantes:
+                        del por_chave[chave]
+    
+    def _destinos(self, evento_id: int, mensagem: MensagemFluxo) -> list:
+        if mensagem.topico is None:
+            return list(self.active_connections.get(evento_id, {}).values())
+        por_chave = self.assinantes.get(evento_id, {}).get(mensagem.topico)
+        if not por_chave:
+            return []
+        destinos = list(por_chave.get(None, ()))
+        if mensagem.chave is not None:
+            destinos.extend(por_chave.get(mensagem.chave, ()))
+        return destinos
     
     async def broadcast_to_event(self, evento_id: int, message: dict):
-        if evento_id in self.active_connections:
-            disconnected = []
-            for connection in self.active_connections[evento_id]:
-                try:
-                    await connection.send_text(json.dumps(message))
-                except:
-                    disconnected.append(connection)
-            
-            for conn in disconnected:
-                self.active_connections[evento_id].remove(conn)
+        mensagem = self._fluxo(evento_id).publicar(message)
+        destinos = self._destinos(evento_id, mensagem)
+        lentas = [conexao for conexao in destinos if not self._enfileirar(conexao, mensagem.texto)]
+        metricas.incrementar("websocket.mensagens_enviadas", len(destinos) - len(lentas))
+        
+        if lentas:
+            metricas.incrementar("websocket.filas_estouradas", len(lentas))
+            # quem publica (venda, check-in) não espera o fechamento de cliente lento
+            fechamento = asyncio.create_task(self._derrubar(lentas))
+            self._fechamentos.add(fechamento)
+            fechamento.add_done_callback(self._fechamentos.discard)
+    
+    def _enfileirar(self, conexao: Conexao, texto: str) -> bool:
+        """False se a fila da conexão está cheia (cliente não acompanha)"""
+        try:
+            conexao.fila.put_nowait(texto)
+            return True
+        except asyncio.QueueFull:
+            return False
+    
+    async def _escrever(self, conexao: Conexao):
+        """Enviar a fila da conexão em ordem; envio que falha ou passa do prazo derruba a conexão"""
+        while True:
+            texto = await conexao.fila.get()
+            try:
+                await asyncio.wait_for(conexao.websocket.send_text(texto), self.ping_prazo)
+            except Exception:
+                metricas.incrementar("websocket.envios_falhos")
+                await self._derrubar([conexao])
+                return
+    
+    async def _derrubar(self, conexoes: List[Conexao]):
+        """Tirar da difusão e fechar, sem esperar mais que o prazo por socket travado"""
+        for conexao in conexoes:
+            self.disconnect(conexao)
+        await asyncio.gather(*[
+            asyncio.wait_for(conexao.websocket.close(code=1001), self.ping_prazo) for conexao in conexoes
+        ], return_exceptions=True)
+    
+    async def atender(self, conexao: Conexao):
+        """Ler o socket até o cliente sair: toda mensagem conta como sinal de vida; ping recebe pong"""
+        try:
+            while True:
+                texto = await conexao.websocket.receive_text()
+                conexao.ultimo_contato = time.monotonic()
+                if _e_ping(texto):
+                    # pela fila, para não disputar o socket com o escritor
+                    self._enfileirar(conexao, json.dumps({"type": "pong", "timestamp": datetime.now().isoformat()}))
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        finally:
+            self.disconnect(conexao)
+    
+    async def verificar_conexoes(self, agora: Optional[float] = None) -> int:
+        """
+        Pingar as conexões caladas e derrubar as que passaram do prazo; retorna
+        quantas caíram. O ping vai pela fila da conexão (o escritor aplica o
+        prazo de envio), então a varredura não espera nenhum socket.
+        """
+        agora = time.monotonic() if agora is None else agora
+        mensagem_ping = json.dumps({"type": "ping"})
+        ociosas = []
+        for conexoes in list(self.active_connections.values()):
+            for conexao in list(conexoes.values()):
+                silencio = agora - conexao.ultimo_contato
+                if silencio >= self.ping_intervalo + self.ping_prazo:
+                    ociosas.append(conexao)
+                elif silencio >= self.ping_intervalo and not self._enfileirar(conexao, mensagem_ping):
+                    ociosas.append(conexao)
+        
+        if ociosas:
+            await self._derrubar(ociosas)
+            metricas.incrementar("websocket.derrubadas", len(ociosas))
+        
+        for evento_id in [e for e, f in self.fluxos.items() if e not in self.active_connections
+                          and agora - f.atualizado_em >= self.retencao]:
+            del self.fluxos[evento_id]
+        return len(ociosas)
+    
+    def contagem(self) -> Dict[str, Any]:
+        por_evento = {evento_id: len(conexoes) for evento_id, conexoes in self.active_connections.items()}
+        return {"total": sum(por_evento.values()), "por_evento": por_evento, "fluxos": len(self.fluxos)}
+    
+    def iniciar(self):
+        self._execucao = asyncio.create_task(self._executar())
+        logger.info(f"Heartbeat WebSocket iniciado: ping a cada {self.ping_intervalo}s, prazo {self.ping_prazo}s")
+    
+    async def encerrar(self):
+        if self._execucao is not None:
+            self._execucao.cancel()
+            await asyncio.gather(self._execucao, return_exceptions=True)
+            self._execucao = None
+    
+    async def _executar(self):
+        while True:
+            await asyncio.sleep(min(self.ping_intervalo, self.ping_prazo))
+            try:
+                await self.verificar_conexoes()
+            except Exception as e:
+                logger.error(f"Erro no heartbeat WebSocket: {e}")
 
 manager = ConnectionManager()
 
+async def websocket_evento(
+    websocket: WebSocket,
+    evento_id: int,
+    last_seq: Optional[int] = None,
+    stream: Optional[str] = None,
+    topicos: Optional[str] = None,
+    produtos: Optional[str] = None,
+    caixa: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    WebSocket de um evento (PDV, portaria, dashboards): snapshot ou retomada
+    na conexão, depois as mensagens dos tópicos assinados.
+    Parâmetros inválidos recusam a conexão com o código 1008.
+    """
+    try:
+        assinatura = Assinatura.de_parametros(topicos, produtos, caixa)
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    conexao = await manager.connect(websocket, evento_id, db, last_seq, stream, assinatura)
+    try:
+        await db.close()  # a sessão só serve ao snapshot; não segura conexão enquanto o socket fica aberto
+        await manager.atender(conexao)
+    finally:
+        # também quando a tarefa é cancelada (ex.: servidor encerrando)
+        manager.disconnect(conexao)
+
 async def notify_stock_update(produto_id: int, evento_id: int, estoque_atual: int, produto_nome: str):
     await manager.broadcast_to_event(evento_id, {
         "type": "stock_update",
@@ -74,3 +448,10 @@ async def notify_dashboard_update(evento_id: int, dashboard_data: dict):
         "data": dashboard_data,
         "timestamp": datetime.now().isoformat()
     })
+
+async def notify_ocupacao_update(evento_id: int, ocupacao_data: dict):
+    await manager.broadcast_to_event(evento_id, {
+        "type": "ocupacao_update",
+        "data": ocupacao_data,
+        "timestamp": datetime.now().isoformat()
+    })
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark da camada assíncrona de banco.
+
+Compara a mesma consulta leve (saldo de comanda por id) feita com Session
+síncrona dentro de uma rota `async def` (como era antes) e com AsyncSession,
+enquanto uma consulta lenta de relatório roda em paralelo no mesmo processo.
+Mede consultas/s e a latência p50/p99 da consulta leve.
+
+Uso: python benchmark_async_db.py [concorrencia] [duracao_s]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.database import criar_async_sessionmaker
+
+CONSULTA_LEVE = text("SELECT saldo_atual FROM comandas WHERE id = :id")
+# CTE recursiva que conta até alguns milhões: simula um relatório pesado
+CONSULTA_LENTA = text(
+    "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < 3000000) "
+    "SELECT count(*) FROM n"
+)
+
+def preparar_banco(caminho: str):
+    engine = create_engine(f"sqlite:///{caminho}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE comandas (id INTEGER PRIMARY KEY, saldo_atual NUMERIC)"))
+        conn.execute(text("INSERT INTO comandas (id, saldo_atual) VALUES (:id, 100)"),
+                     [{"id": i} for i in range(1, 1001)])
+    engine.dispose()
+
+def percentil(valores: list, p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+async def cenario(nome: str, consultar, relatorio, concorrencia: int, duracao: float):
+    latencias: list = []
+    fim = time.perf_counter() + duracao
+
+    async def cliente(numero: int):
+        i = numero
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            await consultar(i % 1000 + 1)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            i += concorrencia
+
+    async def relatorios():
+        while time.perf_counter() < fim:
+            await relatorio()
+
+    await asyncio.gather(relatorios(), *[cliente(n) for n in range(concorrencia)])
+    print(
+        f"{nome:<30} {len(latencias) / duracao:>8.0f} consultas/s   "
+        f"p50={statistics.median(latencias) if latencias else 0:.1f}ms "
+        f"p99={percentil(latencias, 0.99):.1f}ms"
+    )
+
+async def main():
+    concorrencia = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    duracao = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = os.path.join(diretorio, "bench.db")
+        preparar_banco(caminho)
+        url = f"sqlite:///{caminho}"
+
+        engine = create_engine(url, connect_args={"check_same_thread": False}, pool_size=concorrencia + 1)
+        SessionLocal = sessionmaker(bind=engine)
+
+        async def consultar_sync(comanda_id):
+            with SessionLocal() as db:
+                db.execute(CONSULTA_LEVE, {"id": comanda_id}).scalar()
+            await asyncio.sleep(0)
+
+        async def relatorio_sync():
+            with SessionLocal() as db:
+                db.execute(CONSULTA_LENTA).scalar()
+            await asyncio.sleep(0)
+
+        AsyncSessionLocal = criar_async_sessionmaker(url)
+
+        async def consultar_async(comanda_id):
+            async with AsyncSessionLocal() as db:
+                (await db.execute(CONSULTA_LEVE, {"id": comanda_id})).scalar()
+
+        async def relatorio_async():
+            async with AsyncSessionLocal() as db:
+                (await db.execute(CONSULTA_LENTA)).scalar()
+
+        print(f"{concorrencia} clientes concorrentes, {duracao:.0f}s por cenário, relatório lento em paralelo\n")
+        await cenario("Session síncrona em async def", consultar_sync, relatorio_sync, concorrencia, duracao)
+        await cenario("AsyncSession", consultar_async, relatorio_async, concorrencia, duracao)
+
+        engine.dispose()
+        await AsyncSessionLocal.kw["bind"].dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark das consultas do dashboard de check-in.
+
+Monta um SQLite temporário com um evento de N ingressos (mais outros eventos
+com um quarto disso cada, para o índice por evento fazer diferença) e mede a
+latência (p50/p99) de:
+
+1. antes: as cinco consultas do dashboard, com as vendas sem check-in pelo
+   LEFT JOIN por CPF e sem o índice (evento_id, status) de transacoes;
+2. depois: a consulta única de `_consulta_vendas` (COUNT ... FILTER com
+   NOT EXISTS pelo índice evento/transação de checkins). Presentes, check-ins
+   da última hora e por método vêm do estado em memória (ocupacao_service).
+
+Uso: python benchmark_checkin_dashboard.py [ingressos] [repeticoes]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select, func, text
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import Checkin, Transacao, StatusTransacao
+from app.routers.checkins import _consulta_vendas
+
+EVENTO = 1
+OUTROS_EVENTOS = 4
+
+def popular(engine, ingressos: int):
+    agora = datetime.now()
+    aleatorio = random.Random(42)
+    transacoes, checkins = [], []
+    proximo_id = 1
+    for evento_id in range(1, OUTROS_EVENTOS + 2):
+        quantidade = ingressos if evento_id == EVENTO else ingressos // 4
+        for _ in range(quantidade):
+            cpf = f"{proximo_id:011d}"
+            status = "APROVADA" if aleatorio.random() < 0.9 else "CANCELADA"
+            transacoes.append((proximo_id, cpf, "Comprador", 50, status, evento_id, evento_id))
+            if status == "APROVADA" and aleatorio.random() < 0.6:
+                checkins.append((cpf, "Comprador", evento_id, proximo_id, aleatorio.choice(["cpf", "qr_code"]),
+                                 agora - timedelta(minutes=aleatorio.randint(0, 240))))
+            proximo_id += 1
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO transacoes (id, cpf_comprador, nome_comprador, valor, status, evento_id, lista_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", transacoes
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO checkins (cpf, nome, evento_id, transacao_id, metodo_checkin, checkin_em) "
+            "VALUES (?, ?, ?, ?, ?, ?)", checkins
+        )
+        conn.exec_driver_sql("ANALYZE")
+
+def consultas_antes(db):
+    uma_hora_atras = datetime.now() - timedelta(hours=1)
+    aprovada = Transacao.status == StatusTransacao.APROVADA
+    total_checkins = db.scalar(select(func.count(Checkin.id)).where(Checkin.evento_id == EVENTO))
+    checkins_ultima_hora = db.scalar(select(func.count(Checkin.id)).where(
+        Checkin.evento_id == EVENTO, Checkin.checkin_em >= uma_hora_atras
+    ))
+    total_vendas = db.scalar(select(func.count(Transacao.id)).where(Transacao.evento_id == EVENTO, aprovada))
+    por_metodo = db.execute(select(Checkin.metodo_checkin, func.count(Checkin.id)).where(
+        Checkin.evento_id == EVENTO
+    ).group_by(Checkin.metodo_checkin)).all()
+    sem_checkin = db.scalar(select(func.count(Transacao.id)).outerjoin(
+        Checkin, Transacao.cpf_comprador == Checkin.cpf
+    ).where(Transacao.evento_id == EVENTO, aprovada, Checkin.id.is_(None)))
+    return total_vendas, sem_checkin
+
+def consulta_depois(db):
+    return tuple(db.execute(_consulta_vendas(EVENTO)).one())
+
+def medir(nome: str, Session, consulta, repeticoes: int):
+    tempos = []
+    with Session() as db:
+        resultado = consulta(db)
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            consulta(db)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    print(
+        f"{nome:<44} p50={statistics.median(tempos):>8.2f}ms "
+        f"p99={tempos[min(len(tempos) - 1, int(len(tempos) * 0.99))]:>8.2f}ms   "
+        f"vendas={resultado[0]} sem check-in={resultado[1]}"
+    )
+
+def main():
+    ingressos = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    repeticoes = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    with tempfile.TemporaryDirectory() as pasta:
+        engine = create_engine(f"sqlite:///{os.path.join(pasta, 'dashboard.db')}")
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(text("DROP INDEX ix_transacoes_evento_status"))
+        popular(engine, ingressos)
+        Session = sessionmaker(bind=engine)
+
+        print(f"{ingressos} ingressos no evento, {OUTROS_EVENTOS} outros eventos com {ingressos // 4}\n")
+        medir("antes: 5 consultas, LEFT JOIN por CPF", Session, consultas_antes, repeticoes)
+
+        indice = next(i for i in Transacao.__table__.indexes if i.name == "ix_transacoes_evento_status")
+        indice.create(bind=engine)
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ANALYZE")
+        medir("depois: 1 consulta, FILTER + NOT EXISTS", Session, consulta_depois, repeticoes)
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
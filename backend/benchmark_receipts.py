@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark de geração de comprovantes.
+
+Compara a renderização de PDF no próprio event loop (como era antes) com o
+pool de processos do ReceiptService, medindo comprovantes/s e o atraso do
+event loop (p50/p99) enquanto os comprovantes são gerados.
+
+Uso: python benchmark_receipts.py [quantidade] [workers]
+"""
+import asyncio
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+from app.services.receipt_render import renderizar_pdf, renderizar_escpos
+
+def venda_exemplo(numero: int) -> dict:
+    return {
+        "numero_venda": f"PDV{numero:08d}",
+        "data": "19/10/2026 22:15",
+        "estabelecimento": "Empresa Demo",
+        "evento": "Festival de Verão",
+        "itens": [
+            {"nome": f"Produto {i}", "quantidade": 2, "preco_unitario": "12.50", "preco_total": "25.00"}
+            for i in range(6)
+        ],
+        "valor_final": "150.00",
+        "pagamento": "Cartao Credito",
+    }
+
+async def medir_atraso(parar: asyncio.Event, amostras: list):
+    intervalo = 0.005
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        await asyncio.sleep(intervalo)
+        amostras.append((time.perf_counter() - inicio - intervalo) * 1000)
+
+def percentil(valores: list, p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+async def cenario(nome: str, gerar, quantidade: int):
+    amostras: list = []
+    parar = asyncio.Event()
+    monitor = asyncio.create_task(medir_atraso(parar, amostras))
+    await asyncio.sleep(0.05)
+
+    inicio = time.perf_counter()
+    await gerar(quantidade)
+    duracao = time.perf_counter() - inicio
+
+    parar.set()
+    await monitor
+    print(
+        f"{nome:<28} {quantidade / duracao:>9.0f} comprovantes/s   "
+        f"atraso loop p50={statistics.median(amostras) if amostras else 0:.1f}ms "
+        f"p99={percentil(amostras, 0.99):.1f}ms max={max(amostras, default=0):.1f}ms"
+    )
+
+async def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    loop = asyncio.get_running_loop()
+
+    async def pdf_no_loop(n):
+        for i in range(n):
+            renderizar_pdf(venda_exemplo(i))
+            await asyncio.sleep(0)
+
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    # aquecer os processos antes de medir
+    await asyncio.gather(*[loop.run_in_executor(executor, renderizar_pdf, venda_exemplo(i)) for i in range(workers)])
+
+    async def pdf_no_pool(n):
+        await asyncio.gather(*[loop.run_in_executor(executor, renderizar_pdf, venda_exemplo(i)) for i in range(n)])
+
+    async def escpos_no_loop(n):
+        for i in range(n):
+            renderizar_escpos(venda_exemplo(i))
+            if i % 100 == 0:
+                await asyncio.sleep(0)
+
+    print(f"{quantidade} comprovantes, {workers} workers\n")
+    await cenario("PDF no event loop", pdf_no_loop, quantidade)
+    await cenario(f"PDF no pool ({workers} processos)", pdf_no_pool, quantidade)
+    await cenario("ESC/POS no event loop", escpos_no_loop, quantidade)
+
+    executor.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark do perfil SQLite edge.
+
+Simula terminais de PDV gravando vendas (INSERT da venda + UPDATE de estoque)
+ao mesmo tempo que telas de dashboard leem o banco, em três configurações:
+
+1. SQLite padrão (journal DELETE), cada requisição com sua conexão;
+2. pragmas edge (WAL, synchronous=NORMAL, mmap, cache), cada requisição com sua conexão;
+3. pragmas edge + escritor único (EscritorSQLite).
+
+Mede vendas/s, latência p50/p99 das gravações e erros "database is locked".
+
+Uso: python benchmark_sqlite_edge.py [terminais] [duracao_s]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.sqlite_edge import aplicar_pragmas_edge, EscritorSQLite
+
+LEITORES = 4
+INTERVALO_LEITURA = 0.02  # cada dashboard relê a cada 20 ms
+
+def criar(caminho: str, edge: bool, conexoes: int):
+    engine = create_engine(
+        f"sqlite:///{caminho}",
+        connect_args={"check_same_thread": False, "timeout": 5},
+        pool_size=conexoes, max_overflow=0
+    )
+    if edge:
+        event.listen(engine, "connect", lambda conn, _: aplicar_pragmas_edge(conn, 256, 5000, 65536))
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE produtos (id INTEGER PRIMARY KEY, estoque INTEGER)"))
+        conn.execute(text("CREATE TABLE vendas (id INTEGER PRIMARY KEY, produto_id INTEGER, valor NUMERIC, criado_em REAL)"))
+        conn.execute(text("INSERT INTO produtos (id, estoque) VALUES (:id, 1000000)"), [{"id": i} for i in range(1, 51)])
+    return engine
+
+def gravar_venda(db, produto_id: int):
+    db.execute(text("INSERT INTO vendas (produto_id, valor, criado_em) VALUES (:p, 25.0, :t)"),
+               {"p": produto_id, "t": time.time()})
+    db.execute(text("UPDATE produtos SET estoque = estoque - 1 WHERE id = :p"), {"p": produto_id})
+    db.commit()
+
+def ler_dashboard(db):
+    db.execute(text("SELECT count(*), sum(valor) FROM vendas")).one()
+    db.rollback()
+
+def percentil(valores: list, p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+async def cenario(nome: str, edge: bool, escritor_unico: bool, terminais: int, duracao: float):
+    with tempfile.TemporaryDirectory() as diretorio:
+        engine = criar(os.path.join(diretorio, "edge.db"), edge, terminais + LEITORES)
+        SessionLocal = sessionmaker(bind=engine)
+        escritor = EscritorSQLite(sessionmaker(bind=engine), nome="benchmark") if escritor_unico else None
+        latencias, erros = [], 0
+        fim = time.perf_counter() + duracao
+
+        def gravar_com_sessao(produto_id):
+            with SessionLocal() as db:
+                gravar_venda(db, produto_id)
+
+        def ler_com_sessao():
+            with SessionLocal() as db:
+                ler_dashboard(db)
+
+        async def terminal(numero: int):
+            nonlocal erros
+            while time.perf_counter() < fim:
+                inicio = time.perf_counter()
+                try:
+                    if escritor:
+                        await escritor.executar(gravar_venda, numero % 50 + 1)
+                    else:
+                        await asyncio.to_thread(gravar_com_sessao, numero % 50 + 1)
+                    latencias.append((time.perf_counter() - inicio) * 1000)
+                except OperationalError:
+                    erros += 1
+
+        async def dashboard():
+            while time.perf_counter() < fim:
+                try:
+                    await asyncio.to_thread(ler_com_sessao)
+                except OperationalError:
+                    pass
+                await asyncio.sleep(INTERVALO_LEITURA)
+
+        await asyncio.gather(*[terminal(n) for n in range(terminais)], *[dashboard() for _ in range(LEITORES)])
+        if escritor:
+            escritor.encerrar()
+        engine.dispose()
+
+    print(
+        f"{nome:<34} {len(latencias) / duracao:>7.0f} vendas/s   "
+        f"p50={statistics.median(latencias) if latencias else 0:.1f}ms "
+        f"p99={percentil(latencias, 0.99):.1f}ms   locked={erros}"
+    )
+
+async def main():
+    terminais = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    duracao = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    print(
+        f"{terminais} terminais gravando, {LEITORES} dashboards lendo a cada "
+        f"{INTERVALO_LEITURA * 1000:.0f}ms, {duracao:.0f}s por cenário\n"
+    )
+    await cenario("SQLite padrão", False, False, terminais, duracao)
+    await cenario("Pragmas edge", True, False, terminais, duracao)
+    await cenario("Pragmas edge + escritor único", True, True, terminais, duracao)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Migração para ingressos assinados.
+
+1. cria transacoes.qr_code_legado (com índice único) e o índice único
+   (evento_id, transacao_id) de checkins, removendo antes os check-ins
+   repetidos do mesmo ingresso (fica o primeiro). Se um índice não puder
+   ser criado, a migração para com código de saída 1;
+2. move os códigos aleatórios antigos de qr_code_ticket para qr_code_legado
+   e grava no lugar o ingresso assinado. Os QR antigos já distribuídos
+   continuam valendo na portaria pela consulta ao banco;
+3. com --reenviar, enfileira na outbox o email com o novo ingresso para
+   quem tem email cadastrado.
+
+Uso: python migrate_signed_tickets.py [--evento ID] [--reenviar]
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+from sqlalchemy import create_engine, inspect, text, Index
+from sqlalchemy.orm import sessionmaker, joinedload
+from app.database import settings
+from app.models import Transacao, Checkin
+from app.services.outbox_service import outbox_service
+from app.services.ticket_service import ticket_service, PREFIXO
+
+LOTE = 500
+
+def remover_checkins_duplicados(engine) -> int:
+    """Manter só o primeiro check-in de cada ingresso; com repetidos o índice único não é criado"""
+    with engine.begin() as conn:
+        removidos = conn.execute(text("""
+            DELETE FROM checkins
+            WHERE transacao_id IS NOT NULL AND EXISTS (
+                SELECT 1 FROM checkins anterior
+                WHERE anterior.evento_id = checkins.evento_id
+                  AND anterior.transacao_id = checkins.transacao_id
+                  AND anterior.id < checkins.id
+            )
+        """)).rowcount
+    print(f"✅ {removidos} check-ins duplicados removidos")
+    return removidos
+
+def adicionar_colunas(engine):
+    colunas = {coluna["name"] for coluna in inspect(engine).get_columns("transacoes")}
+    if "qr_code_legado" not in colunas:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE transacoes ADD COLUMN qr_code_legado VARCHAR(100)"))
+        print("✅ Campo qr_code_legado adicionado à tabela transacoes")
+    else:
+        print("✅ Campo qr_code_legado já existe na tabela transacoes")
+
+    indices = [
+        Index("ix_transacoes_qr_code_legado", Transacao.__table__.c.qr_code_legado, unique=True),
+        *[indice for indice in Checkin.__table__.indexes if indice.name == "ix_checkins_evento_transacao"],
+    ]
+    remover_checkins_duplicados(engine)
+    for indice in indices:
+        try:
+            indice.create(bind=engine, checkfirst=True)
+            print(f"✅ Índice {indice.name} ok")
+        except Exception as e:
+            print(f"❌ Erro ao criar o índice {indice.name}: {e}")
+            sys.exit(1)
+
+def migrar_ingressos(engine, evento_id=None, reenviar=False):
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    migrados = reenvios = 0
+    ultimo_id = 0
+    try:
+        while True:
+            consulta = db.query(Transacao).options(
+                joinedload(Transacao.evento), joinedload(Transacao.lista)
+            ).filter(
+                Transacao.id > ultimo_id,
+                Transacao.qr_code_ticket.isnot(None),
+                ~Transacao.qr_code_ticket.startswith(PREFIXO)
+            )
+            if evento_id:
+                consulta = consulta.filter(Transacao.evento_id == evento_id)
+            transacoes = consulta.order_by(Transacao.id).limit(LOTE).all()
+            if not transacoes:
+                break
+
+            envios = []
+            for transacao in transacoes:
+                transacao.qr_code_legado = transacao.qr_code_ticket
+                transacao.qr_code_ticket = ticket_service.emitir_para(transacao, transacao.evento, transacao.lista)
+                if reenviar and transacao.email_comprador:
+                    envios.append((transacao.email_comprador, {
+                        "tipo": "ingresso",
+                        "nome": transacao.nome_comprador,
+                        "evento": transacao.evento.nome,
+                        "data": transacao.evento.data_evento.strftime("%d/%m/%Y %H:%M"),
+                        "local": transacao.evento.local,
+                        "codigo": transacao.qr_code_ticket
+                    }))
+            outbox_service.enfileirar_varios(db, "email", envios)
+            db.commit()
+
+            migrados += len(transacoes)
+            reenvios += len(envios)
+            ultimo_id = transacoes[-1].id
+            print(f"   {migrados} ingressos migrados...")
+    finally:
+        db.close()
+
+    print(f"✅ {migrados} ingressos assinados gravados ({reenvios} emails enfileirados)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrar ingressos para o formato assinado")
+    parser.add_argument("--evento", type=int, help="migrar só as transações deste evento")
+    parser.add_argument("--reenviar", action="store_true", help="enviar o novo ingresso por email")
+    args = parser.parse_args()
+
+    engine = create_engine(settings.database_url)
+    adicionar_colunas(engine)
+    migrar_ingressos(engine, args.evento, args.reenviar)
@@ -1,10 +1,25 @@
+import asyncio
+import os
+import tempfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# app.main cria as tabelas no banco configurado ao ser importado: nos testes,
+# um arquivo temporário em vez do eventos.db do repositório
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='eventos-testes-')}/eventos.db"
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.main import app
-from app.database import get_db, Base
+from app.database import get_db, get_db_leitura, get_async_db, criar_async_sessionmaker, Base
+from app.models import Empresa, Usuario, Evento, Lista, Transacao, Produto, TipoUsuario, TipoLista, StatusTransacao
+from app.auth import criar_access_token
+from app.websocket import manager
+from app.services.ticket_service import ticket_service
+from app.services.ocupacao_service import ocupacao_service
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
@@ -17,10 +32,151 @@ def override_get_db():
     finally:
         db.close()
 
+TestingAsyncSessionLocal = criar_async_sessionmaker(SQLALCHEMY_DATABASE_URL)
+
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_db_leitura] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
 
 @pytest.fixture(scope="session")
 def test_db():
     Base.metadata.create_all(bind=engine)
     yield
     Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture(autouse=True)
+def limpar_cache_usuarios():
+    # O cache de usuários autenticados é global ao processo; cada teste recria o banco
+    from app.auth import cache_usuarios
+    cache_usuarios.limpar()
+    yield
+    cache_usuarios.limpar()
+
+ADMIN_CPF = "00000000001"
+
+# CPFs válidos dos compradores padrão; a portaria confere os três primeiros dígitos
+COMPRADORES = ["111.444.777-35", "222.333.444-05", "333.444.555-10"]
+
+def cabecalho(cpf: str = ADMIN_CPF):
+    return {"Authorization": f"Bearer {criar_access_token({'sub': cpf})}"}
+
+@pytest.fixture
+def banco_url(tmp_path):
+    """SQLite do teste, no diretório temporário dele"""
+    return f"sqlite:///{tmp_path / 'teste.db'}"
+
+@pytest.fixture
+def motor(banco_url):
+    """Engine síncrono do banco do teste, com as tabelas já criadas"""
+    motor = create_engine(banco_url, connect_args={"check_same_thread": False, "timeout": 30})
+    Base.metadata.create_all(bind=motor)
+    yield motor
+    motor.dispose()
+
+@pytest.fixture
+def sessoes(motor):
+    return sessionmaker(autocommit=False, autoflush=False, bind=motor)
+
+@pytest.fixture
+def db_session(sessoes):
+    db = sessoes()
+    try:
+        yield db
+    finally:
+        db.close()
+
+@pytest.fixture
+def sessoes_async(motor, banco_url):
+    """Sessões assíncronas no banco do teste (as da API); o engine é descartado no fim"""
+    fabrica = criar_async_sessionmaker(banco_url)
+    yield fabrica
+    asyncio.run(fabrica.kw["bind"].dispose())
+
+@pytest.fixture
+def client(sessoes, sessoes_async):
+    """API sobre o banco do teste, sem cache de ocupação nem fluxos de WebSocket de outro teste"""
+    def sessao_sincrona():
+        db = sessoes()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def sessao_assincrona():
+        async with sessoes_async() as db:
+            yield db
+
+    substitutas = {get_db: sessao_sincrona, get_db_leitura: sessao_sincrona, get_async_db: sessao_assincrona}
+    anteriores = {dep: app.dependency_overrides.get(dep) for dep in substitutas}
+    app.dependency_overrides.update(substitutas)
+    ocupacao_service.limpar()
+    manager.fluxos.clear()
+    try:
+        yield TestClient(app)
+    finally:
+        for dep, anterior in anteriores.items():
+            if anterior is None:
+                app.dependency_overrides.pop(dep, None)
+            else:
+                app.dependency_overrides[dep] = anterior
+        ocupacao_service.limpar()
+        manager.fluxos.clear()
+
+def novo_evento(db, capacidade_maxima=None, presentes=0, **campos_admin) -> Evento:
+    """Empresa, admin (ADMIN_CPF) e um evento amanhã; faz flush, o commit fica com o chamador"""
+    empresa = Empresa(nome="Empresa", cnpj="1", email="e@e.com")
+    admin = Usuario(**{"nome": "Admin", "email": "a@a.com", "cpf": ADMIN_CPF, "tipo": TipoUsuario.ADMIN,
+                       "senha_hash": "x", "ativo": True, **campos_admin})
+    db.add_all([empresa, admin])
+    db.flush()
+    evento = Evento(nome="Festa", data_evento=datetime.now() + timedelta(days=1), local="Clube",
+                    empresa_id=empresa.id, criador_id=admin.id, capacidade_maxima=capacidade_maxima,
+                    presentes=presentes)
+    db.add(evento)
+    db.flush()
+    return evento
+
+@pytest.fixture
+def evento(db_session):
+    evento = novo_evento(db_session)
+    db_session.commit()
+    return evento
+
+@pytest.fixture
+def criar_evento(client, sessoes):
+    """
+    Fábrica do cenário de portaria: evento de `novo_evento` com uma lista e
+    uma transação com ingresso assinado por comprador. Os compradores são
+    CPFs (aprovados) ou pares (cpf, status); os produtos são dicts de campos
+    de Produto. Retorna (sessão, evento, transações) antes do commit, para o
+    teste completar o cenário; a sessão fecha no fim do teste.
+    """
+    abertas = []
+
+    def criar(compradores=COMPRADORES, capacidade_maxima=None, presentes=0, tipo_lista=TipoLista.PAGANTE,
+              produtos=()):
+        db = sessoes()
+        abertas.append(db)
+        evento = novo_evento(db, capacidade_maxima, presentes)
+        lista = Lista(nome=tipo_lista.name.title(), tipo=tipo_lista, evento_id=evento.id)
+        db.add_all([lista] + [Produto(evento_id=evento.id, empresa_id=evento.empresa_id, **campos)
+                              for campos in produtos])
+        db.flush()
+        transacoes = []
+        for comprador in compradores:
+            cpf, status = (comprador, StatusTransacao.APROVADA) if isinstance(comprador, str) else comprador
+            transacoes.append(Transacao(cpf_comprador=cpf, nome_comprador=f"comprador {cpf[:3]}", valor=Decimal("10"),
+                                        status=status, evento_id=evento.id, lista_id=lista.id))
+        db.add_all(transacoes)
+        db.flush()
+        for transacao in transacoes:
+            transacao.qr_code_ticket = ticket_service.emitir_para(transacao, evento, lista)
+        return db, evento, transacoes
+
+    yield criar
+    for db in abertas:
+        db.close()
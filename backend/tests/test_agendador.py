@@ -0,0 +1,106 @@
+import asyncio
+import time
+from decimal import Decimal
+
+import pytest
+
+from app.database import criar_async_sessionmaker
+from app.metrics import metricas
+from app.models import Lista, Transacao, TipoLista, StatusTransacao
+from app.scheduler import Agendador, BloqueioLider
+from app.services.alert_service import AlertService
+from app.services.outbox_service import Canal, OutboxService
+from app.services.whatsapp_service import whatsapp_service
+
+from .conftest import novo_evento
+
+@pytest.fixture(autouse=True)
+def limpar_metricas():
+    metricas.limpar()
+
+class TestAgendador:
+
+    def test_apenas_um_worker_executa_cada_rodada(self, sessoes):
+        execucoes = []
+
+        def worker(nome):
+            agendador = Agendador(BloqueioLider(sessoes, dono=nome))
+
+            async def tarefa():
+                execucoes.append(nome)
+            agendador.agendar("alertas", 0.3, tarefa)
+            return agendador
+
+        workers = [worker(f"worker-{i}") for i in range(3)]
+
+        async def cenario():
+            primeira = await asyncio.gather(*[w.executar_agora("alertas") for w in workers])
+            await asyncio.sleep(0.35)  # bloqueio expira após um intervalo
+            segunda = await asyncio.gather(*[w.executar_agora("alertas") for w in workers])
+            return primeira, segunda
+
+        primeira, segunda = asyncio.run(cenario())
+
+        assert sum(primeira) == 1
+        assert sum(segunda) == 1
+        assert len(execucoes) == 2
+        assert metricas.contador("agendador.alertas.ignoradas") == 4
+
+    def test_regras_em_paralelo_com_timeout_por_regra(self, banco_url):
+        executadas = []
+
+        async def lenta(db):
+            await asyncio.sleep(5)
+
+        async def com_erro(db):
+            raise RuntimeError("falhou")
+
+        async def rapida(db):
+            await asyncio.sleep(0.1)
+            executadas.append("rapida")
+
+        async def cenario():
+            sessoes = criar_async_sessionmaker(banco_url)
+            service = AlertService(sessoes, timeout_regra_segundos=0.3)
+            service.alert_rules = {"lenta": lenta, "com_erro": com_erro, "rapida": rapida, "rapida2": rapida}
+            inicio = time.perf_counter()
+            await service.run_alert_checks()
+            duracao = time.perf_counter() - inicio
+            await sessoes.kw["bind"].dispose()
+            return duracao
+
+        duracao = asyncio.run(cenario())
+
+        assert duracao < 1  # em série seriam 0.5s das rápidas + 0.3s da lenta
+        assert executadas == ["rapida", "rapida"]
+        assert metricas.contador("alertas.lenta.timeouts") == 1
+        assert metricas.contador("alertas.com_erro.erros") == 1
+
+    def test_evento_amanha_conta_vendas_aprovadas(self, db_session, banco_url, monkeypatch):
+        db = db_session
+        evento = novo_evento(db, telefone="11999999999")
+        lista = Lista(nome="Geral", tipo=TipoLista.PAGANTE, evento_id=evento.id)
+        db.add(lista)
+        db.flush()
+        for status in (StatusTransacao.APROVADA, StatusTransacao.APROVADA, StatusTransacao.PENDENTE):
+            db.add(Transacao(cpf_comprador="11144477735", nome_comprador="Cliente", valor=Decimal("10"),
+                             status=status, evento_id=evento.id, lista_id=lista.id))
+        db.commit()
+
+        mensagens = []
+
+        async def enviar(telefone, mensagem):
+            mensagens.append((telefone, mensagem))
+        monkeypatch.setattr(whatsapp_service, "_send_whatsapp_message", enviar)
+
+        async def cenario():
+            sessoes = criar_async_sessionmaker(banco_url)
+            async with sessoes() as sessao:
+                await AlertService(sessoes).check_evento_proximo(sessao)
+            await OutboxService(sessoes, {"whatsapp": Canal(whatsapp_service._entregar_whatsapp)}).processar_pendentes()
+            await sessoes.kw["bind"].dispose()
+
+        asyncio.run(cenario())
+
+        assert len(mensagens) == 1
+        assert "2 vendas confirmadas" in mensagens[0][1]
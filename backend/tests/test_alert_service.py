@@ -0,0 +1,101 @@
+import asyncio
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event
+
+from app.database import Base, criar_async_sessionmaker
+from app.models import Usuario, Empresa, Evento, Lista, Transacao, AlertaEnviado, TipoUsuario, TipoLista, StatusTransacao
+from app.services.alert_service import AlertService
+from app.services.outbox_service import Canal, OutboxService
+from app.services.whatsapp_service import whatsapp_service
+
+@pytest.fixture
+def mensagens(monkeypatch):
+    enviadas = []
+
+    async def enviar(telefone, mensagem):
+        enviadas.append((telefone, mensagem))
+    monkeypatch.setattr(whatsapp_service, "_send_whatsapp_message", enviar)
+    return enviadas
+
+def criar_eventos(sessoes, quantidade: int):
+    """Eventos amanhã, cada um com um promoter e uma venda aprovada (vendas baixas)"""
+    db = sessoes()
+    empresa = Empresa(nome="Empresa", cnpj="1", email="e@e.com")
+    db.add(empresa)
+    db.flush()
+    admin = Usuario(nome="Admin", email="a@a.com", cpf="00000000001", tipo=TipoUsuario.ADMIN,
+                    senha_hash="x", ativo=True, telefone="11900000000")
+    db.add(admin)
+    db.flush()
+    for i in range(quantidade):
+        promoter = Usuario(nome=f"Promoter {i}", email=f"p{i}@p.com", cpf=f"1000000{i:04d}",
+                           tipo=TipoUsuario.PROMOTER, senha_hash="x", ativo=True, telefone=f"1191000{i:04d}")
+        db.add(promoter)
+        db.flush()
+        evento = Evento(nome=f"Evento {i}", data_evento=datetime.now() + timedelta(days=1), local="Local",
+                        empresa_id=empresa.id, criador_id=admin.id)
+        db.add(evento)
+        db.flush()
+        lista = Lista(nome="Geral", tipo=TipoLista.PAGANTE, evento_id=evento.id, promoter_id=promoter.id)
+        db.add(lista)
+        db.flush()
+        db.add(Transacao(cpf_comprador="11144477735", nome_comprador="Cliente", valor=Decimal("10"),
+                         status=StatusTransacao.APROVADA, evento_id=evento.id, lista_id=lista.id))
+    db.commit()
+    db.close()
+
+def rodar_alertas(banco_url):
+    consultas = []
+
+    async def cenario():
+        sessoes = criar_async_sessionmaker(banco_url)
+        motor = sessoes.kw["bind"].sync_engine
+        contar = lambda conn, cursor, statement, *args: consultas.append(statement)
+        event.listen(motor, "before_cursor_execute", contar)
+        try:
+            await AlertService(sessoes).run_alert_checks()
+        finally:
+            event.remove(motor, "before_cursor_execute", contar)
+        try:
+            # alertas saem pela outbox
+            await OutboxService(sessoes, {"whatsapp": Canal(whatsapp_service._entregar_whatsapp)}).processar_pendentes()
+        finally:
+            await sessoes.kw["bind"].dispose()
+
+    asyncio.run(cenario())
+    return len(consultas)
+
+class TestAlertasEmLote:
+
+    def test_consultas_nao_crescem_com_numero_de_eventos(self, motor, sessoes, banco_url, mensagens):
+        criar_eventos(sessoes, 2)
+        consultas_poucos = rodar_alertas(banco_url)
+        assert len(mensagens) == 4  # por evento: admin (evento amanhã) + promoter (vendas baixas)
+
+        Base.metadata.drop_all(bind=motor)
+        Base.metadata.create_all(bind=motor)
+        mensagens.clear()
+        criar_eventos(sessoes, 20)
+        consultas_muitos = rodar_alertas(banco_url)
+
+        assert len(mensagens) == 40
+        assert consultas_muitos == consultas_poucos
+
+    def test_alerta_enviado_nao_se_repete(self, sessoes, banco_url, mensagens):
+        criar_eventos(sessoes, 3)
+        rodar_alertas(banco_url)
+        assert len(mensagens) == 6
+
+        mensagens.clear()
+        rodar_alertas(banco_url)
+        assert mensagens == []
+
+        db = sessoes()
+        try:
+            regras = {alerta.regra for alerta in db.query(AlertaEnviado).all()}
+        finally:
+            db.close()
+        assert regras == {"evento_proximo", "vendas_baixas"}
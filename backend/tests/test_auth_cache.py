@@ -0,0 +1,60 @@
+import pytest
+from sqlalchemy import event
+
+from app.models import Usuario, TipoUsuario
+from app.auth import cache_usuarios
+from app.metrics import metricas
+
+from .conftest import cabecalho
+
+@pytest.fixture
+def usuarios(sessoes):
+    db = sessoes()
+    admin = Usuario(
+        nome="Admin Teste", email="admin@teste.com", cpf="12345678901",
+        tipo=TipoUsuario.ADMIN, senha_hash="$2b$12$test", ativo=True
+    )
+    cliente = Usuario(
+        nome="Cliente Teste", email="cliente@teste.com", cpf="11144477735",
+        tipo=TipoUsuario.CLIENTE, senha_hash="$2b$12$test", ativo=True
+    )
+    db.add_all([admin, cliente])
+    db.commit()
+    ids = {"admin": admin.id, "cliente": cliente.id}
+    db.close()
+    return ids
+
+class TestCacheUsuarios:
+
+    def test_segunda_requisicao_nao_consulta_usuario(self, client, usuarios, sessoes_async):
+        consultas = []
+
+        def contar(conn, cursor, statement, *args):
+            if "FROM usuarios" in statement:
+                consultas.append(statement)
+
+        # /me resolve o usuário pela sessão assíncrona
+        motor = sessoes_async.kw["bind"].sync_engine
+        event.listen(motor, "before_cursor_execute", contar)
+        try:
+            hits = metricas.contador("auth.cache_usuarios.hits")
+            for _ in range(3):
+                resposta = client.get("/api/auth/me", headers=cabecalho("11144477735"))
+                assert resposta.status_code == 200
+                assert resposta.json()["nome"] == "Cliente Teste"
+        finally:
+            event.remove(motor, "before_cursor_execute", contar)
+
+        assert len(consultas) == 1
+        assert metricas.contador("auth.cache_usuarios.hits") - hits == 2
+
+    def test_desativacao_invalida_cache(self, client, usuarios):
+        assert client.get("/api/auth/me", headers=cabecalho("11144477735")).status_code == 200
+        assert cache_usuarios.obter("11144477735") is not None
+
+        resposta = client.delete(f"/api/usuarios/{usuarios['cliente']}", headers=cabecalho("12345678901"))
+        assert resposta.status_code == 200
+
+        resposta = client.get("/api/auth/me", headers=cabecalho("11144477735"))
+        assert resposta.status_code == 401
+        assert resposta.json()["detail"] == "Usuário inativo"
@@ -0,0 +1,128 @@
+import asyncio
+import os
+import time
+
+import httpx
+import pytest
+from passlib.context import CryptContext
+
+import app.auth as auth
+import app.routers.auth as rotas_auth
+from app.main import app
+from app.database import criar_async_sessionmaker
+from app.models import Usuario, Comanda, TipoUsuario, TipoComanda, StatusComanda
+from app.auth import criar_access_token, ExecutorSenhas, autenticar_usuario_async
+from app.services.verification_service import ArmazenamentoCodigosMemoria
+from decimal import Decimal
+
+from .conftest import novo_evento
+
+# Custo menor que o de produção para o teste caber em poucos segundos; cada
+# verificação ainda leva dezenas de ms, o suficiente para travar o loop se
+# rodasse nele.
+ROUNDS_TESTE = 9
+
+@pytest.fixture
+def contexto_teste(monkeypatch):
+    contexto = CryptContext(
+        schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=ROUNDS_TESTE,
+        bcrypt__min_rounds=ROUNDS_TESTE, bcrypt__max_rounds=ROUNDS_TESTE
+    )
+    monkeypatch.setattr(auth, "pwd_context", contexto)
+    monkeypatch.setattr(auth, "executor_senhas", ExecutorSenhas(workers=2, fila_max=200))
+    # códigos em memória: o teste mede só o custo do bcrypt, sem as gravações no banco
+    monkeypatch.setattr(rotas_auth, "codigos_verificacao", ArmazenamentoCodigosMemoria())
+    return contexto
+
+@pytest.fixture
+def cenario(contexto_teste, client, db_session):
+    evento = novo_evento(db_session, senha_hash=contexto_teste.hash("senha123"))
+    comanda = Comanda(
+        numero_comanda="C0001", tipo=TipoComanda.FISICA, saldo_atual=Decimal('100.00'),
+        status=StatusComanda.ATIVA, evento_id=evento.id, empresa_id=evento.empresa_id
+    )
+    db_session.add(comanda)
+    db_session.commit()
+    admin = db_session.get(Usuario, evento.criador_id)
+    return {"comanda_id": comanda.id, "cpf": admin.cpf, "token": criar_access_token({"sub": admin.cpf})}
+
+class TestSenhasForaDoLoop:
+
+    def test_rehash_quando_custo_muda(self, contexto_teste, db_session, banco_url):
+        antigo = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("senha123")
+        db_session.add(Usuario(
+            nome="Cliente", email="c@teste.com", cpf="11144477735",
+            tipo=TipoUsuario.CLIENTE, senha_hash=antigo, ativo=True
+        ))
+        db_session.commit()
+
+        async def autenticar():
+            sessoes = criar_async_sessionmaker(banco_url)
+            async with sessoes() as sessao:
+                usuario = await autenticar_usuario_async("11144477735", "senha123", sessao)
+                senha_hash = usuario.senha_hash if usuario else None
+                invalido = await autenticar_usuario_async("11144477735", "errada", sessao)
+            await sessoes.kw["bind"].dispose()
+            return senha_hash, invalido
+
+        senha_hash, invalido = asyncio.run(autenticar())
+        assert senha_hash
+        assert senha_hash != antigo
+        assert contexto_teste.identify(senha_hash) == "bcrypt"
+        assert not contexto_teste.needs_update(senha_hash)
+        assert not invalido
+
+    @pytest.mark.skipif(
+        not os.getenv("RODAR_BENCHMARKS"),
+        reason="benchmark de latência (tempo de relógio); rode com RODAR_BENCHMARKS=1"
+    )
+    def test_latencia_de_venda_estavel_durante_50_logins(self, cenario):
+        saldo_url = f"/api/pdv/comandas/{cenario['comanda_id']}/saldo"
+        cabecalho = {"Authorization": f"Bearer {cenario['token']}"}
+
+        async def medir_vendas(cliente, parar, latencias):
+            while not parar.is_set():
+                inicio = time.perf_counter()
+                resposta = await cliente.get(saldo_url, headers=cabecalho)
+                latencias.append((time.perf_counter() - inicio) * 1000)
+                assert resposta.status_code == 200
+                await asyncio.sleep(0.01)
+
+        async def rodar():
+            transporte = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+                latencias_base, latencias_pico = [], []
+                # aquecimento: primeira requisição de cada rota e threads do executor
+                await cliente.get(saldo_url, headers=cabecalho)
+                await cliente.post("/api/auth/login", json={"cpf": cenario["cpf"], "senha": "senha123"})
+
+                parar = asyncio.Event()
+                medidor = asyncio.create_task(medir_vendas(cliente, parar, latencias_base))
+                await asyncio.sleep(0.5)
+                parar.set()
+                await medidor
+
+                parar = asyncio.Event()
+                medidor = asyncio.create_task(medir_vendas(cliente, parar, latencias_pico))
+                respostas = await asyncio.gather(*[
+                    cliente.post("/api/auth/login", json={"cpf": cenario["cpf"], "senha": "senha123"})
+                    for _ in range(50)
+                ])
+                parar.set()
+                await medidor
+
+                return latencias_base, latencias_pico, respostas
+
+        base, pico, respostas = asyncio.run(rodar())
+
+        # Primeira etapa do login: senha válida, código de verificação gerado
+        assert all(r.status_code == 202 for r in respostas)
+
+        def percentil(valores, p):
+            ordenados = sorted(valores)
+            return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+        assert len(pico) >= 10
+        # bcrypt no loop seria 50 x ~30 ms de bloqueio; fora dele a venda segue respondendo.
+        # Com ~100 amostras o p99 é a pior amostra; o p95 não depende de um único soluço do SO.
+        assert percentil(pico, 0.95) < max(100, 5 * percentil(base, 0.95))
@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+from app.database import criar_async_sessionmaker
+from app.models import Lista, TipoLista
+from app.services.bulk_invite_service import BulkInviteService, LimitadorTaxa
+from app.services.outbox_service import Canal, OutboxService
+
+from .conftest import novo_evento
+
+class ProvedorFalso:
+    """Provedor com latência fixa que registra o instante de cada envio"""
+
+    def __init__(self, latencia: float = 0.05, falhas_por_telefone: dict = None):
+        self.latencia = latencia
+        self.falhas_por_telefone = dict(falhas_por_telefone or {})
+        self.instantes = []
+        self.entregues = []
+        self.em_andamento = 0
+        self.max_em_andamento = 0
+
+    async def __call__(self, telefone, payload):
+        self.instantes.append(time.monotonic())
+        self.em_andamento += 1
+        self.max_em_andamento = max(self.max_em_andamento, self.em_andamento)
+        try:
+            await asyncio.sleep(self.latencia)
+            if self.falhas_por_telefone.get(telefone, 0) > 0:
+                self.falhas_por_telefone[telefone] -= 1
+                raise RuntimeError("429 Too Many Requests")
+            self.entregues.append((telefone, payload["mensagem"]))
+        finally:
+            self.em_andamento -= 1
+
+def entregar(banco_url: str, canal: Canal, **opcoes):
+    async def cenario():
+        sessoes = criar_async_sessionmaker(banco_url)
+        try:
+            await OutboxService(sessoes, {"whatsapp": canal}, **opcoes).processar_pendentes()
+        finally:
+            await sessoes.kw["bind"].dispose()
+    asyncio.run(cenario())
+
+class TestBulkInvite:
+
+    def test_limitador_sem_rajada_espaca_envios(self):
+        async def cenario():
+            limitador = LimitadorTaxa(taxa=20, capacidade=1)
+            inicio = time.monotonic()
+            for _ in range(5):
+                await limitador.adquirir()
+            return time.monotonic() - inicio
+
+        assert asyncio.run(cenario()) >= 4 / 20 * 0.9
+
+    def test_entrega_respeita_taxa_do_canal(self, db_session, banco_url):
+        service = BulkInviteService()
+        service.iniciar(db_session, "Convite", [f"119000{i:05d}" for i in range(60)])
+        provedor = ProvedorFalso(latencia=0.05)
+
+        entregar(banco_url, Canal(provedor, LimitadorTaxa(taxa=50, capacidade=5)), concorrencia=20, lote=60)
+
+        assert len(provedor.entregues) == 60
+        assert provedor.max_em_andamento > 1  # envios concorrentes
+        # após a rajada inicial, a taxa fica no limite configurado
+        janela = provedor.instantes[-1] - provedor.instantes[5]
+        assert 50 * 0.8 <= (len(provedor.instantes) - 6) / janela <= 50 * 1.2
+
+    def test_progresso_do_envio(self, db_session, banco_url):
+        db = db_session
+        evento = novo_evento(db)
+        lista = Lista(nome="VIP", tipo=TipoLista.VIP, evento_id=evento.id, preco=10)
+        db.add(lista)
+        db.commit()
+
+        service = BulkInviteService()
+        mensagem = service.renderizar_convite(evento, lista)
+        envio = service.iniciar(db, mensagem, ["11900000001", "11900000002", "11900000003", "11900000001"])
+
+        assert envio.total == 3
+        assert service.obter(db, envio.id).progresso()["status"] == "enviando"
+        assert service.obter(db, envio.id).progresso()["pendentes"] == 3
+        assert service.obter(db, "inexistente") is None
+
+        provedor = ProvedorFalso(latencia=0.01, falhas_por_telefone={"11900000001": 1, "11900000002": 5})
+        # as tentativas do canal valem no lugar das da outbox
+        entregar(banco_url, Canal(provedor, tentativas=3, backoff_segundos=0), tentativas=10)
+        progresso = service.obter(db, envio.id).progresso()
+
+        assert "Festa" in provedor.entregues[0][1]
+        assert progresso["status"] == "concluido"
+        assert progresso["success"] == 2
+        assert progresso["failed"] == 1
+        assert progresso["retentativas"] == 3
+        assert progresso["pendentes"] == 0
+        assert progresso["falhas"] == [{"phone": "11900000002", "erro": "429 Too Many Requests"}]
+
+    def test_concorrencia_do_canal_limita_entregas_simultaneas(self, db_session, banco_url):
+        BulkInviteService().iniciar(db_session, "Convite", [f"119000{i:05d}" for i in range(20)])
+        provedor = ProvedorFalso(latencia=0.02)
+
+        entregar(banco_url, Canal(provedor, concorrencia=3), concorrencia=20, lote=20)
+
+        assert len(provedor.entregues) == 20
+        assert provedor.max_em_andamento == 3
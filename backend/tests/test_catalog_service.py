@@ -0,0 +1,107 @@
+import pytest
+from decimal import Decimal
+
+from app.models import Usuario, Produto, MovimentoEstoque, TipoProduto, StatusProduto
+from app.services.catalog_service import CatalogService
+
+@pytest.fixture
+def cenario(db_session, evento):
+    for i in range(1, 4):
+        db_session.add(Produto(
+            nome=f"Cerveja {i}", tipo=TipoProduto.BEBIDA, preco=Decimal('10.00'),
+            codigo_interno=f"BEB{i}", codigo_barras=f"789000{i}", estoque_atual=100,
+            status=StatusProduto.ATIVO, evento_id=evento.id, empresa_id=evento.empresa_id
+        ))
+    db_session.commit()
+    return {"evento": evento, "usuario": db_session.get(Usuario, evento.criador_id)}
+
+class TestCatalogoLote:
+
+    def test_lote_cria_atualiza_e_ignora_inalterados(self, db_session, cenario):
+        service = CatalogService()
+        itens = [
+            {"codigo_interno": "BEB1", "preco": Decimal('12.50')},
+            {"codigo_barras": "7890002", "estoque_atual": 80},
+            {"codigo_interno": "BEB3", "preco": Decimal('10.00')},
+            {"codigo_interno": "COM1", "nome": "Hambúrguer", "tipo": TipoProduto.COMIDA,
+             "preco": Decimal('25.00'), "estoque_atual": 40},
+        ]
+
+        resumo = service.aplicar_lote(db_session, cenario["evento"], itens, cenario["usuario"].id)
+
+        assert resumo["criados"] == 1
+        assert resumo["atualizados"] == 2
+        assert resumo["inalterados"] == 1
+        assert resumo["movimentos_estoque"] == 2
+        assert resumo["erros"] == []
+
+        bebida = db_session.query(Produto).filter(Produto.codigo_interno == "BEB1").one()
+        assert bebida.preco == Decimal('12.50')
+
+        ajuste = db_session.query(MovimentoEstoque).filter(MovimentoEstoque.tipo_movimento == "ajuste").one()
+        assert (ajuste.estoque_anterior, ajuste.estoque_atual, ajuste.quantidade) == (100, 80, 20)
+
+    def test_simulacao_nao_grava(self, db_session, cenario):
+        service = CatalogService()
+
+        resumo = service.aplicar_lote(
+            db_session, cenario["evento"],
+            [{"codigo_interno": "BEB1", "estoque_atual": 5}],
+            cenario["usuario"].id, simular=True
+        )
+
+        assert resumo["atualizados"] == 1
+        assert db_session.query(Produto).filter(Produto.codigo_interno == "BEB1").one().estoque_atual == 100
+        assert db_session.query(MovimentoEstoque).count() == 0
+
+    def test_erros_por_item_nao_abortam_lote(self, db_session, cenario):
+        service = CatalogService()
+        itens = [
+            {"preco": Decimal('1.00')},
+            {"codigo_interno": "BEB2", "preco": Decimal('11.00')},
+            {"codigo_interno": "BEB2", "preco": Decimal('13.00')},
+            {"codigo_interno": "NOVO1", "nome": "Sem preço"},
+        ]
+
+        resumo = service.aplicar_lote(
+            db_session, cenario["evento"], itens, cenario["usuario"].id, criar_novos=True
+        )
+
+        assert resumo["atualizados"] == 1
+        assert len(resumo["erros"]) == 3
+
+    def test_codigo_de_barras_repetido_ou_de_outro_produto(self, db_session, cenario):
+        service = CatalogService()
+        itens = [
+            {"codigo_interno": "NOVO1", "codigo_barras": "555", "nome": "Água",
+             "tipo": TipoProduto.BEBIDA, "preco": Decimal('5.00')},
+            {"codigo_interno": "NOVO2", "codigo_barras": "555", "nome": "Suco",
+             "tipo": TipoProduto.BEBIDA, "preco": Decimal('7.00')},
+            {"codigo_interno": "BEB1", "codigo_barras": "7890002"},
+        ]
+
+        resumo = service.aplicar_lote(db_session, cenario["evento"], itens, cenario["usuario"].id)
+
+        assert resumo["criados"] == 1
+        assert resumo["atualizados"] == 0
+        assert len(resumo["erros"]) == 2
+        assert db_session.query(Produto).filter(Produto.codigo_barras == "555").one().codigo_interno == "NOVO1"
+        assert db_session.query(Produto).filter(Produto.codigo_interno == "BEB1").one().codigo_barras == "7890001"
+
+    def test_violacao_de_unicidade_vira_erro_do_item(self, db_session, cenario, monkeypatch):
+        service = CatalogService()
+        # Simula um produto gravado por outra requisição depois da carga do catálogo
+        monkeypatch.setattr(service, "_carregar_catalogo", lambda db, itens: ({}, {}))
+        itens = [
+            {"codigo_interno": "BEB1", "nome": "Duplicado", "tipo": TipoProduto.BEBIDA, "preco": Decimal('1.00')},
+            {"codigo_interno": "NOVO1", "nome": "Água", "tipo": TipoProduto.BEBIDA,
+             "preco": Decimal('5.00'), "estoque_atual": 10},
+        ]
+
+        resumo = service.aplicar_lote(db_session, cenario["evento"], itens, cenario["usuario"].id)
+
+        assert resumo["criados"] == 1
+        assert resumo["movimentos_estoque"] == 1
+        assert resumo["erros"] == ["Item 1: código BEB1 já cadastrado"]
+        assert db_session.query(Produto).filter(Produto.codigo_interno == "NOVO1").count() == 1
+        assert db_session.query(Produto).filter(Produto.codigo_interno == "BEB1").one().nome == "Cerveja 1"
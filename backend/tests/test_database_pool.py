@@ -0,0 +1,59 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from app.database import criar_engine, settings, SessionLocal, SessionRelatorios, _aplicar_statement_timeout
+from app.metrics import metricas
+
+class TestPoolConexoes:
+
+    def test_relatorio_esgotado_nao_bloqueia_oltp(self, banco_url):
+        oltp = criar_engine(banco_url, nome="teste_oltp", pool_size=2, max_overflow=0, pool_timeout=1)
+        relatorios = criar_engine(banco_url, nome="teste_relatorios", pool_size=1, max_overflow=0, pool_timeout=1)
+        metricas.limpar()
+        try:
+            exportacao = relatorios.connect()
+
+            # a próxima exportação espera o pool_timeout e falha; a venda não espera
+            with pytest.raises(PoolTimeoutError):
+                relatorios.connect()
+            with oltp.connect() as conn:
+                assert conn.execute(text("SELECT 1")).scalar() == 1
+
+            exportacao.close()
+        finally:
+            oltp.dispose()
+            relatorios.dispose()
+
+        snapshot = metricas.snapshot()
+        assert snapshot["contadores"]["db.teste_relatorios.checkout_timeouts"] == 1
+        assert snapshot["observacoes"]["db.teste_relatorios.checkout_espera_ms"]["max"] >= 900
+        assert snapshot["observacoes"]["db.teste_oltp.checkout_espera_ms"]["max"] < 500
+        assert snapshot["gauges"]["db.teste_oltp.conexoes_em_uso"] == 0
+
+    def test_statement_timeout_por_transacao_no_postgresql(self):
+        comandos = []
+
+        class ConexaoFalsa:
+            class dialect:
+                name = "postgresql"
+
+            def exec_driver_sql(self, sql):
+                comandos.append(sql)
+
+        relatorio = SessionRelatorios()
+        venda = SessionLocal()
+        venda.info["statement_timeout_ms"] = 2500  # a rota pode apertar o próprio limite
+        try:
+            _aplicar_statement_timeout(relatorio, None, ConexaoFalsa())
+            _aplicar_statement_timeout(venda, None, ConexaoFalsa())
+        finally:
+            relatorio.close()
+            venda.close()
+
+        assert comandos == [
+            f"SET LOCAL statement_timeout = {settings.relatorios_statement_timeout_ms}",
+            "SET LOCAL statement_timeout = 2500",
+        ]
+        # o ajuste da rota não vaza para as próximas sessões
+        assert SessionLocal().info["statement_timeout_ms"] == settings.db_statement_timeout_ms
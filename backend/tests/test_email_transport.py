@@ -0,0 +1,186 @@
+import asyncio
+import email
+from email import policy
+import socketserver
+import threading
+import time
+
+import pytest
+
+from app.services.email_service import EmailService
+from app.services.email_transport import TransporteSMTP
+
+class ServidorSMTP:
+    """SMTP local mínimo: EHLO, AUTH, MAIL/RCPT/DATA, RSET e QUIT; guarda as mensagens recebidas"""
+
+    def __init__(self, atraso: float = 0, derrubar_apos: int = 0):
+        self.atraso = atraso
+        self.derrubar_apos = derrubar_apos
+        self.conexoes = 0
+        self.logins = 0
+        self.mensagens = []
+        self._lock = threading.Lock()
+        servidor = self
+
+        class Sessao(socketserver.StreamRequestHandler):
+            def handle(self):
+                with servidor._lock:
+                    servidor.conexoes += 1
+                recebidas = 0
+                responder = lambda linha: self.wfile.write(linha.encode() + b"\r\n")
+                responder("220 teste ESMTP")
+                while True:
+                    linha = self.rfile.readline()
+                    if not linha:
+                        return
+                    comando = linha.decode().strip().upper()
+                    if comando.startswith(("EHLO", "HELO")):
+                        responder("250-teste\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME")
+                    elif comando.startswith("AUTH"):
+                        with servidor._lock:
+                            servidor.logins += 1
+                        responder("235 autenticado")
+                    elif comando.startswith("RCPT") and "RECUSADO" in comando:
+                        responder("550 destinatario recusado")
+                    elif comando.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                        responder("250 ok")
+                    elif comando == "DATA":
+                        responder("354 envie")
+                        dados = b""
+                        while not dados.endswith(b"\r\n.\r\n"):
+                            dados += self.rfile.readline()
+                        time.sleep(servidor.atraso)
+                        with servidor._lock:
+                            servidor.mensagens.append(email.message_from_bytes(dados[:-5], policy=policy.default))
+                        responder("250 recebida")
+                        recebidas += 1
+                        if servidor.derrubar_apos and recebidas >= servidor.derrubar_apos:
+                            return
+                    elif comando == "QUIT":
+                        responder("221 tchau")
+                        return
+                    else:
+                        responder("502 nao implementado")
+
+        class Servidor(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        self._servidor = Servidor(("127.0.0.1", 0), Sessao)
+        self.porta = self._servidor.server_address[1]
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+
+    def parar(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+@pytest.fixture
+def servidor():
+    servidores = []
+
+    def criar(**opcoes):
+        servidores.append(ServidorSMTP(**opcoes))
+        return servidores[-1]
+    yield criar
+    for s in servidores:
+        s.parar()
+
+def servico(servidor: ServidorSMTP, **opcoes) -> EmailService:
+    service = EmailService(TransporteSMTP("127.0.0.1", servidor.porta, "usuario", "senha", use_tls=False, **opcoes))
+    service.username, service.password, service.test_mode = "usuario", "senha", False
+    service.from_email = "eventos@exemplo.com"
+    return service
+
+class TestTransporteSMTP:
+
+    def test_conexoes_autenticadas_sao_reaproveitadas(self, servidor):
+        smtp = servidor()
+        service = servico(smtp, conexoes_massa=2)
+
+        async def cenario():
+            inicio = time.perf_counter()
+            enviados = await asyncio.gather(*[
+                service.send_event_reminder(f"cliente{i}@exemplo.com", f"Cliente {i}", "Festa", "20/12 às 22:00", "Clube")
+                for i in range(300)
+            ])
+            return enviados, time.perf_counter() - inicio
+
+        try:
+            enviados, duracao = asyncio.run(cenario())
+        finally:
+            service.transporte.encerrar()
+
+        assert all(enviados)
+        assert len(smtp.mensagens) == 300
+        assert smtp.conexoes <= 2 * 3  # reconexão a cada 100 mensagens por conexão
+        assert smtp.logins == smtp.conexoes
+        assert 300 / duracao * 60 > 3000  # milhares por minuto
+        mensagem = smtp.mensagens[0]
+        assert mensagem["Subject"] == "Lembrete: Festa - 20/12 às 22:00"
+        assert {parte.get_content_type() for parte in mensagem.walk()} >= {"text/plain", "text/html"}
+
+    def test_reconecta_quando_o_servidor_derruba_a_conexao(self, servidor):
+        smtp = servidor(derrubar_apos=3)
+        service = servico(smtp, conexoes=1)
+
+        async def cenario():
+            return [await service.send_welcome_email(f"u{i}@exemplo.com", "Usuário") for i in range(10)]
+
+        try:
+            enviados = asyncio.run(cenario())
+        finally:
+            service.transporte.encerrar()
+
+        assert all(enviados)
+        assert len(smtp.mensagens) == 10
+        assert smtp.conexoes == 4
+
+    def test_destinatario_recusado_nao_descarta_a_conexao(self, servidor):
+        smtp = servidor()
+        service = servico(smtp, conexoes=1)
+
+        async def cenario():
+            return [
+                await service.send_verification_code("recusado@exemplo.com", "A", "123456"),
+                await service.send_verification_code("ok@exemplo.com", "B", "654321"),
+            ]
+
+        try:
+            assert asyncio.run(cenario()) == [False, True]
+        finally:
+            service.transporte.encerrar()
+
+        assert smtp.conexoes == 1
+        assert "654321" in smtp.mensagens[0]["Subject"]
+
+    def test_envio_em_massa_nao_atrasa_transacional(self, servidor):
+        smtp = servidor(atraso=0.01)
+        service = servico(smtp, conexoes=1, conexoes_massa=1)
+
+        async def cenario():
+            campanha = asyncio.gather(*[
+                service.send_ticket(f"c{i}@exemplo.com", "Cliente", "Festa", "20/12", "Clube", f"ING{i}")
+                for i in range(100)
+            ])
+            await asyncio.sleep(0.05)
+            inicio = time.perf_counter()
+            await service.send_verification_code("login@exemplo.com", "Usuário", "111222")
+            espera_codigo = time.perf_counter() - inicio
+            await campanha
+            return espera_codigo
+
+        try:
+            espera_codigo = asyncio.run(cenario())
+        finally:
+            service.transporte.encerrar()
+
+        assert espera_codigo < 0.3  # a campanha leva ~1s na fila de massa
+        assert len(smtp.mensagens) == 101
+
+    def test_modo_teste_nao_abre_conexao(self, servidor):
+        smtp = servidor()
+        service = servico(smtp)
+        service.test_mode = True
+
+        assert asyncio.run(service.send_verification_code("a@exemplo.com", "A", "123456")) is True
+        assert smtp.conexoes == 0
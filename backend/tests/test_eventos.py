@@ -6,7 +6,7 @@ from datetime import datetime, timedelta
 import json
 
 from app.main import app
-from app.database import get_db, Base
+from app.database import get_db, get_db_leitura, Base
 from app.models import Usuario, Empresa, Evento, PromoterEvento, Lista, Transacao, TipoUsuario, StatusEvento
 from app.auth import criar_access_token
 
@@ -22,6 +22,7 @@ def override_get_db():
         db.close()
 
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_db_leitura] = override_get_db
 
 @pytest.fixture(scope="module")
 def client():
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from app.database import criar_async_sessionmaker
+from app.http_client import ClienteHTTP, cliente_http
+from app.metrics import metricas
+from app.models import MensagemSaida, StatusMensagemSaida
+from app.services.outbox_service import Canal, OutboxService
+from app.services.whatsapp_service import whatsapp_service
+
+@pytest.fixture(autouse=True)
+def limpar_metricas():
+    metricas.limpar()
+
+class ServidorWebhook:
+    """Receptor local: guarda os corpos recebidos e a porta de origem de cada conexão"""
+
+    def __init__(self, status: int = 200, atraso: float = 0):
+        self.status = status
+        self.atraso = atraso
+        self.corpos = []
+        self.conexoes = set()
+
+    async def receber(self, request):
+        self.conexoes.add(request.transport.get_extra_info("peername")[1])
+        self.corpos.append(await request.json())
+        await asyncio.sleep(self.atraso)
+        return web.json_response({"ok": True}, status=self.status)
+
+    async def iniciar(self) -> str:
+        app = web.Application()
+        app.router.add_post("/webhook", self.receber)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        porta = site._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{porta}/webhook"
+
+    async def parar(self):
+        await self._runner.cleanup()
+
+class TestClienteHTTP:
+
+    def test_reaproveita_conexoes(self):
+        servidor = ServidorWebhook()
+
+        async def cenario():
+            url = await servidor.iniciar()
+            cliente = ClienteHTTP(limite_por_host=2)
+            try:
+                sequenciais = [await cliente.post_json(url, {"n": i}, nome="teste") for i in range(20)]
+                concorrentes = await asyncio.gather(*[cliente.post_json(url, {"n": i}, nome="teste") for i in range(20)])
+            finally:
+                await cliente.fechar()
+                await servidor.parar()
+            return sequenciais + concorrentes
+
+        status = asyncio.run(cenario())
+
+        assert status == [200] * 40
+        assert len(servidor.corpos) == 40
+        assert len(servidor.conexoes) <= 2  # limite por host, com keep-alive
+        snapshot = metricas.snapshot()
+        assert snapshot["contadores"]["http.teste.requisicoes"] == 40
+        assert snapshot["observacoes"]["http.teste.latencia_ms"]["contagem"] == 40
+
+    def test_timeout_e_erro_http_contam_como_erro(self):
+        lento = ServidorWebhook(atraso=1)
+        com_erro = ServidorWebhook(status=500)
+
+        async def cenario():
+            url_lento = await lento.iniciar()
+            url_erro = await com_erro.iniciar()
+            cliente = ClienteHTTP(timeout_segundos=0.2)
+            try:
+                with pytest.raises(asyncio.TimeoutError):
+                    await cliente.post_json(url_lento, {}, nome="teste")
+                return await cliente.post_json(url_erro, {}, nome="teste")
+            finally:
+                await cliente.fechar()
+                await lento.parar()
+                await com_erro.parar()
+
+        assert asyncio.run(cenario()) == 500
+        assert metricas.contador("http.teste.erros") == 2
+
+    def test_notificacoes_n8n_em_lote(self, sessoes, banco_url):
+        servidor = ServidorWebhook()
+
+        async def cenario():
+            url = await servidor.iniciar()
+            db = sessoes()
+            OutboxService(sessoes).enfileirar_varios(db, "n8n", [
+                (url, {"source": "whatsapp", "event_type": "checkin_realizado", "data": {"n": i}}) for i in range(12)
+            ])
+            db.commit()
+            db.close()
+
+            fabrica = criar_async_sessionmaker(banco_url)
+            canal = Canal(whatsapp_service._entregar_n8n, entregar_lote=whatsapp_service._entregar_n8n_lote, lote_max=5)
+            try:
+                await OutboxService(fabrica, {"n8n": canal}).processar_pendentes()
+            finally:
+                await cliente_http.fechar()
+                await fabrica.kw["bind"].dispose()
+                await servidor.parar()
+
+        asyncio.run(cenario())
+
+        assert [len(corpo["eventos"]) for corpo in servidor.corpos] == [5, 5, 2]
+        assert [e["data"]["n"] for corpo in servidor.corpos for e in corpo["eventos"]] == list(range(12))
+        db = sessoes()
+        try:
+            assert {m.status for m in db.query(MensagemSaida).all()} == {StatusMensagemSaida.ENVIADA}
+        finally:
+            db.close()
@@ -0,0 +1,48 @@
+import pytest
+import csv
+import io
+import time
+
+from app.models import Comanda, TipoComanda
+from app.services.issuance_service import IssuanceService
+
+class TestEmissaoLote:
+
+    def test_emitir_lote_gera_codigos_unicos(self, db_session, evento):
+        service = IssuanceService()
+
+        resultado = service.emitir_lote(db_session, evento, 500, prefixo="FX")
+
+        comandas = db_session.query(Comanda).filter(Comanda.evento_id == evento.id).all()
+        assert len(comandas) == 500
+        assert len({c.qr_code for c in comandas}) == 500
+        assert len({c.codigo_rfid for c in comandas}) == 500
+        assert all(c.numero_comanda.startswith(f"FX{resultado['lote']}") for c in comandas)
+        assert all(c.empresa_id == evento.empresa_id for c in comandas)
+
+    def test_csv_contem_todas_as_comandas(self, db_session, evento):
+        service = IssuanceService()
+        resultado = service.emitir_lote(db_session, evento, 2500, tipo=TipoComanda.FISICA, gerar_rfid=False)
+
+        blocos = list(service.gerar_csv(resultado["linhas"], linhas_por_bloco=1000))
+        linhas = list(csv.reader(io.StringIO("".join(blocos))))
+
+        assert len(blocos) == 3
+        assert linhas[0] == ["numero_comanda", "qr_code", "codigo_rfid", "tipo"]
+        assert len(linhas) == 2501
+        assert linhas[1][2] == ""
+        assert linhas[1][3] == "FISICA"
+
+    def test_emitir_50k_em_segundos(self, db_session, evento):
+        service = IssuanceService()
+
+        inicio = time.perf_counter()
+        service.emitir_lote(db_session, evento, 50000)
+        duracao = time.perf_counter() - inicio
+
+        assert db_session.query(Comanda).count() == 50000
+        assert duracao < 30
+
+    def test_quantidade_invalida(self, db_session, evento):
+        with pytest.raises(ValueError):
+            IssuanceService().emitir_lote(db_session, evento, 0)
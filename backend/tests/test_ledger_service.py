@@ -0,0 +1,102 @@
+import pytest
+import threading
+from decimal import Decimal
+
+from app.models import Comanda, MovimentoSaldoComanda, TipoComanda, StatusComanda, TipoMovimentoSaldo
+from app.services.ledger_service import (
+    LedgerService, SaldoInsuficienteError, ComandaInativaError, ComandaNaoEncontradaError
+)
+
+@pytest.fixture
+def comanda(db_session, evento):
+    comanda = Comanda(
+        numero_comanda="C0001", tipo=TipoComanda.FISICA, saldo_atual=Decimal('100.00'),
+        status=StatusComanda.ATIVA, evento_id=evento.id, empresa_id=evento.empresa_id
+    )
+    db_session.add(comanda)
+    db_session.commit()
+    db_session.refresh(comanda)
+    return comanda
+
+class TestLedgerService:
+
+    def test_credito_e_debito_registram_movimentos(self, db_session, comanda):
+        ledger = LedgerService()
+
+        assert ledger.creditar(db_session, comanda.id, Decimal('50.00')) == Decimal('150.00')
+        assert ledger.debitar(db_session, comanda.id, Decimal('30.00')) == Decimal('120.00')
+        db_session.commit()
+
+        movimentos = db_session.query(MovimentoSaldoComanda).order_by(MovimentoSaldoComanda.id).all()
+        assert [m.tipo for m in movimentos] == [TipoMovimentoSaldo.CREDITO, TipoMovimentoSaldo.DEBITO]
+        assert movimentos[0].saldo_anterior == Decimal('100.00')
+        assert movimentos[1].saldo_posterior == Decimal('120.00')
+        assert ledger.obter_saldo(db_session, comanda.id) == Decimal('120.00')
+
+    def test_debito_sem_saldo_nao_altera_comanda(self, db_session, comanda):
+        ledger = LedgerService()
+
+        with pytest.raises(SaldoInsuficienteError):
+            ledger.debitar(db_session, comanda.id, Decimal('100.01'))
+        db_session.commit()
+
+        db_session.refresh(comanda)
+        assert comanda.saldo_atual == Decimal('100.00')
+        assert db_session.query(MovimentoSaldoComanda).count() == 0
+
+    def test_comanda_bloqueada_ou_inexistente(self, db_session, comanda):
+        ledger = LedgerService()
+        comanda.status = StatusComanda.BLOQUEADA
+        db_session.commit()
+
+        with pytest.raises(ComandaInativaError):
+            ledger.creditar(db_session, comanda.id, Decimal('10.00'))
+        with pytest.raises(ComandaNaoEncontradaError):
+            ledger.debitar(db_session, 99999, Decimal('10.00'))
+
+    def test_saldo_visto_por_outra_sessao_apos_commit(self, db_session, sessoes, comanda):
+        ledger = LedgerService()
+        outra = sessoes()
+        try:
+            assert ledger.obter_saldo(outra, comanda.id) == Decimal('100.00')
+
+            ledger.debitar(db_session, comanda.id, Decimal('40.00'))
+            db_session.rollback()
+            outra.rollback()
+            assert ledger.obter_saldo(outra, comanda.id) == Decimal('100.00')
+
+            ledger.debitar(db_session, comanda.id, Decimal('40.00'))
+            db_session.commit()
+            outra.rollback()
+            assert ledger.obter_saldo(outra, comanda.id) == Decimal('60.00')
+        finally:
+            outra.close()
+
+    def test_debitos_concorrentes_nao_gastam_alem_do_saldo(self, db_session, sessoes, comanda):
+        ledger = LedgerService()
+        sucessos = []
+        falhas = []
+
+        def gastar():
+            db = sessoes()
+            try:
+                ledger.debitar(db, comanda.id, Decimal('15.00'))
+                db.commit()
+                sucessos.append(1)
+            except SaldoInsuficienteError:
+                db.rollback()
+                falhas.append(1)
+            finally:
+                db.close()
+
+        threads = [threading.Thread(target=gastar) for _ in range(12)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        db_session.refresh(comanda)
+        assert len(sucessos) == 6
+        assert len(falhas) == 6
+        assert comanda.saldo_atual == Decimal('10.00')
+        assert db_session.query(MovimentoSaldoComanda).count() == 6
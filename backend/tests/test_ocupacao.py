@@ -0,0 +1,160 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.database import criar_async_sessionmaker
+from app.models import Evento, Transacao, Checkin
+from app.services.ocupacao_service import OcupacaoService, EstadoEvento, ocupacao_service, ocupar_vaga, REPETIDO, LOTADO
+
+from .conftest import cabecalho
+
+@pytest.fixture
+def ingressos(criar_evento):
+    """Evento com capacidade 2, uma entrada já gravada e dois ingressos ainda sem entrada"""
+    db, evento, transacoes = criar_evento(capacidade_maxima=2, presentes=1)
+    db.add(Checkin(cpf=transacoes[0].cpf_comprador, nome=transacoes[0].nome_comprador, evento_id=evento.id,
+                   usuario_id=evento.criador_id, transacao_id=transacoes[0].id, metodo_checkin="cpf",
+                   checkin_em=datetime.now() - timedelta(minutes=2)))
+    db.commit()
+    return [t.qr_code_ticket for t in transacoes]
+
+def checkin_qr(client, codigo, cpf):
+    return client.post("/api/checkins/qr", params={"qr_code": codigo, "validacao_cpf": cpf}, headers=cabecalho())
+
+class TestEstadoEvento:
+
+    def test_reserva_barra_repetida_e_lotado(self):
+        servico = OcupacaoService()
+        servico._estados[1] = EstadoEvento(capacidade=2)
+
+        assert servico.reservar(1, 1_000_000) is None
+        assert servico.reservar(1, 1_000_000) == REPETIDO
+        assert servico.reservar(1, None) is None
+        assert servico.reservar(1, 7) == LOTADO
+        servico.liberar(1, 1_000_000)
+        assert servico.reservar(1, 7) is None
+        assert servico._estados[1].ingressos == 1
+
+    def test_mapa_de_entradas_comeca_na_primeira_transacao_do_evento(self):
+        estado = EstadoEvento(primeira_transacao=1_000_003)
+
+        estado._marcar(1_000_010)
+        assert len(estado._entradas) == 2
+        assert estado.marcado(1_000_010) and not estado.marcado(10)
+
+        estado._marcar(999_990)
+        assert estado.marcado(999_990) and estado.marcado(1_000_010)
+        assert len(estado._entradas) == 4
+
+    def test_entradas_por_minuto(self):
+        agora = datetime(2026, 1, 1, 22, 30, 10)
+        estado = EstadoEvento()
+        for minutos in [0, 0, 1, 3, 61]:
+            estado._contar("qr_code", agora - timedelta(minutes=minutos), agora)
+
+        assert estado.entradas_por_minuto(5, agora) == [0, 1, 0, 1, 2]
+        assert estado.por_metodo == {"qr_code": 5}
+        # o minuto de uma hora depois reaproveita a posição do anel sem herdar a contagem
+        assert estado.entradas_por_minuto(1, agora + timedelta(hours=1)) == [0]
+
+class TestOcupacao:
+
+    def test_capacidade_e_contadores_ao_vivo(self, client, ingressos):
+        assert checkin_qr(client, ingressos[0], "111").status_code == 400
+        assert checkin_qr(client, ingressos[1], "222").status_code == 200
+        lotado = checkin_qr(client, ingressos[2], "333")
+
+        assert lotado.status_code == 409
+        resumo = client.get("/api/checkins/ocupacao/1", headers=cabecalho()).json()
+        assert (resumo["presentes"], resumo["capacidade"], resumo["lotado"]) == (2, 2, True)
+        assert resumo["ocupacao_percentual"] == 100.0
+        assert resumo["por_metodo"] == {"cpf": 1, "qr_code": 1}
+        assert resumo["checkins_ultima_hora"] == 2
+        assert resumo["checkins_ultimo_minuto"] == 1
+
+    def test_aumento_de_capacidade_libera_entrada(self, client, ingressos, sessoes):
+        checkin_qr(client, ingressos[1], "222")
+        assert checkin_qr(client, ingressos[2], "333").status_code == 409
+
+        db = sessoes()
+        db.get(Evento, 1).capacidade_maxima = 3
+        db.commit()
+        db.close()
+        ocupacao_service.atualizar_capacidade(1, 3)
+
+        assert checkin_qr(client, ingressos[2], "333").status_code == 200
+        assert client.get("/api/checkins/ocupacao/99", headers=cabecalho()).status_code == 404
+
+    def test_dashboard_conta_vendas_sem_checkin_numa_consulta(self, client, ingressos):
+        checkin_qr(client, ingressos[1], "222")
+
+        dashboard = client.get("/api/checkins/dashboard/1", headers=cabecalho()).json()
+
+        assert (dashboard["total_vendas"], dashboard["total_checkins"], dashboard["fila_espera"]) == (3, 2, 1)
+        assert dashboard["taxa_presenca"] == 66.7
+
+    def test_capacidade_vale_entre_processos(self, client, ingressos, sessoes, monkeypatch):
+        # outro processo ocupou a última vaga; o cache deste ainda não viu
+        db = sessoes()
+        assert ocupar_vaga(db, 1) == 2
+        assert ocupar_vaga(db, 1) is None
+        db.commit()
+        db.close()
+        monkeypatch.setattr(ocupacao_service, "intervalo_atualizacao", 3600)
+        client.get("/api/checkins/ocupacao/1", headers=cabecalho())
+        ocupacao_service._estados[1].presentes = 1
+
+        assert checkin_qr(client, ingressos[1], "222").status_code == 409
+
+        db = sessoes()
+        assert db.get(Evento, 1).presentes == 2
+        assert db.query(Checkin).count() == 1
+        db.close()
+        # a recusa do banco força a releitura do cache
+        assert client.get("/api/checkins/ocupacao/1", headers=cabecalho()).json()["lotado"] is True
+
+    def test_cache_rele_entradas_de_outros_processos(self, client, ingressos, sessoes):
+        resumo = client.get("/api/checkins/ocupacao/1", headers=cabecalho()).json()
+        assert resumo["presentes"] == 1
+
+        db = sessoes()
+        transacao = db.query(Transacao).filter(Transacao.cpf_comprador == "222.333.444-05").one()
+        ocupar_vaga(db, 1)
+        db.add(Checkin(cpf=transacao.cpf_comprador, nome=transacao.nome_comprador, evento_id=1,
+                       transacao_id=transacao.id, metodo_checkin="whatsapp"))
+        db.commit()
+        db.close()
+        ocupacao_service._estados[1].atualizado_em -= ocupacao_service.intervalo_atualizacao
+
+        resumo = client.get("/api/checkins/ocupacao/1", headers=cabecalho()).json()
+        assert (resumo["presentes"], resumo["lotado"]) == (2, True)
+        assert resumo["por_metodo"] == {"cpf": 1, "whatsapp": 1}
+        assert checkin_qr(client, ingressos[1], "222").status_code == 400
+
+    def test_leituras_concorrentes_contam_cada_entrada_uma_vez(self, client, ingressos, sessoes, banco_url):
+        db = sessoes()
+        transacao = db.query(Transacao).filter(Transacao.cpf_comprador == "222.333.444-05").one()
+        ocupar_vaga(db, 1)
+        db.add(Checkin(cpf=transacao.cpf_comprador, nome=transacao.nome_comprador, evento_id=1,
+                       transacao_id=transacao.id, metodo_checkin="lista"))
+        db.commit()
+        db.close()
+
+        async def carregar_juntos(atualizar):
+            fabrica = criar_async_sessionmaker(banco_url)
+            abertas = [fabrica() for _ in range(8)]
+            try:
+                await asyncio.gather(*[ocupacao_service.carregar(s, 1, atualizar=atualizar) for s in abertas])
+            finally:
+                for sessao in abertas:
+                    await sessao.close()
+                await fabrica.kw["bind"].dispose()
+
+        asyncio.run(carregar_juntos(False))  # primeira carga, todas montando o estado
+        asyncio.run(carregar_juntos(True))   # releituras depois de um check-in
+
+        resumo = ocupacao_service.resumo(1)
+        assert resumo["por_metodo"] == {"cpf": 1, "lista": 1}
+        assert (resumo["presentes"], resumo["checkins_ultima_hora"]) == (2, 2)
+        assert ocupacao_service._estados[1].ingressos == 2
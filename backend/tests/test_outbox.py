@@ -0,0 +1,118 @@
+import asyncio
+
+from app.database import criar_async_sessionmaker
+from app.models import MensagemSaida, StatusMensagemSaida
+from app.services.outbox_service import Canal, OutboxService
+
+class Provedor:
+    def __init__(self, falhas_por_destino: dict = None, latencia: float = 0):
+        self.falhas_por_destino = dict(falhas_por_destino or {})
+        self.latencia = latencia
+        self.entregues = []
+        self.em_andamento = 0
+        self.max_em_andamento = 0
+
+    async def __call__(self, destino, payload):
+        self.em_andamento += 1
+        self.max_em_andamento = max(self.max_em_andamento, self.em_andamento)
+        try:
+            await asyncio.sleep(self.latencia)
+            if self.falhas_por_destino.get(destino, 0) > 0:
+                self.falhas_por_destino[destino] -= 1
+                raise RuntimeError("provedor indisponível")
+            self.entregues.append((destino, payload["mensagem"]))
+        finally:
+            self.em_andamento -= 1
+
+def enfileirar(sessoes, destinos):
+    db = sessoes()
+    OutboxService(sessoes).enfileirar_varios(
+        db, "whatsapp", [(destino, {"mensagem": f"Olá {destino}"}) for destino in destinos]
+    )
+    db.commit()
+    db.close()
+
+def mensagens(sessoes):
+    db = sessoes()
+    try:
+        return {m.destino: m for m in db.query(MensagemSaida).all()}
+    finally:
+        db.close()
+
+def rodar(banco_url, cenario):
+    async def executar():
+        sessoes = criar_async_sessionmaker(banco_url)
+        try:
+            return await cenario(sessoes)
+        finally:
+            await sessoes.kw["bind"].dispose()
+    return asyncio.run(executar())
+
+class TestOutbox:
+
+    def test_falhas_sao_repetidas_ate_o_dead_letter(self, sessoes, banco_url):
+        enfileirar(sessoes, ["1190", "1191", "1192"])
+        provedor = Provedor({"1191": 1, "1192": 10})
+
+        async def cenario(sessoes):
+            outbox = OutboxService(sessoes, {"whatsapp": Canal(provedor)}, tentativas=3, backoff_segundos=0)
+            return await outbox.processar_pendentes()
+
+        rodar(banco_url, cenario)
+        resultado = mensagens(sessoes)
+
+        assert sorted(destino for destino, _ in provedor.entregues) == ["1190", "1191"]
+        assert resultado["1190"].status == StatusMensagemSaida.ENVIADA
+        assert resultado["1191"].status == StatusMensagemSaida.ENVIADA
+        assert resultado["1191"].tentativas == 2
+        assert resultado["1192"].status == StatusMensagemSaida.FALHOU
+        assert resultado["1192"].tentativas == 3
+        assert resultado["1192"].ultimo_erro == "provedor indisponível"
+
+        db = sessoes()
+        assert OutboxService(sessoes).reprocessar_falhas(db) == 1
+        db.close()
+        assert mensagens(sessoes)["1192"].status == StatusMensagemSaida.PENDENTE
+
+    def test_mensagem_de_worker_que_caiu_volta_para_a_fila(self, sessoes, banco_url):
+        enfileirar(sessoes, ["1190"])
+        provedor = Provedor()
+
+        async def cenario(sessoes):
+            outbox = OutboxService(sessoes, {"whatsapp": Canal(provedor)}, prazo_segundos=0.2)
+            await outbox._reivindicar()  # worker reivindica e cai antes de entregar
+            antes_do_prazo = await outbox.processar_lote()
+            await asyncio.sleep(0.25)
+            return antes_do_prazo, await outbox.processar_lote()
+
+        antes_do_prazo, depois_do_prazo = rodar(banco_url, cenario)
+
+        assert (antes_do_prazo, depois_do_prazo) == (0, 1)
+        assert provedor.entregues == [("1190", "Olá 1190")]
+        assert mensagens(sessoes)["1190"].tentativas == 2
+
+    def test_workers_concorrentes_entregam_cada_mensagem_uma_vez(self, sessoes, banco_url):
+        enfileirar(sessoes, [f"119{i:04d}" for i in range(60)])
+        provedor = Provedor(latencia=0.01)
+
+        async def cenario(sessoes):
+            workers = [
+                OutboxService(sessoes, {"whatsapp": Canal(provedor)}, lote=7, concorrencia=3)
+                for _ in range(3)
+            ]
+            return await asyncio.gather(*[w.processar_pendentes() for w in workers])
+
+        processadas = rodar(banco_url, cenario)
+
+        assert sum(processadas) == 60
+        assert len(provedor.entregues) == len(set(provedor.entregues)) == 60
+        assert provedor.max_em_andamento <= 9  # 3 por worker
+        assert {m.status for m in mensagens(sessoes).values()} == {StatusMensagemSaida.ENVIADA}
+
+    def test_enfileirar_acompanha_a_transacao_do_chamador(self, sessoes, banco_url):
+        db = sessoes()
+        OutboxService(sessoes).enfileirar(db, "email", "a@a.com", {"tipo": "boas_vindas", "nome": "A"})
+        db.rollback()
+        db.close()
+
+        assert mensagens(sessoes) == {}
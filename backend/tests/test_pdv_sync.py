@@ -0,0 +1,141 @@
+import pytest
+from decimal import Decimal
+from datetime import datetime
+from sqlalchemy import event
+
+from app.models import Produto, Comanda, TipoProduto, TipoComanda, StatusProduto
+from app.pagination import paginar_keyset, sincronizar_delta, CursorInvalidoError
+from app.services.catalog_service import CatalogService
+from app.services.issuance_service import IssuanceService
+from app.services.ledger_service import LedgerService
+
+def _produto(evento, indice, **campos):
+    return Produto(
+        nome=f"Produto {indice}", tipo=TipoProduto.BEBIDA, preco=Decimal('10.00'),
+        codigo_interno=f"P{indice}", estoque_atual=100, status=StatusProduto.ATIVO,
+        evento_id=evento.id, empresa_id=evento.empresa_id, **campos
+    )
+
+def _sincronizar(db, evento, since, limite=100):
+    query = db.query(Produto).filter(Produto.evento_id == evento.id)
+    return sincronizar_delta(db, query, Produto, evento.id, since, limite)
+
+class TestSincronizacaoPorVersao:
+
+    def test_alteracoes_e_remocoes_chegam_em_ordem_de_commit(self, db_session, evento):
+        produtos = [_produto(evento, i) for i in range(3)]
+        db_session.add_all(produtos)
+        db_session.commit()
+
+        itens, removidos, cursor, ha_mais = _sincronizar(db_session, evento, "0", limite=2)
+        assert [p.codigo_interno for p in itens] == ["P0", "P1"]
+        assert (removidos, ha_mais) == ([], True)
+
+        itens, removidos, cursor, ha_mais = _sincronizar(db_session, evento, cursor)
+        assert [p.codigo_interno for p in itens] == ["P2"]
+        assert not ha_mais
+
+        produtos[0].estoque_atual = 90
+        db_session.delete(produtos[1])
+        db_session.commit()
+
+        itens, removidos, novo_cursor, _ = _sincronizar(db_session, evento, cursor)
+        assert [p.codigo_interno for p in itens] == ["P0"]
+        assert removidos == [produtos[1].id]
+        assert int(novo_cursor) > int(cursor)
+
+        assert _sincronizar(db_session, evento, novo_cursor)[:2] == ([], [])
+
+    def test_escritas_em_core_tambem_sao_versionadas(self, db_session, evento):
+        IssuanceService().emitir_lote(db_session, evento, 3, tipo=TipoComanda.RFID)
+        query = db_session.query(Comanda).filter(Comanda.evento_id == evento.id)
+
+        itens, _, cursor, _ = sincronizar_delta(db_session, query, Comanda, evento.id, "0", 100)
+        assert len(itens) == 3
+
+        LedgerService().creditar(db_session, itens[0].id, Decimal('50.00'))
+        db_session.commit()
+
+        itens_alterados, _, _, _ = sincronizar_delta(db_session, query, Comanda, evento.id, cursor, 100)
+        assert [c.id for c in itens_alterados] == [itens[0].id]
+
+    def test_itens_gravados_em_savepoint_sao_versionados(self, db_session, evento, monkeypatch):
+        db_session.add(_produto(evento, 0))
+        db_session.commit()
+        _, _, cursor, _ = _sincronizar(db_session, evento, "0")
+
+        service = CatalogService()
+        monkeypatch.setattr(service, "_carregar_catalogo", lambda db, itens: ({}, {}))
+        service.aplicar_lote(db_session, evento, [
+            {"codigo_interno": "P0", "nome": "Duplicado", "tipo": TipoProduto.BEBIDA, "preco": Decimal('1.00')},
+            {"codigo_interno": "P1", "nome": "Novo", "tipo": TipoProduto.BEBIDA, "preco": Decimal('1.00')},
+        ], usuario_id=evento.criador_id)
+
+        itens, _, _, _ = _sincronizar(db_session, evento, cursor)
+        assert [p.codigo_interno for p in itens] == ["P1"]
+
+    def test_registro_que_sai_do_filtro_volta_como_removido(self, db_session, evento):
+        produtos = [_produto(evento, i) for i in range(2)]
+        db_session.add_all(produtos)
+        db_session.commit()
+
+        ativos = db_session.query(Produto).filter(Produto.evento_id == evento.id, Produto.status == StatusProduto.ATIVO)
+        itens, _, cursor, _ = sincronizar_delta(db_session, ativos, Produto, evento.id, "0", 100)
+        assert [p.codigo_interno for p in itens] == ["P0", "P1"]
+
+        produtos[0].status = StatusProduto.INATIVO
+        produtos[1].estoque_atual = 50
+        db_session.commit()
+
+        itens, removidos, _, _ = sincronizar_delta(db_session, ativos, Produto, evento.id, cursor, 100)
+        assert [p.codigo_interno for p in itens] == ["P1"]
+        assert removidos == [produtos[0].id]
+
+    def test_contador_do_evento_so_e_travado_no_commit(self, db_session, evento):
+        comandos = []
+        def registrar(conn, cursor, sql, parametros, contexto, executemany):
+            comandos.append(" ".join(sql.split()[:3]))
+        def travas(desde=0):
+            return [i for i, sql in enumerate(comandos) if i >= desde and sql.startswith("UPDATE contadores_sincronizacao")]
+
+        event.listen(db_session.get_bind(), "before_cursor_execute", registrar)
+        try:
+            IssuanceService().emitir_lote(db_session, evento, 5, tipo=TipoComanda.RFID)
+            # Na emissão, o contador só é tocado depois de todos os INSERTs do lote
+            ultimo_insert = max(i for i, sql in enumerate(comandos) if sql == "INSERT INTO comandas")
+            assert travas() and min(travas()) > ultimo_insert
+
+            # Escrita pelo ORM já enviada ao banco ainda não trava o contador; o commit, sim
+            inicio = len(comandos)
+            db_session.add(_produto(evento, 0))
+            db_session.flush()
+            assert travas(inicio) == []
+            db_session.commit()
+            assert travas(inicio)
+        finally:
+            event.remove(db_session.get_bind(), "before_cursor_execute", registrar)
+
+        comandas = db_session.query(Comanda).filter(Comanda.evento_id == evento.id)
+        assert sorted(c.versao for c in comandas) == [1, 2, 3, 4, 5]
+
+    def test_cursor_invalido(self, db_session, evento):
+        with pytest.raises(CursorInvalidoError):
+            _sincronizar(db_session, evento, "abc")
+
+class TestPaginacaoKeyset:
+
+    def test_empates_no_criado_em_nao_duplicam_nem_pulam(self, db_session, evento):
+        momento = datetime(2025, 1, 1, 22, 0, 0)
+        db_session.add_all([_produto(evento, i, criado_em=momento) for i in range(5)])
+        db_session.commit()
+
+        query = db_session.query(Produto).filter(Produto.evento_id == evento.id)
+        vistos, cursor = [], None
+        while True:
+            itens, cursor = paginar_keyset(db_session, query, Produto.criado_em, Produto.id, cursor, 2)
+            vistos.extend(p.id for p in itens)
+            if cursor is None:
+                break
+
+        assert vistos == sorted(vistos, reverse=True)
+        assert len(set(vistos)) == 5
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+from decimal import Decimal
+
+from app import database
+from app.models import TipoPagamentoPDV, VendaPDV
+from app.services import receipt_service as modulo_receipt
+from app.services.receipt_render import renderizar_escpos, renderizar_pdf, ESCPOS_CORTE
+from app.services.receipt_service import ReceiptService
+
+DADOS_VENDA = {
+    "numero_venda": "PDV00000001",
+    "data": "19/10/2026 22:15",
+    "estabelecimento": "Empresa Teste",
+    "evento": "Evento Teste",
+    "itens": [{"nome": "Cerveja", "quantidade": 2, "preco_unitario": "10.00", "preco_total": "20.00"}],
+    "valor_final": "20.00",
+    "pagamento": "Pix",
+}
+
+class TestComprovantes:
+
+    def test_renderizacao_pdf_e_escpos(self):
+        assert renderizar_pdf(DADOS_VENDA).startswith(b"%PDF")
+
+        escpos = renderizar_escpos(DADOS_VENDA)
+        assert b"PDV00000001" in escpos
+        assert b"R$ 20.00" in escpos
+        assert escpos.endswith(ESCPOS_CORTE)
+
+    def test_fila_agrupa_comprovantes_por_impressora(self):
+        recebido = []
+        conexoes = []
+
+        async def cenario():
+            async def tratar(reader, writer):
+                conexoes.append(1)
+                recebido.append(await reader.read())
+                writer.close()
+
+            servidor = await asyncio.start_server(tratar, "127.0.0.1", 0)
+            porta = servidor.sockets[0].getsockname()[1]
+
+            service = ReceiptService()
+            service.impressoras = {"caixa1": ("127.0.0.1", porta)}
+            for _ in range(5):
+                await service.enfileirar_impressao("caixa1", renderizar_escpos(DADOS_VENDA))
+            await service.encerrar()
+            await asyncio.sleep(0.05)
+
+            servidor.close()
+            await servidor.wait_closed()
+
+        asyncio.run(cenario())
+
+        assert len(conexoes) == 1
+        assert b"".join(recebido).count(ESCPOS_CORTE) == 5
+
+    def test_imprimir_venda_carrega_fora_do_event_loop_pela_sessao_oltp(self, monkeypatch, db_session, evento, sessoes):
+        assert modulo_receipt.SessionLocal is database.SessionLocal
+        db_session.add(VendaPDV(numero_venda="PDV00000042", valor_total=Decimal("20"), valor_final=Decimal("20"),
+                                tipo_pagamento=TipoPagamentoPDV.PIX, evento_id=evento.id,
+                                empresa_id=evento.empresa_id, usuario_vendedor_id=evento.criador_id))
+        db_session.commit()
+
+        threads = []
+        def sessao():
+            threads.append(threading.get_ident())
+            return sessoes()
+        monkeypatch.setattr(modulo_receipt, "SessionLocal", sessao)
+
+        enfileirados = []
+        service = ReceiptService()
+        async def enfileirar(impressora, conteudo):
+            enfileirados.append((impressora, conteudo))
+        service.enfileirar_impressao = enfileirar
+
+        async def cenario():
+            loop = threading.get_ident()
+            venda_id = db_session.query(VendaPDV.id).scalar()
+            await service.imprimir_venda(venda_id, "caixa1")
+            await service.imprimir_venda(venda_id + 1)
+            return loop
+
+        loop = asyncio.run(cenario())
+
+        assert len(threads) == 2 and loop not in threads
+        assert [impressora for impressora, _ in enfileirados] == ["caixa1"]
+        assert b"PDV00000042" in enfileirados[0][1]
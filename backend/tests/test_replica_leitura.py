@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.database import RoteadorLeitura, Base
+from app.models import Empresa
+
+@pytest.fixture
+def bases(tmp_path):
+    # Duas bases locais fazem o papel de primário e réplica
+    engines = {nome: create_engine(f"sqlite:///{tmp_path / nome}.db") for nome in ("primario", "replica")}
+    for nome, engine in engines.items():
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO empresas (nome, cnpj, email, ativa) VALUES (:nome, :cnpj, 'e@e.com', 1)"),
+                         {"nome": f"Empresa {nome}", "cnpj": nome})
+    yield {nome: sessionmaker(bind=engine) for nome, engine in engines.items()}
+    for engine in engines.values():
+        Base.metadata.drop_all(bind=engine)
+        engine.dispose()
+
+def nome_empresa(db):
+    return db.query(Empresa.nome).scalar()
+
+class TestRoteadorLeitura:
+
+    def test_replica_em_dia_atende_leituras_sem_aceitar_escrita(self, bases):
+        roteador = RoteadorLeitura(bases["replica"], bases["primario"], 30, 5, medir_atraso=lambda conn: 2.0)
+
+        with roteador.sessao() as db:
+            assert nome_empresa(db) == "Empresa replica"
+            db.add(Empresa(nome="Nova", cnpj="novo", email="n@n.com"))
+            with pytest.raises(RuntimeError):
+                db.flush()
+
+    def test_replica_atrasada_ou_fora_do_ar_cai_no_primario(self, bases):
+        atraso = {"valor": 60.0}
+        roteador = RoteadorLeitura(bases["replica"], bases["primario"], 30, 0, medir_atraso=lambda conn: atraso["valor"])
+
+        with roteador.sessao() as db:
+            assert nome_empresa(db) == "Empresa primario"
+        # limite por chamada, mais tolerante que o padrão
+        with roteador.sessao(atraso_max_segundos=120) as db:
+            assert nome_empresa(db) == "Empresa replica"
+
+        def fora_do_ar(conn):
+            raise ConnectionError("réplica fora do ar")
+        roteador.medir_atraso = fora_do_ar
+        with roteador.sessao() as db:
+            assert nome_empresa(db) == "Empresa primario"
+
+    def test_sem_replica_configurada_usa_primario(self, bases):
+        roteador = RoteadorLeitura(None, bases["primario"], 30, 5)
+
+        assert roteador.atraso_replica() is None
+        with roteador.sessao() as db:
+            assert nome_empresa(db) == "Empresa primario"
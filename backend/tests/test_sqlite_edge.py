@@ -0,0 +1,90 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from app.database import criar_engine
+from app.sqlite_edge import EscritorSQLite
+
+@pytest.fixture
+def engine(banco_url):
+    engine = criar_engine(banco_url, nome="teste_edge")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS vendas (id INTEGER PRIMARY KEY, valor INTEGER NOT NULL)"))
+    yield engine
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE vendas"))
+    engine.dispose()
+
+def gravar_venda(db, valor):
+    db.execute(text("INSERT INTO vendas (valor) VALUES (:valor)"), {"valor": valor})
+    db.commit()
+    return valor
+
+class TestSQLiteEdge:
+
+    def test_pragmas_aplicados_em_cada_conexao(self, engine):
+        with engine.connect() as conn:
+            assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+            assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+            assert conn.execute(text("PRAGMA mmap_size")).scalar() > 0
+
+    def test_escritor_unico_serializa_gravacoes_concorrentes(self, engine):
+        escritor = EscritorSQLite(sessionmaker(bind=engine), nome="teste_edge")
+
+        async def cenario():
+            resultados = await asyncio.gather(*[escritor.executar(gravar_venda, i) for i in range(100)])
+            # uma gravação com erro não derruba o escritor nem as seguintes
+            with pytest.raises(Exception):
+                await escritor.executar(gravar_venda, None)
+            await escritor.executar(gravar_venda, 100)
+            return resultados
+
+        try:
+            assert asyncio.run(cenario()) == list(range(100))
+        finally:
+            escritor.encerrar()
+
+        with engine.connect() as conn:
+            assert conn.execute(text("SELECT count(*) FROM vendas")).scalar() == 101
+
+    def test_fila_cheia_responde_503(self, engine):
+        escritor = EscritorSQLite(sessionmaker(bind=engine), nome="teste_edge", fila_max=1)
+        escritor._iniciar = lambda: None  # sem thread consumindo, a fila não esvazia
+
+        async def cenario():
+            pendente = asyncio.ensure_future(escritor.executar(gravar_venda, 1))
+            await asyncio.sleep(0)
+            with pytest.raises(HTTPException) as erro:
+                await escritor.executar(gravar_venda, 2)
+            pendente.cancel()
+            return erro.value.status_code
+
+        assert asyncio.run(cenario()) == 503
+
+    def test_encerramento_no_meio_do_lote_nao_deixa_requisicao_pendurada(self, engine):
+        escritor = EscritorSQLite(sessionmaker(bind=engine), nome="teste_edge", lote_max=2)
+        escritor._iniciar = lambda: None
+
+        async def cenario():
+            loop = asyncio.get_running_loop()
+            futuros = [loop.create_future() for _ in range(3)]
+            escritor._fila.put((gravar_venda, (1,), loop, futuros[0], time.perf_counter()))
+            escritor._fila.put(None)
+            escritor._fila.put((gravar_venda, (2,), loop, futuros[1], time.perf_counter()))
+            escritor._fila.put((gravar_venda, (3,), loop, futuros[2], time.perf_counter()))
+
+            thread = threading.Thread(target=escritor._executar_fila)
+            thread.start()
+            resultados = await asyncio.wait_for(asyncio.gather(*futuros, return_exceptions=True), 5)
+            thread.join()
+            return resultados
+
+        gravada, *recusadas = asyncio.run(cenario())
+        assert gravada == 1
+        assert [r.status_code for r in recusadas] == [503, 503]
@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app.models import Checkin, TipoLista, StatusTransacao
+from app.services.ticket_service import TicketService, TicketInvalido
+from app.services.ocupacao_service import EstadoEvento, ocupacao_service
+
+from .conftest import COMPRADORES, cabecalho
+
+@pytest.fixture
+def consultas(sessoes_async):
+    """SQL emitido pela sessão assíncrona da API durante o teste"""
+    emitidas = []
+    motor = sessoes_async.kw["bind"].sync_engine
+    ouvir = lambda conn, cursor, statement, *args: emitidas.append(statement)
+    event.listen(motor, "before_cursor_execute", ouvir)
+    yield emitidas
+    event.remove(motor, "before_cursor_execute", ouvir)
+
+@pytest.fixture
+def ingressos(criar_evento):
+    """Evento amanhã com três ingressos VIP: assinado, legado e cancelado"""
+    db, _, transacoes = criar_evento(
+        [COMPRADORES[0], COMPRADORES[1], (COMPRADORES[2], StatusTransacao.CANCELADA)], tipo_lista=TipoLista.VIP
+    )
+    transacoes[1].qr_code_legado = "TICKET-ABCD1234-1"
+    db.commit()
+    return dict(zip(["assinado", "legado", "cancelado"], (t.qr_code_ticket for t in transacoes)))
+
+def checkins(sessoes):
+    db = sessoes()
+    try:
+        return db.query(Checkin).count()
+    finally:
+        db.close()
+
+class TestTicketService:
+
+    def test_emite_e_verifica_sem_banco(self):
+        service = TicketService("segredo")
+        expira = datetime.now() + timedelta(hours=5)
+        codigo = service.emitir(42, 123456, TipoLista.PROMOTER, expira)
+
+        dados = service.verificar(codigo)
+
+        assert (dados.evento_id, dados.transacao_id, dados.tipo_lista) == (42, 123456, TipoLista.PROMOTER)
+        assert dados.expira_em == datetime.fromtimestamp(int(expira.timestamp()))
+        assert len(codigo) <= 40 and set(codigo) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZ234567T1")
+        assert service.verificar(codigo.lower()) == dados
+
+    def test_rejeita_adulterado_expirado_e_chave_desconhecida(self):
+        service = TicketService("segredo")
+        codigo = service.emitir(1, 2, TipoLista.VIP, datetime.now() + timedelta(hours=1))
+        adulterado = codigo[:5] + ("A" if codigo[5] != "A" else "B") + codigo[6:]
+
+        for invalido in [adulterado, codigo[:-3], "T1!!!", "T1"]:
+            with pytest.raises(TicketInvalido):
+                service.verificar(invalido)
+        with pytest.raises(TicketInvalido, match="expirado"):
+            service.verificar(codigo, agora=datetime.now() + timedelta(hours=2))
+        with pytest.raises(TicketInvalido):
+            TicketService("outro", segredo_anterior="").verificar(codigo)
+        # troca de chave: a anterior continua valendo para os ingressos já vendidos
+        assert TicketService("nova", segredo_anterior="segredo").verificar(codigo).transacao_id == 2
+
+class TestCheckinQR:
+
+    def test_ingresso_assinado_e_entrada_repetida(self, client, ingressos, sessoes, consultas):
+        consultas.clear()
+        resposta = client.post("/api/checkins/qr", params={"qr_code": ingressos["assinado"], "validacao_cpf": "111"},
+                               headers=cabecalho())
+        assert resposta.status_code == 200
+        assert resposta.json()["nome"] == "comprador 111"
+
+        consultas.clear()
+        repetido = client.post("/api/checkins/qr", params={"qr_code": ingressos["assinado"], "validacao_cpf": "111"},
+                               headers=cabecalho())
+        assert repetido.status_code == 400
+        # só a autenticação vai ao banco: a portaria decide pela assinatura e pelo mapa de entradas
+        assert not any("checkins" in consulta or "transacoes" in consulta for consulta in consultas)
+        assert checkins(sessoes) == 1
+
+    def test_entrada_gravada_por_outro_processo_e_barrada_pelo_indice(self, client, ingressos, sessoes):
+        client.post("/api/checkins/qr", params={"qr_code": ingressos["assinado"], "validacao_cpf": "111"},
+                    headers=cabecalho())
+        ocupacao_service.limpar()
+        ocupacao_service._estados[1] = EstadoEvento()  # estado deste processo sem a entrada
+
+        resposta = client.post("/api/checkins/qr", params={"qr_code": ingressos["assinado"], "validacao_cpf": "111"},
+                               headers=cabecalho())
+
+        assert resposta.status_code == 400
+        assert checkins(sessoes) == 1
+
+    def test_cancelado_e_cpf_errado_nao_marcam_entrada(self, client, ingressos, sessoes):
+        cancelado = client.post("/api/checkins/qr", params={"qr_code": ingressos["cancelado"], "validacao_cpf": "333"},
+                                headers=cabecalho())
+        cpf_errado = client.post("/api/checkins/qr", params={"qr_code": ingressos["assinado"], "validacao_cpf": "999"},
+                                 headers=cabecalho())
+        correto = client.post("/api/checkins/qr", params={"qr_code": ingressos["assinado"], "validacao_cpf": "111"},
+                              headers=cabecalho())
+
+        assert cancelado.status_code == 404
+        assert cpf_errado.status_code == 400
+        assert correto.status_code == 200
+        assert checkins(sessoes) == 1
+
+    def test_codigo_legado_continua_valendo(self, client, ingressos, sessoes):
+        legado = client.post("/api/checkins/qr", params={"qr_code": "TICKET-ABCD1234-1", "validacao_cpf": "222"},
+                             headers=cabecalho())
+        novo = client.post("/api/checkins/qr", params={"qr_code": ingressos["legado"], "validacao_cpf": "222"},
+                           headers=cabecalho())
+
+        assert legado.status_code == 200
+        assert novo.status_code == 400
+        assert checkins(sessoes) == 1
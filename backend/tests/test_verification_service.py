@@ -0,0 +1,58 @@
+import pytest
+
+from app.models import CodigoVerificacao
+from app.services.verification_service import ArmazenamentoCodigosMemoria, ArmazenamentoCodigosBanco
+
+@pytest.fixture(params=["memoria", "banco"])
+def armazenamento(request):
+    if request.param == "memoria":
+        return ArmazenamentoCodigosMemoria(ttl_segundos=600, max_tentativas=3, max_codigos=2)
+    return ArmazenamentoCodigosBanco(ttl_segundos=600, max_tentativas=3)
+
+class TestCodigosVerificacao:
+
+    def test_codigo_e_consumido_ao_validar(self, db_session, armazenamento):
+        armazenamento.salvar(db_session, "12345678901", "123456")
+
+        assert not armazenamento.validar(db_session, "12345678901", "000000")
+        assert armazenamento.validar(db_session, "12345678901", "123456")
+        assert not armazenamento.validar(db_session, "12345678901", "123456")
+
+    def test_limite_de_tentativas(self, db_session, armazenamento):
+        armazenamento.salvar(db_session, "12345678901", "123456")
+
+        for _ in range(3):
+            assert not armazenamento.validar(db_session, "12345678901", "999999")
+        assert not armazenamento.validar(db_session, "12345678901", "123456")
+
+    def test_codigo_expirado(self, db_session, armazenamento):
+        armazenamento.ttl_segundos = -1
+        armazenamento.salvar(db_session, "12345678901", "123456")
+
+        assert not armazenamento.validar(db_session, "12345678901", "123456")
+
+    def test_banco_compartilhado_entre_workers(self, db_session, sessoes):
+        worker_a = ArmazenamentoCodigosBanco()
+        worker_b = ArmazenamentoCodigosBanco()
+        outra_sessao = sessoes()
+        try:
+            worker_a.salvar(db_session, "12345678901", "123456")
+            assert worker_b.validar(outra_sessao, "12345678901", "123456")
+        finally:
+            outra_sessao.close()
+
+    def test_memoria_limitada(self, db_session):
+        armazenamento = ArmazenamentoCodigosMemoria(max_codigos=2)
+        for cpf in ("1", "2", "3"):
+            armazenamento.salvar(db_session, cpf, "123456")
+
+        assert len(armazenamento) == 2
+        assert not armazenamento.validar(db_session, "1", "123456")
+
+    def test_banco_remove_expirados_ao_gerar_codigo(self, db_session):
+        armazenamento = ArmazenamentoCodigosBanco(ttl_segundos=-1)
+        armazenamento.salvar(db_session, "1", "123456")
+        armazenamento.ttl_segundos = 600
+        armazenamento.salvar(db_session, "2", "123456")
+
+        assert [c.cpf for c in db_session.query(CodigoVerificacao).all()] == ["2"]
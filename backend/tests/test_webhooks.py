@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from app.database import criar_async_sessionmaker
+from app.metrics import metricas
+from app.models import LogAuditoria, MensagemSaida, StatusWebhookRecebido, WebhookRecebido
+from app.services.webhook_service import WebhookService, processadores
+
+@pytest.fixture(autouse=True)
+def limpar_metricas():
+    metricas.limpar()
+
+def webhooks(sessoes):
+    db = sessoes()
+    try:
+        return db.query(WebhookRecebido).order_by(WebhookRecebido.id).all()
+    finally:
+        db.close()
+
+def processar(banco_url, processadores_origem, **opcoes):
+    async def executar():
+        sessoes = criar_async_sessionmaker(banco_url)
+        try:
+            servico = WebhookService(sessoes, processadores_origem, backoff_segundos=0, **opcoes)
+            return await servico.processar_pendentes()
+        finally:
+            await sessoes.kw["bind"].dispose()
+    return asyncio.run(executar())
+
+class TestWebhooks:
+
+    def test_reenvio_do_provedor_e_confirmado_sem_duplicar(self, client, sessoes, banco_url):
+        mensagem = {"phone": "5511999990000", "message": "CONFIRMAR 11144477735", "message_id": "wamid.1"}
+
+        primeira = client.post("/api/whatsapp/whatsapp/webhook", json=mensagem)
+        reenvio = client.post("/api/whatsapp/whatsapp/webhook", json=mensagem)
+        outra = client.post("/api/whatsapp/whatsapp/webhook", json={**mensagem, "message_id": "wamid.2"})
+
+        assert primeira.status_code == reenvio.status_code == outra.status_code == 202
+        assert primeira.json()["duplicado"] is False
+        assert reenvio.json() == {**primeira.json(), "duplicado": True}
+        assert [w.chave for w in webhooks(sessoes)] == ["wamid.1", "wamid.2"]
+        assert metricas.contador("webhooks.whatsapp.recebidos") == 2
+        assert metricas.contador("webhooks.whatsapp.duplicados") == 1
+
+    def test_n8n_sem_chave_deduplica_pelo_conteudo(self, client, sessoes, banco_url):
+        url = "/api/n8n/n8n/webhook/meta-ads"
+
+        assert client.post(url, json={"event_type": "lead", "id": 1}).json()["duplicado"] is False
+        assert client.post(url, json={"id": 1, "event_type": "lead"}).json()["duplicado"] is True
+        assert client.post(url, json={"event_type": "lead", "id": 2}, headers={"Idempotency-Key": "k1"}).status_code == 202
+        assert client.post(url, json={"event_type": "lead", "id": 3}, headers={"Idempotency-Key": "k1"}).json()["duplicado"] is True
+        assert client.post(url, content=b"{invalido", headers={"Content-Type": "application/json"}).status_code == 400
+        assert len(webhooks(sessoes)) == 2
+
+    def test_workers_processam_na_ordem_e_registram_o_atraso(self, client, sessoes, banco_url):
+        for i in range(5):
+            client.post("/api/n8n/n8n/webhook/crm", json={"action": "new_contact", "n": i})
+        client.post("/api/n8n/n8n/webhook/meta-ads", json={"event_type": "purchase"})
+
+        assert processar(banco_url, processadores, lote=2) == 6
+
+        assert {w.status for w in webhooks(sessoes)} == {StatusWebhookRecebido.PROCESSADO}
+        db = sessoes()
+        try:
+            logs = db.query(LogAuditoria).order_by(LogAuditoria.id).all()
+        finally:
+            db.close()
+        assert [log.acao for log in logs] == ["webhook_crm"] * 5 + ["webhook_meta_ads"]
+        assert [f'"n": {i}' in log.dados_novos for i, log in enumerate(logs[:5])] == [True] * 5
+        assert logs[0].ip_origem == "testclient"
+        snapshot = metricas.snapshot()
+        assert snapshot["observacoes"]["webhooks.crm.atraso_ms"]["contagem"] == 5
+        assert snapshot["contadores"]["webhooks.meta_ads.processados"] == 1
+
+    def test_falha_no_processamento_e_repetida_ate_esgotar(self, client, sessoes, banco_url):
+        client.post("/api/n8n/n8n/webhook/crm", json={"action": "instavel"})
+        client.post("/api/n8n/n8n/webhook/crm", json={"action": "quebrado"})
+        falhas = {"instavel": 1, "quebrado": 10}
+        processados = []
+
+        def processador(db, payload, ip_origem):
+            if falhas[payload["action"]] > 0:
+                falhas[payload["action"]] -= 1
+                raise RuntimeError("CRM indisponível")
+            processados.append(payload["action"])
+
+        processar(banco_url, {"crm": processador}, tentativas=3)
+
+        resultado = {w.payload: w for w in webhooks(sessoes)}
+        instavel, quebrado = resultado['{"action": "instavel"}'], resultado['{"action": "quebrado"}']
+        assert processados == ["instavel"]
+        assert (instavel.status, instavel.tentativas) == (StatusWebhookRecebido.PROCESSADO, 2)
+        assert (quebrado.status, quebrado.tentativas) == (StatusWebhookRecebido.FALHOU, 3)
+        assert quebrado.ultimo_erro == "CRM indisponível"
+        assert metricas.contador("webhooks.crm.retentativas") == 3
+
+    def test_resposta_do_whatsapp_entra_na_outbox_com_o_processamento(self, client, sessoes, banco_url):
+        client.post("/api/whatsapp/whatsapp/webhook", json={"phone": "5511999990000", "message": "oi"})
+        client.post("/api/whatsapp/whatsapp/webhook", json={"phone": "5511999990001", "message": "CONFIRMAR 123"})
+
+        assert processar(banco_url, processadores) == 2
+
+        db = sessoes()
+        try:
+            respostas = {m.destino: m.payload for m in db.query(MensagemSaida).filter(MensagemSaida.canal == "whatsapp")}
+        finally:
+            db.close()
+        assert "SISTEMA DE EVENTOS" in respostas["5511999990000"]
+        assert "CPF inválido" in respostas["5511999990001"]
+        assert {w.status for w in webhooks(sessoes)} == {StatusWebhookRecebido.PROCESSADO}
@@ -0,0 +1,292 @@
+import asyncio
+import json
+import time
+from decimal import Decimal
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from app.models import TipoProduto
+from app.metrics import metricas
+from app.websocket import FluxoEvento, manager
+
+from .conftest import cabecalho
+
+@pytest.fixture
+def ingressos(criar_evento):
+    """Evento com um produto em estoque e três ingressos assinados"""
+    db, _, transacoes = criar_evento(capacidade_maxima=100, produtos=[
+        {"nome": "Água", "tipo": TipoProduto.BEBIDA, "preco": Decimal("5"), "estoque_atual": 30}
+    ])
+    db.commit()
+    return [(t.qr_code_ticket, t.cpf_comprador[:3]) for t in transacoes]
+
+def checkin(client, ingresso):
+    codigo, cpf = ingresso
+    resposta = client.post("/api/checkins/qr", params={"qr_code": codigo, "validacao_cpf": cpf}, headers=cabecalho())
+    assert resposta.status_code == 200
+
+def abrir_caixa(client):
+    resposta = client.post("/api/pdv/caixa/abrir", json={"numero_caixa": "01", "evento_id": 1}, headers=cabecalho())
+    assert resposta.status_code == 200
+
+class TestFluxoEvento:
+
+    def test_mensagens_desde_uma_sequencia(self):
+        fluxo = FluxoEvento(tamanho=3)
+        for i in range(5):
+            fluxo.publicar({"type": "teste", "n": i})
+
+        assert [mensagem.seq for mensagem in fluxo.desde(3)] == [4, 5]
+        assert fluxo.desde(5) == []
+        assert fluxo.desde(1) is None  # a mensagem 2 já saiu do buffer
+        assert fluxo.desde(2) is not None
+        assert fluxo.desde(9) is None  # sequência de outro processo
+
+class TestWebSocketRetomada:
+
+    def test_conexao_recebe_snapshot_e_deltas_numerados(self, client, ingressos):
+        with client.websocket_connect("/api/checkin/ws/1") as ws:
+            snapshot = ws.receive_json()
+            checkin(client, ingressos[0])
+            ocupacao, novo_checkin = ws.receive_json(), ws.receive_json()
+
+        assert (snapshot["type"], snapshot["seq"]) == ("snapshot", 0)
+        assert snapshot["data"]["ocupacao"]["presentes"] == 0
+        assert snapshot["data"]["estoque"] == [{"produto_id": 1, "produto_nome": "Água", "estoque_atual": 30}]
+        assert (ocupacao["type"], ocupacao["seq"], ocupacao["data"]["presentes"]) == ("ocupacao_update", 1, 1)
+        assert (novo_checkin["type"], novo_checkin["seq"]) == ("checkin_update", 2)
+
+    def test_reconexao_recebe_so_o_que_perdeu(self, client, ingressos):
+        with client.websocket_connect("/api/pdv/ws/1") as ws:
+            stream = ws.receive_json()["stream"]
+            checkin(client, ingressos[0])
+            ultimo = ws.receive_json()["seq"]
+        checkin(client, ingressos[1])
+
+        with client.websocket_connect(f"/api/pdv/ws/1?last_seq={ultimo}&stream={stream}") as ws:
+            retomada = ws.receive_json()
+            perdidas = [ws.receive_json() for _ in range(3)]
+
+        assert retomada == {"type": "resume", "stream": stream, "seq": 1}
+        assert [m["seq"] for m in perdidas] == [2, 3, 4]
+        assert perdidas[1]["data"]["presentes"] == 2
+
+    def test_buffer_excedido_ou_outro_stream_recebem_snapshot(self, client, ingressos, monkeypatch):
+        monkeypatch.setattr(manager, "tamanho_buffer", 2)
+        for ingresso in ingressos:
+            checkin(client, ingresso)
+
+        with client.websocket_connect("/api/checkin/ws/1?last_seq=1") as ws:
+            excedido = ws.receive_json()
+        with client.websocket_connect("/api/checkin/ws/1?last_seq=6&stream=outro") as ws:
+            reiniciado = ws.receive_json()
+
+        assert (excedido["type"], excedido["seq"], excedido["data"]["ocupacao"]["presentes"]) == ("snapshot", 6, 3)
+        assert (reiniciado["type"], reiniciado["seq"]) == ("snapshot", 6)
+
+class TestWebSocketTopicos:
+
+    def test_cada_conexao_recebe_so_os_topicos_e_filtros_assinados(self, client, ingressos):
+        metricas.limpar()
+        with client.websocket_connect("/api/checkin/ws/1?topicos=checkins") as portaria, \
+                client.websocket_connect("/api/pdv/ws/1?topicos=caixa&caixa=1") as caixa, \
+                client.websocket_connect("/api/pdv/ws/1?topicos=estoque&produtos=2") as bar:
+            snapshots = [portaria.receive_json(), caixa.receive_json(), bar.receive_json()]
+            abrir_caixa(client)
+            checkin(client, ingressos[0])
+            recebido_portaria = portaria.receive_json()
+            recebido_caixa = caixa.receive_json()
+
+        assert [list(s["data"]) for s in snapshots] == [["ocupacao"], [], ["estoque"]]
+        assert snapshots[2]["data"]["estoque"] == []  # produto 1 fora do filtro
+        assert (recebido_portaria["type"], recebido_portaria["seq"]) == ("ocupacao_update", 2)
+        assert (recebido_caixa["type"], recebido_caixa["seq"], recebido_caixa["caixa"]["id"]) == ("cash_register_update", 1, 1)
+        # caixa -> 1 conexão; ocupação e check-in -> só a portaria; o bar não recebe nada
+        assert metricas.contador("websocket.mensagens_enviadas") == 3
+
+    def test_retomada_reenvia_so_o_que_foi_assinado(self, client, ingressos):
+        with client.websocket_connect("/api/pdv/ws/1?topicos=caixa") as ws:
+            stream = ws.receive_json()["stream"]
+        checkin(client, ingressos[0])
+        abrir_caixa(client)
+
+        with client.websocket_connect(f"/api/pdv/ws/1?topicos=caixa&last_seq=0&stream={stream}") as ws:
+            retomada, perdida = ws.receive_json(), ws.receive_json()
+
+        assert retomada["type"] == "resume"
+        assert (perdida["type"], perdida["seq"]) == ("cash_register_update", 3)
+
+    def test_topico_ou_filtro_invalido_recusa_a_conexao(self, client):
+        for url in ["/api/checkin/ws/1?topicos=bar", "/api/pdv/ws/1?produtos=agua"]:
+            with pytest.raises(WebSocketDisconnect) as erro:
+                with client.websocket_connect(url) as ws:
+                    ws.receive_json()
+            assert erro.value.code == 1008
+
+class SocketFalso:
+    """Socket em memória; `travado` faz os envios (e o fechamento) nunca terminarem"""
+
+    def __init__(self):
+        self.recebidas = []
+        self.travado = False
+        self.fechado_com = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, texto):
+        if self.travado:
+            await asyncio.Event().wait()
+        self.recebidas.append(json.loads(texto))
+
+    async def close(self, code=1000):
+        if self.travado:
+            await asyncio.Event().wait()
+        self.fechado_com = code
+
+def conectar_e_rodar(sockets, cenario):
+    """Conectar os sockets falsos ao evento 9 e rodar o cenário; devolve o que ele retorna"""
+    async def executar():
+        for socket in sockets:
+            socket.travado, travar = False, socket.travado
+            await manager.connect(socket, 9)
+            socket.travado = travar
+        try:
+            return await cenario()
+        finally:
+            for conexao in list(manager.active_connections.get(9, {}).values()):
+                manager.disconnect(conexao)
+            await asyncio.sleep(0)  # deixa os escritores cancelados terminarem
+
+    try:
+        return asyncio.run(executar())
+    finally:
+        manager.fluxos.pop(9, None)
+
+class TestWebSocketDifusao:
+
+    def test_difusao_nao_espera_cliente_travado_e_o_derruba(self, monkeypatch):
+        monkeypatch.setattr(manager, "ping_prazo", 0.2)
+        sockets = [SocketFalso() for _ in range(4)]
+        sockets[0].travado = sockets[2].travado = True
+
+        async def cenario():
+            inicio = time.monotonic()
+            await manager.broadcast_to_event(9, {"type": "checkin", "data": {}})
+            duracao = time.monotonic() - inicio
+            await asyncio.sleep(3 * 0.2)  # prazo do envio travado + prazo do fechamento
+            return duracao, [c.websocket for c in manager.active_connections.get(9, {}).values()]
+
+        duracao, restantes = conectar_e_rodar(sockets, cenario)
+
+        assert duracao < 0.05
+        assert [s.recebidas[-1]["type"] for s in (sockets[1], sockets[3])] == ["checkin", "checkin"]
+        assert restantes == [sockets[1], sockets[3]]
+
+    def test_difusoes_concorrentes_chegam_em_ordem_de_seq(self):
+        sockets = [SocketFalso() for _ in range(5)]
+
+        async def cenario():
+            await asyncio.gather(*[manager.broadcast_to_event(9, {"type": "checkin", "n": n}) for n in range(20)])
+            await asyncio.sleep(0.05)
+
+        conectar_e_rodar(sockets, cenario)
+
+        for socket in sockets:
+            seqs = [mensagem["seq"] for mensagem in socket.recebidas[1:]]
+            assert seqs == sorted(seqs) and len(seqs) == 20
+
+    def test_fila_estourada_derruba_so_o_cliente_lento(self, monkeypatch):
+        monkeypatch.setattr(manager, "tamanho_fila", 2)
+        sockets = [SocketFalso(), SocketFalso()]
+        sockets[0].travado = True
+
+        async def cenario():
+            for n in range(4):
+                await manager.broadcast_to_event(9, {"type": "checkin", "n": n})
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+            return [c.websocket for c in manager.active_connections.get(9, {}).values()]
+
+        restantes = conectar_e_rodar(sockets, cenario)
+
+        assert restantes == [sockets[1]]
+        assert [mensagem["n"] for mensagem in sockets[1].recebidas[1:]] == [0, 1, 2, 3]
+
+class TestWebSocketHeartbeat:
+
+    def test_varredura_nao_espera_sockets_travados(self, monkeypatch):
+        monkeypatch.setattr(manager, "ping_prazo", 0.3)
+        sockets = [SocketFalso() for _ in range(4)]
+        for socket in sockets[:3]:
+            socket.travado = True
+
+        async def cenario():
+            # todas caladas há pouco mais de ping_intervalo: recebem ping, ninguém passou do prazo ainda
+            calado = time.monotonic() + manager.ping_intervalo + 0.1
+            comeco = time.monotonic()
+            assert await manager.verificar_conexoes(calado) == 0
+            duracao = time.monotonic() - comeco
+            await asyncio.sleep(3 * 0.3)  # prazo do ping travado + prazo do fechamento
+            return duracao, [c.websocket for c in manager.active_connections.get(9, {}).values()]
+
+        duracao, restantes = conectar_e_rodar(sockets, cenario)
+
+        assert duracao < 0.05
+        assert sockets[3].recebidas[-1] == {"type": "ping"}
+        assert restantes == [sockets[3]]
+
+    def test_ping_do_cliente_recebe_pong(self, client):
+        with client.websocket_connect("/api/pdv/ws/1") as ws:
+            ws.receive_json()
+            ws.send_text("ping")
+            texto = ws.receive_json()
+            ws.send_json({"type": "ping"})
+            json = ws.receive_json()
+
+        assert texto["type"] == json["type"] == "pong"
+
+    def test_conexao_calada_recebe_ping_e_e_derrubada_no_prazo(self, client):
+        with client.websocket_connect("/api/checkin/ws/1") as ws:
+            ws.receive_json()
+            conexao = next(iter(manager.active_connections[1].values()))
+            inicio = conexao.ultimo_contato
+
+            assert ws.portal.call(manager.verificar_conexoes, inicio + manager.ping_intervalo + 1) == 0
+            assert ws.receive_json() == {"type": "ping"}
+            ws.send_json({"type": "pong"})
+            ws.send_text("ping")
+            ws.receive_json()
+            assert conexao.ultimo_contato > inicio
+            assert manager.contagem()["por_evento"] == {1: 1}
+
+            calado = conexao.ultimo_contato + manager.ping_intervalo + manager.ping_prazo + 1
+            assert ws.portal.call(manager.verificar_conexoes, calado) == 1
+            with pytest.raises(WebSocketDisconnect) as erro:
+                ws.receive_json()
+
+        assert erro.value.code == 1001
+        assert manager.contagem() == {"total": 0, "por_evento": {}, "fluxos": 1}
+        assert manager.assinantes[1]["checkins"] == {}
+
+    def test_fluxo_sem_conexoes_e_descartado_apos_a_retencao(self, client):
+        with client.websocket_connect("/api/pdv/ws/1") as ws:
+            stream = ws.receive_json()["stream"]
+            fluxo = manager.fluxos[1]
+            agora = fluxo.atualizado_em + manager.retencao + 1
+            ws.portal.call(manager.verificar_conexoes, fluxo.atualizado_em)
+            assert 1 in manager.fluxos  # evento com conexão aberta mantém o fluxo
+        asyncio.run(manager.verificar_conexoes(agora))
+        assert 1 not in manager.fluxos
+
+        with client.websocket_connect(f"/api/pdv/ws/1?last_seq=0&stream={stream}") as ws:
+            assert ws.receive_json()["type"] == "snapshot"  # fluxo recriado: a sequência antiga não vale mais
+
+    def test_contagem_de_conexoes_para_admins(self, client, ingressos):
+        with client.websocket_connect("/api/pdv/ws/1") as pdv, client.websocket_connect("/api/checkin/ws/1") as portaria:
+            pdv.receive_json(), portaria.receive_json()  # registradas depois do snapshot
+            resposta = client.get("/api/websocket/conexoes", headers=cabecalho())
+
+        assert resposta.status_code == 200
+        assert resposta.json()["por_evento"] == {"1": 2}
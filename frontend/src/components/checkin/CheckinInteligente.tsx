@@ -42,7 +42,8 @@ const CheckinInteligente: React.FC<CheckinInteligente> = ({ eventoId = 1 }) => {
   const conectarWebSocket = () => {
     if (!eventoSelecionado) return;
     
-    const wsUrl = `ws://localhost:8000/api/checkin/ws/${eventoSelecionado}`;
+    // só check-ins e dashboard: vendas e estoque do PDV não interessam à portaria
+    const wsUrl = `ws://localhost:8000/api/checkin/ws/${eventoSelecionado}?topicos=checkins,dashboard`;
     const ws = new WebSocket(wsUrl);
     
     ws.onopen = () => {
@@ -52,7 +53,9 @@ const CheckinInteligente: React.FC<CheckinInteligente> = ({ eventoId = 1 }) => {
     ws.onmessage = (event) => {
       const data = JSON.parse(event.data);
       
-      if (data.type === 'checkin_update') {
+      if (data.type === 'ping') {
+        ws.send(JSON.stringify({ type: 'pong' }));
+      } else if (data.type === 'checkin_update') {
         carregarDashboard();
         carregarCheckinsRecentes();
         
@@ -5,8 +5,15 @@ class WebSocketService {
   private maxReconnectAttempts = 5;
   private reconnectInterval = 3000;
   private listeners: { [key: string]: ((data: any) => void)[] } = {};
+  // posição no fluxo do evento: ao reconectar, o servidor reenvia só o que foi perdido
+  private lastSeq: number | null = null;
+  private stream: string | null = null;
 
   connect(eventoId: number) {
+    if (this.eventoId !== eventoId) {
+      this.lastSeq = null;
+      this.stream = null;
+    }
     this.eventoId = eventoId;
     this.connectWebSocket();
   }
@@ -14,7 +21,8 @@ class WebSocketService {
   private connectWebSocket() {
     if (!this.eventoId) return;
 
-    const wsUrl = `ws://localhost:8000/api/ws/${this.eventoId}`;
+    const retomada = this.lastSeq !== null && this.stream ? `?last_seq=${this.lastSeq}&stream=${this.stream}` : '';
+    const wsUrl = `ws://localhost:8000/api/pdv/ws/${this.eventoId}${retomada}`;
     
     try {
       this.ws = new WebSocket(wsUrl);
@@ -64,6 +72,19 @@ class WebSocketService {
   private handleMessage(data: any) {
     const { type } = data;
     
+    // heartbeat do servidor: sem resposta, a conexão é derrubada
+    if (type === 'ping') {
+      this.send({ type: 'pong' });
+      return;
+    }
+    
+    if (type === 'snapshot' || type === 'resume') {
+      this.stream = data.stream;
+    }
+    if (typeof data.seq === 'number') {
+      this.lastSeq = data.seq;
+    }
+    
     if (this.listeners[type]) {
       this.listeners[type].forEach(callback => callback(data));
     }
@@ -98,6 +119,8 @@ class WebSocketService {
       this.ws = null;
     }
     this.listeners = {};
+    this.lastSeq = null;
+    this.stream = null;
   }
 }
 